@@ -11,19 +11,89 @@
 - InstagramReelsDownloader: reels Instagram
 - YouTubeVideoDownloader: видео YouTube (с обходом блокировок)
 - YouTubeShortsDownloader: shorts YouTube
+
+Пакетный режим: python module1_download.py --batch links.txt (или --batch - для stdin)
+скачивает список URL параллельно с лимитами по платформам.
 """
 from pathlib import Path
+from typing import Iterator, TextIO
 import sys
 
 # Добавляем src в путь
 sys.path.insert(0, str(Path(__file__).parent))
 
-from src.modules.content_router import ContentRouter
+from src.modules.content_router import PLATFORM_CONCURRENCY, ContentRouter
 from src.modules.downloader_base import DownloadSettings
 
 
+def read_urls(stream: TextIO) -> Iterator[str]:
+    """URL из файла со ссылками: по одному в строке, пустые строки и # комментарии пропускаются"""
+    for line in stream:
+        line = line.strip()
+        if line and not line.startswith('#'):
+            yield line
+
+
+def run_batch(router: ContentRouter, source: str, concurrency: dict) -> int:
+    """
+    Пакетная загрузка URL из файла или stdin ('-')
+
+    Returns:
+        Код выхода: 0 - все загружены, 1 - были ошибки
+    """
+    if source == '-':
+        urls = list(read_urls(sys.stdin))
+    else:
+        with open(source, 'r', encoding='utf-8') as f:
+            urls = list(read_urls(f))
+
+    total = len(dict.fromkeys(urls))
+    print(f"📋 URL в списке: {total} | параллельно: "
+          + ", ".join(f"{platform} x{limit}" for platform, limit in concurrency.items()))
+    print()
+
+    failed = 0
+    for done, item in enumerate(router.download_many(urls, concurrency), 1):
+        if item.ok:
+            print(f"✅ [{done}/{total}] {item.url} -> {item.result.folder_path.name}")
+        else:
+            failed += 1
+            print(f"❌ [{done}/{total}] {item.url}: {item.error}")
+
+    print()
+    print(f"📊 Загружено: {total - failed}/{total}, ошибок: {failed}")
+    return 1 if failed else 0
+
+
 def main():
     """Точка входа"""
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Модуль 1: загрузка контента")
+    parser.add_argument(
+        '--batch',
+        metavar='FILE',
+        help="Скачать все URL из файла (по одному в строке; '-' - читать из stdin)"
+    )
+    parser.add_argument(
+        '--comments',
+        action='store_true',
+        help='Скачивать комментарии'
+    )
+    parser.add_argument(
+        '--instagram-workers',
+        type=int,
+        default=PLATFORM_CONCURRENCY['Instagram'],
+        help=f"Одновременных загрузок Instagram в пакетном режиме (по умолчанию: {PLATFORM_CONCURRENCY['Instagram']})"
+    )
+    parser.add_argument(
+        '--youtube-workers',
+        type=int,
+        default=PLATFORM_CONCURRENCY['YouTube'],
+        help=f"Одновременных загрузок YouTube в пакетном режиме (по умолчанию: {PLATFORM_CONCURRENCY['YouTube']})"
+    )
+    args = parser.parse_args()
+
     print("\n" + "="*70)
     print("📥 МОДУЛЬ 1: ЗАГРУЗКА КОНТЕНТА (Modular Architecture)")
     print("="*70)
@@ -69,7 +139,7 @@ def main():
     
     settings = DownloadSettings(
         download_video=True,
-        download_comments=False,  # По умолчанию выключено
+        download_comments=args.comments,  # По умолчанию выключено
         video_quality='best',
         max_comments=100,
         instagram_cookies=instagram_cookies,
@@ -102,6 +172,16 @@ def main():
     print()
     print("="*70)
     print()
+
+    if args.batch:
+        try:
+            sys.exit(run_batch(router, args.batch, {
+                'Instagram': max(1, args.instagram_workers),
+                'YouTube': max(1, args.youtube_workers),
+            }))
+        except KeyboardInterrupt:
+            print("\n🛑 Прервано: уже скачанное сохранено")
+            sys.exit(130)
     
     # Основной цикл
     while True:
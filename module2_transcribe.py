@@ -6,13 +6,110 @@
 у которых еще нет файла транскрипции.
 """
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import fcntl
+import math
+import os
 import sys
+import time
 
 # Добавляем src в путь
 sys.path.insert(0, str(Path(__file__).parent))
 
-from src.modules.local_ears import LocalEars
+from src.modules.decoding_profiles import DEFAULT_PROFILE, PROFILES, needs_upgrade
+from src.modules.local_ears import LocalEars, parse_language_models
+from src.modules.subtitle_transcript import transcript_from_subtitles
+from src.modules.transcript_cache import TranscriptCache
+from src.modules.vault_index import TRANSCRIBE, ANALYZE, VaultIndex
+from src.modules.transcript_writer import (
+    TranscriptCheckpoint,
+    read_transcript_profile,
+    render_transcript_markdown,
+    write_atomic,
+)
+
+
+# Лок-файл, которым процесс "забирает" папку в работу
+LOCK_FILENAME = ".transcribe.lock"
+# Улучшение транскрипций (--upgrade) идёт, пока чужая нагрузка на ядро ниже порога
+IDLE_LOAD_PER_CORE = 0.5
+# Приоритет улучшения: уступает процессор всему остальному
+UPGRADE_NICE = 10
+
+
+def own_load(threads: int, seconds: float) -> float:
+    """
+    Вклад своей работы в load average за минуту
+    
+    Load average - экспоненциальное среднее с окном 60 секунд:
+    threads занятых потоков за seconds секунд поднимают его на
+    threads * (1 - e^(-seconds/60)).
+    """
+    return threads * (1 - math.exp(-max(0.0, seconds) / 60.0))
+
+
+def system_idle(own: float = 0.0) -> bool:
+    """
+    Машина простаивает: load average за минуту без own (своей работы)
+    ниже IDLE_LOAD_PER_CORE на ядро
+    """
+    try:
+        load = os.getloadavg()[0]
+    except (AttributeError, OSError):
+        return True
+    return max(0.0, load - own) / (os.cpu_count() or 1) < IDLE_LOAD_PER_CORE
+
+
+# Открытые лок-файлы забранных этим процессом папок
+_held_locks: Dict[Path, int] = {}
+
+
+def claim_folder(folder: Path) -> bool:
+    """
+    Забирает папку в работу: flock на лок-файле
+    
+    Лок держит ядро, поэтому лок упавшего воркера снимается вместе с
+    процессом, а перехват брошенного лока не гоняется с другими
+    воркерами. Лок-файл в папке - только для наглядности (pid, время).
+    
+    Returns:
+        True если папка забрана этим процессом
+    """
+    lock_file = folder / LOCK_FILENAME
+    
+    while True:
+        fd = os.open(lock_file, os.O_CREAT | os.O_WRONLY)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        
+        # release_folder другого процесса мог удалить файл, пока мы ждали:
+        # лок на удалённом inode ничего не охраняет - открываем заново
+        try:
+            if os.fstat(fd).st_ino == os.stat(lock_file).st_ino:
+                break
+        except FileNotFoundError:
+            pass
+        os.close(fd)
+    
+    os.ftruncate(fd, 0)
+    os.write(fd, f"{os.getpid()} {time.time():.0f}\n".encode())
+    _held_locks[folder] = fd
+    return True
+
+
+def release_folder(folder: Path) -> None:
+    """Снимает лок с папки (файл удаляется до снятия flock)"""
+    try:
+        (folder / LOCK_FILENAME).unlink()
+    except FileNotFoundError:
+        pass
+    fd = _held_locks.pop(folder, None)
+    if fd is not None:
+        os.close(fd)
 
 
 class TranscriptionProcessor:
@@ -23,13 +120,46 @@ class TranscriptionProcessor:
     создает транскрипцию с таймингами и сохраняет в Markdown.
     """
     
-    def __init__(self, content_dir: Path = Path("downloads")):
+    def __init__(
+        self,
+        content_dir: Path = Path("downloads"),
+        num_threads: Optional[int] = None,
+        chunk_workers: int = 1,
+        profile: Optional[str] = None,
+        use_subtitles: bool = True,
+        subtitle_languages: Tuple[str, ...] = ('ru', 'en'),
+        cache: Optional[TranscriptCache] = None,
+        language: Optional[str] = None,
+        language_models: Optional[Dict[str, str]] = None,
+        index: Optional[VaultIndex] = None
+    ):
         """
         Args:
             content_dir: Директория с папками контента
+            num_threads: Потоки CPU для Whisper (по умолчанию - как в LocalEars)
+            chunk_workers: Параллельные куски одного длинного файла (нарезка по тишине)
+            profile: Профиль декодирования (по умолчанию - по длительности медиа)
+            use_subtitles: Брать транскрипцию из субтитров платформы, если они есть
+            subtitle_languages: Языки субтитров, которым доверяем (в порядке предпочтения)
+            cache: Кэш транскрипций по хэшу медиа (по умолчанию DATA_DIR/transcript_cache.sqlite3)
+            language: Язык речи (None - определять для каждого файла)
+            language_models: Модель Whisper для языка, например {"en": "distil-small.en"}
+            index: Инкрементальный индекс папок (None - полный обход при каждом запуске)
         """
         self.content_dir = Path(content_dir)
-        self.ears = LocalEars()
+        self.index = index
+        self.profile = profile
+        self.use_subtitles = use_subtitles
+        self.subtitle_languages = subtitle_languages
+        ears_kwargs = {
+            'chunk_workers': chunk_workers,
+            'cache': cache or TranscriptCache(),
+            'language': language,
+            'language_models': language_models,
+        }
+        if num_threads:
+            ears_kwargs['num_threads'] = num_threads
+        self.ears = LocalEars(**ears_kwargs)
         
         # Поддерживаемые форматы
         self.video_extensions = ['.mp4', '.mov', '.avi', '.mkv', '.webm']
@@ -55,6 +185,24 @@ class TranscriptionProcessor:
         
         return sorted(folders)
     
+    def find_pending_folders(self) -> List[Path]:
+        """
+        Папки для обработки
+        
+        С индексом - только папки с медиа без транскрипции (перечитываются
+        лишь изменившиеся папки), без него - все папки верхнего уровня.
+        """
+        if self.index is None:
+            return self.find_content_folders()
+        
+        if not self.content_dir.exists():
+            print(f"❌ Директория не найдена: {self.content_dir}")
+            return []
+        
+        rescanned = self.index.refresh()
+        print(f"🗂️  Индекс папок: перечитано изменившихся папок: {rescanned}")
+        return self.index.pending(TRANSCRIBE)
+    
     def find_media_files(self, folder: Path) -> List[Path]:
         """
         Находит медиа файлы в папке
@@ -84,13 +232,19 @@ class TranscriptionProcessor:
         transcript_file = folder / "transcript.md"
         return transcript_file.exists()
     
-    def transcribe_file(self, media_file: Path, output_folder: Path) -> Optional[Path]:
+    def transcribe_file(
+        self,
+        media_file: Path,
+        output_folder: Path,
+        profile: Optional[str] = None
+    ) -> Optional[Path]:
         """
         Транскрибирует один медиа файл
         
         Args:
             media_file: Путь к медиа файлу
             output_folder: Папка для сохранения транскрипции
+            profile: Профиль декодирования (по умолчанию - self.profile)
             
         Returns:
             Путь к созданному transcript.md или None при ошибке
@@ -110,12 +264,12 @@ class TranscriptionProcessor:
             print(f"⏳ Запуск Whisper (модель: {self.ears.model_size})...")
             print(f"   Это может занять несколько минут...")
             
-            import time
             start_time = time.time()
             
-            transcript = self.ears.transcribe(media_file)
+            # Сегменты пишутся в transcript.partial.jsonl: после падения продолжим с места остановки
+            checkpoint = TranscriptCheckpoint.for_folder(output_folder, media_file)
+            transcript = self.ears.transcribe(media_file, checkpoint=checkpoint, profile=profile or self.profile)
             
-            elapsed_time = time.time() - start_time
             elapsed_time = time.time() - start_time
             
             if not transcript:
@@ -126,41 +280,16 @@ class TranscriptionProcessor:
             print(f"\n✅ Транскрибация завершена за {elapsed_time:.1f} секунд")
             print(f"   Язык: {transcript.language}")
             print(f"   Длительность: {transcript.duration:.1f} сек")
+            print(f"   Профиль: {transcript.profile}")
             
             # Создаем transcript.md
             transcript_file = output_folder / "transcript.md"
             
             print(f"\n📝 Сохранение в Markdown...")
             
-            # Формируем Markdown с YAML frontmatter
-            from datetime import datetime
-            
-            markdown = "---\n"
-            markdown += f"title: Транскрипция {media_file.stem}\n"
-            markdown += f"date: {datetime.now().strftime('%Y-%m-%d')}\n"
-            markdown += f"media_file: {media_file.name}\n"
-            markdown += f"whisper_model: {self.ears.model_size}\n"
-            markdown += f"language: {transcript.language}\n"
-            markdown += f"duration: {transcript.duration:.1f}\n"
-            markdown += f"type: transcript\n"
-            markdown += "---\n\n"
-            
-            markdown += f"# Транскрипция\n\n"
-            markdown += f"**Файл**: `{media_file.name}`\n"
-            markdown += f"**Модель**: `{self.ears.model_size}`\n"
-            markdown += f"**Язык**: `{transcript.language}`\n"
-            markdown += f"**Длительность**: `{transcript.duration:.1f}` секунд\n\n"
-            markdown += "---\n\n"
-            
-            # Добавляем транскрипт с таймингами
-            markdown += transcript.timed_transcript
-            markdown += "\n\n---\n\n"
-            markdown += "## Полный текст (без таймингов)\n\n"
-            markdown += transcript.full_text
-            markdown += "\n"
-            
-            # Сохраняем
-            transcript_file.write_text(markdown, encoding='utf-8')
+            # Markdown с YAML frontmatter; transcript.md появляется только сейчас, атомарно
+            markdown = render_transcript_markdown(transcript, media_file, self.ears.model_size)
+            checkpoint.finalize(transcript_file, markdown)
             
             print(f"✅ Сохранено: transcript.md ({transcript_file.stat().st_size / 1024:.1f} KB)")
             print(f"{'='*70}")
@@ -179,6 +308,25 @@ class TranscriptionProcessor:
             print(f"{'='*70}\n")
             return None
     
+    def transcribe_from_subtitles(self, media_file: Path, output_folder: Path) -> Optional[Path]:
+        """
+        Создаёт transcript.md из субтитров платформы (без Whisper)
+        
+        Returns:
+            Путь к transcript.md или None, если подходящих субтитров нет
+        """
+        found = transcript_from_subtitles(output_folder, self.subtitle_languages)
+        if found is None:
+            return None
+        
+        transcript, track = found
+        transcript_file = output_folder / "transcript.md"
+        write_atomic(transcript_file, render_transcript_markdown(transcript, media_file, f"subtitles ({track.name})"))
+        
+        print(f"   📝 Транскрипция из субтитров: {track.name} "
+              f"({transcript.language}, {transcript.duration:.0f} сек) - Whisper не нужен")
+        return transcript_file
+    
     def _format_timestamp(self, seconds: float) -> str:
         """
         Форматирует таймстемп из секунд в MM:SS
@@ -212,6 +360,7 @@ class TranscriptionProcessor:
             'folder': folder.name,
             'already_has_transcript': False,
             'no_media': False,
+            'locked': False,
             'success': False,
             'error': None
         }
@@ -237,8 +386,26 @@ class TranscriptionProcessor:
         
         print(f"   ▶️  Найден медиа файл: {media_file.name}")
         
-        # Транскрибируем
-        transcript_file = self.transcribe_file(media_file, folder)
+        # Забираем папку, чтобы параллельные воркеры и бот не делали её дважды
+        if not claim_folder(folder):
+            print(f"   ⏭️  Пропуск: папка уже обрабатывается другим процессом")
+            stats['locked'] = True
+            return stats
+        
+        try:
+            # Повторная проверка: транскрипция могла появиться, пока ждали лок
+            if self.has_transcript(folder):
+                stats['already_has_transcript'] = True
+                return stats
+            
+            # Субтитры платформы дешевле Whisper; без них - транскрибируем
+            transcript_file = None
+            if self.use_subtitles:
+                transcript_file = self.transcribe_from_subtitles(media_file, folder)
+            if transcript_file is None:
+                transcript_file = self.transcribe_file(media_file, folder)
+        finally:
+            release_folder(folder)
         
         if transcript_file:
             stats['success'] = True
@@ -303,10 +470,40 @@ class TranscriptionProcessor:
                 
         return agg_stats
 
-    def process_all(self) -> dict:
+    def collect_pending_folders(self, folders: Optional[List[Path]] = None) -> List[Path]:
+        """
+        Раскрывает контейнеры и возвращает контент-папки без транскрипции
+        
+        Args:
+            folders: Стартовые папки (по умолчанию - find_content_folders())
+            
+        Returns:
+            Список папок с медиа, которым нужна транскрибация
+        """
+        pending = []
+        stack = list(reversed(folders if folders is not None else self.find_content_folders()))
+        
+        while stack:
+            folder = stack.pop()
+            if self.find_media_files(folder):
+                if not self.has_transcript(folder):
+                    pending.append(folder)
+                continue
+            try:
+                subfolders = sorted(f for f in folder.iterdir() if f.is_dir() and not f.name.startswith('.'))
+            except Exception:
+                subfolders = []
+            stack.extend(reversed(subfolders))
+        
+        return pending
+    
+    def process_all(self, workers: int = 1) -> dict:
         """
         Обрабатывает все папки
         
+        Args:
+            workers: Количество процессов-воркеров (1 - последовательно)
+        
         Returns:
             Общая статистика
         """
@@ -320,7 +517,7 @@ class TranscriptionProcessor:
         
         # Находим папки
         print(f"\n🔍 Сканирование директории...")
-        folders = self.find_content_folders()
+        folders = self.find_pending_folders()
         
         if not folders:
             print("\n⚠️  Папки с контентом не найдены")
@@ -335,30 +532,24 @@ class TranscriptionProcessor:
             'already_has_transcript': 0,
             'no_media': 0,
             'successfully_transcribed': 0,
+            'locked': 0,
             'errors': 0,
             'start_time': __import__('time').time()
         }
         
-        # Обрабатываем каждую папку
-        for i, folder in enumerate(folders, 1):
-            print(f"\n{'='*70}")
-            print(f"📂 ПАПКА [{i}/{len(folders)}]")
-            print(f"{'='*70}")
-            print(f"📌 {folder.name[:80]}")
-            print(f"{'='*70}")
-            
-            stats = self.process_folder(folder)
-            
-            if stats['already_has_transcript']:
-                total_stats['already_has_transcript'] += 1
-            elif stats['no_media']:
-                total_stats['no_media'] += 1
-            elif stats['success']:
-                total_stats['successfully_transcribed'] += 1
-                print(f"\n✅ [{i}/{len(folders)}] Завершено успешно")
-            else:
-                total_stats['errors'] += 1
-                print(f"\n❌ [{i}/{len(folders)}] Ошибка обработки")
+        if workers > 1:
+            self._process_all_parallel(folders, workers, total_stats)
+        else:
+            # Обрабатываем каждую папку
+            for i, folder in enumerate(folders, 1):
+                print(f"\n{'='*70}")
+                print(f"📂 ПАПКА [{i}/{len(folders)}]")
+                print(f"{'='*70}")
+                print(f"📌 {folder.name[:80]}")
+                print(f"{'='*70}")
+                
+                stats = self.process_folder(folder)
+                self._accumulate_stats(total_stats, stats, f"[{i}/{len(folders)}]")
         
         # Вычисляем время
         elapsed_time = __import__('time').time() - total_stats['start_time']
@@ -374,6 +565,8 @@ class TranscriptionProcessor:
         print(f"⏭️  Уже есть транскрипция: {total_stats['already_has_transcript']}")
         print(f"⏭️  Нет медиа файлов: {total_stats['no_media']}")
         print(f"✅ Успешно транскрибировано: {total_stats['successfully_transcribed']}")
+        if total_stats['locked'] > 0:
+            print(f"🔒 Заняты другим процессом: {total_stats['locked']}")
         if total_stats['errors'] > 0:
             print(f"❌ Ошибок: {total_stats['errors']}")
         
@@ -396,6 +589,12 @@ class TranscriptionProcessor:
             pending_transcribe = 0
             pending_ai = 0
             
+            if self.index is not None:
+                self.index.refresh()
+                counts = self.index.counts()
+                pending_transcribe, pending_ai = counts[TRANSCRIBE], counts[ANALYZE]
+                folders = []
+            
             for folder in folders:
                 has_transcript = (folder / "transcript.md").exists()
                 has_analysis = (folder / "Knowledge.md").exists()  # Модуль 3 создает Knowledge.md
@@ -420,6 +619,163 @@ class TranscriptionProcessor:
         
         return total_stats
 
+    def find_upgradable_folders(self, target: str = DEFAULT_PROFILE) -> List[Path]:
+        """
+        Папки, чья транскрипция сделана профилем ниже target
+        
+        Returns:
+            Список контент-папок с transcript.md и медиа
+        """
+        upgradable = []
+        stack = list(reversed(self.find_content_folders()))
+        
+        while stack:
+            folder = stack.pop()
+            if self.find_media_files(folder):
+                if self.has_transcript(folder) and needs_upgrade(
+                    read_transcript_profile(folder / "transcript.md"), target
+                ):
+                    upgradable.append(folder)
+                continue
+            try:
+                subfolders = sorted(f for f in folder.iterdir() if f.is_dir() and not f.name.startswith('.'))
+            except Exception:
+                subfolders = []
+            stack.extend(reversed(subfolders))
+        
+        return upgradable
+    
+    def upgrade_all(self, target: str = DEFAULT_PROFILE) -> dict:
+        """
+        Перетранскрибирует быстрые транскрипции профилем target
+        
+        Работает с пониженным приоритетом (UPGRADE_NICE) и только пока
+        машина простаивает: собственный Whisper из нагрузки вычитается,
+        при росте чужой нагрузки улучшение останавливается, оставшиеся
+        папки улучшатся при следующем запуске.
+        
+        Returns:
+            Статистика улучшения
+        """
+        folders = self.find_upgradable_folders(target)
+        stats = {'candidates': len(folders), 'upgraded': 0, 'errors': 0, 'skipped_busy': 0}
+        
+        print(f"\n⬆️  Улучшение транскрипций до профиля {target}: {len(folders)} папок")
+        if folders:
+            try:
+                os.nice(UPGRADE_NICE)
+            except (AttributeError, OSError):
+                pass
+        
+        own = 0.0
+        for i, folder in enumerate(folders, 1):
+            if not system_idle(own):
+                stats['skipped_busy'] = len(folders) - i + 1
+                print(f"   ⏸️  Машина занята, улучшение отложено ({stats['skipped_busy']} папок)")
+                break
+            
+            if not claim_folder(folder):
+                continue
+            try:
+                media_file = self.find_media_files(folder)[0]
+                print(f"\n⬆️  [{i}/{len(folders)}] {folder.name[:80]}")
+                started = time.monotonic()
+                if self.transcribe_file(media_file, folder, profile=target):
+                    stats['upgraded'] += 1
+                else:
+                    stats['errors'] += 1
+                own = own_load(self.ears.num_threads, time.monotonic() - started)
+            finally:
+                release_folder(folder)
+        
+        print(f"\n✅ Улучшено транскрипций: {stats['upgraded']}")
+        return stats
+    
+    def _accumulate_stats(self, total_stats: dict, stats: dict, label: str) -> None:
+        """Добавляет статистику папки в общую"""
+        if stats['already_has_transcript']:
+            total_stats['already_has_transcript'] += 1
+        elif stats['no_media']:
+            total_stats['no_media'] += 1
+        elif stats.get('locked'):
+            total_stats['locked'] += 1
+        elif stats['success']:
+            total_stats['successfully_transcribed'] += 1
+            print(f"\n✅ {label} Завершено успешно")
+        else:
+            total_stats['errors'] += 1
+            print(f"\n❌ {label} Ошибка обработки")
+    
+    def _process_all_parallel(self, folders: List[Path], workers: int, total_stats: dict) -> None:
+        """
+        Параллельная транскрибация пулом процессов
+        
+        Каждый воркер держит свою модель с cpu_threads = ядра / workers:
+        N маленьких задач на коротких рилсах быстрее одной переподписанной.
+        Папки забираются через лок-файлы, transcript.md пишется атомарно.
+        """
+        pending = self.collect_pending_folders(folders)
+        cpu_threads = max(1, (os.cpu_count() or workers) // workers)
+        
+        print(f"\n⚡ Параллельный режим: {workers} воркеров × {cpu_threads} потоков")
+        print(f"📋 К транскрибации: {len(pending)} папок")
+        
+        if not pending:
+            return
+        
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(
+                str(self.content_dir), cpu_threads, self.profile, self.use_subtitles,
+                self.ears.language, self.ears.language_models
+            )
+        ) as executor:
+            futures = {executor.submit(_worker_process, str(folder)): folder for folder in pending}
+            
+            for i, future in enumerate(as_completed(futures), 1):
+                folder = futures[future]
+                try:
+                    stats = future.result()
+                except Exception as e:
+                    stats = {
+                        'folder': folder.name,
+                        'already_has_transcript': False,
+                        'no_media': False,
+                        'success': False,
+                        'error': str(e)
+                    }
+                self._accumulate_stats(total_stats, stats, f"[{i}/{len(pending)}] {folder.name[:60]}")
+
+
+# Процессор воркера (один на процесс пула)
+_worker_processor: Optional[TranscriptionProcessor] = None
+
+
+def _init_worker(
+    content_dir: str,
+    cpu_threads: int,
+    profile: Optional[str] = None,
+    use_subtitles: bool = True,
+    language: Optional[str] = None,
+    language_models: Optional[Dict[str, str]] = None
+) -> None:
+    """Инициализация процесса-воркера"""
+    global _worker_processor
+    _worker_processor = TranscriptionProcessor(
+        content_dir=Path(content_dir),
+        num_threads=cpu_threads,
+        profile=profile,
+        use_subtitles=use_subtitles,
+        language=language,
+        language_models=language_models
+    )
+
+
+def _worker_process(folder: str) -> dict:
+    """Транскрибация одной контент-папки в процессе-воркере"""
+    return _worker_processor._process_content_folder(Path(folder))
+
 
 def main():
     """Точка входа"""
@@ -439,12 +795,64 @@ def main():
         type=str,
         help='Обработать только одну папку (имя папки)'
     )
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help='Количество параллельных процессов транскрибации (по умолчанию: 1)'
+    )
+    parser.add_argument(
+        '--chunk-workers',
+        type=int,
+        default=1,
+        help='Параллельные куски одного длинного видео (по умолчанию: 1)'
+    )
+    parser.add_argument(
+        '--profile',
+        choices=list(PROFILES),
+        help='Профиль декодирования: fast, balanced, accurate (по умолчанию: по длительности)'
+    )
+    parser.add_argument(
+        '--language',
+        default='auto',
+        help='Язык речи: auto (определять по первым 30 сек), ru, en, ... (по умолчанию: auto)'
+    )
+    parser.add_argument(
+        '--language-models',
+        default='',
+        help='Модель для языка, например: en=distil-small.en,de=medium'
+    )
+    parser.add_argument(
+        '--no-subtitles',
+        action='store_true',
+        help='Не использовать субтитры платформы, всегда запускать Whisper'
+    )
+    parser.add_argument(
+        '--upgrade',
+        action='store_true',
+        help='Перетранскрибировать быстрые транскрипции профилем accurate, пока машина простаивает'
+    )
+    parser.add_argument(
+        '--full-scan',
+        action='store_true',
+        help='Обойти все папки без индекса (DATA_DIR/vault_index.sqlite3)'
+    )
     
     args = parser.parse_args()
     
-    processor = TranscriptionProcessor(content_dir=args.dir)
+    processor = TranscriptionProcessor(
+        content_dir=args.dir,
+        chunk_workers=max(1, args.chunk_workers),
+        profile=args.profile,
+        use_subtitles=not args.no_subtitles,
+        language=None if args.language == 'auto' else args.language,
+        language_models=parse_language_models(args.language_models),
+        index=None if args.full_scan or args.folder else VaultIndex(args.dir)
+    )
     
-    if args.folder:
+    if args.upgrade:
+        processor.upgrade_all(target=args.profile or DEFAULT_PROFILE)
+    elif args.folder:
         # Обработка одной папки
         folder_path = args.dir / args.folder
         if not folder_path.exists():
@@ -467,7 +875,7 @@ def main():
             print(f"❌ Ошибка: {stats['error']}")
     else:
         # Обработка всех папок
-        processor.process_all()
+        processor.process_all(workers=max(1, args.workers))
 
 
 if __name__ == "__main__":
@@ -6,7 +6,8 @@
 Создает теги, саммари и сохраняет в Obsidian-совместимый Markdown.
 """
 from pathlib import Path
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, Tuple
+import asyncio
 import sys
 from datetime import datetime
 
@@ -14,8 +15,11 @@ from datetime import datetime
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from src.modules.local_brain import LocalBrain
+from src.modules.module4_rag import index_worker, rag_available
+from src.modules.prompt_compaction import compact_description, compact_transcript
+from src.modules.structured_output import PARTIAL_FILENAME
+from src.modules.vault_index import ANALYZE, VaultIndex
 from src.modules.tag_manager import TagManager
-import threading
 
 
 class AIProcessor:
@@ -30,15 +34,21 @@ class AIProcessor:
         self,
         content_dir: Path = Path("downloads"),
         tags_file: Path = Path("known_tags.json"),
-        model: str = "qwen2.5:7b"
+        model: str = "qwen2.5:7b",
+        index: Optional[VaultIndex] = None,
+        index_rag: bool = True
     ):
         """
         Args:
             content_dir: Директория с папками контента
             tags_file: Файл с базой тегов
             model: Модель Ollama для анализа
+            index: Инкрементальный индекс папок (None - полный обход при каждом запуске)
+            index_rag: Индексировать Knowledge.md в RAG в фоне (демон делает это сам)
         """
         self.content_dir = Path(content_dir)
+        self.index = index
+        self.index_rag = index_rag
         self.brain = LocalBrain(model=model)
         self.tag_manager = TagManager(tags_file)  # Передаём путь напрямую
         
@@ -64,6 +74,25 @@ class AIProcessor:
         
         return sorted(folders)
     
+    def find_pending_folders(self) -> List[Path]:
+        """
+        Папки для обработки
+        
+        С индексом - только папки контента, готовые к анализу и без
+        Knowledge.md (перечитываются лишь изменившиеся папки), без него -
+        все папки верхнего уровня.
+        """
+        if self.index is None:
+            return self.find_content_folders()
+        
+        if not self.content_dir.exists():
+            print(f"❌ Директория не найдена: {self.content_dir}")
+            return []
+        
+        rescanned = self.index.refresh()
+        print(f"🗂️  Индекс папок: перечитано изменившихся папок: {rescanned}")
+        return self.index.pending(ANALYZE)
+    
     def has_analysis(self, folder: Path) -> bool:
         """
         Проверяет, есть ли уже AI анализ
@@ -123,47 +152,94 @@ class AIProcessor:
                 images.append(file)
         return sorted(images)
     
-    def analyze_content(self, folder: Path) -> Optional[Dict]:
+    def _gather_inputs(self, folder: Path) -> Optional[Tuple[Optional[str], Optional[str], List[Path]]]:
         """
-        Анализирует контент папки
+        Собирает данные папки для анализа
+        
+        Из файлов убирается разметка (frontmatter, заголовки), а из
+        транскрипции - дублирующий её чистый текст: в промпт идут данные.
         
-        Args:
-            folder: Папка для анализа
-            
         Returns:
-            Словарь с результатами анализа или None
+            (описание, транскрипция, изображения) или None, если анализировать нечего
         """
-        print(f"\n🧠 AI Анализ: {folder.name}")
-        
-        # Собираем данные
         description = self.read_description(folder)
         transcript = self.read_transcript(folder)
         images = self.find_images(folder)
         
+        if description is not None:
+            description = compact_description(description)
+        if transcript is not None:
+            transcript = compact_transcript(transcript)
+        
         if not description and not transcript:
             print("⚠️  Нет данных для анализа (нет description.md и transcript.md)")
             return None
         
-        # Формируем контекст для анализа
-        context_parts = []
+        return description, transcript, images
+    
+    def _apply_summary(
+        self,
+        summary: Optional[Dict],
+        description: Optional[str],
+        transcript: Optional[str],
+        images: List[Path]
+    ) -> Optional[Dict]:
+        """
+        Обрабатывает теги из ответа LLM и собирает результат анализа
         
-        if description:
-            context_parts.append(f"## Описание\n\n{description}")
+        Returns:
+            Словарь с результатами анализа или None
+        """
+        if not summary:
+            print("❌ AI не вернул результат")
+            return None
         
-        if transcript:
-            context_parts.append(f"## Транскрипция\n\n{transcript}")
+        # Извлекаем теги из результата AI (summary уже содержит теги)
+        print("   🏷️  Обработка тегов...")
+        tags = summary.get('tags', [])
+        
+        # Добавляем новые теги в базу
+        new_count = 0
+        if tags:
+            new_count = self.tag_manager.add_tags(tags)
+            if new_count > 0:
+                print(f"   ✨ Добавлено новых тегов: {new_count}")
+            print(f"   ✅ Теги: {', '.join(tags)}")
+        else:
+            print("   ⚠️  Теги не найдены")
+        
+        return {
+            'summary': summary,
+            'tags': tags,
+            'new_tags_count': new_count,
+            'has_description': description is not None,
+            'has_transcript': transcript is not None,
+            'image_count': len(images)
+        }
+    
+    def analyze_content(self, folder: Path) -> Optional[Dict]:
+        """
+        Анализирует контент папки
         
-        if images:
-            context_parts.append(f"## Изображения\n\nКоличество: {len(images)}")
+        Args:
+            folder: Папка для анализа
+            
+        Returns:
+            Словарь с результатами анализа или None
+        """
+        print(f"\n🧠 AI Анализ: {folder.name}")
         
-        context = "\n\n".join(context_parts)
+        inputs = self._gather_inputs(folder)
+        if inputs is None:
+            return None
+        description, transcript, images = inputs
         
         # AI анализ
         try:
             print("   🤖 Запуск AI анализа...")
             
-            # Получаем строку с известными тегами
-            known_tags_str = self.tag_manager.get_tags_string()
+            # Стабильный блок тегов (кэшируемый префикс) + теги, добавленные после него
+            known_tags, recent_tags = self.tag_manager.get_tags_block()
             
             # Создаем саммари
             summary = self.brain.analyze(
@@ -171,35 +247,12 @@ class AIProcessor:
                 transcript=transcript or "",
                 comments=[],  # Комментарии пока не используем
                 author="",     # Автор не всегда известен
-                known_tags=known_tags_str
+                known_tags=known_tags,
+                recent_tags=recent_tags,
+                partial_path=folder / PARTIAL_FILENAME  # Повтор продолжит с сохранённого
             )
             
-            if not summary:
-                print("❌ AI не вернул результат")
-                return None
-            
-            # Извлекаем теги из результата AI (summary уже содержит теги)
-            print("   🏷️  Обработка тегов...")
-            tags = summary.get('tags', [])
-            
-            # Добавляем новые теги в базу
-            new_count = 0
-            if tags:
-                new_count = self.tag_manager.add_tags(tags)
-                if new_count > 0:
-                    print(f"   ✨ Добавлено новых тегов: {new_count}")
-                print(f"   ✅ Теги: {', '.join(tags)}")
-            else:
-                print("   ⚠️  Теги не найдены")
-            
-            return {
-                'summary': summary,
-                'tags': tags,
-                'new_tags_count': new_count,
-                'has_description': description is not None,
-                'has_transcript': transcript is not None,
-                'image_count': len(images)
-            }
+            return self._apply_summary(summary, description, transcript, images)
             
         except Exception as e:
             print(f"❌ Ошибка AI анализа: {e}")
@@ -207,6 +260,39 @@ class AIProcessor:
             traceback.print_exc()
             return None
     
+    async def analyze_content_async(self, folder: Path) -> Optional[Dict]:
+        """
+        Асинхронный analyze_content: запросы к Ollama идут параллельно
+        
+        Args:
+            folder: Папка для анализа
+            
+        Returns:
+            Словарь с результатами анализа или None
+        """
+        inputs = self._gather_inputs(folder)
+        if inputs is None:
+            return None
+        description, transcript, images = inputs
+        
+        try:
+            known_tags, recent_tags = self.tag_manager.get_tags_block()
+            summary = await self.brain.analyze_async(
+                caption=description or "",
+                transcript=transcript or "",
+                comments=[],
+                author="",
+                known_tags=known_tags,
+                recent_tags=recent_tags,
+                label=folder.name,
+                partial_path=folder / PARTIAL_FILENAME
+            )
+            return self._apply_summary(summary, description, transcript, images)
+            
+        except Exception as e:
+            print(f"❌ Ошибка AI анализа ({folder.name}): {e}")
+            return None
+    
     def _extract_summary_text(self, summary_data: Dict) -> str:
         """
         Извлекает текст саммари из результата LLM.
@@ -351,37 +437,10 @@ processed: true
         try:
             note_file.write_text(markdown, encoding='utf-8')
             print(f"✅ Сохранено: Knowledge.md")
-            # После успешного сохранения — попробуем индексировать в RAG (если модуль доступен)
-            try:
-                # Импортируем лениво — если модуль4 отсутствует, ничего не делаем
-                from src.modules.module4_rag import RAGEngine
-
-                try:
-                    # Ищем корень пользователя (например downloads/{user_folder})
-                    # Предположим, что папка контента лежит внутри папки пользователя
-                    user_root = None
-                    for p in note_file.parents:
-                        if p.name and (p.parent.name == 'downloads' or '_' in p.name or p.parent == Path('downloads')):
-                            user_root = p
-                            break
-
-                    rag = RAGEngine(user_root=user_root)
-                    # Запускаем индексирование в фоне, чтобы не блокировать основной поток
-                    def _run_index():
-                        try:
-                            indexed = rag.index_folder(folder)
-                            print(f"   ✅ Indexed {indexed} chunks into user's RAG DB")
-                        except Exception as e:
-                            print(f"   ⚠️ RAG indexing failed (background): {e}")
-
-                    t = threading.Thread(target=_run_index, daemon=True)
-                    t.start()
-                except Exception as e:
-                    print(f"   ⚠️ RAG indexing failed: {e}")
-            except ImportError:
-                # module4 not installed — пропускаем
-                pass
-
+            if not self.index_rag:
+                return note_file
+            # После успешного сохранения — индексируем в RAG (если модуль доступен)
+            self._queue_rag_index(folder, note_file)
             return note_file
         except Exception as e:
             print(f"❌ Ошибка сохранения: {e}")
@@ -434,17 +493,8 @@ processed: true
         # 5. Вообще нет контента для анализа
         return False, "нет контента для обработки"
     
-    def _process_content_folder(self, folder: Path) -> dict:
-        """
-        Обрабатывает одну папку
-        
-        Args:
-            folder: Папка для обработки
-            
-        Returns:
-            Статистика обработки
-        """
-        stats = {
+    def _new_folder_stats(self, folder: Path) -> dict:
+        return {
             'folder': folder.name,
             'already_processed': False,
             'success': False,
@@ -452,8 +502,9 @@ processed: true
             'error': None,
             'skip_reason': None
         }
-        
-        # Проверяем, нужна ли обработка
+    
+    def _check_folder(self, folder: Path, stats: dict) -> bool:
+        """Проверяет, нужна ли обработка, и отмечает пропуск в статистике"""
         should_process, reason = self.should_process_folder(folder)
         
         if not should_process:
@@ -462,28 +513,83 @@ processed: true
                 stats['already_processed'] = True
             else:
                 stats['skip_reason'] = reason
-            return stats
+            return False
         
         print(f"✅ Обработка: {folder.name} ({reason})")
-        
-        # Анализируем
-        analysis = self.analyze_content(folder)
-        
+        return True
+    
+    def _store_analysis(self, folder: Path, analysis: Optional[Dict], stats: dict) -> dict:
+        """Создаёт Knowledge.md и дополняет статистику"""
         if not analysis:
             stats['error'] = "Нет данных или ошибка анализа"
             return stats
         
-        # Создаем Knowledge.md
         note_file = self.create_obsidian_note(folder, analysis)
         
         if note_file:
             stats['success'] = True
             stats['new_tags'] = analysis.get('new_tags_count', 0)
+            (folder / PARTIAL_FILENAME).unlink(missing_ok=True)
         else:
             stats['error'] = "Ошибка создания Knowledge.md"
         
         return stats
     
+    def _process_content_folder(self, folder: Path) -> dict:
+        """
+        Обрабатывает одну папку
+        
+        Args:
+            folder: Папка для обработки
+            
+        Returns:
+            Статистика обработки
+        """
+        stats = self._new_folder_stats(folder)
+        if not self._check_folder(folder, stats):
+            return stats
+        
+        return self._store_analysis(folder, self.analyze_content(folder), stats)
+    
+    async def _process_content_folder_async(self, folder: Path) -> dict:
+        """Асинхронный _process_content_folder"""
+        stats = self._new_folder_stats(folder)
+        if not self._check_folder(folder, stats):
+            return stats
+        
+        return self._store_analysis(folder, await self.analyze_content_async(folder), stats)
+    
+    async def process_content_folder_async(self, folder: Path) -> dict:
+        """
+        Асинхронный анализ одной папки контента (для демона конвейера)
+        
+        Вызовы из одного event loop идут через общий клиент Ollama,
+        одновременно - не больше brain.max_parallel запросов.
+        """
+        return await self._process_content_folder_async(folder)
+    
+    def collect_content_folders(self, folder: Path) -> List[Path]:
+        """
+        Папки контента внутри folder (контейнеры раскрываются рекурсивно,
+        как в process_folder)
+        """
+        should, reason = self.should_process_folder(folder)
+        if should or "Knowledge.md" in reason or "требуется Модуль 2" in reason:
+            return [folder]
+        
+        try:
+            subfolders = [f for f in folder.iterdir() if f.is_dir() and not f.name.startswith('.')]
+        except Exception:
+            subfolders = []
+        
+        if not subfolders:
+            return [folder]
+        
+        folders = []
+        for sub in sorted(subfolders):
+            folders.extend(self.collect_content_folders(sub))
+        return folders
+    
     def process_folder(self, folder: Path) -> dict:
         """
         Обрабатывает папку (рекурсивно, если это контейнер)
@@ -535,10 +641,84 @@ processed: true
              
         return agg_stats
 
-    def process_all(self) -> dict:
+    @staticmethod
+    def _accumulate_stats(total_stats: dict, stats: dict) -> None:
+        """Добавляет результат папки в общую статистику"""
+        if stats['already_processed']:
+            total_stats['already_processed'] += 1
+        elif stats['success']:
+            total_stats['successfully_processed'] += 1
+            total_stats['total_new_tags'] += stats['new_tags']
+        elif stats.get('skip_reason'):
+            reason = stats['skip_reason']
+            if "требуется транскрибация" in reason:
+                total_stats['need_transcription'] += 1
+            elif "нет контента" in reason:
+                total_stats['no_content'] += 1
+        else:
+            total_stats['errors'] += 1
+    
+    async def _process_concurrently(self, folders: List[Path], concurrency: int) -> List[dict]:
+        """
+        Анализ папок параллельно: не больше concurrency запросов к Ollama
+        
+        Один AsyncClient на все запросы, клиент сбрасывается после прогона
+        (он привязан к event loop).
+        """
+        self.brain.max_parallel = concurrency
+        try:
+            return await asyncio.gather(*(self._process_content_folder_async(f) for f in folders))
+        finally:
+            self.brain.reset_async()
+    
+    def _queue_rag_index(self, folder: Path, note_file: Path) -> None:
+        """
+        Ставит папку в очередь фоновой RAG индексации
+
+        Один поток на процесс и общие движки module4: модель эмбеддингов
+        загружается один раз, а запись в vector_db идёт по порядку.
+        """
+        if not rag_available():
+            # module4 not installed — пропускаем
+            return
+
+        # Ищем корень пользователя (например downloads/{user_folder})
+        # Предположим, что папка контента лежит внутри папки пользователя
+        user_root = None
+        for p in note_file.parents:
+            if p.name and (p.parent.name == 'downloads' or '_' in p.name or p.parent == Path('downloads')):
+                user_root = p
+                break
+        if user_root is None:
+            user_root = folder.parent
+
+        def _indexed(chunks: int) -> None:
+            print(f"   ✅ Indexed {chunks} chunks into user's RAG DB")
+            if self.index is not None:
+                self.index.update_folder(folder)
+                self.index.mark_indexed(folder)
+
+        index_worker.submit(
+            user_root, folder,
+            on_done=_indexed,
+            on_error=lambda e: print(f"   ⚠️ RAG indexing failed (background): {e}")
+        )
+
+    @staticmethod
+    def wait_rag_index() -> None:
+        """Дожидается фоновой RAG индексации (иначе выход из процесса её прервёт)"""
+        if index_worker.pending():
+            print(f"\n⏳ Ожидание RAG индексации: {index_worker.pending()} папок...")
+            index_worker.join()
+
+    def process_all(self, concurrency: int = 1) -> dict:
         """
         Обрабатывает все папки
         
+        Args:
+            concurrency: Одновременных запросов к Ollama (1 - последовательно;
+                         больше - согласуйте с OLLAMA_NUM_PARALLEL сервера)
+        
         Returns:
             Общая статистика
         """
@@ -549,12 +729,16 @@ processed: true
         print(f"🏷️  База тегов: {self.tag_manager.tags_file}")
         
         # Находим папки
-        folders = self.find_content_folders()
+        folders = self.find_pending_folders()
         
         if not folders:
             print("\n⚠️  Папки с контентом не найдены")
             return {'total_folders': 0}
         
+        if concurrency > 1 and self.index is None:
+            # Контейнеры раскрываются заранее, чтобы в параллель шли сами папки контента
+            folders = [f for folder in folders for f in self.collect_content_folders(folder)]
+        
         print(f"📊 Найдено папок: {len(folders)}")
         
         # Общая статистика
@@ -568,27 +752,22 @@ processed: true
             'total_new_tags': 0
         }
         
-        # Обрабатываем каждую папку
-        for i, folder in enumerate(folders, 1):
-            print(f"\n{'='*70}")
-            print(f"📂 [{i}/{len(folders)}] {folder.name}")
-            print(f"{'='*70}")
-            
-            stats = self.process_folder(folder)
-            
-            if stats['already_processed']:
-                total_stats['already_processed'] += 1
-            elif stats['success']:
-                total_stats['successfully_processed'] += 1
-                total_stats['total_new_tags'] += stats['new_tags']
-            elif stats.get('skip_reason'):
-                reason = stats['skip_reason']
-                if "требуется транскрибация" in reason:
-                    total_stats['need_transcription'] += 1
-                elif "нет контента" in reason:
-                    total_stats['no_content'] += 1
-            else:
-                total_stats['errors'] += 1
+        self.brain.metrics.clear()
+        self.brain.parse_stats.clear()
+        if concurrency > 1:
+            print(f"⚡ Параллельных запросов к Ollama: {concurrency}")
+            for stats in asyncio.run(self._process_concurrently(folders, concurrency)):
+                self._accumulate_stats(total_stats, stats)
+        else:
+            # Обрабатываем каждую папку
+            for i, folder in enumerate(folders, 1):
+                print(f"\n{'='*70}")
+                print(f"📂 [{i}/{len(folders)}] {folder.name}")
+                print(f"{'='*70}")
+                
+                self._accumulate_stats(total_stats, self.process_folder(folder))
+        
+        self.wait_rag_index()
         
         # Итоговая статистика
         print("\n" + "="*70)
@@ -605,6 +784,23 @@ processed: true
             print(f"⚠️  Нет контента: {total_stats['no_content']}")
         if total_stats['errors'] > 0:
             print(f"❌ Ошибок: {total_stats['errors']}")
+        
+        metrics = self.brain.metrics
+        if metrics:
+            tokens = sum(m.eval_tokens for m in metrics)
+            busy = sum(m.duration for m in metrics)
+            print(f"🤖 Запросов к Ollama: {len(metrics)}, токенов: {tokens}")
+            print(f"   Средняя скорость: {sum(m.tokens_per_sec for m in metrics) / len(metrics):.1f} ток/с на запрос")
+            print(f"   Среднее ожидание слота: {sum(m.queue_wait for m in metrics) / len(metrics):.1f} с, "
+                  f"среднее время запроса: {busy / len(metrics):.1f} с")
+            print(f"   Обработка промпта: {sum(m.prompt_tokens for m in metrics) / len(metrics):.0f} ток., "
+                  f"{sum(m.prompt_eval_time for m in metrics) / len(metrics):.2f} с в среднем")
+        
+        parse_stats = self.brain.parse_stats
+        if sum(parse_stats.values()):
+            print(f"🔧 Починка JSON: {self.brain.repair_rate:.0%} ответов "
+                  f"(терпимый разбор: {parse_stats['tolerant']}, запрос починки: {parse_stats['repaired']}, "
+                  f"не разобрано: {parse_stats['failed']})")
         print("="*70)
         
         return total_stats
@@ -640,13 +836,26 @@ def main():
         type=str,
         help='Обработать только одну папку (имя папки)'
     )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=1,
+        help='Одновременных запросов к Ollama (по умолчанию: 1; '
+             'не больше OLLAMA_NUM_PARALLEL сервера)'
+    )
+    parser.add_argument(
+        '--full-scan',
+        action='store_true',
+        help='Обойти все папки без индекса (DATA_DIR/vault_index.sqlite3)'
+    )
     
     args = parser.parse_args()
     
     processor = AIProcessor(
         content_dir=args.dir,
         tags_file=args.tags,
-        model=args.model
+        model=args.model,
+        index=None if args.full_scan or args.folder else VaultIndex(args.dir)
     )
     
     if args.folder:
@@ -658,6 +867,7 @@ def main():
         
         print(f"\n🎯 Обработка одной папки: {args.folder}")
         stats = processor.process_folder(folder_path)
+        processor.wait_rag_index()
         
         print("\n" + "="*70)
         print("📊 СТАТИСТИКА")
@@ -672,7 +882,7 @@ def main():
             print(f"❌ Ошибка: {stats['error']}")
     else:
         # Обработка всех папок
-        processor.process_all()
+        processor.process_all(concurrency=max(1, args.concurrency))
 
 
 if __name__ == "__main__":
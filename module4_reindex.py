@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Модуль 4: Пересборка RAG базы (vector_db) пользователей
+
+Потоки читают и режут на фрагменты файлы всех папок, один воркер
+считает эмбеддинги большими пакетами фиксированного размера, а запись
+в ChromaDB идёт крупными upsert. Прерванный запуск продолжается с места
+остановки: уже записанные файлы пропускаются по манифесту.
+"""
+from pathlib import Path
+from typing import List
+import sys
+
+# Добавляем корень проекта в путь
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.modules.module4_rag import RAGEngine, ReindexStats
+
+
+def find_roots(users_dir: Path) -> List[Path]:
+    """Папки downloads всех пользователей"""
+    return sorted(p for p in users_dir.glob('*/downloads') if p.is_dir())
+
+
+def print_progress(stats: ReindexStats) -> None:
+    print(f"   📦 Папок: {stats.folders} | файлов: {stats.files} | фрагментов: {stats.chunks} "
+          f"| {stats.chunks_per_sec:.1f} фрагм/с")
+
+
+def main():
+    """Точка входа"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Модуль 4: пересборка RAG базы (vector_db)"
+    )
+    parser.add_argument(
+        '--users-dir',
+        type=Path,
+        default=Path('users'),
+        help='Папка пользователей, индексируются users/*/downloads (по умолчанию: users)'
+    )
+    parser.add_argument(
+        '--dir',
+        type=Path,
+        action='append',
+        help='Индексировать конкретную папку downloads (можно несколько раз, вместо --users-dir)'
+    )
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=256,
+        help='Фрагментов на один расчёт эмбеддингов (по умолчанию: 256)'
+    )
+    parser.add_argument(
+        '--upsert-batch',
+        type=int,
+        default=4096,
+        help='Фрагментов на одну запись в ChromaDB (по умолчанию: 4096)'
+    )
+    parser.add_argument(
+        '--readers',
+        type=int,
+        default=4,
+        help='Потоков чтения файлов (по умолчанию: 4)'
+    )
+    parser.add_argument(
+        '--full',
+        action='store_true',
+        help='Удалить коллекцию и манифест и проиндексировать всё заново'
+    )
+
+    args = parser.parse_args()
+
+    roots = args.dir or find_roots(args.users_dir)
+    if not roots:
+        print(f"❌ Не найдено папок downloads в {args.users_dir}")
+        sys.exit(1)
+
+    failed = 0
+    for root in roots:
+        print(f"\n🔄 Индексация: {root}")
+        try:
+            stats = RAGEngine(user_root=root).reindex(
+                batch_size=max(1, args.batch_size),
+                upsert_batch=max(1, args.upsert_batch),
+                readers=args.readers,
+                full=args.full,
+                progress=print_progress
+            )
+        except KeyboardInterrupt:
+            print("\n🛑 Прервано: следующий запуск продолжит с места остановки")
+            sys.exit(130)
+        except ImportError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+
+        failed += stats.failed
+        print(f"✅ {root}: {stats.chunks} новых фрагментов из {stats.files} файлов "
+              f"за {stats.elapsed:.1f} с ({stats.chunks_per_sec:.1f} фрагм/с)")
+        if stats.failed:
+            print(f"⚠️  Пропущено папок с ошибками: {stats.failed}")
+
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,456 @@
+#!/usr/bin/env python3
+"""
+Демон конвейера: скачанное -> транскрипция -> AI анализ -> RAG
+
+Следит за users/*/downloads (inotify через watchdog, без него - опрос
+индекса папок) и на каждое изменение папки ставит в очередь только
+следующий для неё этап. Модели Whisper, Ollama и эмбеддингов остаются
+загруженными между событиями, поэтому ссылка, отправленная боту,
+доходит до проиндексированной заметки без ручных команд и полных обходов.
+"""
+from pathlib import Path
+from typing import Dict, List, Optional
+import asyncio
+import logging
+import os
+import sys
+import time
+
+# Добавляем корень проекта в путь
+sys.path.insert(0, str(Path(__file__).parent))
+
+from src.bot.services.job_queue import AI, FAILED, RAG, TRANSCRIBE, Job, JobDispatcher, JobQueue
+from src.modules import vault_index
+from src.modules.vault_index import VaultIndex
+
+logger = logging.getLogger(__name__)
+
+# Этап индекса -> этап очереди
+STAGE_JOBS = {
+    vault_index.TRANSCRIBE: TRANSCRIBE,
+    vault_index.ANALYZE: AI,
+    vault_index.INDEX: RAG,
+}
+
+# Папка "успокоилась": столько секунд без событий (скачивание пишет файлы по частям)
+SETTLE_SECONDS = 5.0
+# Страховочный проход по индексу (с inotify) и интервал опроса без него
+SAFETY_SCAN_SECONDS = 600.0
+POLL_SECONDS = 30.0
+# Временные файлы загрузчиков и атомарной записи
+TEMP_SUFFIXES = ('.part', '.tmp', '.ytdl', '.temp')
+
+
+def default_jobs_path() -> Path:
+    """Очередь демона отдельно от очереди бота (у задач бота другой payload)"""
+    return Path(os.getenv('DATA_DIR', 'data')) / "pipeline_jobs.sqlite3"
+
+
+def find_roots(users_dir: Path) -> List[Path]:
+    """Папки downloads всех пользователей"""
+    return sorted(p for p in users_dir.glob('*/downloads') if p.is_dir())
+
+
+class PipelineDaemon:
+    """
+    Реактивный конвейер над хранилищем
+
+    События файловой системы -> папка -> VaultIndex.next_stage() ->
+    задача в JobQueue; JobDispatcher выполняет задачи тёплыми моделями.
+    """
+
+    def __init__(
+        self,
+        users_dir: Optional[Path] = None,
+        roots: Optional[List[Path]] = None,
+        tags_file: Path = Path("known_tags.json"),
+        model: str = "qwen2.5:7b",
+        queue: Optional[JobQueue] = None,
+        index_path: Optional[Path] = None,
+        concurrency: Optional[Dict[str, int]] = None,
+        settle: float = SETTLE_SECONDS
+    ):
+        """
+        Args:
+            users_dir: Папка пользователей (следим за users/*/downloads)
+            roots: Явный список корней (вместо users_dir)
+            tags_file: База тегов для AI анализа
+            model: Модель Ollama
+            queue: Очередь задач (по умолчанию DATA_DIR/pipeline_jobs.sqlite3)
+            index_path: Файл индекса папок (по умолчанию DATA_DIR/vault_index.sqlite3)
+            concurrency: Параллельных задач на этап (по умолчанию по одной)
+            settle: Секунд тишины в папке перед запуском этапа
+        """
+        self.users_dir = Path(users_dir) if users_dir else None
+        self.tags_file = Path(tags_file)
+        self.model = model
+        self.index_path = index_path
+        self.settle = settle
+        self.queue = queue or JobQueue(default_jobs_path())
+        self.indexes: Dict[Path, VaultIndex] = {}
+        for root in roots or []:
+            self._add_root(Path(root))
+
+        self.dispatcher = JobDispatcher(
+            self.queue,
+            handlers={
+                TRANSCRIBE: self._run_transcribe,
+                AI: self._run_ai,
+                RAG: self._run_rag,
+            },
+            concurrency=concurrency
+        )
+
+        # Тяжёлые объекты создаются при первой задаче и живут до остановки.
+        # У каждой параллельной транскрибации свой LocalEars (он переключает
+        # модель по языку и возвращает её в пул) - модели общие через пул.
+        self._transcribers: List = []
+        self._analyzer = None
+        self._rag_available: Optional[bool] = None
+
+        self._dirty: Dict[Path, float] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._observer = None
+        self._stopped = False
+
+    # ---- Корни и маршрутизация ----
+
+    def _add_root(self, root: Path) -> VaultIndex:
+        root = root.resolve()
+        if root not in self.indexes:
+            self.indexes[root] = VaultIndex(root, path=self.index_path)
+        return self.indexes[root]
+
+    def discover_roots(self) -> List[Path]:
+        """Подхватывает downloads новых пользователей"""
+        if self.users_dir is not None:
+            for root in find_roots(self.users_dir):
+                self._add_root(root)
+        return list(self.indexes)
+
+    def root_of(self, folder: Path) -> Optional[Path]:
+        folder = Path(folder).resolve()
+        for root in self.indexes:
+            if folder == root or root in folder.parents:
+                return root
+        return None
+
+    def route(self, folder: Path) -> Optional[Job]:
+        """
+        Ставит в очередь следующий этап папки
+
+        Returns:
+            Задача или None, если папке ничего не нужно
+        """
+        folder = Path(folder).resolve()
+        root = self.root_of(folder)
+        if root is None:
+            # Возможно, появился новый пользователь
+            self.discover_roots()
+            root = self.root_of(folder)
+        if root is None or folder == root:
+            return None
+
+        index = self.indexes[root]
+        index.update_folder(folder)
+        stage = index.next_stage(folder)
+        if stage is None or (stage == vault_index.INDEX and not self.rag_available):
+            return None
+
+        job = self._enqueue(root, folder, stage)
+        if job is None:
+            return None
+        logger.info(f"📥 {job.stage}#{job.id}: {folder.name}")
+        self.dispatcher.wake()
+        return job
+
+    def _enqueue(self, root: Path, folder: Path, stage: str) -> Optional[Job]:
+        """
+        Задача этапа для папки
+
+        Уже стоящая в очереди папка не дублируется (dedupe_key). Если
+        последняя задача этапа упала после всех попыток, папка ждёт
+        изменения на диске (VaultIndex.skip_failed), а не крутится в
+        очереди на каждом событии и проходе.
+        """
+        job_stage = STAGE_JOBS[stage]
+        last = self.queue.last_job(job_stage, str(folder))
+        if last is not None and last.status == FAILED and self.indexes[root].skip_failed(folder, stage, last.id):
+            logger.debug(f"Skipping {folder.name}: {job_stage}#{last.id} failed, folder unchanged")
+            return None
+        return self.queue.enqueue(
+            job_stage,
+            user_id=0,
+            username=root.parent.name,
+            payload={'folder': str(folder), 'root': str(root)},
+            dedupe_key=str(folder)
+        )
+
+    def scan(self) -> int:
+        """
+        Проход по индексам всех корней: ставит в очередь всё, что ждёт работы
+
+        Перечитываются только изменившиеся папки, поэтому проход дешёвый;
+        он ловит то, что случилось, пока демон не работал. Уже стоящие в
+        очереди папки не дублируются (dedupe_key).
+
+        Returns:
+            Сколько папок ждёт работы
+        """
+        pending = 0
+        for root in self.discover_roots():
+            index = self.indexes[root]
+            index.refresh()
+            for stage in STAGE_JOBS:
+                if stage == vault_index.INDEX and not self.rag_available:
+                    continue
+                for folder in index.pending(stage):
+                    if self._enqueue(root, folder, stage) is not None:
+                        pending += 1
+        if pending:
+            logger.info(f"🗂️  Ждут работы по индексу: {pending}")
+        return pending
+
+    # ---- События файловой системы ----
+
+    def on_path_changed(self, path: Path) -> None:
+        """
+        Событие файловой системы (из потока наблюдателя)
+
+        Папка запускается не сразу, а после SETTLE секунд без событий.
+        """
+        path = Path(path)
+        if path.name.startswith('.') or path.suffix.lower() in TEMP_SUFFIXES:
+            return
+        # Записи индексатора в vector_db и подобные - не папки контента
+        if vault_index.SKIP_DIRS.intersection(path.parts):
+            return
+        folder = path if path.is_dir() else path.parent
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._touch, folder)
+        else:
+            self._touch(folder)
+
+    def _touch(self, folder: Path) -> None:
+        self._dirty[folder] = time.monotonic() + self.settle
+
+    def _pop_settled(self) -> List[Path]:
+        """Забирает папки, в которых всё стихло (в потоке event loop, как и _touch)"""
+        now = time.monotonic()
+        ready = [folder for folder, deadline in self._dirty.items() if deadline <= now]
+        for folder in ready:
+            del self._dirty[folder]
+        return ready
+
+    def _route_all(self, folders: List[Path]) -> int:
+        for folder in folders:
+            try:
+                self.route(folder)
+            except Exception as e:
+                logger.error(f"Route failed for {folder}: {e}", exc_info=True)
+        return len(folders)
+
+    def flush_settled(self) -> int:
+        """Маршрутизирует папки, в которых всё стихло. Returns: сколько папок"""
+        return self._route_all(self._pop_settled())
+
+    def _start_observer(self) -> bool:
+        """inotify через watchdog; False - библиотеки нет, работаем опросом"""
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            logger.warning("⚠️  watchdog не установлен (pip install watchdog), опрос индекса каждые "
+                           f"{POLL_SECONDS:.0f} с")
+            return False
+
+        daemon = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.event_type in ('opened', 'closed_no_write'):
+                    return
+                daemon.on_path_changed(Path(getattr(event, 'dest_path', '') or event.src_path))
+
+        self._observer = Observer()
+        watched = [self.users_dir] if self.users_dir is not None else list(self.indexes)
+        watched = [path for path in watched if path.exists()]
+        for path in watched:
+            self._observer.schedule(Handler(), str(path), recursive=True)
+        self._observer.start()
+        logger.info(f"👀 inotify: {', '.join(str(p) for p in watched)}")
+        return True
+
+    # ---- Обработчики этапов ----
+
+    def _take_transcriber(self):
+        """Свободный процессор транскрибации (новый, если все заняты)"""
+        if self._transcribers:
+            return self._transcribers.pop()
+        from module2_transcribe import TranscriptionProcessor
+        return TranscriptionProcessor(content_dir=next(iter(self.indexes), Path("downloads")))
+
+    @property
+    def analyzer(self):
+        if self._analyzer is None:
+            from module3_analyze import AIProcessor
+            self._analyzer = AIProcessor(
+                content_dir=next(iter(self.indexes), Path("downloads")),
+                tags_file=self.tags_file,
+                model=self.model,
+                index_rag=False
+            )
+            # Модель не выгружается между событиями; параллельные задачи AI
+            # идут в этом event loop через общий асинхронный клиент Ollama
+            self._analyzer.brain.keep_alive = -1
+            self._analyzer.brain.max_parallel = max(1, self.dispatcher.concurrency.get(AI, 1))
+        return self._analyzer
+
+    @property
+    def rag_available(self) -> bool:
+        """Модуль 4 (chromadb, sentence-transformers) установлен"""
+        if self._rag_available is None:
+            from src.modules.module4_rag import rag_available
+            self._rag_available = rag_available()
+            if not self._rag_available:
+                logger.warning("⚠️  RAG недоступен: этап индексации пропускается")
+        return self._rag_available
+
+    async def _run_transcribe(self, job: Job) -> None:
+        folder = Path(job.payload['folder'])
+        transcriber = self._take_transcriber()
+        try:
+            stats = await asyncio.to_thread(transcriber.process_folder, folder)
+        finally:
+            self._transcribers.append(transcriber)
+        if stats.get('error'):
+            raise RuntimeError(stats['error'])
+        await asyncio.to_thread(self.route, folder)
+
+    async def _run_ai(self, job: Job) -> None:
+        folder = Path(job.payload['folder'])
+        stats = await self.analyzer.process_content_folder_async(folder)
+        if stats.get('error'):
+            raise RuntimeError(stats['error'])
+        await asyncio.to_thread(self.route, folder)
+
+    async def _run_rag(self, job: Job) -> None:
+        from src.modules.module4_rag import get_engine
+
+        folder = Path(job.payload['folder'])
+        root = Path(job.payload['root'])
+        # Общий движок на корень: эмбеддер и клиент ChromaDB остаются загруженными
+        chunks = await asyncio.to_thread(get_engine(root).index_folder, folder)
+        logger.info(f"✅ RAG: {folder.name} ({chunks} фрагментов)")
+
+        index = self.indexes[root]
+        await asyncio.to_thread(index.update_folder, folder)
+        await asyncio.to_thread(index.mark_indexed, folder)
+
+    # ---- Жизненный цикл ----
+
+    async def run(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        self.discover_roots()
+        watching = self._start_observer()
+        dispatcher_task = asyncio.create_task(self.dispatcher.run())
+
+        interval = SAFETY_SCAN_SECONDS if watching else POLL_SECONDS
+        next_scan = 0.0
+        try:
+            while not self._stopped:
+                if time.monotonic() >= next_scan:
+                    if await asyncio.to_thread(self.scan):
+                        self.dispatcher.wake()
+                    next_scan = time.monotonic() + interval
+                # Индекс и очередь - SQLite с ожиданием блокировки: не в event loop
+                ready = self._pop_settled()
+                if ready:
+                    await asyncio.to_thread(self._route_all, ready)
+                await asyncio.sleep(1.0)
+        finally:
+            if self._observer is not None:
+                self._observer.stop()
+                self._observer.join()
+            self.dispatcher.stop()
+            await dispatcher_task
+            for transcriber in self._transcribers:
+                transcriber.ears.release()
+            if self._analyzer is not None:
+                self._analyzer.brain.reset_async()
+
+    def stop(self) -> None:
+        self._stopped = True
+
+
+def main():
+    """Точка входа"""
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Демон конвейера: следит за папками и запускает следующий этап"
+    )
+    parser.add_argument(
+        '--users-dir',
+        type=Path,
+        default=Path('users'),
+        help='Папка пользователей, следим за users/*/downloads (по умолчанию: users)'
+    )
+    parser.add_argument(
+        '--dir',
+        type=Path,
+        action='append',
+        help='Следить за конкретной папкой downloads (можно несколько раз, вместо --users-dir)'
+    )
+    parser.add_argument(
+        '--tags',
+        type=Path,
+        default=Path('known_tags.json'),
+        help='Файл с базой тегов (по умолчанию: known_tags.json)'
+    )
+    parser.add_argument(
+        '--model',
+        type=str,
+        default='qwen2.5:7b',
+        help='Модель Ollama (по умолчанию: qwen2.5:7b)'
+    )
+    parser.add_argument(
+        '--transcribe-concurrency',
+        type=int,
+        default=1,
+        help='Параллельных транскрибаций (по умолчанию: 1)'
+    )
+    parser.add_argument(
+        '--ai-concurrency',
+        type=int,
+        default=1,
+        help='Параллельных AI анализов - запросов к Ollama (не больше OLLAMA_NUM_PARALLEL, по умолчанию: 1)'
+    )
+
+    args = parser.parse_args()
+
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+        stream=sys.stdout
+    )
+
+    daemon = PipelineDaemon(
+        users_dir=None if args.dir else args.users_dir,
+        roots=args.dir,
+        tags_file=args.tags,
+        model=args.model,
+        concurrency={
+            TRANSCRIBE: args.transcribe_concurrency,
+            AI: args.ai_concurrency,
+        }
+    )
+
+    try:
+        asyncio.run(daemon.run())
+    except KeyboardInterrupt:
+        logger.info("🛑 Демон остановлен")
+
+
+if __name__ == "__main__":
+    main()
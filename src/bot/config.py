@@ -22,6 +22,14 @@ class BotConfig(BaseSettings):
     # Models
     whisper_model: str = Field("small", alias="WHISPER_MODEL")
     whisper_threads: int = Field(16, alias="WHISPER_THREADS")
+    whisper_chunk_workers: int = Field(1, alias="WHISPER_CHUNK_WORKERS")
+    whisper_language: str = Field("auto", alias="WHISPER_LANGUAGE")
+    whisper_language_models: str = Field("", alias="WHISPER_LANGUAGE_MODELS")
+
+    # Job queue: parallel jobs per stage
+    transcribe_concurrency: int = Field(1, alias="TRANSCRIBE_CONCURRENCY")
+    ai_concurrency: int = Field(1, alias="AI_CONCURRENCY")
+    job_max_attempts: int = Field(3, alias="JOB_MAX_ATTEMPTS")
 
 
     # Logs
@@ -33,11 +33,13 @@ async def main() -> None:
     # Initialize Dispatcher
     dp = Dispatcher(storage=MemoryStorage())
     
-    from src.bot.routers import base, content, worker_cmds
+    from src.bot.routers import ask, base, content, worker_cmds
     from src.bot.middlewares.auth import AdminAccessMiddleware
     
     # Register routers
     dp.include_router(base.router)
+    # /ask before content: its catch-all text handler would swallow the command
+    dp.include_router(ask.router)
     dp.include_router(content.router)
     dp.include_router(worker_cmds.router)
     
@@ -47,10 +49,27 @@ async def main() -> None:
     # Inject config into middleware/workflow data
     dp["config"] = config
     
+    # Durable job queue: dispatcher starts queued jobs as stage workers free up
+    from src.bot.services.job_queue import AI, TRANSCRIBE, JobDispatcher, queue
+    job_dispatcher = JobDispatcher(
+        queue,
+        handlers=worker_cmds.make_job_handlers(bot, config),
+        concurrency={
+            TRANSCRIBE: config.transcribe_concurrency,
+            AI: config.ai_concurrency,
+        }
+    )
+    dp["job_dispatcher"] = job_dispatcher
+    dispatcher_task = asyncio.create_task(job_dispatcher.run())
+    
     # Delete webhook and start polling
     logger.info("🚀 Starting Data Hive Bot (Aiogram 3.x)...")
     await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        job_dispatcher.stop()
+        await dispatcher_task
 
 if __name__ == "__main__":
     # Install uvloop policy
@@ -1 +1 @@
-from . import base, content, worker_cmds
+from . import ask, base, content, worker_cmds
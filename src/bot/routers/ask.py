@@ -0,0 +1,95 @@
+import asyncio
+import html
+import logging
+import time
+from typing import List
+
+from aiogram import Router, types
+from aiogram.filters import Command, CommandObject
+
+from src.bot.config import BotConfig
+from src.modules.module4_rag import get_engine, rag_available
+
+router = Router()
+logger = logging.getLogger(__name__)
+
+# Не чаще раза в N секунд правим ответ (Telegram: ~1 edit/с на чат, 20/мин в группах)
+STREAM_EDIT_INTERVAL = 1.5
+# Длина сообщения Telegram
+MESSAGE_LIMIT = 4096
+# Курсор "ещё пишу" в конце частичного ответа
+CURSOR = " ▌"
+
+
+def render_answer(answer: str, sources: List[str], partial: bool = False) -> str:
+    """Ответ в HTML (parse_mode бота) с источниками, не длиннее MESSAGE_LIMIT"""
+    footer = ""
+    if sources and not partial:
+        footer = "\n\n📚 <b>Источники:</b>\n" + "\n".join(
+            f"• <code>{html.escape(name)}</code>" for name in sources
+        )
+    cursor = CURSOR if partial else ""
+    room = MESSAGE_LIMIT - len(footer) - len(cursor)
+    body = html.escape(answer)
+    if len(body) > room:
+        # Обрезаем исходный текст, чтобы не разрезать HTML-сущность
+        low, high = 0, room - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if len(html.escape(answer[:middle])) <= room - 1:
+                low = middle
+            else:
+                high = middle - 1
+        body = html.escape(answer[:low]) + "…"
+    return body + cursor + footer
+
+
+async def _safe_edit(message: types.Message, text: str) -> None:
+    """Правка ответа; ошибки Telegram (not modified, flood) не критичны"""
+    try:
+        await message.edit_text(text)
+    except Exception as e:
+        logger.debug(f"Answer update skipped: {e}")
+
+
+@router.message(Command("ask"))
+async def cmd_ask(message: types.Message, config: BotConfig, command: CommandObject):
+    """Handler for /ask <вопрос>: ответ по базе пользователя, печатается по мере генерации"""
+    question = (command.args or "").strip()
+    if not question:
+        await message.reply("❓ Задайте вопрос: /ask что я сохранял про docker?")
+        return
+    if not rag_available():
+        await message.reply("⚠️ RAG недоступен: установите chromadb и sentence-transformers")
+        return
+
+    reply = await message.reply("🔎 Ищу в базе...")
+    # Single user mode: always use 'admin' folder
+    engine = await asyncio.to_thread(get_engine, config.users_dir / "admin" / "downloads")
+
+    answer = ""
+    sources: List[str] = []
+    last_edit = time.monotonic()
+    try:
+        async for event in engine.query_stream(question):
+            if event['type'] == 'sources':
+                sources = event['sources']
+                if sources:
+                    await _safe_edit(reply, f"🧠 Нашёл {len(sources)} источн., формулирую ответ...")
+            elif event['type'] == 'token':
+                answer += event['text']
+                now = time.monotonic()
+                if now - last_edit >= STREAM_EDIT_INTERVAL:
+                    last_edit = now
+                    await _safe_edit(reply, render_answer(answer, sources, partial=True))
+            elif event['type'] == 'done':
+                answer = event['answer']
+            elif event['type'] == 'error':
+                await _safe_edit(reply, f"❌ {html.escape(event['error'][:500])}")
+                return
+    except Exception as e:
+        logger.error(f"/ask failed: {e}", exc_info=True)
+        await _safe_edit(reply, f"❌ Ошибка поиска: {html.escape(str(e)[:200])}")
+        return
+
+    await _safe_edit(reply, render_answer(answer, sources))
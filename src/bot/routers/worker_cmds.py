@@ -3,47 +3,101 @@ import sys
 import logging
 from pathlib import Path
 import subprocess
+import time
+from typing import Dict, Optional
 from aiogram import Router, types, F, Bot
-from aiogram.filters import Command
+from aiogram.filters import Command, CommandObject
 from aiogram.fsm.context import FSMContext
 
 from src.bot.config import BotConfig
-from src.bot.services.process_queue import queue
-from src.modules.local_ears import LocalEars
+from src.bot.services.job_queue import AI, TRANSCRIBE, Job, JobDispatcher, JobHandler, queue
+from src.modules.decoding_profiles import PROFILES
+from src.modules.local_ears import LocalEars, parse_language_models
+from src.modules.subtitle_transcript import transcript_from_subtitles
+from src.modules.transcript_cache import TranscriptCache
+from src.modules.transcript_writer import (
+    TRANSCRIPT_FILENAME,
+    TranscriptCheckpoint,
+    render_transcript_markdown,
+    write_atomic
+)
+from src.modules.whisper_pool import model_pool
 
 router = Router()
 logger = logging.getLogger(__name__)
 
-async def run_transcription(file_path: Path, output_dir: Path, config: BotConfig, message: types.Message):
-    """Run transcription in executor"""
-    status_msg = await message.answer("🎤 Транскрибирую видео...\nЭто может занять несколько минут.")
+# Не чаще раза в N секунд правим статус (лимиты Telegram на edit)
+PROGRESS_INTERVAL = 10.0
+
+async def run_transcription(job: Job, bot: Bot, config: BotConfig):
+    """Transcription job: runs Whisper in executor, raises on failure so the job is retried"""
+    file_path = Path(job.payload['file'])
+    output_dir = Path(job.payload['folder'])
+    profile = job.payload.get('profile')
+    status_msg = await bot.send_message(
+        job.payload['chat_id'],
+        "🎤 Транскрибирую видео...\nЭто может занять несколько минут."
+    )
     
-    try:
-        ears = LocalEars(
-            model_size=config.whisper_model,
-            num_threads=config.whisper_threads
-        )
-        
-        loop = asyncio.get_event_loop()
-        transcript_result = await loop.run_in_executor(
-            None,
-            lambda: ears.transcribe(file_path)
+    # Модель берётся из общего пула процесса: повторный /transcribe не грузит её с диска
+    ears = LocalEars(
+        model_size=config.whisper_model,
+        num_threads=config.whisper_threads,
+        chunk_workers=config.whisper_chunk_workers,
+        cache=TranscriptCache(),
+        language=None if config.whisper_language == "auto" else config.whisper_language,
+        language_models=parse_language_models(config.whisper_language_models)
+    )
+    # Сегменты пишутся в чекпоинт: после перезапуска бота работа продолжится с места падения
+    checkpoint = TranscriptCheckpoint.for_folder(output_dir, file_path)
+    loop = asyncio.get_running_loop()
+    last_update = 0.0
+    
+    def on_progress(position: float, total: float):
+        # Вызывается из потока executor'а: правим сообщение через event loop
+        nonlocal last_update
+        now = time.monotonic()
+        if total <= 0 or now - last_update < PROGRESS_INTERVAL:
+            return
+        last_update = now
+        percent = min(100, int(position / total * 100))
+        asyncio.run_coroutine_threadsafe(
+            _edit_progress(status_msg, f"🎤 Транскрибирую видео... {percent}%"),
+            loop
         )
+    
+    # Профиль по длительности и очереди: при очереди короткие задачи идут быстрее
+    queue_depth = await asyncio.to_thread(queue.depth, TRANSCRIBE)
+    
+    try:
+        # Субтитры платформы (YouTube) заменяют Whisper
+        found = transcript_from_subtitles(output_dir)
+        if found is not None:
+            transcript_result, track = found
+            write_atomic(
+                output_dir / TRANSCRIPT_FILENAME,
+                render_transcript_markdown(transcript_result, file_path, f"subtitles ({track.name})")
+            )
+        else:
+            transcript_result = await loop.run_in_executor(
+                None,
+                lambda: ears.transcribe(
+                    file_path,
+                    checkpoint=checkpoint,
+                    progress_callback=on_progress,
+                    profile=profile,
+                    queue_depth=queue_depth
+                )
+            )
+            if transcript_result:
+                markdown = render_transcript_markdown(transcript_result, file_path, ears.model_size)
+                checkpoint.finalize(output_dir / TRANSCRIPT_FILENAME, markdown)
         
         if transcript_result:
-            transcript_path = output_dir / "transcript.md"
-            with open(transcript_path, 'w', encoding='utf-8') as f:
-                f.write(f"# Транскрипция\n\n")
-                f.write(f"**Язык:** {transcript_result.language}\n")
-                f.write(f"**Длительность:** {transcript_result.duration:.1f} сек\n\n")
-                f.write("## С таймкодами\n\n")
-                f.write(transcript_result.timed_transcript)
-                f.write("\n\n## Полный текст\n\n")
-                f.write(transcript_result.full_text)
-            
             await status_msg.edit_text(
                 f"✅ Транскрипция готова!\n\n"
                 f"📂 Папка: `{output_dir.name}`\n"
+                f"🎚️ Профиль: `{transcript_result.profile}`\n"
                 f"📝 **О чем это видео?**\n"
                 f"Опиши содержание в нескольких словах."
             )
@@ -51,15 +105,76 @@ async def run_transcription(file_path: Path, output_dir: Path, config: BotConfig
              await status_msg.edit_text("⚠️ Не удалось транскрибировать.")
 
     except Exception as e:
-        logger.error(f"Transcription error: {e}", exc_info=True)
-        await status_msg.edit_text(f"❌ Ошибка транскрибации: {str(e)[:100]}")
+        retry_note = " Повторю позже." if job.attempts < job.max_attempts else ""
+        await status_msg.edit_text(
+            f"❌ Ошибка транскрибации (попытка {job.attempts}/{job.max_attempts}): {str(e)[:100]}{retry_note}"
+        )
+        raise
     finally:
-        queue.finish_transcribe()
+        ears.release()
+
+
+async def run_ai(job: Job, bot: Bot, config: BotConfig):
+    """AI job: runs module3_analyze.py and waits for it"""
+    status_msg = await bot.send_message(job.payload['chat_id'], "🤖 Запускаю AI обработку...")
+    
+    config.ai_log.parent.mkdir(parents=True, exist_ok=True)
+    with open(config.ai_log, 'w') as log:
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, "module3_analyze.py",
+            cwd=Path.cwd(),
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            start_new_session=True
+        )
+    config.ai_pid.write_text(str(process.pid))
+    
+    await status_msg.edit_text(
+        f"✅ **AI Анализ запущен!**\n"
+        f"📝 PID: {process.pid}\n"
+        f"📋 Логи: `{config.ai_log}`"
+    )
+    
+    try:
+        returncode = await process.wait()
+    finally:
+        config.ai_pid.unlink(missing_ok=True)
+    
+    if returncode != 0:
+        raise RuntimeError(f"module3_analyze.py exited with code {returncode}")
+    await status_msg.edit_text("✅ AI анализ завершён")
+
+
+def make_job_handlers(bot: Bot, config: BotConfig) -> Dict[str, JobHandler]:
+    """Stage handlers for JobDispatcher"""
+    return {
+        TRANSCRIBE: lambda job: run_transcription(job, bot, config),
+        AI: lambda job: run_ai(job, bot, config),
+    }
+
+
+async def _edit_progress(status_msg: types.Message, text: str):
+    """Обновление статуса; ошибки Telegram (not modified, flood) не критичны"""
+    try:
+        await status_msg.edit_text(text)
+    except Exception as e:
+        logger.debug(f"Progress update skipped: {e}")
 
 
 @router.message(Command("transcribe"))
-async def cmd_transcribe(message: types.Message, state: FSMContext, config: BotConfig):
-    """Handler for /transcribe"""
+async def cmd_transcribe(
+    message: types.Message,
+    state: FSMContext,
+    config: BotConfig,
+    command: CommandObject,
+    job_dispatcher: JobDispatcher
+):
+    """Handler for /transcribe [fast|balanced|accurate]"""
+    profile = (command.args or "").strip().lower() or None
+    if profile and profile not in PROFILES:
+        await message.reply(f"⚠️ Неизвестный профиль: {profile}. Доступны: {', '.join(PROFILES)}")
+        return
+    
     # Simply pick the last downloaded file from user folder? 
     # Or rely on FSM state set by content handler.
     # For now, let's assume we look at the last folder in user dir.
@@ -86,52 +201,43 @@ async def cmd_transcribe(message: types.Message, state: FSMContext, config: BotC
         
     target_file = video_files[0]
     
-    if not queue.can_start_transcribe():
-        pos = queue.add_to_transcribe_queue(message.from_user.id, message.from_user.username)
-        await message.reply(f"⏳ Добавлен в очередь транскрибации (позиция {pos})")
-        return
-
-    queue.start_transcribe(message.from_user.id, message.from_user.username, 0)
-    asyncio.create_task(run_transcription(target_file, latest_folder, config, message))
+    job = await asyncio.to_thread(
+        queue.enqueue,
+        TRANSCRIBE,
+        message.from_user.id,
+        message.from_user.username,
+        payload={
+            'file': str(target_file),
+            'folder': str(latest_folder),
+            'profile': profile,
+            'chat_id': message.chat.id,
+        },
+        max_attempts=config.job_max_attempts,
+        dedupe_key=str(target_file)
+    )
+    job_dispatcher.wake()
+    
+    position = await asyncio.to_thread(queue.position, job)
+    if position > 1 or job_dispatcher.running(TRANSCRIBE) >= config.transcribe_concurrency:
+        await message.reply(f"⏳ Добавлен в очередь транскрибации (позиция {max(position, 1)})")
 
 
 @router.message(Command("ai"))
-async def cmd_ai(message: types.Message, config: BotConfig, bot: Bot):
+async def cmd_ai(message: types.Message, config: BotConfig, job_dispatcher: JobDispatcher):
     """Handler for /ai"""
-    if config.ai_pid.exists():
-        await message.reply("⚠️ AI анализ уже запущен.")
+    if await asyncio.to_thread(queue.depth, AI) > 0:
+        await message.reply("⚠️ AI анализ уже запущен или в очереди.")
         return
-
-    status_msg = await message.reply("🤖 Запускаю AI обработку...")
     
-    try:
-        # Run module3_analyze.py
-        # Assuming it's in root
-        cmd = [sys.executable, "module3_analyze.py"]
-        
-        config.ai_log.parent.mkdir(parents=True, exist_ok=True)
-        config.ai_log.write_text("")
-        
-        process = subprocess.Popen(
-            cmd,
-            cwd=Path.cwd(),
-            stdout=open(config.ai_log, 'w'),
-            stderr=subprocess.STDOUT,
-            start_new_session=True
-        )
-        
-        config.ai_pid.write_text(str(process.pid))
-        
-        await status_msg.edit_text(
-            f"✅ **AI Анализ запущен!**\n"
-            f"📝 PID: {process.pid}\n"
-            f"📋 Логи: `{config.ai_log}`"
-        )
-        
-        # Log tailing task would go here (simplified for now)
-        
-    except Exception as e:
-        await status_msg.edit_text(f"❌ Ошибка запуска: {e}")
+    await asyncio.to_thread(
+        queue.enqueue,
+        AI,
+        message.from_user.id,
+        message.from_user.username,
+        payload={'chat_id': message.chat.id},
+        max_attempts=config.job_max_attempts
+    )
+    job_dispatcher.wake()
 
 @router.message(Command("check"))
 async def cmd_check(message: types.Message, config: BotConfig):
@@ -139,13 +245,19 @@ async def cmd_check(message: types.Message, config: BotConfig):
     status_text = "📊 **Статус задач:**\n\n"
     
     # Check Transcribe
-    t_status = queue.get_transcribe_status(message.from_user.id)
-    status_text += f"🎤 Transcribe: {t_status['status']}\n"
+    t_status = await asyncio.to_thread(queue.get_status, TRANSCRIBE, message.from_user.id)
+    status_text += f"🎤 Transcribe: {t_status['status']}"
+    if 'position' in t_status:
+        status_text += f" ({t_status['position']}/{t_status['total']})"
+    status_text += f", в очереди: {await asyncio.to_thread(queue.depth, TRANSCRIBE)}\n"
+    for entry in model_pool.stats():
+        status_text += (
+            f"   🧩 Whisper {entry['model_size']}: "
+            f"refs={entry['refcount']}, hits={entry['hits']}, idle={entry['idle']}s\n"
+        )
     
     # Check AI
-    if config.ai_pid.exists():
-        status_text += f"🤖 AI: Running (PID file exists)\n"
-    else:
-        status_text += f"🤖 AI: Idle\n"
+    a_status = await asyncio.to_thread(queue.get_status, AI, message.from_user.id)
+    status_text += f"🤖 AI: {a_status['status']}\n"
         
     await message.reply(status_text, parse_mode="Markdown")
@@ -0,0 +1,361 @@
+"""Durable job queue for transcription, AI and RAG stages.
+
+Jobs live in SQLite, so a bot restart resumes waiting work. A dispatcher
+starts queued jobs as stage workers free up, with per-stage concurrency,
+priorities and retries with exponential backoff.
+
+JobQueue calls block (a writer may wait up to 30 s for the SQLite lock);
+async code runs them in a thread (asyncio.to_thread) so the bot's event
+loop keeps serving updates.
+"""
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterator, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Stages of the pipeline
+TRANSCRIBE = "transcribe"
+AI = "ai"
+RAG = "rag"
+
+
+@dataclass
+class Job:
+    """A unit of work for one stage"""
+    id: int
+    stage: str
+    user_id: int
+    username: str
+    payload: Dict[str, Any] = field(default_factory=dict)
+    priority: int = 0
+    status: str = QUEUED
+    attempts: int = 0
+    max_attempts: int = 3
+    error: Optional[str] = None
+
+
+def default_db_path() -> Path:
+    return Path(os.getenv('DATA_DIR', 'data')) / "jobs.sqlite3"
+
+
+class JobQueue:
+    """SQLite-backed job queue shared by all stages"""
+
+    def __init__(self, path: Optional[Path] = None, retry_delay: float = 30.0):
+        """
+        Args:
+            path: SQLite file (default DATA_DIR/jobs.sqlite3)
+            retry_delay: Backoff before the first retry, doubled on each attempt
+        """
+        self.path = Path(path) if path else default_db_path()
+        self.retry_delay = retry_delay
+        self._initialized = False
+
+    @contextmanager
+    def _session(self, write: bool = True) -> Iterator[sqlite3.Connection]:
+        """Connection in an immediate (write-locked) or, for reads, a deferred transaction"""
+        if not self._initialized:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            self._ensure_schema(conn)
+            # WAL: a deferred read never waits for the writer
+            conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def _ensure_schema(self, conn: sqlite3.Connection) -> None:
+        if self._initialized:
+            return
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                stage TEXT NOT NULL,
+                user_id INTEGER NOT NULL,
+                username TEXT NOT NULL DEFAULT '',
+                dedupe_key TEXT,
+                payload TEXT NOT NULL DEFAULT '{}',
+                priority INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL DEFAULT 3,
+                available_at REAL NOT NULL,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                error TEXT
+            );
+            CREATE INDEX IF NOT EXISTS jobs_pending
+                ON jobs (stage, status, priority DESC, id);
+            CREATE INDEX IF NOT EXISTS jobs_dedupe
+                ON jobs (stage, dedupe_key, id);
+            """
+        )
+        self._initialized = True
+
+    @staticmethod
+    def _to_job(row: sqlite3.Row) -> Job:
+        return Job(
+            id=row['id'],
+            stage=row['stage'],
+            user_id=row['user_id'],
+            username=row['username'],
+            payload=json.loads(row['payload']),
+            priority=row['priority'],
+            status=row['status'],
+            attempts=row['attempts'],
+            max_attempts=row['max_attempts'],
+            error=row['error'],
+        )
+
+    def enqueue(
+        self,
+        stage: str,
+        user_id: int,
+        username: Optional[str] = None,
+        payload: Optional[Dict[str, Any]] = None,
+        priority: int = 0,
+        max_attempts: int = 3,
+        dedupe_key: Optional[str] = None
+    ) -> Job:
+        """Adds a job. An active job with the same dedupe_key is returned instead."""
+        now = time.time()
+        with self._session() as conn:
+            if dedupe_key is not None:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE stage = ? AND dedupe_key = ? AND status IN (?, ?)",
+                    (stage, dedupe_key, QUEUED, RUNNING)
+                ).fetchone()
+                if row is not None:
+                    return self._to_job(row)
+
+            cursor = conn.execute(
+                "INSERT INTO jobs (stage, user_id, username, dedupe_key, payload, priority, status, "
+                "max_attempts, available_at, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (stage, user_id, username or '', dedupe_key, json.dumps(payload or {}, ensure_ascii=False),
+                 priority, QUEUED, max_attempts, now, now)
+            )
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (cursor.lastrowid,)).fetchone()
+        return self._to_job(row)
+
+    def claim(self, stage: str) -> Optional[Job]:
+        """Takes the next ready job of the stage (highest priority first, then FIFO)"""
+        with self._session() as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE stage = ? AND status = ? AND available_at <= ? "
+                "ORDER BY priority DESC, id LIMIT 1",
+                (stage, QUEUED, time.time())
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, started_at = ? WHERE id = ?",
+                (RUNNING, time.time(), row['id'])
+            )
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (row['id'],)).fetchone()
+        return self._to_job(row)
+
+    def complete(self, job: Job) -> None:
+        with self._session() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = NULL WHERE id = ?",
+                (DONE, time.time(), job.id)
+            )
+
+    def fail(self, job: Job, error: str) -> bool:
+        """
+        Records a failure. Returns True if the job will be retried.
+
+        Retries are delayed by retry_delay * 2^(attempt - 1).
+        """
+        with self._session() as conn:
+            row = conn.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ?", (job.id,)).fetchone()
+            if row is None:
+                return False
+            if row['attempts'] < row['max_attempts']:
+                delay = self.retry_delay * 2 ** (row['attempts'] - 1)
+                conn.execute(
+                    "UPDATE jobs SET status = ?, available_at = ?, error = ? WHERE id = ?",
+                    (QUEUED, time.time() + delay, error, job.id)
+                )
+                return True
+            conn.execute(
+                "UPDATE jobs SET status = ?, finished_at = ?, error = ? WHERE id = ?",
+                (FAILED, time.time(), error, job.id)
+            )
+            return False
+
+    def last_job(self, stage: str, dedupe_key: str) -> Optional[Job]:
+        """Latest job of the stage with this dedupe_key, in any status"""
+        with self._session(write=False) as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE stage = ? AND dedupe_key = ? ORDER BY id DESC LIMIT 1",
+                (stage, dedupe_key)
+            ).fetchone()
+        return self._to_job(row) if row is not None else None
+
+    def recover_running(self) -> int:
+        """Requeues jobs left running by a previous (crashed) bot process"""
+        with self._session() as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, available_at = ? WHERE status = ?",
+                (QUEUED, time.time(), RUNNING)
+            )
+            return cursor.rowcount
+
+    def position(self, job: Job) -> int:
+        """Position in the stage queue: 0 - running, 1 - next"""
+        with self._session(write=False) as conn:
+            row = conn.execute("SELECT status, priority FROM jobs WHERE id = ?", (job.id,)).fetchone()
+            if row is None or row['status'] != QUEUED:
+                return 0
+            ahead = conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE stage = ? AND status = ? "
+                "AND (priority > ? OR (priority = ? AND id < ?))",
+                (job.stage, QUEUED, row['priority'], row['priority'], job.id)
+            ).fetchone()[0]
+        return ahead + 1
+
+    def depth(self, stage: str) -> int:
+        """Jobs of the stage waiting or running"""
+        with self._session(write=False) as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM jobs WHERE stage = ? AND status IN (?, ?)",
+                (stage, QUEUED, RUNNING)
+            ).fetchone()[0]
+
+    def get_status(self, stage: str, user_id: int) -> Dict:
+        """Status of the user's latest job in the stage"""
+        with self._session(write=False) as conn:
+            row = conn.execute(
+                "SELECT * FROM jobs WHERE stage = ? AND user_id = ? ORDER BY id DESC LIMIT 1",
+                (stage, user_id)
+            ).fetchone()
+        if row is None:
+            return {'status': 'not_in_queue'}
+
+        job = self._to_job(row)
+        status = {'status': job.status, 'job_id': job.id, 'attempts': job.attempts}
+        if job.status == QUEUED:
+            status['position'] = self.position(job)
+            status['total'] = self.depth(stage)
+        if job.error:
+            status['error'] = job.error
+        return status
+
+
+JobHandler = Callable[[Job], Awaitable[None]]
+
+
+class JobDispatcher:
+    """Starts queued jobs as stage workers free up"""
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handlers: Dict[str, JobHandler],
+        concurrency: Optional[Dict[str, int]] = None,
+        poll_interval: float = 5.0
+    ):
+        """
+        Args:
+            queue: Job storage
+            handlers: Coroutine per stage; raising an exception schedules a retry
+            concurrency: Max parallel jobs per stage (default 1)
+            poll_interval: How often delayed retries are checked without wake()
+        """
+        self.queue = queue
+        self.handlers = handlers
+        self.concurrency = concurrency or {}
+        self.poll_interval = poll_interval
+        self._running: Dict[str, Set[asyncio.Task]] = {stage: set() for stage in handlers}
+        self._wake = asyncio.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stopped = False
+
+    def wake(self) -> None:
+        """Signals that new jobs may be ready (also from worker threads)"""
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            try:
+                current = asyncio.get_running_loop()
+            except RuntimeError:
+                current = None
+            if current is not loop:
+                loop.call_soon_threadsafe(self._wake.set)
+                return
+        self._wake.set()
+
+    def running(self, stage: str) -> int:
+        return len(self._running.get(stage, ()))
+
+    async def run(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        recovered = await asyncio.to_thread(self.queue.recover_running)
+        if recovered:
+            logger.info(f"♻️ Requeued {recovered} interrupted jobs")
+
+        while not self._stopped:
+            await self.dispatch()
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    def stop(self) -> None:
+        self._stopped = True
+        self.wake()
+
+    async def dispatch(self) -> int:
+        """Starts ready jobs up to each stage's concurrency. Returns number started."""
+        started = 0
+        for stage, handler in self.handlers.items():
+            while self.running(stage) < max(1, self.concurrency.get(stage, 1)):
+                job = await asyncio.to_thread(self.queue.claim, stage)
+                if job is None:
+                    break
+                task = asyncio.create_task(self._run_job(handler, job))
+                self._running[stage].add(task)
+                task.add_done_callback(self._running[stage].discard)
+                started += 1
+        return started
+
+    async def _run_job(self, handler: JobHandler, job: Job) -> None:
+        try:
+            await handler(job)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            retry = await asyncio.to_thread(self.queue.fail, job, str(e)[:500])
+            logger.error(f"Job {job.stage}#{job.id} failed (attempt {job.attempts}, retry={retry}): {e}", exc_info=True)
+        else:
+            await asyncio.to_thread(self.queue.complete, job)
+        finally:
+            self.wake()
+
+
+# Global instance
+queue = JobQueue()
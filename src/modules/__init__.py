@@ -44,7 +44,7 @@ from .youtube_shorts_downloader import YouTubeShortsDownloader
 from .youtube_comment_service import YouTubeCommentService
 
 # Роутер (главный интерфейс)
-from .content_router import ContentRouter
+from .content_router import BatchItem, ContentRouter
 
 # YouTube grabber с обходом блокировок
 from .youtube_grabber_v2 import ProductionYouTubeGrabber
@@ -97,6 +97,7 @@ __all__ = [
     
     # Роутер (главный интерфейс)
     'ContentRouter',
+    'BatchItem',
     
     # YouTube grabber
     'ProductionYouTubeGrabber',
@@ -0,0 +1,127 @@
+"""
+AnswerCache - Кэш эмбеддингов вопросов и ответов RAG
+
+Повторный или почти такой же вопрос к базе не должен заново считать
+эмбеддинг, искать в ChromaDB и генерировать ответ LLM. Ответ хранится
+по нормализованному вопросу, фильтрам и версии индекса (любая
+переиндексация меняет версию) с TTL; близкий по эмбеддингу вопрос
+получает тот же ответ.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+import math
+import re
+import time
+
+
+# Косинусная близость, с которой вопрос считается тем же самым
+DEFAULT_SIMILARITY = 0.97
+DEFAULT_TTL = 3600.0
+
+_PUNCTUATION = re.compile(r'[^\w\s]')
+
+
+def normalize_question(question: str) -> str:
+    """Нижний регистр, ё -> е, без пунктуации и лишних пробелов"""
+    text = _PUNCTUATION.sub(' ', question.lower().replace('ё', 'е'))
+    return " ".join(text.split())
+
+
+def _unit(vector: Sequence[float]) -> List[float]:
+    values = [float(x) for x in vector]
+    norm = math.sqrt(sum(x * x for x in values)) or 1.0
+    return [x / norm for x in values]
+
+
+class LRUCache:
+    """Словарь ограниченного размера, вытесняет давно не читанное"""
+
+    def __init__(self, maxsize: int = 256) -> None:
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, Any]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Any:
+        if key not in self._data:
+            return None
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def put(self, key: Hashable, value: Any) -> None:
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def items(self) -> List[Tuple[Hashable, Any]]:
+        """Записи без изменения порядка вытеснения"""
+        return list(self._data.items())
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class AnswerCache:
+    """
+    Ответы RAG по (вопрос, фильтры, версия индекса)
+
+    Точное совпадение нормализованного вопроса ищется по словарю,
+    близкое - перебором эмбеддингов записей с теми же фильтрами и версией.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 128,
+        ttl: float = DEFAULT_TTL,
+        similarity: float = DEFAULT_SIMILARITY
+    ) -> None:
+        """
+        Args:
+            maxsize: Сколько ответов хранить
+            ttl: Время жизни ответа, секунд (0 - не кэшировать)
+            similarity: Порог косинусной близости вопросов (> 1 - только точное совпадение)
+        """
+        self.ttl = ttl
+        self.similarity = similarity
+        self._entries = LRUCache(maxsize)
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, question: str, embedding: Sequence[float], scope: Tuple, version: int) -> Optional[Dict]:
+        """
+        Args:
+            question: Вопрос как задан
+            embedding: Эмбеддинг вопроса
+            scope: Фильтры поиска (hashable)
+            version: Версия индекса
+        """
+        now = time.monotonic()
+        entry = self._entries.get((normalize_question(question), scope, version))
+        if entry is None and self.similarity <= 1.0:
+            vector = _unit(embedding)
+            best = 0.0
+            for (_, entry_scope, entry_version), candidate in self._entries.items():
+                if entry_scope != scope or entry_version != version or candidate[0] < now:
+                    continue
+                score = sum(a * b for a, b in zip(vector, candidate[1]))
+                if score >= self.similarity and score > best:
+                    best, entry = score, candidate
+
+        if entry is None or entry[0] < now:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[2]
+
+    def put(self, question: str, embedding: Sequence[float], scope: Tuple, version: int, result: Dict) -> None:
+        if self.ttl <= 0:
+            return
+        self._entries.put(
+            (normalize_question(question), scope, version),
+            (time.monotonic() + self.ttl, _unit(embedding), result)
+        )
+
+    def clear(self) -> None:
+        self._entries.clear()
@@ -0,0 +1,270 @@
+"""
+AudioPrep - Подготовка аудио перед Whisper
+
+Демультиплексирует видео в 16 kHz mono PCM один раз и кэширует рядом
+с медиафайлом (ключ - имя и хэш содержимого), затем режет аудио на куски
+по тишине (VAD), чтобы длинные видео транскрибировались параллельно.
+
+PCM читается через memmap как int16; в float32 переводятся только
+нужные куски (as_float32), поэтому часовое видео не занимает в памяти
+лишние 230 МБ. Кэш живёт, пока транскрипцию может понадобиться улучшить
+(--upgrade), и вытесняется новой версией того же медиа.
+"""
+from pathlib import Path
+from typing import Any, List, Optional, Tuple
+from dataclasses import dataclass
+import hashlib
+import os
+import subprocess
+
+
+SAMPLE_RATE = 16000
+# VAD проходит аудио блоками, чтобы не переводить в float32 всё сразу
+VAD_BLOCK_SECONDS = 600
+VAD_MIN_SILENCE_MS = 500
+# Префикс кэша: скрытый файл рядом с медиа (.pcm не считается медиа модулями 2/3)
+CACHE_PREFIX = ".audio_"
+CACHE_SUFFIX = ".pcm"
+
+
+@dataclass
+class PreparedAudio:
+    """Аудио, готовое для Whisper"""
+    path: Path            # Путь к кэшу PCM
+    media_hash: str       # Хэш исходного медиафайла
+    audio: Any            # numpy.memmap int16, 16 kHz mono (в float32 - as_float32)
+
+    @property
+    def duration(self) -> float:
+        return len(self.audio) / SAMPLE_RATE
+
+    def discard(self) -> None:
+        """Удаляет кэш PCM (транскрипция окончательная, улучшать нечего)"""
+        self.path.unlink(missing_ok=True)
+
+
+def media_hash(path: Path, block_size: int = 1024 * 1024) -> str:
+    """
+    Хэш содержимого медиафайла (blake2b, потоково)
+
+    Args:
+        path: Путь к файлу
+        block_size: Размер блока чтения
+
+    Returns:
+        Hex-строка (32 символа)
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _cache_stem(media_path: Path) -> str:
+    """Общее начало имён кэшей одного медиафайла"""
+    return f"{CACHE_PREFIX}{media_path.name}."
+
+
+def cache_path_for(media_path: Path, content_hash: str) -> Path:
+    """Путь к кэшу PCM для медиафайла: .audio_<имя медиа>.<хэш>.pcm"""
+    return media_path.parent / f"{_cache_stem(media_path)}{content_hash[:16]}{CACHE_SUFFIX}"
+
+
+def extract_audio(media_path: Path, content_hash: Optional[str] = None) -> Optional[Path]:
+    """
+    Извлекает 16 kHz mono s16le PCM через ffmpeg (с кэшем)
+
+    Args:
+        media_path: Видео/аудио файл
+        content_hash: Готовый хэш содержимого (если уже посчитан)
+
+    Returns:
+        Путь к PCM кэшу или None, если ffmpeg недоступен/упал
+    """
+    content_hash = content_hash or media_hash(media_path)
+    cache_file = cache_path_for(media_path, content_hash)
+
+    if cache_file.exists() and cache_file.stat().st_size > 0:
+        return cache_file
+
+    tmp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+    cmd = [
+        'ffmpeg', '-nostdin', '-hide_banner', '-loglevel', 'error', '-y',
+        '-i', str(media_path),
+        '-vn', '-ac', '1', '-ar', str(SAMPLE_RATE),
+        '-f', 's16le', '-acodec', 'pcm_s16le',
+        str(tmp_file)
+    ]
+
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=1800)
+    except (FileNotFoundError, subprocess.TimeoutExpired) as e:
+        print(f"   ⚠️  ffmpeg недоступен, Whisper декодирует файл сам: {e}")
+        tmp_file.unlink(missing_ok=True)
+        return None
+
+    if result.returncode != 0 or not tmp_file.exists() or tmp_file.stat().st_size == 0:
+        print(f"   ⚠️  Не удалось извлечь аудио: {result.stderr.strip()[:200]}")
+        tmp_file.unlink(missing_ok=True)
+        return None
+
+    os.replace(tmp_file, cache_file)
+
+    # Удаляем кэши от прежних версий этого медиа; кэши других файлов папки не трогаем
+    stem = _cache_stem(media_path)
+    for stale in media_path.parent.iterdir():
+        if stale.name.startswith(stem) and stale.name.endswith(CACHE_SUFFIX) and stale != cache_file:
+            stale.unlink(missing_ok=True)
+
+    return cache_file
+
+
+def load_pcm(pcm_path: Path):
+    """
+    Открывает s16le PCM без чтения в память
+
+    Returns:
+        numpy.memmap int16; куски переводятся в float32 через as_float32
+    """
+    import numpy as np
+
+    return np.memmap(pcm_path, dtype=np.int16, mode='r')
+
+
+def as_float32(samples):
+    """
+    Кусок аудио в виде, который ждёт Whisper: float32 [-1, 1]
+
+    int16 из PCM кэша переводится (копируется только этот кусок),
+    float32 (decode_audio) возвращается как есть.
+    """
+    import numpy as np
+
+    if samples.dtype == np.int16:
+        return samples.astype(np.float32) / 32768.0
+    return samples
+
+
+def prepare_audio(media_path: Path, content_hash: Optional[str] = None) -> Optional[PreparedAudio]:
+    """
+    Готовит аудио для Whisper: извлечение (или кэш) + загрузка
+
+    Returns:
+        PreparedAudio или None (тогда Whisper читает исходный файл)
+    """
+    try:
+        content_hash = content_hash or media_hash(media_path)
+        pcm_path = extract_audio(media_path, content_hash)
+        if pcm_path is None:
+            return None
+        return PreparedAudio(path=pcm_path, media_hash=content_hash, audio=load_pcm(pcm_path))
+    except Exception as e:
+        print(f"   ⚠️  Предобработка аудио не удалась: {e}")
+        return None
+
+
+def group_speech(
+    spans: List[Tuple[int, int]],
+    total_samples: int,
+    target_samples: int
+) -> List[Tuple[int, int]]:
+    """
+    Группирует речевые интервалы в куски ~target_samples
+
+    Границы кусков ставятся посередине пауз между интервалами речи,
+    поэтому слово никогда не режется пополам. Интервал длиннее
+    target_samples остаётся одним куском.
+
+    Args:
+        spans: Интервалы речи [(start, end)] в сэмплах, по возрастанию
+        total_samples: Длина аудио в сэмплах
+        target_samples: Желаемая длина куска
+
+    Returns:
+        Куски [(start, end)] в сэмплах, покрывающие всё аудио
+    """
+    if not spans:
+        return [(0, total_samples)] if total_samples > 0 else []
+
+    chunks = []
+    chunk_start = 0
+
+    for (_, prev_end), (next_start, _) in zip(spans, spans[1:]):
+        if prev_end - chunk_start >= target_samples:
+            boundary = (prev_end + next_start) // 2
+            chunks.append((chunk_start, boundary))
+            chunk_start = boundary
+
+    chunks.append((chunk_start, total_samples))
+    return chunks
+
+
+def merge_block_spans(
+    spans: List[Tuple[int, int]],
+    block_samples: int,
+    min_silence: int
+) -> List[Tuple[int, int]]:
+    """
+    Склеивает речь, разрезанную границей блока VAD
+
+    Между соседними интервалами, которые разделяет граница блока, а пауза
+    короче min_silence, на самом деле тишины нет - резать там нельзя.
+
+    Args:
+        spans: Интервалы речи [(start, end)] в сэмплах, по возрастанию
+        block_samples: Длина блока VAD
+        min_silence: Минимальная пауза в сэмплах
+
+    Returns:
+        Интервалы речи без разрезов на границах блоков
+    """
+    merged: List[Tuple[int, int]] = []
+    for start, end in spans:
+        if merged:
+            prev_start, prev_end = merged[-1]
+            crosses_block = (prev_end - 1) // block_samples != start // block_samples
+            if crosses_block and start - prev_end < min_silence:
+                merged[-1] = (prev_start, end)
+                continue
+        merged.append((start, end))
+    return merged
+
+
+def plan_chunks(audio, chunk_seconds: float = 120.0) -> List[Tuple[int, int]]:
+    """
+    Режет аудио на куски по тишине (VAD из faster-whisper)
+
+    VAD идёт блоками по VAD_BLOCK_SECONDS: в float32 переводится один
+    блок за раз. Речь, разрезанная границей блока, склеивается обратно.
+
+    Args:
+        audio: numpy-массив 16 kHz (int16 из PCM кэша или float32)
+        chunk_seconds: Желаемая длина куска
+
+    Returns:
+        Куски [(start, end)] в сэмплах
+    """
+    target = int(chunk_seconds * SAMPLE_RATE)
+    if len(audio) <= target:
+        return [(0, len(audio))]
+
+    try:
+        from faster_whisper.vad import VadOptions, get_speech_timestamps
+
+        options = VadOptions(min_silence_duration_ms=VAD_MIN_SILENCE_MS)
+        block = VAD_BLOCK_SECONDS * SAMPLE_RATE
+        spans = []
+        for block_start in range(0, len(audio), block):
+            block_audio = as_float32(audio[block_start:block_start + block])
+            for ts in get_speech_timestamps(block_audio, options):
+                spans.append((block_start + ts['start'], block_start + ts['end']))
+        spans = merge_block_spans(spans, block, VAD_MIN_SILENCE_MS * SAMPLE_RATE // 1000)
+    except Exception as e:
+        print(f"   ⚠️  VAD недоступен, режем по фиксированной длине: {e}")
+        return [(start, min(start + target, len(audio))) for start in range(0, len(audio), target)]
+
+    return group_speech(spans, len(audio), target)
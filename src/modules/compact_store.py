@@ -0,0 +1,568 @@
+"""
+CompactStore - Компактное хранилище векторов RAG на NumPy
+
+ChromaDB хранит float32 векторы и полные тексты фрагментов (и ещё
+индексирует их). Для личной базы до нескольких сотен тысяч фрагментов
+хватает перебора: векторы квантуются в int8 (в 4 раза меньше float32)
+и лежат в memory-mapped файле, тексты - один раз в файле документов
+по смещению, метаданные - в SQLite. Поиск - перебор блоками (BLAS).
+
+В битовом режиме перебираются только знаки координат (в 32 раза меньше
+float32, popcount расстояния Хэмминга), а int8 векторы читаются с диска
+лишь для пересчёта оценки лучших кандидатов.
+
+Интерфейс повторяет используемую RAGEngine часть коллекции chromadb:
+upsert / delete / query.
+"""
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import fcntl
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+
+INT8 = "int8"
+BINARY = "binary"
+MODES = (INT8, BINARY)
+
+# Строк в блоке перебора: временный float32 блок ~ BLOCK_ROWS * dim * 4 байт
+BLOCK_ROWS = 32768
+# Кандидатов на пересчёт оценки в битовом режиме: n_results * OVERSAMPLE
+OVERSAMPLE = 32
+
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+_WHERE_OPS = {'$eq': '=', '$ne': '!=', '$in': 'IN', '$nin': 'NOT IN'}
+
+
+def unit_rows(vectors: Any) -> np.ndarray:
+    """float32 векторы единичной длины (по строкам)"""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Симметричное int8 квантование с масштабом на строку: x ~ code * scale"""
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def quantize_binary(vectors: np.ndarray) -> np.ndarray:
+    """Знаки координат, упакованные по 8 в байт"""
+    return np.packbits(vectors > 0, axis=1)
+
+
+def _where_sql(where: Dict) -> Tuple[str, List[Any]]:
+    """Фильтр chroma (равенство, $in, $nin, $ne, $and) -> условие SQL по metadata"""
+    if '$and' in where:
+        parts = [_where_sql(clause) for clause in where['$and']]
+        return " AND ".join(f"({sql})" for sql, _ in parts), [p for _, params in parts for p in params]
+    if len(where) != 1:
+        return _where_sql({'$and': [{key: value} for key, value in where.items()]})
+
+    key, value = next(iter(where.items()))
+    field = "json_extract(metadata, ?)"
+    params: List[Any] = [f'$.{key}']
+    if not isinstance(value, dict):
+        return f"{field} = ?", params + [value]
+
+    op, operand = next(iter(value.items()))
+    if op not in _WHERE_OPS:
+        raise ValueError(f"Unsupported where operator: {op}")
+    if op in ('$in', '$nin'):
+        if not operand:
+            return ("0" if op == '$in' else "1"), []
+        return f"{field} {_WHERE_OPS[op]} ({', '.join('?' * len(operand))})", params + list(operand)
+    return f"{field} {_WHERE_OPS[op]} ?", params + [operand]
+
+
+@dataclass(frozen=True)
+class _View:
+    """
+    Ссылки на состояние коллекции для одного запроса
+
+    Оценка идёт без блокировки экземпляра: пока запрос держит разделяемый
+    flock, писателей нет, поэтому _refresh других запросов ничего не меняет
+    и массивы по этим ссылкам остаются согласованными.
+    """
+    count: int
+    dim: Optional[int]
+    codes: Optional[np.memmap]
+    scales: Optional[np.memmap]
+    bits: Optional[np.memmap]
+    ids: List[Optional[str]]
+    offsets: np.ndarray
+    lengths: np.ndarray
+    metadata: Dict[int, str]
+
+
+class CompactCollection:
+    """
+    Коллекция фрагментов в папке: vectors.*, scales.f32, documents.bin, rows.sqlite3
+
+    Номера строк векторов переиспользуются после удаления. Если другой
+    процесс (демон, бот) изменил коллекцию, перечитываются только строки,
+    изменённые после известного поколения (столбец generation и таблица
+    freed для удалённых).
+    """
+
+    def __init__(self, path: Path, mode: str = INT8) -> None:
+        """
+        Args:
+            path: Папка коллекции
+            mode: INT8 (точнее) или BINARY (быстрее перебор, меньше памяти)
+
+        Raises:
+            ValueError: Неизвестный режим
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown compact store mode: {mode} (available: {', '.join(MODES)})")
+        self.path = Path(path)
+        self.mode = mode
+        self._lock = threading.RLock()
+        self._generation: Optional[int] = None
+        self._created: Optional[int] = None
+        self.dim: Optional[int] = None
+        self._capacity = 0
+        self._count = 0
+        self._codes: Optional[np.memmap] = None
+        self._scales: Optional[np.memmap] = None
+        self._bits: Optional[np.memmap] = None
+        self._ids: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self._offsets = np.zeros(0, dtype=np.int64)
+        self._lengths = np.zeros(0, dtype=np.int64)
+        self._live = np.zeros(0, dtype=bool)
+        self._metadata: Dict[int, str] = {}
+
+    # ---- Хранение ----
+
+    @property
+    def _vectors_file(self) -> Path:
+        return self.path / "vectors.int8"
+
+    @property
+    def _bits_file(self) -> Path:
+        return self.path / "vectors.binary"
+
+    @property
+    def _scales_file(self) -> Path:
+        return self.path / "scales.f32"
+
+    @property
+    def _documents_file(self) -> Path:
+        return self.path / "documents.bin"
+
+    @contextmanager
+    def _session(self, write: bool = True) -> Iterator[sqlite3.Connection]:
+        """
+        Транзакция под блокировкой файлов коллекции между процессами
+
+        Векторы и тексты пишутся вне SQLite, поэтому писатель держит
+        эксклюзивный flock (и BEGIN IMMEDIATE), а запросы - разделяемый
+        flock и отложенную транзакцию: они идут параллельно друг другу и
+        ждут только текущий upsert/delete, а не друг друга.
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        lock = os.open(self.path / ".lock", os.O_CREAT | os.O_RDWR)
+        conn = None
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX if write else fcntl.LOCK_SH)
+            conn = sqlite3.connect(self.path / "rows.sqlite3", timeout=30, isolation_level=None)
+            self._ensure_schema(conn)
+            conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            if conn is not None:
+                conn.close()
+            os.close(lock)
+
+    @staticmethod
+    def _ensure_schema(conn: sqlite3.Connection) -> None:
+        """Таблицы коллекции; коллекция прежней версии получает generation и freed"""
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'freed'").fetchone():
+            return
+        conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS rows (
+                row INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, doc_offset INTEGER NOT NULL,
+                doc_length INTEGER NOT NULL, metadata TEXT NOT NULL, generation INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            """
+        )
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(rows)")}
+        if 'generation' not in columns:
+            # Первое чтение любого экземпляра полное, поэтому 0 у старых строк достаточно
+            try:
+                conn.execute("ALTER TABLE rows ADD COLUMN generation INTEGER NOT NULL DEFAULT 0")
+            except sqlite3.OperationalError:
+                # Параллельный читатель уже добавил столбец
+                pass
+        conn.execute("CREATE INDEX IF NOT EXISTS rows_generation ON rows (generation)")
+        # Метка создания: коллекцию, пересозданную другим процессом, перечитываем целиком
+        conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('created', ?)", (time.time_ns(),))
+        # freed - последней: по ней проверяется, что схема готова
+        conn.execute("CREATE TABLE IF NOT EXISTS freed (row INTEGER PRIMARY KEY, generation INTEGER NOT NULL)")
+
+    @staticmethod
+    def _meta(conn: sqlite3.Connection) -> Dict[str, int]:
+        return dict(conn.execute("SELECT key, value FROM meta").fetchall())
+
+    @staticmethod
+    def _set_meta(conn: sqlite3.Connection, **values: int) -> None:
+        conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", list(values.items()))
+
+    def _open_arrays(self) -> None:
+        """memmap векторов, масштабов и битов на self._capacity строк"""
+        self._codes = self._scales = self._bits = None
+        if not self.dim or not self._capacity:
+            return
+        self._codes = np.memmap(self._vectors_file, dtype=np.int8, mode='r+', shape=(self._capacity, self.dim))
+        self._scales = np.memmap(self._scales_file, dtype=np.float32, mode='r+', shape=(self._capacity,))
+        if self.mode == BINARY:
+            self._bits = np.memmap(self._bits_file, dtype=np.uint8, mode='r+',
+                                   shape=(self._capacity, (self.dim + 7) // 8))
+
+    def _grow(self, rows: int) -> None:
+        """Расширяет файлы векторов до rows строк (с запасом)"""
+        if rows <= self._capacity:
+            return
+        capacity = max(rows, self._capacity * 2, 1024)
+        files = [(self._vectors_file, self.dim), (self._scales_file, 4)]
+        if self.mode == BINARY:
+            files.append((self._bits_file, (self.dim + 7) // 8))
+        for path, width in files:
+            with open(path, 'ab') as f:
+                f.truncate(capacity * width)
+        self._capacity = capacity
+        self._open_arrays()
+
+    def _refresh(self, conn: sqlite3.Connection) -> None:
+        """Подтягивает изменения коллекции (в том числе другого процесса) после известного поколения"""
+        meta = self._meta(conn)
+        generation = meta.get('generation', 0)
+        if self._generation == generation and self._created == meta.get('created'):
+            return
+
+        since = self._generation
+        if since is None or generation < since or self._created != meta.get('created'):
+            since = None
+            self._ids, self._rows, self._metadata = [], {}, {}
+            self._offsets = np.zeros(0, dtype=np.int64)
+            self._lengths = np.zeros(0, dtype=np.int64)
+            self._live = np.zeros(0, dtype=bool)
+
+        self.dim = meta.get('dim')
+        self._count = meta.get('count', 0)
+        if self._capacity != meta.get('capacity', 0) or self._codes is None:
+            self._capacity = meta.get('capacity', 0)
+            self._open_arrays()
+        self._resize_state()
+
+        if since is None:
+            changed = conn.execute("SELECT row, id, doc_offset, doc_length, metadata FROM rows")
+        else:
+            for (row,) in conn.execute("SELECT row FROM freed WHERE generation > ?", (since,)):
+                self._forget(row)
+            changed = conn.execute(
+                "SELECT row, id, doc_offset, doc_length, metadata FROM rows WHERE generation > ?", (since,)
+            )
+        for row, chunk_id, offset, length, metadata in changed:
+            self._forget(row)
+            self._ids[row] = chunk_id
+            self._rows[chunk_id] = row
+            self._offsets[row] = offset
+            self._lengths[row] = length
+            self._live[row] = True
+            self._metadata[row] = metadata
+        self._generation = generation
+        self._created = meta.get('created')
+
+    def _forget(self, row: int) -> None:
+        """Убирает строку из состояния (id мог уже переехать в другую строку)"""
+        chunk_id = self._ids[row]
+        if chunk_id is not None and self._rows.get(chunk_id) == row:
+            del self._rows[chunk_id]
+        self._ids[row] = None
+        self._live[row] = False
+        self._metadata.pop(row, None)
+
+    def _next_generation(self) -> int:
+        return (self._generation or 0) + 1
+
+    def _commit_meta(self, conn: sqlite3.Connection, **values: int) -> None:
+        generation = self._next_generation()
+        self._set_meta(conn, generation=generation, count=self._count, capacity=self._capacity, **values)
+        self._generation = generation
+
+    # ---- Интерфейс коллекции ----
+
+    def count(self) -> int:
+        with self._lock, self._session(write=False) as conn:
+            self._refresh(conn)
+            return int(self._live.sum())
+
+    def upsert(
+        self,
+        ids: Sequence[str],
+        documents: Sequence[str],
+        metadatas: Sequence[Dict],
+        embeddings: Any
+    ) -> None:
+        """Добавляет или заменяет фрагменты
+
+        Raises:
+            ValueError: Размерность не совпадает с уже сохранёнными векторами
+        """
+        if not len(ids):
+            return
+        vectors = unit_rows(embeddings)
+        with self._lock, self._session() as conn:
+            self._refresh(conn)
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                self._set_meta(conn, dim=self.dim)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f"Embedding dimension {vectors.shape[1]} != {self.dim}")
+
+            # Строки: своя у существующего id, затем освобождённые, затем новые в конце
+            free = iter(np.flatnonzero(~self._live).tolist())
+            rows = []
+            for chunk_id in ids:
+                row = self._rows.get(chunk_id)
+                if row is None:
+                    row = next(free, None)
+                    if row is None:
+                        row = self._count
+                        self._count += 1
+                    self._rows[chunk_id] = row
+                rows.append(row)
+            self._grow(self._count)
+            self._resize_state()
+
+            # Тексты дописываются в конец файла документов
+            encoded = [doc.encode('utf-8') for doc in documents]
+            with open(self._documents_file, 'ab') as f:
+                offset = f.tell()
+                f.write(b"".join(encoded))
+            waste = int(self._lengths[[row for row in rows if self._live[row]]].sum())
+
+            index = np.asarray(rows)
+            self._codes[index], self._scales[index] = quantize_int8(vectors)
+            self._codes.flush()
+            self._scales.flush()
+            if self.mode == BINARY:
+                self._bits[index] = quantize_binary(vectors)
+                self._bits.flush()
+
+            generation = self._next_generation()
+            records = []
+            for row, chunk_id, data, metadata in zip(rows, ids, encoded, metadatas):
+                metadata_json = json.dumps(metadata or {}, ensure_ascii=False)
+                records.append((row, chunk_id, offset, len(data), metadata_json, generation))
+                self._ids[row] = chunk_id
+                self._offsets[row], self._lengths[row] = offset, len(data)
+                self._live[row] = True
+                self._metadata[row] = metadata_json
+                offset += len(data)
+            conn.executemany(
+                "INSERT OR REPLACE INTO rows (row, id, doc_offset, doc_length, metadata, generation) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                records
+            )
+            conn.executemany("DELETE FROM freed WHERE row = ?", [(row,) for row in rows])
+            self._commit_meta(conn, waste=self._meta(conn).get('waste', 0) + waste)
+
+    def add(self, ids: Sequence[str], documents: Sequence[str], metadatas: Sequence[Dict], embeddings: Any) -> None:
+        self.upsert(ids, documents, metadatas, embeddings)
+
+    def delete(self, ids: Optional[Sequence[str]] = None, where: Optional[Dict] = None) -> None:
+        """Удаляет фрагменты по id и/или фильтру metadata"""
+        with self._lock, self._session() as conn:
+            self._refresh(conn)
+            rows = {self._rows[chunk_id] for chunk_id in ids or () if chunk_id in self._rows}
+            if where:
+                sql, params = _where_sql(where)
+                rows.update(row for (row,) in conn.execute(f"SELECT row FROM rows WHERE {sql}", params))
+            if not rows:
+                return
+
+            conn.executemany("DELETE FROM rows WHERE row = ?", [(row,) for row in rows])
+            generation = self._next_generation()
+            conn.executemany(
+                "INSERT OR REPLACE INTO freed (row, generation) VALUES (?, ?)",
+                [(row, generation) for row in rows]
+            )
+            for row in rows:
+                self._forget(row)
+            waste = self._meta(conn).get('waste', 0) + int(self._lengths[list(rows)].sum())
+            self._commit_meta(conn, waste=waste)
+            # Файл документов переписывается, когда мусора в нём больше, чем живых текстов
+            if waste > int(self._lengths[self._live].sum()):
+                self._compact_documents(conn)
+
+    def _compact_documents(self, conn: sqlite3.Connection) -> None:
+        """Переписывает файл документов без удалённых и заменённых текстов"""
+        temp = self._documents_file.with_suffix('.tmp')
+        generation = self._next_generation()
+        records = []
+        with open(self._documents_file, 'rb') as src, open(temp, 'wb') as dst:
+            for row in np.flatnonzero(self._live).tolist():
+                src.seek(int(self._offsets[row]))
+                data = src.read(int(self._lengths[row]))
+                records.append((dst.tell(), generation, row))
+                self._offsets[row] = dst.tell()
+                dst.write(data)
+            dst.flush()
+            os.fsync(dst.fileno())
+        conn.executemany("UPDATE rows SET doc_offset = ?, generation = ? WHERE row = ?", records)
+        os.replace(temp, self._documents_file)
+        self._commit_meta(conn, waste=0)
+
+    def _resize_state(self) -> None:
+        """Массивы состояния под self._count строк"""
+        missing = self._count - len(self._ids)
+        if missing > 0:
+            self._ids.extend([None] * missing)
+            self._offsets = np.concatenate([self._offsets, np.zeros(missing, dtype=np.int64)])
+            self._lengths = np.concatenate([self._lengths, np.zeros(missing, dtype=np.int64)])
+            self._live = np.concatenate([self._live, np.zeros(missing, dtype=bool)])
+
+    def _view(self) -> _View:
+        return _View(
+            count=self._count, dim=self.dim, codes=self._codes, scales=self._scales, bits=self._bits,
+            ids=self._ids, offsets=self._offsets, lengths=self._lengths, metadata=self._metadata
+        )
+
+    def _scores(self, view: _View, query: np.ndarray, mask: np.ndarray) -> np.ndarray:
+        """Первый проход по всем строкам: косинус (int8) или -расстояние Хэмминга (биты)"""
+        scores = np.full(view.count, -np.inf, dtype=np.float32)
+        if self.mode == INT8:
+            for start in range(0, view.count, BLOCK_ROWS):
+                end = min(start + BLOCK_ROWS, view.count)
+                block = np.asarray(view.codes[start:end], dtype=np.float32)
+                scores[start:end] = (block @ query) * view.scales[start:end]
+        else:
+            packed_query = quantize_binary(query[None, :])[0]
+            for start in range(0, view.count, BLOCK_ROWS):
+                end = min(start + BLOCK_ROWS, view.count)
+                distance = _POPCOUNT[np.bitwise_xor(view.bits[start:end], packed_query)].sum(axis=1, dtype=np.int32)
+                scores[start:end] = -distance
+        scores[~mask] = -np.inf
+        return scores
+
+    @staticmethod
+    def _rescore(view: _View, query: np.ndarray, rows: np.ndarray) -> np.ndarray:
+        """Косинус кандидатов по int8 векторам (читаются с диска только эти строки)"""
+        return (np.asarray(view.codes[rows], dtype=np.float32) @ query) * view.scales[rows]
+
+    def query(
+        self,
+        query_embeddings: Any = None,
+        n_results: int = 10,
+        include: Optional[Sequence[str]] = None,
+        where: Optional[Dict] = None,
+        **kwargs: Any
+    ) -> Dict[str, List[List[Any]]]:
+        """Ближайшие фрагменты, формат ответа как у chromadb
+
+        Блокировка экземпляра нужна только на _refresh и снимок ссылок;
+        фильтр и перебор идут вне неё, так что запросы одного процесса
+        выполняются параллельно (от писателей защищает разделяемый flock).
+
+        Raises:
+            TypeError: Нет query_embeddings (поиск по тексту не поддерживается)
+        """
+        if query_embeddings is None:
+            raise TypeError("CompactCollection.query needs query_embeddings")
+        queries = unit_rows(query_embeddings)
+
+        result: Dict[str, List[List[Any]]] = {'ids': [], 'documents': [], 'metadatas': [], 'distances': []}
+        with ExitStack() as session:
+            # Порядок как у писателей (экземпляр, затем flock), но экземпляр
+            # отпускается сразу после снимка, а flock - только после перебора
+            with self._lock:
+                conn = session.enter_context(self._session(write=False))
+                self._refresh(conn)
+                view = self._view()
+                mask = self._live.copy()
+
+            if where:
+                sql, params = _where_sql(where)
+                allowed = np.zeros(view.count, dtype=bool)
+                allowed[[row for (row,) in conn.execute(f"SELECT row FROM rows WHERE {sql}", params)]] = True
+                mask &= allowed
+
+            for query in queries:
+                rows, scores = self._search(view, query, mask, n_results)
+                result['ids'].append([view.ids[row] for row in rows])
+                result['metadatas'].append([json.loads(view.metadata[row]) for row in rows])
+                result['distances'].append([float(1.0 - score) for score in scores])
+                result['documents'].append(self._documents(view, rows))
+        return result
+
+    def _documents(self, view: _View, rows: List[int]) -> List[str]:
+        if not rows:
+            return []
+        texts = []
+        with open(self._documents_file, 'rb') as docs:
+            for row in rows:
+                docs.seek(int(view.offsets[row]))
+                texts.append(docs.read(int(view.lengths[row])).decode('utf-8'))
+        return texts
+
+    def _search(
+        self,
+        view: _View,
+        query: np.ndarray,
+        mask: np.ndarray,
+        n_results: int
+    ) -> Tuple[List[int], List[float]]:
+        live = int(mask.sum())
+        if not live or not view.dim or n_results <= 0:
+            return [], []
+        scores = self._scores(view, query, mask)
+        # В битовом режиме первый проход грубый: кандидатов больше, оценка пересчитывается
+        take = min(live, n_results * OVERSAMPLE if self.mode == BINARY else n_results)
+        candidates = np.argpartition(-scores, take - 1)[:take]
+        exact = self._rescore(view, query, candidates)
+        order = np.argsort(-exact, kind='stable')[:n_results]
+        return candidates[order].tolist(), exact[order].tolist()
+
+    def size_bytes(self) -> int:
+        """Размер коллекции на диске"""
+        return sum(f.stat().st_size for f in self.path.iterdir() if f.is_file())
+
+
+class CompactClient:
+    """Замена chromadb.PersistentClient: коллекции - подпапки path"""
+
+    def __init__(self, path: Path, mode: str = INT8) -> None:
+        self.path = Path(path)
+        self.mode = mode
+
+    def _collection_path(self, name: str) -> Path:
+        return self.path / f"{name}.{self.mode}"
+
+    def get_or_create_collection(self, name: str = 'secbrain') -> CompactCollection:
+        return CompactCollection(self._collection_path(name), self.mode)
+
+    def delete_collection(self, name: str = 'secbrain') -> None:
+        shutil.rmtree(self._collection_path(name), ignore_errors=True)
@@ -4,7 +4,10 @@ Content Router
 Оркестратор всех подмодулей скачивания.
 Автоматически определяет тип контента и маршрутизирует к нужному скачивателю.
 """
-from typing import List, Optional
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Deque, Dict, Iterable, Iterator, List, Optional
 from pathlib import Path
 
 from .downloader_base import BaseDownloader, DownloadResult, DownloadSettings
@@ -15,6 +18,28 @@ from .youtube_shorts_downloader import YouTubeShortsDownloader
 from .downloader_utils import print_progress
 
 
+# Одновременных загрузок на платформу в download_many.
+# YouTube дополнительно ограничен rate_limit в ProductionYouTubeGrabber
+# (общим для всех потоков), а cookies между загрузками ротирует ImprovedCookieManager.
+PLATFORM_CONCURRENCY = {
+    'Instagram': 4,
+    'YouTube': 2,
+}
+
+
+@dataclass
+class BatchItem:
+    """Результат одного URL из download_many"""
+    url: str
+    platform: str
+    result: Optional[DownloadResult] = None
+    error: Optional[str] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.result is not None
+
+
 class ContentRouter:
     """
     Маршрутизирует URL к соответствующему скачивателю
@@ -79,6 +104,63 @@ class ContentRouter:
         
         return result
     
+    def download_many(
+        self,
+        urls: Iterable[str],
+        concurrency: Optional[Dict[str, int]] = None
+    ) -> Iterator[BatchItem]:
+        """
+        Скачивает несколько URL параллельно, отдавая результаты по мере готовности
+
+        На каждую платформу одновременно идёт не больше concurrency[платформа]
+        загрузок; очередь одной платформы не занимает потоки другой.
+        Повторы URL пропускаются, неподдерживаемые URL сразу отдаются с ошибкой.
+
+        Args:
+            urls: URL контента
+            concurrency: Лимиты по платформам (по умолчанию PLATFORM_CONCURRENCY)
+
+        Yields:
+            BatchItem в порядке завершения
+        """
+        limits = {**PLATFORM_CONCURRENCY, **(concurrency or {})}
+        queues: Dict[str, Deque[str]] = {}
+        for url in dict.fromkeys(url.strip() for url in urls if url.strip()):
+            platform = self.get_downloader_info(url)['platform']
+            if platform == 'Unknown':
+                yield BatchItem(url, platform, error="URL не поддерживается")
+                continue
+            queues.setdefault(platform, deque()).append(url)
+        if not queues:
+            return
+
+        running: Dict[Future, BatchItem] = {}
+        active = {platform: 0 for platform in queues}
+        workers = sum(max(1, limits.get(platform, 1)) for platform in queues)
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='download') as pool:
+            def fill() -> None:
+                for platform, pending in queues.items():
+                    while pending and active[platform] < max(1, limits.get(platform, 1)):
+                        item = BatchItem(pending.popleft(), platform)
+                        running[pool.submit(self.download, item.url)] = item
+                        active[platform] += 1
+
+            fill()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item = running.pop(future)
+                    active[item.platform] -= 1
+                    try:
+                        item.result = future.result()
+                    except Exception as e:
+                        item.error = str(e) or e.__class__.__name__
+                    if item.result is None and item.error is None:
+                        item.error = "Загрузка не удалась"
+                    yield item
+                fill()
+
     def download_comments(self, url: str, folder_path: Path) -> Optional[Path]:
         """
         Скачивает только комментарии для контента
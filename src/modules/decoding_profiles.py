@@ -0,0 +1,89 @@
+"""
+DecodingProfiles - Профили декодирования Whisper
+
+beam_size=10, best_of=5 на CPU стоят в несколько раз дороже жадного
+декодирования. Профиль выбирается на задачу по длительности медиа и
+глубине очереди транскрибации; быстрые транскрипции потом можно
+улучшить в фоне (module2_transcribe.py --upgrade).
+"""
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+
+@dataclass(frozen=True)
+class DecodingProfile:
+    """Параметры декодирования Whisper"""
+    name: str
+    beam_size: int
+    best_of: int
+    rank: int  # Чем больше, тем точнее (и медленнее)
+
+
+PROFILES: Dict[str, DecodingProfile] = {
+    'fast': DecodingProfile('fast', beam_size=1, best_of=1, rank=0),          # Жадное декодирование
+    'balanced': DecodingProfile('balanced', beam_size=5, best_of=3, rank=1),
+    'accurate': DecodingProfile('accurate', beam_size=10, best_of=5, rank=2),  # Прежние параметры
+}
+
+DEFAULT_PROFILE = 'accurate'
+
+# Пороги выбора профиля
+MEDIUM_MEDIA_SECONDS = 5 * 60    # Длиннее - balanced
+LONG_MEDIA_SECONDS = 20 * 60     # Длиннее - fast
+BUSY_QUEUE_DEPTH = 3             # Каждые N задач в очереди - на профиль быстрее
+
+
+def get_profile(name: str) -> DecodingProfile:
+    """
+    Профиль по имени
+
+    Raises:
+        ValueError: Неизвестный профиль
+    """
+    try:
+        return PROFILES[name]
+    except KeyError:
+        raise ValueError(f"Неизвестный профиль декодирования: {name} (доступны: {', '.join(PROFILES)})")
+
+
+def choose_profile(duration: float, queue_depth: int = 0, override: Optional[str] = None) -> DecodingProfile:
+    """
+    Выбор профиля для задачи
+
+    Короткие рилсы декодируются точно, длинные видео - быстрее;
+    при очереди профиль понижается, чтобы очередь не росла.
+
+    Args:
+        duration: Длительность медиа в секундах (0 - неизвестна)
+        queue_depth: Сколько задач транскрибации ждёт или выполняется
+        override: Явно заданный профиль (имеет приоритет)
+
+    Returns:
+        DecodingProfile
+    """
+    if override:
+        return get_profile(override)
+
+    if duration > LONG_MEDIA_SECONDS:
+        rank = PROFILES['fast'].rank
+    elif duration > MEDIUM_MEDIA_SECONDS:
+        rank = PROFILES['balanced'].rank
+    else:
+        rank = PROFILES['accurate'].rank
+
+    rank -= queue_depth // BUSY_QUEUE_DEPTH
+    rank = max(0, rank)
+
+    return next(profile for profile in PROFILES.values() if profile.rank == rank)
+
+
+def needs_upgrade(profile_name: Optional[str], target: str = DEFAULT_PROFILE) -> bool:
+    """
+    Нужно ли перетранскрибировать результат профилем target
+
+    Транскрипции без отметки профиля сделаны прежними параметрами (accurate).
+    """
+    current = PROFILES.get(profile_name or DEFAULT_PROFILE)
+    if current is None:
+        return False
+    return current.rank < get_profile(target).rank
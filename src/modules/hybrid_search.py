@@ -0,0 +1,303 @@
+"""
+HybridSearch - Лексический индекс RAG и слияние выдач
+
+Плотный поиск по MiniLM плохо находит точные имена, теги и формы
+русских слов. Рядом с ChromaDB хранится индекс SQLite FTS5 по тем же
+фрагментам (по основам слов), а выдачи обоих поисков объединяются
+reciprocal rank fusion. Метаданные папок (дата, платформа, теги) лежат
+там же и служат фильтрами для обоих поисков.
+"""
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+import re
+import sqlite3
+
+from .note_chunker import parse_frontmatter
+
+
+LEXICAL_FILENAME = "lexical.sqlite3"
+
+# Константа RRF: вклад документа на месте rank равен 1 / (RRF_K + rank)
+RRF_K = 60
+
+_WORD = re.compile(r'[0-9a-zа-я]+')
+_CYRILLIC = re.compile(r'[а-я]')
+# Окончания для лёгкого стемминга: падежи, числа, роды, частые глагольные формы
+_RU_ENDINGS = sorted((
+    'ами', 'ями', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ых', 'их', 'ой', 'ей', 'ий', 'ый',
+    'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ую', 'юю', 'ом', 'ем', 'ам', 'ям', 'ах', 'ях', 'ов', 'ев',
+    'ать', 'ять', 'ить', 'еть', 'ешь', 'ет', 'ют', 'ут', 'ит', 'ат', 'ят', 'ла', 'ли', 'ло',
+    'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+), key=len, reverse=True)
+_EN_ENDINGS = ('ing', 'ed', 'es', 's')
+# Основа короче не обрезается
+_MIN_STEM = 3
+
+_FOLDER_DATE = re.compile(r'^(\d{4}-\d{2}-\d{2})(?:_\d{2}-\d{2})?_([^_]+)')
+
+
+def stem(word: str) -> str:
+    """Лёгкий стемминг: одно самое длинное окончание, основа не короче _MIN_STEM"""
+    endings = _RU_ENDINGS if _CYRILLIC.search(word) else _EN_ENDINGS
+    for ending in endings:
+        if word.endswith(ending) and len(word) - len(ending) >= _MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def stems(text: str) -> List[str]:
+    """Основы слов текста (нижний регистр, ё -> е)"""
+    return [stem(word) for word in _WORD.findall(text.lower().replace('ё', 'е'))]
+
+
+def match_query(text: str) -> Optional[str]:
+    """
+    Запрос FTS5 по основам слов вопроса
+
+    Основы объединяются через OR (ранжирует bm25), длинные ищутся
+    как префикс: "нейросет" находит и "нейросетевой".
+    """
+    terms = dict.fromkeys(stems(text))
+    if not terms:
+        return None
+    return " OR ".join(f'"{term}"*' if len(term) > _MIN_STEM else f'"{term}"' for term in terms)
+
+
+def folder_metadata(folder: Path) -> Dict[str, object]:
+    """
+    Дата, платформа и теги папки
+
+    Дата и платформа берутся из имени папки ({YYYY-MM-DD}_{HH-MM}_{Platform}_...),
+    иначе из frontmatter Knowledge.md (date/created, source); теги - из frontmatter.
+    """
+    meta: Dict[str, object] = {'date': '', 'platform': '', 'tags': []}
+    match = _FOLDER_DATE.match(folder.name)
+    if match:
+        meta['date'], meta['platform'] = match.group(1), match.group(2).lower()
+
+    try:
+        text = (folder / "Knowledge.md").read_text(encoding='utf-8')
+    except (OSError, UnicodeDecodeError):
+        return meta
+    fields, _ = parse_frontmatter(text)
+
+    if not meta['date']:
+        meta['date'] = str(fields.get('date') or fields.get('created') or '')[:10]
+    if not meta['platform']:
+        meta['platform'] = str(fields.get('source') or '').lower()
+    tags = fields.get('tags') or []
+    if isinstance(tags, str):
+        tags = tags.split(',')
+    meta['tags'] = [tag.strip().strip('"\'').lstrip('#').lower() for tag in tags if tag.strip()]
+    return meta
+
+
+@dataclass
+class SearchFilters:
+    """Фильтры поиска; None - без ограничения"""
+    source_type: Optional[str] = None
+    date_from: Optional[str] = None
+    date_to: Optional[str] = None
+    platform: Optional[str] = None
+    tag: Optional[str] = None
+
+    @property
+    def by_folder(self) -> bool:
+        """Нужны метаданные папок (всё, кроме source_type)"""
+        return any((self.date_from, self.date_to, self.platform, self.tag))
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[str]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """
+    Слияние нескольких выдач по рангам
+
+    Returns:
+        (id, score) по убыванию score; у равных - порядок первого появления
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, 1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class LexicalIndex:
+    """
+    FTS5 по фрагментам RAG и таблица метаданных папок
+
+    Фрагменты и их ID те же, что в ChromaDB: RAGEngine пишет в оба
+    индекса из одних и тех же планов индексации.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._initialized = False
+
+    @contextmanager
+    def _session(self) -> Iterator[sqlite3.Connection]:
+        if not self._initialized:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                if not self._initialized:
+                    conn.executescript(
+                        """
+                        CREATE VIRTUAL TABLE IF NOT EXISTS chunks USING fts5 (
+                            id UNINDEXED,
+                            file_path UNINDEXED,
+                            folder UNINDEXED,
+                            folder_name UNINDEXED,
+                            source_type UNINDEXED,
+                            text UNINDEXED,
+                            stems,
+                            tokenize = 'unicode61 remove_diacritics 2'
+                        );
+                        CREATE TABLE IF NOT EXISTS folders (
+                            folder TEXT PRIMARY KEY,
+                            folder_name TEXT NOT NULL,
+                            date TEXT NOT NULL DEFAULT '',
+                            platform TEXT NOT NULL DEFAULT '',
+                            tags TEXT NOT NULL DEFAULT ''
+                        );
+                        -- UNINDEXED столбцы FTS5 ищутся перебором: id -> rowid, файл и папка здесь
+                        CREATE TABLE IF NOT EXISTS chunk_rows (
+                            id TEXT PRIMARY KEY,
+                            chunk_rowid INTEGER NOT NULL,
+                            file_path TEXT NOT NULL,
+                            folder TEXT NOT NULL
+                        );
+                        CREATE INDEX IF NOT EXISTS chunk_rows_file ON chunk_rows (file_path);
+                        CREATE INDEX IF NOT EXISTS chunk_rows_folder ON chunk_rows (folder);
+                        """
+                    )
+                    # Индекс из версии без chunk_rows: заполняем один раз
+                    if conn.execute("SELECT 1 FROM chunk_rows LIMIT 1").fetchone() is None:
+                        conn.execute(
+                            "INSERT OR REPLACE INTO chunk_rows (id, chunk_rowid, file_path, folder) "
+                            "SELECT id, rowid, file_path, folder FROM chunks"
+                        )
+                    self._initialized = True
+                yield conn
+        finally:
+            conn.close()
+
+    def folder_files(self, folder: Path) -> Set[str]:
+        """Файлы папки, фрагменты которых есть в индексе"""
+        with self._session() as conn:
+            rows = conn.execute("SELECT DISTINCT file_path FROM chunk_rows WHERE folder = ?", (str(folder),))
+            return {row[0] for row in rows}
+
+    def update(
+        self,
+        inserted: Sequence[Tuple[str, str, Path, str, str]],
+        deleted_ids: Sequence[str],
+        deleted_files: Sequence[str],
+        folders: Iterable[Path]
+    ) -> None:
+        """
+        Применяет изменения одной транзакцией
+
+        Args:
+            inserted: (id, file_path, folder, source_type, text) новых фрагментов
+            deleted_ids: Устаревшие фрагменты
+            deleted_files: Файлы, все фрагменты которых удаляются
+            folders: Папки, чьи метаданные перечитываются
+        """
+        with self._session() as conn:
+            # Удаление по rowid из chunk_rows, без перебора FTS5
+            rowids: Dict[str, int] = {}
+            for chunk_id in list(deleted_ids) + [row[0] for row in inserted]:
+                # Повтор после прерывания не должен дублировать фрагменты
+                row = conn.execute("SELECT chunk_rowid FROM chunk_rows WHERE id = ?", (chunk_id,)).fetchone()
+                if row:
+                    rowids[chunk_id] = row[0]
+            for path in deleted_files:
+                rowids.update(conn.execute("SELECT id, chunk_rowid FROM chunk_rows WHERE file_path = ?", (path,)))
+            conn.executemany("DELETE FROM chunks WHERE rowid = ?", [(rowid,) for rowid in rowids.values()])
+            conn.executemany("DELETE FROM chunk_rows WHERE id = ?", [(chunk_id,) for chunk_id in rowids])
+
+            for chunk_id, file_path, folder, source_type, text in inserted:
+                cursor = conn.execute(
+                    "INSERT INTO chunks (id, file_path, folder, folder_name, source_type, text, stems) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (chunk_id, file_path, str(folder), Path(folder).name, source_type, text, " ".join(stems(text)))
+                )
+                conn.execute(
+                    "INSERT INTO chunk_rows (id, chunk_rowid, file_path, folder) VALUES (?, ?, ?, ?)",
+                    (chunk_id, cursor.lastrowid, file_path, str(folder))
+                )
+            for folder in folders:
+                meta = folder_metadata(Path(folder))
+                conn.execute(
+                    "INSERT OR REPLACE INTO folders (folder, folder_name, date, platform, tags) VALUES (?, ?, ?, ?, ?)",
+                    (str(folder), Path(folder).name, meta['date'], meta['platform'],
+                     f" {' '.join(meta['tags'])} ")
+                )
+
+    def clear(self) -> None:
+        with self._session() as conn:
+            conn.execute("DELETE FROM chunks")
+            conn.execute("DELETE FROM chunk_rows")
+            conn.execute("DELETE FROM folders")
+
+    @staticmethod
+    def _folder_where(filters: SearchFilters) -> Tuple[str, List[str]]:
+        clauses, params = [], []
+        if filters.date_from:
+            clauses.append("date >= ?")
+            params.append(filters.date_from)
+        if filters.date_to:
+            clauses.append("date <= ?")
+            params.append(filters.date_to)
+        if filters.platform:
+            clauses.append("platform = ?")
+            params.append(filters.platform.lower())
+        if filters.tag:
+            clauses.append("instr(tags, ?) > 0")
+            params.append(f" {filters.tag.lstrip('#').lower()} ")
+        return " AND ".join(clauses) or "1", params
+
+    def folder_names(self, filters: SearchFilters) -> List[str]:
+        """Имена папок, подходящих под фильтры по дате, платформе и тегу"""
+        where, params = self._folder_where(filters)
+        with self._session() as conn:
+            return [row[0] for row in conn.execute(f"SELECT folder_name FROM folders WHERE {where}", params)]
+
+    def search(self, question: str, limit: int, filters: Optional[SearchFilters] = None) -> List[Dict]:
+        """
+        Поиск bm25 по основам слов
+
+        Returns:
+            [{'id', 'text', 'metadata'}] по убыванию релевантности
+        """
+        query = match_query(question)
+        if query is None:
+            return []
+        filters = filters or SearchFilters()
+
+        sql = ("SELECT id, text, folder_name, file_path, source_type FROM chunks "
+               "WHERE chunks MATCH ?")
+        params: List[object] = [query]
+        if filters.source_type:
+            sql += " AND source_type = ?"
+            params.append(filters.source_type)
+        if filters.by_folder:
+            where, folder_params = self._folder_where(filters)
+            sql += f" AND folder IN (SELECT folder FROM folders WHERE {where})"
+            params.extend(folder_params)
+        sql += " ORDER BY rank LIMIT ?"
+        params.append(limit)
+
+        with self._session() as conn:
+            rows = conn.execute(sql, params).fetchall()
+        return [
+            {
+                'id': chunk_id,
+                'text': text,
+                'metadata': {'folder_name': folder_name, 'file_path': file_path, 'source_type': source_type},
+            }
+            for chunk_id, text, folder_name, file_path, source_type in rows
+        ]
@@ -1,8 +1,49 @@
 """
 LocalBrain - Анализ контента через локальную LLM (Ollama)
 """
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Sequence
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+import asyncio
 import json
+import os
+import time
+
+from .prompt_compaction import estimate_tokens, split_into_chunks, truncate_to_tokens
+from .structured_output import (
+    ANALYSIS_SCHEMA,
+    AnalysisPartial,
+    normalize_analysis,
+    parse_json_loose,
+    source_digest,
+)
+
+
+DEFAULT_NUM_CTX = 8192
+RESPONSE_TOKENS = 500   # num_predict ответа
+REPAIR_TOKENS = 2 * RESPONSE_TOKENS  # num_predict починки: обрезанный ответ надо дописать
+PROMPT_MARGIN = 256     # Запас на шаблон чата и погрешность оценки токенов
+
+
+def default_num_parallel() -> int:
+    """Параллельных запросов, которые обслуживает Ollama (OLLAMA_NUM_PARALLEL)"""
+    try:
+        return max(1, int(os.getenv('OLLAMA_NUM_PARALLEL', '4')))
+    except ValueError:
+        return 4
+
+
+@dataclass
+class RequestMetrics:
+    """Метрики одного запроса к Ollama"""
+    label: str
+    queue_wait: float      # Ожидание свободного слота, сек
+    duration: float        # Сам запрос, сек
+    eval_tokens: int       # Сгенерировано токенов
+    tokens_per_sec: float  # Скорость генерации (по eval_duration Ollama)
+    prompt_tokens: int = 0        # Токенов промпта, посчитанных заново (без KV-кэша)
+    prompt_eval_time: float = 0.0  # Время обработки промпта, сек
 
 
 class LocalBrain:
@@ -14,7 +55,7 @@ Input Data:
 1. Post Text & Author
 2. Video Transcript (with timestamps)
 3. User Comments
-4. KNOWN TAGS LIST: [{known_tags}]
+4. KNOWN TAGS LIST (at the end of these instructions)
 
 Tasks:
 1. Analyze: Understand the core meaning of the content.
@@ -38,21 +79,50 @@ Output: strictly JSON.
   "tags": ["tag1", "tag2"],
   "valuable_comments": ["user: text", "user: text"]
 }
+
+KNOWN TAGS LIST: [{known_tags}]
 """
     
-    def __init__(self, model: str = "llama3.2", base_url: str = "http://localhost:11434") -> None:
+    # Map-шаг для транскрипций длиннее бюджета контекста
+    CONDENSE_PROMPT = """You condense one part of a long video transcript for a later analysis.
+Write 5-10 short bullet points in Russian with the key facts, tools, numbers and advice.
+Keep the [MM:SS] timestamp of each point. Output only the bullet points."""
+    
+    # Починка ответа, который не удалось разобрать (без повторного анализа контента)
+    REPAIR_PROMPT = """The text below was meant to be a JSON object with the keys
+"summary" (string), "category" (string), "tags" (array of strings) and
+"valuable_comments" (array of strings), but it is malformed or cut off.
+Return the same content as valid JSON. Do not add new information."""
+    
+    def __init__(
+        self,
+        model: str = "llama3.2",
+        base_url: str = "http://localhost:11434",
+        max_parallel: Optional[int] = None,
+        keep_alive: str = "30m"
+    ) -> None:
         """
         Инициализация LLM клиента
         
         Args:
             model: Название модели Ollama
             base_url: URL Ollama сервера
+            max_parallel: Одновременных запросов в analyze_async
+                          (по умолчанию OLLAMA_NUM_PARALLEL)
+            keep_alive: Сколько Ollama держит модель в памяти между запросами
         """
         self.model = model
         self.base_url = base_url
         self.client = None
+        self.async_client = None
+        self.max_parallel = max_parallel or default_num_parallel()
+        self.keep_alive = keep_alive
+        self.metrics: List[RequestMetrics] = []
+        # Как разобран ответ: valid / tolerant / repaired / failed
+        self.parse_stats: Counter = Counter()
         self.num_threads = None
         self.num_ctx = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
     
     def initialize(self) -> None:
         """Инициализация клиента Ollama"""
@@ -75,6 +145,27 @@ Output: strictly JSON.
         except Exception as e:
             raise ConnectionError(f"Не удалось подключиться к Ollama: {e}")
     
+    def initialize_async(self) -> None:
+        """
+        Асинхронный клиент Ollama
+        
+        Один клиент на все запросы: httpx держит keep-alive соединения,
+        а семафор ограничивает параллелизм числом слотов Ollama.
+        """
+        try:
+            import ollama
+        except ImportError:
+            raise ImportError(
+                "Библиотека ollama не установлена. "
+                "Установите: pip install ollama"
+            )
+        self.async_client = ollama.AsyncClient(host=self.base_url)
+    
+    def reset_async(self) -> None:
+        """Сбрасывает асинхронный клиент (он привязан к завершённому event loop)"""
+        self.async_client = None
+        self._semaphore = None
+    
     def warm_up(self) -> bool:
         """
         Прогрев модели (загрузка в память)
@@ -110,17 +201,25 @@ Output: strictly JSON.
         transcript: str,
         comments: List[str],
         author: str,
-        known_tags: str
+        known_tags: str,
+        recent_tags: Sequence[str] = (),
+        partial_path: Optional[Path] = None
     ) -> Optional[Dict]:
         """
         Анализ контента через LLM
         
+        Системный промпт (инструкции + блок тегов) одинаков для всех
+        запросов, поэтому Ollama берёт его из KV-кэша; меняется только
+        сообщение пользователя с контентом.
+        
         Args:
             caption: Текст поста
             transcript: Транскрипт с таймкодами
             comments: Список комментариев
             author: Автор поста
-            known_tags: Строка с известными тегами
+            known_tags: Строка с известными тегами (стабильный блок)
+            recent_tags: Теги, добавленные после обновления блока
+            partial_path: Файл промежуточных результатов (повтор продолжает с них)
             
         Returns:
             Словарь с результатами анализа
@@ -128,9 +227,26 @@ Output: strictly JSON.
         if self.client is None:
             self.initialize()
         
+        partial = self._open_partial(partial_path, caption, transcript, comments)
+        if partial is not None:
+            if partial.get('result'):
+                print("   ♻️  Анализ уже выполнен ранее")
+                return partial.get('result')
+            if partial.get('raw_response'):
+                result = self._parse_analysis(partial.get('raw_response')) or self._repair(partial.get('raw_response'))
+                if result is not None:
+                    partial.save(result=result)
+                    return result
+        
         # Формирование промпта
-        user_prompt = self._build_prompt(caption, transcript, comments, author)
-        system_prompt = self.SYSTEM_PROMPT.replace("{known_tags}", known_tags)
+        system_prompt = self._system_prompt(known_tags)
+        caption, comments, transcript_budget = self._fit_inputs(system_prompt, caption, comments, recent_tags)
+        if estimate_tokens(transcript) > transcript_budget:
+            condensed = partial.get('condensed_transcript') if partial is not None else None
+            transcript = condensed or self.condense_transcript(transcript, transcript_budget)
+            if partial is not None:
+                partial.save(condensed_transcript=transcript)
+        user_prompt = self._build_prompt(caption, transcript, comments, author, recent_tags)
         
         print("🧠 Анализ контента через LLM...")
         print("   ⏳ Отправка запроса к модели...")
@@ -149,50 +265,355 @@ Output: strictly JSON.
             ) as progress:
                 task = progress.add_task("   Анализ через AI... (может занять несколько минут)", total=None)
                 
-                response = self.client.chat(
-                    model=self.model,
-                    messages=[
-                        {'role': 'system', 'content': system_prompt},
-                        {'role': 'user', 'content': user_prompt}
-                    ],
-                    format='json',  # Требуем JSON ответ
-                    options={
-                        'temperature': 0.7,
-                        'num_predict': 500,  # Уменьшено для ускорения
-                        'num_thread': self.num_threads if self.num_threads else 8,
-                        'num_ctx': self.num_ctx if self.num_ctx else 8192
-                    }
-                )
+                started_at = time.monotonic()
+                response = self.client.chat(**self._chat_request(system_prompt, user_prompt))
                 
                 progress.update(task, completed=True)
             
-            print("   ✅ Анализ завершён")
-            
-            # Парсинг JSON ответа
-            result_text = response['message']['content']
-            result = json.loads(result_text)
+            metrics = self._record_metrics("", 0.0, time.monotonic() - started_at, response)
+            print(f"   ✅ Анализ завершён (промпт: {metrics.prompt_tokens} ток. за {metrics.prompt_eval_time:.1f} с)")
             
+            raw = response['message']['content']
+            result = self._parse_analysis(raw)
+            if result is None:
+                if partial is not None:
+                    partial.save(raw_response=raw)
+                result = self._repair(raw, metrics.eval_tokens)
+            if result is not None and partial is not None:
+                partial.save(result=result)
             return result
             
         except TimeoutError as e:
             print(f"⏱️  Timeout: {e}")
             return None
-        except json.JSONDecodeError as e:
-            print(f"❌ Ошибка парсинга JSON: {e}")
-            print(f"Ответ LLM: {result_text[:200]}...")
-            return None
         except Exception as e:
             print(f"❌ Ошибка LLM: {e}")
             return None
     
+    async def analyze_async(
+        self,
+        caption: str,
+        transcript: str,
+        comments: List[str],
+        author: str,
+        known_tags: str,
+        recent_tags: Sequence[str] = (),
+        label: str = "",
+        partial_path: Optional[Path] = None
+    ) -> Optional[Dict]:
+        """
+        Асинхронный анализ: не больше max_parallel запросов одновременно
+        
+        Пока одна папка ждёт ответа, Ollama уже считает следующую.
+        Метрики запроса (ожидание слота, токены/сек) копятся в self.metrics.
+        
+        Args:
+            caption, transcript, comments, author, known_tags, recent_tags: Как в analyze()
+            label: Подпись запроса в логах (имя папки)
+            partial_path: Как в analyze()
+            
+        Returns:
+            Словарь с результатами анализа
+        """
+        if self.async_client is None:
+            self.initialize_async()
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_parallel)
+        
+        partial = self._open_partial(partial_path, caption, transcript, comments)
+        if partial is not None:
+            if partial.get('result'):
+                return partial.get('result')
+            if partial.get('raw_response'):
+                result = self._parse_analysis(partial.get('raw_response'))
+                if result is None:
+                    result = await self._repair_async(partial.get('raw_response'))
+                if result is not None:
+                    partial.save(result=result)
+                    return result
+        
+        system_prompt = self._system_prompt(known_tags)
+        caption, comments, transcript_budget = self._fit_inputs(system_prompt, caption, comments, recent_tags)
+        if estimate_tokens(transcript) > transcript_budget:
+            condensed = partial.get('condensed_transcript') if partial is not None else None
+            transcript = condensed or await self.condense_transcript_async(transcript, transcript_budget, label)
+            if partial is not None:
+                partial.save(condensed_transcript=transcript)
+        user_prompt = self._build_prompt(caption, transcript, comments, author, recent_tags)
+        
+        queued_at = time.monotonic()
+        async with self._semaphore:
+            started_at = time.monotonic()
+            try:
+                response = await self.async_client.chat(**self._chat_request(system_prompt, user_prompt))
+            except Exception as e:
+                print(f"❌ Ошибка LLM ({label}): {e}")
+                return None
+            finished_at = time.monotonic()
+        
+        metrics = self._record_metrics(label, started_at - queued_at, finished_at - started_at, response)
+        print(f"   ✅ {label}: {metrics.eval_tokens} ток., {metrics.tokens_per_sec:.1f} ток/с, "
+              f"промпт {metrics.prompt_tokens} ток. за {metrics.prompt_eval_time:.1f} с, "
+              f"ожидание {metrics.queue_wait:.1f} с, запрос {metrics.duration:.1f} с")
+        
+        raw = response['message']['content']
+        result = self._parse_analysis(raw)
+        if result is None:
+            if partial is not None:
+                partial.save(raw_response=raw)
+            result = await self._repair_async(raw, metrics.eval_tokens)
+        if result is not None and partial is not None:
+            partial.save(result=result)
+        return result
+    
+    @property
+    def context_size(self) -> int:
+        return self.num_ctx if self.num_ctx else DEFAULT_NUM_CTX
+    
+    def _fit_inputs(
+        self,
+        system_prompt: str,
+        caption: str,
+        comments: List[str],
+        recent_tags: Sequence[str] = ()
+    ):
+        """
+        Делит бюджет контекста между частями запроса
+        
+        Описание и комментарии получают не больше четверти бюджета каждое,
+        остальное - транскрипции.
+        
+        Returns:
+            (описание, комментарии, бюджет транскрипции в токенах)
+        """
+        budget = (self.context_size - estimate_tokens(system_prompt) - RESPONSE_TOKENS
+                  - PROMPT_MARGIN - estimate_tokens(", ".join(recent_tags)))
+        
+        caption = truncate_to_tokens(caption, budget // 4)
+        
+        kept, comments_tokens = [], 0
+        for comment in comments[:50]:  # Лимит 50
+            tokens = estimate_tokens(comment) + 2
+            if comments_tokens + tokens > budget // 4:
+                break
+            kept.append(comment)
+            comments_tokens += tokens
+        
+        return caption, kept, max(0, budget - estimate_tokens(caption) - comments_tokens)
+    
+    def _condense_chunks(self, transcript: str) -> List[str]:
+        """Части транскрипции для map-шага (каждая помещается в контекст)"""
+        chunk_budget = (self.context_size - estimate_tokens(self.CONDENSE_PROMPT)
+                        - RESPONSE_TOKENS - PROMPT_MARGIN)
+        return split_into_chunks(transcript, max(chunk_budget, RESPONSE_TOKENS))
+    
+    def _reduce_notes(self, transcript: str, notes: List[str], budget: int) -> Optional[str]:
+        """
+        Склеивает заметки по частям
+        
+        Returns:
+            Готовый текст или None, если нужен ещё один раунд сжатия
+        """
+        condensed = "\n".join(note for note in notes if note)
+        if estimate_tokens(condensed) <= budget:
+            return condensed
+        if estimate_tokens(condensed) >= estimate_tokens(transcript):
+            # Сжатие не помогает - обрезаем, чтобы не зациклиться
+            return truncate_to_tokens(condensed, budget)
+        return None
+    
+    def condense_transcript(self, transcript: str, budget: int) -> str:
+        """
+        Map-reduce сжатие транскрипции под бюджет токенов
+        
+        Транскрипция делится на части, каждая пересказывается отдельным
+        запросом; если заметки всё ещё не помещаются - раунд повторяется.
+        
+        Args:
+            transcript: Текст с таймкодами
+            budget: Бюджет транскрипции в токенах
+            
+        Returns:
+            Сжатый текст (заметки по частям с таймкодами)
+        """
+        print(f"   📚 Транскрипция ~{estimate_tokens(transcript)} ток. > бюджета {budget}, сжатие по частям...")
+        while True:
+            chunks = self._condense_chunks(transcript)
+            notes = [self._condense_chunk(chunk, i, len(chunks)) for i, chunk in enumerate(chunks, 1)]
+            condensed = self._reduce_notes(transcript, notes, budget)
+            if condensed is not None:
+                return condensed
+            transcript = "\n".join(notes)
+    
+    async def condense_transcript_async(self, transcript: str, budget: int, label: str = "") -> str:
+        """condense_transcript с параллельными map-запросами (под общим семафором)"""
+        print(f"   📚 {label}: транскрипция ~{estimate_tokens(transcript)} ток. > бюджета {budget}, сжатие по частям...")
+        while True:
+            chunks = self._condense_chunks(transcript)
+            notes = await asyncio.gather(*(self._condense_chunk_async(chunk) for chunk in chunks))
+            condensed = self._reduce_notes(transcript, list(notes), budget)
+            if condensed is not None:
+                return condensed
+            transcript = "\n".join(notes)
+    
+    def _condense_chunk(self, chunk: str, index: int, total: int) -> str:
+        print(f"      🧩 Часть {index}/{total}")
+        try:
+            response = self.client.chat(**self._chat_request(self.CONDENSE_PROMPT, chunk, json_format=False))
+            return response['message']['content'].strip()
+        except Exception as e:
+            print(f"      ⚠️  Часть {index} не сжата ({e}), берём начало")
+            return truncate_to_tokens(chunk, RESPONSE_TOKENS)
+    
+    async def _condense_chunk_async(self, chunk: str) -> str:
+        async with self._semaphore:
+            try:
+                response = await self.async_client.chat(
+                    **self._chat_request(self.CONDENSE_PROMPT, chunk, json_format=False)
+                )
+                return response['message']['content'].strip()
+            except Exception as e:
+                print(f"      ⚠️  Часть не сжата ({e}), берём начало")
+                return truncate_to_tokens(chunk, RESPONSE_TOKENS)
+    
+    def _system_prompt(self, known_tags: str) -> str:
+        """
+        Системный промпт: инструкции, затем блок тегов
+        
+        Блок тегов стоит в конце, чтобы при его обновлении из кэша
+        переиспользовались хотя бы инструкции.
+        """
+        return self.SYSTEM_PROMPT.replace("{known_tags}", known_tags)
+    
+    def _chat_request(self, system_prompt: str, user_prompt: str, json_format: bool = True) -> Dict:
+        """Параметры запроса chat к Ollama"""
+        request = dict(
+            model=self.model,
+            messages=[
+                {'role': 'system', 'content': system_prompt},
+                {'role': 'user', 'content': user_prompt}
+            ],
+            options={
+                'temperature': 0.7,
+                'num_predict': RESPONSE_TOKENS,  # Уменьшено для ускорения
+                'num_thread': self.num_threads if self.num_threads else 8,
+                'num_ctx': self.context_size
+            },
+            keep_alive=self.keep_alive
+        )
+        if json_format:
+            request['format'] = ANALYSIS_SCHEMA  # Генерация ограничена схемой ответа
+        return request
+    
+    @staticmethod
+    def _open_partial(
+        partial_path: Optional[Path],
+        caption: str,
+        transcript: str,
+        comments: List[str]
+    ) -> Optional[AnalysisPartial]:
+        if partial_path is None:
+            return None
+        return AnalysisPartial(partial_path, source_digest(caption, transcript, *comments))
+    
+    def _parse_analysis(self, text: str) -> Optional[Dict]:
+        """
+        Разбор ответа модели: строгий JSON, затем терпимый разбор
+        
+        Returns:
+            Словарь по схеме ANALYSIS_SCHEMA или None - нужна починка
+        """
+        try:
+            data = json.loads(text)
+            kind = 'valid'
+        except json.JSONDecodeError:
+            data = parse_json_loose(text)
+            kind = 'tolerant'
+        
+        result = normalize_analysis(data) if isinstance(data, dict) else None
+        if result is not None:
+            self.parse_stats[kind] += 1
+        return result
+    
+    def _repair_request(self, text: str, eval_tokens: int = 0) -> Dict:
+        """
+        Запрос починки JSON
+        
+        Чаще всего ответ битый, потому что упёрся в num_predict, и починка
+        должна уместить его целиком плюс закрытие. Поэтому лимит не меньше
+        REPAIR_TOKENS и вдвое больше, чем модель уже выдала (eval_count).
+        """
+        request = self._chat_request(self.REPAIR_PROMPT, text)
+        request['options']['temperature'] = 0
+        request['options']['num_predict'] = max(REPAIR_TOKENS, 2 * eval_tokens)
+        return request
+    
+    def _repaired(self, response) -> Optional[Dict]:
+        data = parse_json_loose(response['message']['content'])
+        result = normalize_analysis(data) if data else None
+        self.parse_stats['repaired' if result is not None else 'failed'] += 1
+        if result is None:
+            print("❌ Ответ LLM не удалось разобрать даже после починки")
+        return result
+    
+    def _repair(self, text: str, eval_tokens: int = 0) -> Optional[Dict]:
+        """
+        Починка битого ответа отдельным коротким запросом
+        
+        В запрос идёт только сам ответ (без контента и тегов), поэтому
+        он в разы дешевле повторного анализа.
+        """
+        print(f"   🔧 Ответ LLM не разобран, починка JSON: {text[:80]!r}...")
+        try:
+            return self._repaired(self.client.chat(**self._repair_request(text, eval_tokens)))
+        except Exception as e:
+            print(f"❌ Ошибка починки JSON: {e}")
+            self.parse_stats['failed'] += 1
+            return None
+    
+    async def _repair_async(self, text: str, eval_tokens: int = 0) -> Optional[Dict]:
+        async with self._semaphore:
+            try:
+                response = await self.async_client.chat(**self._repair_request(text, eval_tokens))
+            except Exception as e:
+                print(f"❌ Ошибка починки JSON: {e}")
+                self.parse_stats['failed'] += 1
+                return None
+        return self._repaired(response)
+    
+    @property
+    def repair_rate(self) -> float:
+        """Доля ответов, которым понадобилась починка (терпимый разбор или запрос)"""
+        total = sum(self.parse_stats.values())
+        if not total:
+            return 0.0
+        return (total - self.parse_stats['valid']) / total
+    
+    def _record_metrics(self, label: str, queue_wait: float, duration: float, response) -> RequestMetrics:
+        eval_tokens = response.get('eval_count') or 0
+        eval_seconds = (response.get('eval_duration') or 0) / 1e9
+        metrics = RequestMetrics(
+            label=label,
+            queue_wait=queue_wait,
+            duration=duration,
+            eval_tokens=eval_tokens,
+            tokens_per_sec=eval_tokens / eval_seconds if eval_seconds > 0 else 0.0,
+            # При попадании в KV-кэш Ollama считает только новую часть промпта
+            prompt_tokens=response.get('prompt_eval_count') or 0,
+            prompt_eval_time=(response.get('prompt_eval_duration') or 0) / 1e9
+        )
+        self.metrics.append(metrics)
+        return metrics
+    
     def _build_prompt(
         self,
         caption: str,
         transcript: str,
         comments: List[str],
-        author: str
+        author: str,
+        recent_tags: Sequence[str] = ()
     ) -> str:
-        """Сборка промпта для LLM"""
+        """Сборка промпта для LLM (меняющаяся часть запроса)"""
         
         parts = [
             f"**Author:** {author}\n",
@@ -201,7 +622,11 @@ Output: strictly JSON.
         ]
         
         if comments:
-            comments_text = "\n".join(f"- {c}" for c in comments[:50])  # Лимит 50
+            comments_text = "\n".join(f"- {c}" for c in comments[:50])  # Лимит 50 (см. _fit_inputs)
             parts.append(f"**Comments:**\n{comments_text}\n")
         
+        if recent_tags:
+            # Новые теги не попадают в системный промпт до обновления блока
+            parts.append(f"**Also known tags:** {', '.join(recent_tags)}\n")
+        
         return "\n".join(filter(None, parts))
@@ -2,8 +2,37 @@
 LocalEars - Транскрибация видео через faster-whisper
 """
 from pathlib import Path
-from typing import Dict, Optional
-from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from dataclasses import dataclass, field, replace
+from concurrent.futures import ThreadPoolExecutor
+
+from .audio_prep import SAMPLE_RATE, as_float32, media_hash, plan_chunks, prepare_audio
+from .decoding_profiles import DEFAULT_PROFILE, DecodingProfile, choose_profile, get_profile, needs_upgrade
+from .whisper_pool import ModelKey, WhisperModelPool, model_pool
+
+
+# Язык, если определение не уверено (основной контент - русский)
+DEFAULT_LANGUAGE = "ru"
+# Сколько секунд аудио слушать для определения языка
+DETECT_SECONDS = 30
+# Ниже этой вероятности определённому языку не доверяем
+MIN_LANGUAGE_PROBABILITY = 0.5
+
+# Начальный промпт для контекста по языку (помогает со сленгом и терминами)
+INITIAL_PROMPTS = {
+    'ru': "Транскрипция видео на русском языке из Instagram. "
+          "Включает разговорную речь, сленг, упоминания технологий и социальных сетей.",
+    'en': "Transcript of a video from Instagram or YouTube. "
+          "Includes casual speech, slang, and mentions of technology and social media.",
+}
+
+
+@dataclass
+class TimedSegment:
+    """Сегмент транскрипции с абсолютными таймкодами"""
+    start: float
+    end: float
+    text: str
 
 
 @dataclass
@@ -13,6 +42,9 @@ class TranscriptResult:
     full_text: str         # Чистый текст
     language: str = "ru"
     duration: float = 0.0
+    model: Optional[str] = None    # Модель Whisper, если отличается от заданной (маршрутизация по языку)
+    profile: str = DEFAULT_PROFILE  # Профиль декодирования (fast/balanced/accurate)
+    segments: List[TimedSegment] = field(default_factory=list)
 
 
 class LocalEars:
@@ -23,7 +55,15 @@ class LocalEars:
         model_size: str = "small",  # Изменено с "base" на "small" для лучшей точности
         device: str = "cpu", 
         num_threads: int = 16,  # Оптимизировано: используем гиперпоточность для максимальной скорости
-        compute_type: str = "int8"  # int8 для CPU (float16 не поддерживается эффективно)
+        compute_type: str = "int8",  # int8 для CPU (float16 не поддерживается эффективно)
+        pool: Optional[WhisperModelPool] = None,
+        preprocess: bool = True,
+        chunk_workers: int = 1,
+        chunk_seconds: float = 120.0,
+        cache=None,
+        language: Optional[str] = None,
+        language_models: Optional[Dict[str, str]] = None,
+        detect_model: str = "tiny"
     ):
         """
         Инициализация Whisper модели
@@ -40,41 +80,125 @@ class LocalEars:
                          int8 - оптимально для CPU: быстро + хорошая точность
                          float16 - только для GPU
                          float32 - самое медленное, максимальная точность
+            pool: Пул моделей (по умолчанию общий для процесса)
+            preprocess: Извлекать аудио в кэш 16 kHz PCM перед Whisper (нужен ffmpeg)
+            chunk_workers: Сколько кусков аудио транскрибировать параллельно
+                          (num_threads делятся между ними)
+            chunk_seconds: Желаемая длина куска при нарезке по тишине
+            cache: TranscriptCache - готовые транскрипции по хэшу медиа
+                   (дубликаты не декодируются)
+            language: Язык речи (None - определить по первым DETECT_SECONDS секундам)
+            language_models: Модель для языка, например {"en": "distil-small.en"}
+            detect_model: Модель для определения языка (tiny - доли секунды)
         """
         self.model_size = model_size
         self.device = device
         self.num_threads = num_threads
         self.compute_type = compute_type
+        self.pool = pool or model_pool
+        self.preprocess = preprocess
+        self.chunk_workers = max(1, chunk_workers)
+        self.chunk_seconds = chunk_seconds
+        self.cache = cache
+        self.language = language
+        self.language_models = language_models or {}
+        self.detect_model = detect_model
         self.model = None
+        self._pool_key: Optional[ModelKey] = None
     
-    def load_model(self) -> None:
-        """Ленивая загрузка модели"""
-        if self.model is None:
-            try:
-                from faster_whisper import WhisperModel
-                
-                print(f"🔄 Загрузка Whisper модели ({self.model_size}, {self.compute_type})...")
-                print(f"   ⏳ Это может занять некоторое время при первом запуске...")
-                self.model = WhisperModel(
-                    self.model_size,
-                    device=self.device,
-                    compute_type=self.compute_type,
-                    cpu_threads=self.num_threads
-                )
-                print("   ✅ Модель Whisper готова")
-                
-            except ImportError:
-                raise ImportError(
-                    "Библиотека faster-whisper не установлена. "
-                    "Установите: pip install faster-whisper"
-                )
+    @property
+    def model_key(self) -> ModelKey:
+        """Ключ модели в общем пуле"""
+        return self._key_for(self.model_size)
+    
+    def _key_for(self, model_size: str) -> ModelKey:
+        return ModelKey(
+            model_size=model_size,
+            compute_type=self.compute_type,
+            device=self.device,
+            cpu_threads=max(1, self.num_threads // self.chunk_workers),
+            num_workers=self.chunk_workers
+        )
+    
+    def _model_for(self, language: Optional[str]) -> str:
+        """Модель для языка (language_models), иначе model_size"""
+        return self.language_models.get(language, self.model_size)
+    
+    def load_model(self, model_size: Optional[str] = None) -> None:
+        """
+        Ленивая загрузка модели из общего пула процесса
+        
+        Args:
+            model_size: Другая модель (маршрутизация по языку); прежняя возвращается в пул
+        """
+        key = self._key_for(model_size or self.model_size)
+        if self.model is not None and self._pool_key == key:
+            return
+        self.release()
+        self.model = self.pool.acquire(key)
+        self._pool_key = key
     
-    def transcribe(self, media_path: Path) -> Optional[TranscriptResult]:
+    def detect_language(self, audio) -> Tuple[str, float]:
+        """
+        Определение языка по первым DETECT_SECONDS секундам
+        
+        Args:
+            audio: numpy-массив 16 kHz (int16 из PCM кэша или float32)
+            
+        Returns:
+            (язык, вероятность); при неуверенности - DEFAULT_LANGUAGE
+        """
+        key = replace(self._key_for(self.detect_model), num_workers=1)
+        model = self.pool.acquire(key)
+        try:
+            # Язык определяется уже при вызове transcribe(), сегменты не декодируем
+            _, info = model.transcribe(
+                as_float32(audio[:DETECT_SECONDS * SAMPLE_RATE]),
+                language=None,
+                beam_size=1,
+                vad_filter=True,
+                without_timestamps=True
+            )
+        finally:
+            self.pool.release(key)
+        
+        if info.language_probability < MIN_LANGUAGE_PROBABILITY:
+            return DEFAULT_LANGUAGE, info.language_probability
+        return info.language, info.language_probability
+    
+    def release(self) -> None:
+        """
+        Возвращает модель в пул
+        
+        Модель остаётся в памяти до истечения idle TTL пула,
+        поэтому следующий LocalEars с теми же параметрами получит её сразу.
+        """
+        if self._pool_key is not None:
+            self.pool.release(self._pool_key)
+            self._pool_key = None
+        self.model = None
+    
+    def transcribe(
+        self,
+        media_path: Path,
+        checkpoint=None,
+        progress_callback: Optional[Callable[[float, float], None]] = None,
+        profile: Optional[str] = None,
+        queue_depth: int = 0
+    ) -> Optional[TranscriptResult]:
         """
         Транскрибация медиафайла
         
         Args:
             media_path: Путь к видео/аудио файлу
+            checkpoint: TranscriptCheckpoint - сегменты пишутся в него по мере
+                        появления, при повторном запуске работа продолжается
+                        с последнего сохранённого сегмента
+            progress_callback: Вызывается как (обработано_сек, всего_сек)
+                               после каждого сегмента (из рабочего потока)
+            profile: Профиль декодирования (по умолчанию выбирается по
+                     длительности медиа и queue_depth)
+            queue_depth: Сколько задач транскрибации в очереди
             
         Returns:
             TranscriptResult или None если не видео
@@ -88,17 +212,176 @@ class LocalEars:
             print("ℹ️  Это изображение, транскрибация не требуется")
             return None
         
-        self.load_model()
+        done = checkpoint.load() if checkpoint is not None else []
+        if checkpoint is not None and checkpoint.completed:
+            print(f"   ♻️  Транскрипция уже завершена в чекпоинте ({len(done)} сегментов)")
+            return self._build_result(
+                done,
+                checkpoint.completed['language'],
+                checkpoint.completed['duration'],
+                checkpoint.completed.get('profile', DEFAULT_PROFILE)
+            )
+        
+        # Тот же файл уже транскрибирован (репост, повторная ссылка) - берём из кэша
+        content_hash = media_hash(media_path) if self.cache is not None else None
+        if content_hash is not None:
+            # Ключ - модель после маршрутизации по языку; без явного языка
+            # он берётся из записи кэша, определение языка не нужно
+            routed = self._model_for(self.language) if self.language else self._model_for
+            cached = self.cache.get(content_hash, routed, min_profile=profile)
+            if cached is not None:
+                print(f"   ♻️  Транскрипция из кэша по хэшу медиа (профиль {cached.profile})")
+                return cached
         
         print("🎤 Транскрибация аудиодорожки...")
+        
+        # Аудио извлекается один раз и кэшируется рядом с медиа
+        prepared = prepare_audio(media_path, content_hash) if self.preprocess else None
+        if prepared is not None:
+            print(f"   🎧 Аудио: {prepared.duration:.1f} сек (кэш {prepared.path.name})")
+        audio = prepared.audio if prepared is not None else None
+        
+        # Язык: задан явно, определён быстрой моделью или (без аудио) самим Whisper
+        language = self.language
+        if language is None and audio is not None and len(audio) > 0:
+            language, probability = self.detect_language(audio)
+            print(f"   🌐 Язык: {language} ({probability:.0%})")
+        
+        model_size = self._model_for(language)
+        if model_size != self.model_size:
+            print(f"   🔀 Модель для языка {language}: {model_size}")
+        self.load_model(model_size)
+        
+        resume_at = checkpoint.resume_from if checkpoint is not None else 0.0
+        if resume_at > 0 and audio is None:
+            audio = self._decode_audio(media_path)
+            if audio is None:
+                checkpoint.discard()
+                done, resume_at = [], 0.0
+        if resume_at > 0:
+            print(f"   ⏩ Продолжение с [{self._format_timestamp(resume_at)}] "
+                  f"({len(done)} сегментов из чекпоинта)")
+        
+        total = len(audio) / SAMPLE_RATE if audio is not None else 0.0
+        
+        # Продолжение чекпоинта - тем же профилем, что и начало
+        if resume_at > 0 and checkpoint.profile:
+            decoding = get_profile(checkpoint.profile)
+        else:
+            decoding = choose_profile(total, queue_depth, profile)
+        if checkpoint is not None:
+            checkpoint.profile = decoding.name
+        print(f"   🎚️  Профиль: {decoding.name} (beam_size={decoding.beam_size})")
+        
         print("   ⏳ Обработка...")
         
-        # Запуск транскрибации с улучшенными параметрами
-        segments, info = self.model.transcribe(
-            str(media_path),
-            language="ru",  # Можно изменить на None для auto-detect
-            beam_size=10,   # Увеличено с 5 до 10 для лучшей точности
-            best_of=5,      # Выбор лучшего из 5 вариантов
+        source = audio[int(resume_at * SAMPLE_RATE):] if audio is not None else str(media_path)
+        
+        meta: Dict = {}
+        segments = list(done)
+        segment_count = 0
+        
+        try:
+            for segment in self._iter_segments(source, resume_at, meta, decoding, language):
+                segments.append(segment)
+                if checkpoint is not None:
+                    checkpoint.append(segment)
+                
+                segment_count += 1
+                if segment_count % 10 == 0:
+                    print(f"   📝 Обработано сегментов: {segment_count}")
+                
+                if progress_callback is not None:
+                    progress_callback(segment.end, total or meta.get('duration', 0.0))
+            
+            print(f"   ✅ Транскрибация завершена ({segment_count} сегментов)")
+            
+            language = meta.get('language', language or DEFAULT_LANGUAGE)
+            duration = total or meta.get('duration', 0.0)
+            if checkpoint is not None:
+                checkpoint.mark_done(language, duration)
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
+        
+        # PCM нужен, пока транскрипцию можно улучшить (--upgrade перечитает его
+        # вместо ffmpeg); после окончательного профиля он больше не понадобится
+        if prepared is not None and not needs_upgrade(decoding.name):
+            prepared.discard()
+        
+        result = self._build_result(segments, language, duration, decoding.name)
+        if model_size != self.model_size:
+            result.model = model_size
+        if content_hash is not None:
+            self.cache.put(content_hash, model_size, result)
+        return result
+    
+    def _build_result(
+        self,
+        segments: List[TimedSegment],
+        language: str,
+        duration: float,
+        profile: str = DEFAULT_PROFILE
+    ) -> TranscriptResult:
+        """Сборка TranscriptResult из сегментов"""
+        return build_transcript_result(segments, language, duration, profile)
+    
+    def _decode_audio(self, media_path: Path):
+        """Декодирование медиа в numpy (для продолжения без ffmpeg-кэша)"""
+        try:
+            from faster_whisper import decode_audio
+            return decode_audio(str(media_path), sampling_rate=SAMPLE_RATE)
+        except Exception as e:
+            print(f"   ⚠️  Не удалось декодировать аудио для продолжения, начинаем заново: {e}")
+            return None
+    
+    def _iter_segments(
+        self,
+        source,
+        offset: float,
+        meta: Dict,
+        decoding: Optional[DecodingProfile] = None,
+        language: Optional[str] = DEFAULT_LANGUAGE
+    ) -> Iterator[TimedSegment]:
+        """
+        Сегменты транскрипции по мере декодирования
+        
+        Args:
+            source: numpy-массив 16 kHz или путь к файлу
+            offset: Смещение source относительно начала медиа (сек)
+            meta: Сюда записываются language и duration из info Whisper
+            decoding: Профиль декодирования (по умолчанию accurate)
+            language: Язык речи (None - Whisper определит сам)
+        """
+        decoding = decoding or get_profile(DEFAULT_PROFILE)
+        chunks = []
+        if not isinstance(source, str) and self.chunk_workers > 1:
+            chunks = plan_chunks(source, self.chunk_seconds)
+        
+        if len(chunks) > 1:
+            yield from self._iter_chunk_segments(source, chunks, offset, meta, decoding, language)
+            return
+        
+        if not isinstance(source, str):
+            source = as_float32(source)
+        segments, info = self.model.transcribe(source, **self._decode_options(decoding, language))
+        meta['language'] = info.language
+        meta['duration'] = info.duration + offset
+        
+        for segment in segments:
+            yield TimedSegment(segment.start + offset, segment.end + offset, segment.text)
+    
+    def _decode_options(
+        self,
+        decoding: Optional[DecodingProfile] = None,
+        language: Optional[str] = DEFAULT_LANGUAGE
+    ) -> Dict:
+        """Параметры декодирования Whisper для профиля и языка"""
+        decoding = decoding or get_profile(DEFAULT_PROFILE)
+        return dict(
+            language=language,  # None - Whisper определяет язык сам
+            beam_size=decoding.beam_size,  # accurate: 10, fast: 1 (жадно)
+            best_of=decoding.best_of,
             temperature=0.0,  # Детерминированный вывод
             vad_filter=True,  # Фильтрация тишины
             vad_parameters=dict(
@@ -108,37 +391,54 @@ class LocalEars:
                 min_silence_duration_ms=2000,
                 speech_pad_ms=400
             ),
-            # Начальный промпт для контекста (помогает с русским языком)
-            initial_prompt="Транскрипция видео на русском языке из Instagram. "
-                          "Включает разговорную речь, сленг, упоминания технологий и социальных сетей."
+            # Начальный промпт для контекста (помогает со сленгом и терминами)
+            initial_prompt=INITIAL_PROMPTS.get(language)
         )
+    
+    def _iter_chunk_segments(
+        self,
+        audio,
+        chunks: List[Tuple[int, int]],
+        offset: float,
+        meta: Dict,
+        decoding: Optional[DecodingProfile] = None,
+        language: Optional[str] = DEFAULT_LANGUAGE
+    ) -> Iterator[TimedSegment]:
+        """
+        Параллельная транскрибация кусков аудио
         
-        # Формирование результатов
-        timed_lines = []
-        full_lines = []
-        segment_count = 0
+        Модель загружена с num_workers = chunk_workers, поэтому вызовы
+        transcribe() из разных потоков действительно идут параллельно.
+        Таймкоды сдвигаются на начало куска; куски отдаются строго по
+        порядку, так что чекпоинт всегда содержит непрерывный префикс.
         
-        for segment in segments:
-            timestamp = self._format_timestamp(segment.start)
-            text = segment.text.strip()
-            
-            timed_lines.append(f"[{timestamp}] {text}")
-            full_lines.append(text)
-            
-            segment_count += 1
-            if segment_count % 10 == 0:
-                print(f"   📝 Обработано сегментов: {segment_count}")
+        Args:
+            audio: numpy-массив 16 kHz (куски переводятся в float32 по одному)
+            chunks: Куски [(start, end)] в сэмплах
+            offset: Смещение audio относительно начала медиа (сек)
+            meta: Сюда записывается language первого куска
+            decoding: Профиль декодирования
+            language: Язык речи (один на все куски)
+        """
+        print(f"   ✂️  Разбито по тишине на {len(chunks)} кусков, потоков: {self.chunk_workers}")
+        options = self._decode_options(decoding, language)
         
-        print(f"   ✅ Транскрибация завершена ({segment_count} сегментов)")
+        def run(chunk: Tuple[int, int]):
+            start, end = chunk
+            chunk_offset = offset + start / SAMPLE_RATE
+            segments, info = self.model.transcribe(as_float32(audio[start:end]), **options)
+            return [
+                TimedSegment(seg.start + chunk_offset, seg.end + chunk_offset, seg.text)
+                for seg in segments
+            ], info
         
-        return TranscriptResult(
-            timed_transcript="\n".join(timed_lines),
-            full_text=" ".join(full_lines),
-            language=info.language,
-            duration=info.duration
-        )
+        with ThreadPoolExecutor(max_workers=self.chunk_workers) as executor:
+            for chunk_segments, info in executor.map(run, chunks):
+                meta.setdefault('language', info.language)
+                yield from chunk_segments
     
-    def _format_timestamp(self, seconds: float) -> str:
+    @staticmethod
+    def _format_timestamp(seconds: float) -> str:
         """
         Форматирование таймкода MM:SS
         
@@ -151,3 +451,48 @@ class LocalEars:
         minutes = int(seconds // 60)
         secs = int(seconds % 60)
         return f"{minutes:02d}:{secs:02d}"
+
+
+def parse_language_models(spec: str) -> Dict[str, str]:
+    """
+    Разбор маршрутизации моделей по языку: "en=distil-small.en,de=medium"
+    
+    Returns:
+        {язык: модель}
+    """
+    models = {}
+    for item in spec.split(','):
+        if '=' in item:
+            language, model_size = item.split('=', 1)
+            models[language.strip().lower()] = model_size.strip()
+    return models
+
+
+def build_transcript_result(
+    segments: List[TimedSegment],
+    language: str,
+    duration: float,
+    profile: str = DEFAULT_PROFILE
+) -> TranscriptResult:
+    """
+    Сборка TranscriptResult из сегментов (Whisper или субтитры)
+    
+    Returns:
+        TranscriptResult с секциями [MM:SS] и чистым текстом
+    """
+    timed_lines = []
+    full_lines = []
+    
+    for segment in segments:
+        text = segment.text.strip()
+        timed_lines.append(f"[{LocalEars._format_timestamp(segment.start)}] {text}")
+        full_lines.append(text)
+    
+    return TranscriptResult(
+        timed_transcript="\n".join(timed_lines),
+        full_text=" ".join(full_lines),
+        language=language,
+        duration=duration,
+        profile=profile,
+        segments=list(segments)
+    )
@@ -4,21 +4,229 @@ Module 4 - RAG / Oracle
 Provides RAGEngine for indexing folders into a per-user ChromaDB and
 running semantic search + answer generation via LocalBrain.
 
+RAG_VECTOR_BACKEND selects the vector store: chroma (default), or the
+compact int8/binary store from compact_store that needs no chromadb.
+
 This module is optional: if chromadb/sentence-transformers are not installed
 the code will raise ImportError with a friendly message.
 """
 from __future__ import annotations
 
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import astuple, dataclass, field
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import AsyncIterator, Callable, Deque, Iterator, List, Dict, Optional, Sequence, Tuple
+import asyncio
 import os
 import hashlib
+import json
+import logging
+import queue
+import sqlite3
+import threading
+import time
+
+from . import compact_store
+from .answer_cache import DEFAULT_SIMILARITY, DEFAULT_TTL, AnswerCache, LRUCache, normalize_question
+from .hybrid_search import LEXICAL_FILENAME, LexicalIndex, SearchFilters, reciprocal_rank_fusion
+from .note_chunker import CHUNK_SIZE, CHUNKER_VERSION, chunk_file
+from .reranker import DEFAULT_BUDGET_MS, Reranker
+
+logger = logging.getLogger(__name__)
+
+
+# Files indexed per content folder and their source_type
+SOURCE_FILES = {
+    "Knowledge.md": 'summary',
+    "description.md": 'description',
+    "transcript.md": 'transcript',
+}
 
 
 def _hash_text(text: str) -> str:
     return hashlib.sha256(text.encode('utf-8')).hexdigest()
 
 
+def chunk_ids(file_path: str, chunks: List[str], metadatas: Optional[List[Dict]] = None) -> List[str]:
+    """Content-addressed chunk IDs.
+
+    An ID depends on the chunk text and metadata (plus its occurrence number
+    for repeated text), not on its position, so an edit only changes the IDs
+    of the chunks that actually changed.
+    """
+    seen: Dict[str, int] = {}
+    ids = []
+    for i, chunk in enumerate(chunks):
+        if metadatas and metadatas[i]:
+            chunk = f"{chunk}\0{json.dumps(metadatas[i], sort_keys=True, ensure_ascii=False)}"
+        occurrence = seen.get(chunk, 0)
+        seen[chunk] = occurrence + 1
+        ids.append(_hash_text(f"{file_path}\0{occurrence}\0{chunk}"))
+    return ids
+
+
+class ChunkManifest:
+    """Per-file record of what is in the vector DB.
+
+    Stores size/mtime, content hash and chunk IDs of every indexed file, so
+    unchanged files are skipped without reading and stale chunks can be
+    deleted when a file changes or disappears.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self._initialized = False
+
+    @contextmanager
+    def _session(self) -> Iterator[sqlite3.Connection]:
+        if not self._initialized:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                if not self._initialized:
+                    conn.execute(
+                        """
+                        CREATE TABLE IF NOT EXISTS files (
+                            file_path TEXT PRIMARY KEY,
+                            folder TEXT NOT NULL,
+                            size INTEGER NOT NULL,
+                            mtime_ns INTEGER NOT NULL,
+                            content_hash TEXT NOT NULL,
+                            chunk_ids TEXT NOT NULL,
+                            indexed_at REAL NOT NULL
+                        )
+                        """
+                    )
+                    conn.execute("CREATE INDEX IF NOT EXISTS files_folder ON files (folder)")
+                    conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+                    self._initialized = True
+                yield conn
+        finally:
+            conn.close()
+
+    def folder_files(self, folder: Path) -> Dict[str, Tuple[int, int, str, List[str]]]:
+        """file_path -> (size, mtime_ns, content_hash, chunk_ids) for a folder"""
+        with self._session() as conn:
+            rows = conn.execute(
+                "SELECT file_path, size, mtime_ns, content_hash, chunk_ids FROM files WHERE folder = ?",
+                (str(folder),)
+            ).fetchall()
+        return {row[0]: (row[1], row[2], row[3], json.loads(row[4])) for row in rows}
+
+    def version(self) -> int:
+        """Index version: changes whenever chunks are added or removed (by any process)"""
+        with self._session() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return row[0] if row else 0
+
+    def update(self, plans: List["FilePlan"], changed: bool = True) -> None:
+        """Records indexed files (plan.record) and forgets removed ones in one transaction
+
+        Args:
+            changed: Chunks were added or removed, bump the index version
+        """
+        now = time.time()
+        with self._session() as conn:
+            if changed:
+                conn.execute(
+                    "INSERT INTO meta (key, value) VALUES ('version', 1) "
+                    "ON CONFLICT (key) DO UPDATE SET value = value + 1"
+                )
+            conn.executemany(
+                "INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [(plan.file_path, str(plan.folder), *plan.record[:3], json.dumps(plan.record[3]), now)
+                 for plan in plans if plan.record is not None]
+            )
+            conn.executemany(
+                "DELETE FROM files WHERE file_path = ?",
+                [(plan.file_path,) for plan in plans if plan.record is None]
+            )
+
+    def clear(self) -> None:
+        with self._session() as conn:
+            conn.execute("DELETE FROM files")
+            conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('version', 1) "
+                "ON CONFLICT (key) DO UPDATE SET value = value + 1"
+            )
+
+    def bind(self, layout: str) -> bool:
+        """Ties the manifest to a vector backend and chunking scheme.
+
+        The manifest describes one store and one way of chunking only: after
+        either changes it is cleared, so every file is indexed again.
+
+        Returns:
+            True if the manifest was cleared
+        """
+        with self._session() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'layout'").fetchone()
+            # Manifests from before layouts existed: ChromaDB with the generic splitter
+            known = row[0] if row else ('legacy' if conn.execute("SELECT 1 FROM files LIMIT 1").fetchone() else None)
+            if known == layout:
+                return False
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('layout', ?)", (layout,))
+        if known is None:
+            return False
+        self.clear()
+        return True
+
+
+@dataclass
+class FilePlan:
+    """What has to change in the vector DB for one source file"""
+    folder: Path
+    file_path: str
+    source_type: str = 'unknown'
+    # Chunks that are not in the DB yet and their IDs
+    chunks: List[str] = field(default_factory=list)
+    ids: List[str] = field(default_factory=list)
+    # Per-chunk metadata from the chunker (frontmatter fields, transcript time range)
+    chunk_metadata: List[Dict] = field(default_factory=list)
+    stale_ids: List[str] = field(default_factory=list)
+    # No manifest entry: chunks from before the manifest may still be in the DB
+    untracked: bool = False
+    # Manifest entry (size, mtime_ns, content_hash, chunk_ids); None removes it
+    record: Optional[Tuple[int, int, str, List[str]]] = None
+    embeddings: List = field(default_factory=list)
+    # (id, chunk) already in chroma but missing from the lexical index
+    lexical_only: List[Tuple[str, str]] = field(default_factory=list)
+
+    def metadata(self, index: Optional[int] = None) -> Dict:
+        """Metadata of the file, plus the chunker's metadata of chunk `index`"""
+        extra = self.chunk_metadata[index] if index is not None and index < len(self.chunk_metadata) else {}
+        return {
+            **extra,
+            'folder_name': self.folder.name,
+            'file_path': self.file_path,
+            'source_type': self.source_type,
+        }
+
+
+@dataclass
+class ReindexStats:
+    """Progress of RAGEngine.reindex()"""
+    folders: int = 0
+    files: int = 0
+    chunks: int = 0
+    failed: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    @property
+    def chunks_per_sec(self) -> float:
+        return self.chunks / self.elapsed if self.elapsed > 0 else 0.0
+
+
+# End of a producer's stream in reindex()
+_DONE = object()
+
+
 class RAGEngine:
     """A small RAG engine using chromadb + sentence-transformers.
 
@@ -29,8 +237,17 @@ class RAGEngine:
     """
 
     def __init__(self, user_root: Optional[Path] = None) -> None:
+        # chroma, or a compact_store mode (int8 / binary)
+        self.backend = os.getenv('RAG_VECTOR_BACKEND', 'chroma').strip().lower()
+        if self.backend != 'chroma' and self.backend not in compact_store.MODES:
+            raise ValueError(
+                f"Unknown RAG_VECTOR_BACKEND: {self.backend} (available: chroma, {', '.join(compact_store.MODES)})"
+            )
+
+        chromadb = None
         try:
-            import chromadb
+            if self.backend == 'chroma':
+                import chromadb
             from sentence_transformers import SentenceTransformer
             from langchain_text_splitters import RecursiveCharacterTextSplitter
         except Exception as e:  # pragma: no cover - import-time check
@@ -44,6 +261,24 @@ class RAGEngine:
 
         self.embedding_model_name = os.getenv('RAG_EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
         self.top_k = int(os.getenv('RAG_SEARCH_TOP_K', '5'))
+        # Candidates taken from each of the dense and lexical searches before fusion
+        self.candidates = int(os.getenv('RAG_SEARCH_CANDIDATES', str(self.top_k * 4)))
+
+        # Cross-encoder over the fused candidates; opt-in, since the model is a
+        # separate download (see reranker.RECOMMENDED_RERANK_MODEL)
+        self.reranker: Optional[Reranker] = None
+        self.rerank_candidates = int(os.getenv('RAG_RERANK_CANDIDATES', '50'))
+        rerank_model = os.getenv('RAG_RERANK_MODEL', '').strip()
+        if rerank_model:
+            try:
+                from sentence_transformers import CrossEncoder
+            except ImportError:
+                logger.info("sentence-transformers has no CrossEncoder, reranking disabled")
+            else:
+                self.reranker = Reranker(
+                    lambda: shared_embedder(CrossEncoder, rerank_model),
+                    budget_ms=float(os.getenv('RAG_RERANK_BUDGET_MS', str(DEFAULT_BUDGET_MS)))
+                )
 
         # user_root is the downloads/{userfolder}
         self.user_root = Path(user_root) if user_root else None
@@ -52,6 +287,21 @@ class RAGEngine:
         self._client = None
         self._collection = None
         self._embedder = None
+        self.manifest: Optional[ChunkManifest] = None
+        self.lexical: Optional[LexicalIndex] = None
+        # One writer per vector_db: index_folder/reindex calls are serialised
+        self._lock = threading.RLock()
+
+        # Repeated questions: cached query embeddings and answers (per index version)
+        self._cache_lock = threading.Lock()
+        self._query_embeddings = LRUCache(int(os.getenv('RAG_EMBED_CACHE', '256')))
+        self.answers = AnswerCache(
+            ttl=float(os.getenv('RAG_ANSWER_TTL', str(DEFAULT_TTL))),
+            similarity=float(os.getenv('RAG_ANSWER_SIMILARITY', str(DEFAULT_SIMILARITY)))
+        )
+        # LocalBrain for answers, created and initialized once
+        self._brain = None
+        self._brain_loop: Optional[asyncio.AbstractEventLoop] = None
 
     def _init_client(self) -> None:
         if self._client is None:
@@ -63,13 +313,22 @@ class RAGEngine:
             vector_path.mkdir(parents=True, exist_ok=True)
 
             # Persistent client pointing to per-user folder
-            self._client = self.chromadb.PersistentClient(path=str(vector_path))
+            if self.backend == 'chroma':
+                self._client = self.chromadb.PersistentClient(path=str(vector_path))
+            else:
+                self._client = compact_store.CompactClient(vector_path, mode=self.backend)
             # single collection for all user docs
             self._collection = self._client.get_or_create_collection(name='secbrain')
+            # what is already in the collection, per source file
+            self.manifest = ChunkManifest(vector_path / 'manifest.sqlite3')
+            if self.manifest.bind(f"{self.backend}/chunker-{CHUNKER_VERSION}"):
+                logger.info(f"Vector backend or chunking changed: {vector_path} will be reindexed")
+            # BM25 over the same chunks for hybrid search
+            self.lexical = LexicalIndex(vector_path / LEXICAL_FILENAME)
 
         if self._embedder is None:
-            # load sentence-transformers model (CPU)
-            self._embedder = self.EmbedModel(self.embedding_model_name)
+            # sentence-transformers model (CPU), loaded once per process
+            self._embedder = shared_embedder(self.EmbedModel, self.embedding_model_name)
 
     def index_folder(self, folder: Path) -> int:
         """Index files from a folder into the user's ChromaDB.
@@ -101,132 +360,638 @@ class RAGEngine:
                 # fallback to folder.parent
                 self.user_root = folder.parent
 
-        self._init_client()
+        with self._lock:
+            self._init_client()
+            return self._commit(self._plan_folder(folder))
 
-        texts: List[str] = []
-        metadatas: List[Dict] = []
-        ids: List[str] = []
+    def _plan_folder(self, folder: Path) -> List[FilePlan]:
+        """Compares the folder's source files with the manifest (no DB writes)"""
+        known = self.manifest.folder_files(folder)
+        # Files indexed before the lexical index existed are added to it without re-embedding
+        lexical_files = self.lexical.folder_files(folder)
+        splitter = self.TextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=150)
+        plans: List[FilePlan] = []
 
         # Prioritise files: Knowledge.md, description.md, transcript.md
-        priority_files = ["Knowledge.md", "description.md", "transcript.md"]
-
-        for fname in priority_files:
+        for fname, source_type in SOURCE_FILES.items():
             fpath = folder / fname
-            if fpath.exists() and fpath.is_file():
-                content = fpath.read_text(encoding='utf-8')
-                source_type = 'unknown'
-                if fname == 'Knowledge.md':
-                    source_type = 'summary'
-                elif fname == 'description.md':
-                    source_type = 'description'
-                elif fname == 'transcript.md':
-                    source_type = 'transcript'
-
-                # Split into chunks
-                splitter = self.TextSplitter(chunk_size=1000, chunk_overlap=150)
-                chunks = splitter.split_text(content)
-                for idx, chunk in enumerate(chunks):
-                    chunk_id = _hash_text(f"{fname}:{idx}:{chunk[:64]}")
-                    texts.append(chunk)
-                    metadatas.append({
-                        'folder_name': folder.name,
-                        'file_path': str(fpath),
-                        'source_type': source_type,
-                    })
-                    ids.append(chunk_id)
-
-        if not texts:
-            return 0
+            file_key = str(fpath)
+            previous = known.pop(file_key, None)
+
+            if not fpath.is_file():
+                if previous is not None:
+                    # File was removed: drop its chunks
+                    plans.append(FilePlan(folder, file_key, stale_ids=previous[3]))
+                continue
+
+            stat = fpath.stat()
+            in_lexical = previous is not None and (file_key in lexical_files or not previous[3])
+            if previous is not None and previous[:2] == (stat.st_size, stat.st_mtime_ns) and in_lexical:
+                continue
+
+            content = fpath.read_text(encoding='utf-8')
+            content_hash = _hash_text(content)
+            plan = FilePlan(folder, file_key, source_type, untracked=previous is None)
+            plans.append(plan)
+            old_ids = previous[3] if previous is not None else []
+            if previous is not None and previous[2] == content_hash:
+                # Touched but not changed
+                plan.record = (stat.st_size, stat.st_mtime_ns, content_hash, old_ids)
+                if not in_lexical:
+                    chunks = chunk_file(fname, content, splitter.split_text)
+                    texts = [chunk.text for chunk in chunks]
+                    ids = chunk_ids(file_key, texts, [chunk.metadata for chunk in chunks])
+                    plan.lexical_only = list(zip(ids, texts))
+                continue
+
+            # Split by the file's structure; only chunks that are not in the DB yet get embedded
+            chunks = chunk_file(fname, content, splitter.split_text)
+            new_ids = chunk_ids(file_key, [chunk.text for chunk in chunks], [chunk.metadata for chunk in chunks])
+            existing = set(old_ids)
+            for chunk_id, chunk in zip(new_ids, chunks):
+                if chunk_id not in existing:
+                    plan.chunks.append(chunk.text)
+                    plan.chunk_metadata.append(chunk.metadata)
+                    plan.ids.append(chunk_id)
+            plan.stale_ids = sorted(existing - set(new_ids))
+            plan.record = (stat.st_size, stat.st_mtime_ns, content_hash, new_ids)
+
+        # Files of the folder that are no longer indexed at all
+        for file_key, previous in known.items():
+            plans.append(FilePlan(folder, file_key, stale_ids=previous[3]))
+
+        return plans
+
+    def _commit(self, plans: List[FilePlan], embeddings: Optional[List] = None) -> int:
+        """Applies plans to the collection, then to the manifest.
+
+        Returns number of chunks upserted.
+        """
+        stale_ids = [chunk_id for plan in plans for chunk_id in plan.stale_ids]
+        if stale_ids:
+            self._collection.delete(ids=stale_ids)
+        untracked = [plan.file_path for plan in plans if plan.untracked]
+        if untracked:
+            self._collection.delete(where={'file_path': {'$in': untracked}})
 
+        texts: List[str] = []
+        metadatas: List[Dict] = []
+        ids: List[str] = []
+        for plan in plans:
+            texts.extend(plan.chunks)
+            ids.extend(plan.ids)
+            metadatas.extend(plan.metadata(i) for i in range(len(plan.chunks)))
+        if texts:
+            self._upsert(ids, texts, metadatas, embeddings)
+
+        # Manifest changes are written only after both indexes are updated
+        self.lexical.update(
+            inserted=[(chunk_id, plan.file_path, plan.folder, plan.source_type, chunk)
+                      for plan in plans
+                      for chunk_id, chunk in list(zip(plan.ids, plan.chunks)) + plan.lexical_only],
+            deleted_ids=stale_ids,
+            deleted_files=untracked,
+            folders=dict.fromkeys(plan.folder for plan in plans)
+        )
+        changed = bool(texts or stale_ids or untracked or any(plan.record is None for plan in plans))
+        self.manifest.update(plans, changed=changed)
+        if changed:
+            with self._cache_lock:
+                self.answers.clear()
+        return len(texts)
+
+    def _upsert(self, ids: List[str], texts: List[str], metadatas: List[Dict],
+                embeddings: Optional[List] = None) -> None:
         # compute embeddings
+        if embeddings is None:
+            embeddings = self._embedder.encode(texts, show_progress_bar=False)
+
+        # chroma rejects batches above the client's limit
+        get_max_batch_size = getattr(self._client, 'get_max_batch_size', None)
+        step = get_max_batch_size() if get_max_batch_size else len(ids)
+
+        for i in range(0, len(ids), step):
+            batch = dict(ids=ids[i:i + step], documents=texts[i:i + step],
+                         metadatas=metadatas[i:i + step], embeddings=embeddings[i:i + step])
+            # Upsert into collection (use add/upsert depending on API)
+            try:
+                # prefer upsert if available
+                if hasattr(self._collection, 'upsert'):
+                    self._collection.upsert(**batch)
+                else:
+                    self._collection.add(**batch)
+            except Exception:
+                # best-effort add
+                self._collection.add(**batch)
+
+    def content_folders(self) -> Iterator[Path]:
+        """Folders under user_root that have files to index"""
+        if self.user_root is None:
+            raise ValueError("user_root must be set to list content folders")
+        for dirpath, dirnames, filenames in os.walk(self.user_root):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith('.') and d != 'vector_db')
+            if any(name in SOURCE_FILES for name in filenames):
+                yield Path(dirpath)
+
+    def reindex(
+        self,
+        batch_size: int = 256,
+        upsert_batch: int = 4096,
+        readers: int = 4,
+        full: bool = False,
+        progress: Optional[Callable[[ReindexStats], None]] = None
+    ) -> ReindexStats:
+        """(Re)build the whole user's vector DB in one streaming pass.
+
+        Reader threads stat, read and chunk folders; one worker embeds chunks
+        from all folders in fixed batches of batch_size; the calling thread
+        upserts about upsert_batch chunks at a time. The manifest is written
+        after every upsert, so an interrupted run resumes where it stopped:
+        finished files are skipped by size/mtime.
+
+        Args:
+            batch_size: Chunks per encode() call
+            upsert_batch: Chunks per collection upsert
+            readers: Threads reading and chunking files
+            full: Drop the collection and the manifest first
+            progress: Called with the stats after every upsert
+        """
+        if self.user_root is None:
+            raise ValueError("user_root must be set for reindex()")
+        with self._lock:
+            return self._reindex(batch_size, upsert_batch, readers, full, progress)
+
+    def _reindex(
+        self,
+        batch_size: int,
+        upsert_batch: int,
+        readers: int,
+        full: bool,
+        progress: Optional[Callable[[ReindexStats], None]]
+    ) -> ReindexStats:
         self._init_client()
-        embeddings = self._embedder.encode(texts, show_progress_bar=False)
-
-        # Upsert into collection (use add/upsert depending on API)
+        if full:
+            self._client.delete_collection(name='secbrain')
+            self._collection = self._client.get_or_create_collection(name='secbrain')
+            self.manifest.clear()
+            self.lexical.clear()
+
+        stats = ReindexStats()
+        readers = max(1, readers)
+        folder_q: queue.Queue = queue.Queue(maxsize=readers * 4)
+        plan_q: queue.Queue = queue.Queue(maxsize=readers * 2)
+        # A few embedded batches ahead of the upserts at most
+        ready_q: queue.Queue = queue.Queue(maxsize=max(2, upsert_batch // max(1, batch_size)))
+
+        def walk() -> None:
+            try:
+                for folder in self.content_folders():
+                    folder_q.put(folder)
+            finally:
+                for _ in range(readers):
+                    folder_q.put(_DONE)
+
+        def read() -> None:
+            while True:
+                folder = folder_q.get()
+                if folder is _DONE:
+                    plan_q.put(_DONE)
+                    return
+                try:
+                    plan_q.put((folder, self._plan_folder(folder)))
+                except Exception as e:
+                    logger.warning(f"RAG reindex: skipping {folder}: {e}")
+                    plan_q.put((folder, None))
+
+        threads = [threading.Thread(target=walk, daemon=True)]
+        threads += [threading.Thread(target=read, daemon=True) for _ in range(readers)]
+        threads.append(threading.Thread(target=self._embed_stream, args=(plan_q, ready_q, batch_size, readers),
+                                        daemon=True))
+        for thread in threads:
+            thread.start()
+
+        pending: List[FilePlan] = []
+        pending_chunks = 0
+        pending_folders = 0
+
+        def flush() -> None:
+            nonlocal pending, pending_chunks, pending_folders
+            embeddings = [vector for plan in pending for vector in plan.embeddings]
+            stats.chunks += self._commit(pending, embeddings)
+            stats.files += len(pending)
+            stats.folders += pending_folders
+            pending, pending_chunks, pending_folders = [], 0, 0
+            if progress is not None:
+                progress(stats)
+
+        while True:
+            item = ready_q.get()
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            folder, plans = item
+            if plans is None:
+                stats.failed += 1
+                continue
+            pending.extend(plans)
+            pending_chunks += sum(len(plan.chunks) for plan in plans)
+            pending_folders += 1
+            if pending_chunks >= upsert_batch:
+                flush()
+        if pending or pending_folders:
+            flush()
+        return stats
+
+    def _embed_stream(self, plan_q: queue.Queue, ready_q: queue.Queue, batch_size: int, producers: int) -> None:
+        """Embedding worker of reindex(): folders in, folders with embeddings out (in order)"""
         try:
-            # prefer upsert if available
-            if hasattr(self._collection, 'upsert'):
-                self._collection.upsert(ids=ids, documents=texts, metadatas=metadatas, embeddings=embeddings)
-            else:
-                self._collection.add(ids=ids, documents=texts, metadatas=metadatas, embeddings=embeddings)
-        except Exception:
-            # best-effort add
-            self._collection.add(ids=ids, documents=texts, metadatas=metadatas, embeddings=embeddings)
+            waiting: Deque[Tuple[Path, Optional[List[FilePlan]]]] = deque()
+            buffer: List[Tuple[FilePlan, str]] = []
+
+            def release() -> None:
+                while waiting and all(len(plan.embeddings) == len(plan.chunks) for plan in waiting[0][1] or ()):
+                    ready_q.put(waiting.popleft())
+
+            def encode(count: int) -> None:
+                batch, buffer[:count] = buffer[:count], []
+                vectors = self._embedder.encode([chunk for _, chunk in batch], show_progress_bar=False)
+                for (plan, _), vector in zip(batch, vectors):
+                    plan.embeddings.append(vector)
+
+            finished = 0
+            while finished < producers:
+                item = plan_q.get()
+                if item is _DONE:
+                    finished += 1
+                    continue
+                waiting.append(item)
+                buffer.extend((plan, chunk) for plan in item[1] or () for chunk in plan.chunks)
+                while len(buffer) >= batch_size:
+                    encode(batch_size)
+                release()
+
+            if buffer:
+                encode(len(buffer))
+            release()
+            ready_q.put(_DONE)
+        except Exception as e:
+            ready_q.put(e)
 
-        return len(texts)
+    def search(
+        self,
+        question: str,
+        filters: Optional[SearchFilters] = None,
+        embedding: Optional[Sequence[float]] = None
+    ) -> List[Dict]:
+        """Top_k chunks of the fused dense and lexical rankings.
 
-    def query(self, question: str) -> Dict:
-        """Run semantic search and generate an answer using LocalBrain.
+        With a reranker, rerank_candidates fused chunks are rescored by the
+        cross-encoder within its time budget and the best top_k are kept.
 
-        Returns a dict: {'answer': str, 'sources': [folder_names], 'chunks': [texts]}
+        Returns [{'id', 'text', 'metadata'}] best first.
         """
-        if self.user_root is None:
-            raise ValueError("user_root must be set for query()")
-
-        self._init_client()
-        # embed query
+        filters = filters or SearchFilters()
+        with self._lock:
+            self._init_client()
+
+        where = self._vector_where(filters)
+        if where is False:
+            # No folder matches the filters
+            return []
+
+        if embedding is None:
+            embedding = self.embed_query(question)
+        limit = max(self.candidates, self.rerank_candidates) if self.reranker else self.candidates
+        dense = self._dense_search(question, embedding, limit, where)
+        lexical = self.lexical.search(question, limit, filters)
+
+        hits = {hit['id']: hit for hit in lexical}
+        hits.update((hit['id'], hit) for hit in dense)
+        fused = reciprocal_rank_fusion([[hit['id'] for hit in dense], [hit['id'] for hit in lexical]])
+        if self.reranker is None:
+            return [hits[chunk_id] for chunk_id, _ in fused[:self.top_k]]
+        pool = [hits[chunk_id] for chunk_id, _ in fused[:max(self.top_k, self.rerank_candidates)]]
+        return self.reranker.rerank(question, pool, self.top_k)
+
+    def _vector_where(self, filters: SearchFilters):
+        """Chroma where-filter for the filters; False if no folder can match"""
+        clauses: List[Dict] = []
+        if filters.source_type:
+            clauses.append({'source_type': filters.source_type})
+        if filters.by_folder:
+            names = self.lexical.folder_names(filters)
+            if not names:
+                return False
+            clauses.append({'folder_name': {'$in': names}})
+        if not clauses:
+            return None
+        return clauses[0] if len(clauses) == 1 else {'$and': clauses}
+
+    def embed_query(self, question: str) -> Sequence[float]:
+        """Query embedding, cached by normalized question"""
+        key = normalize_question(question)
+        with self._cache_lock:
+            cached = self._query_embeddings.get(key)
+        if cached is not None:
+            return cached
+        with self._lock:
+            self._init_client()
         q_emb = self._embedder.encode([question])[0]
+        with self._cache_lock:
+            self._query_embeddings.put(key, q_emb)
+        return q_emb
+
+    def _dense_search(self, question: str, q_emb: Sequence[float], limit: int, where: Optional[Dict]) -> List[Dict]:
+        """Semantic search in chroma: [{'id', 'text', 'metadata'}] best first"""
+        kwargs = {'where': where} if where else {}
 
         # query collection
         try:
-            results = self._collection.query(query_embeddings=[q_emb], n_results=self.top_k, include=['documents', 'metadatas'])
+            results = self._collection.query(query_embeddings=[q_emb], n_results=limit,
+                                             include=['documents', 'metadatas'], **kwargs)
         except TypeError:
             # fallback to text query
-            results = self._collection.query(query_texts=[question], n_results=self.top_k, include=['documents', 'metadatas'])
+            results = self._collection.query(query_texts=[question], n_results=limit,
+                                             include=['documents', 'metadatas'], **kwargs)
 
         # results structure varies; normalize
-        docs = []
-        metadatas = []
         try:
+            ids = results['ids'][0]
             docs = results['documents'][0]
             metadatas = results['metadatas'][0]
         except Exception:
             # try older structure
+            ids = results.get('ids', [])
             docs = results.get('documents', [])
             metadatas = results.get('metadatas', [])
 
+        return [{'id': i, 'text': d, 'metadata': m or {}} for i, d, m in zip(ids, docs, metadatas)]
+
+    # system prompt per spec
+    ANSWER_PROMPT = """
+Ты — умный помощник. Отвечай на вопрос ТОЛЬКО на основе приведенного ниже контекста.
+Если в контексте нет ответа, скажи "Я не нашел информации в вашей базе".
+Не выдумывай факты.
+"""
+    NOT_FOUND = "Я не нашел информации в вашей базе"
+
+    def _retrieve(self, question: str, filters: SearchFilters) -> Tuple[Tuple, Optional[Dict], List[str], List[str]]:
+        """Cached answer, or the context for a new one.
+
+        Returns (cache_key, cached_result, chunks, source_folders).
+        """
+        if self.user_root is None:
+            raise ValueError("user_root must be set for query()")
+
+        with self._lock:
+            self._init_client()
+        version = self.manifest.version()
+        q_emb = self.embed_query(question)
+        key = (q_emb, astuple(filters), version)
+        with self._cache_lock:
+            cached = self.answers.get(question, *key)
+        if cached is not None:
+            return key, dict(cached), [], []
+
+        hits = self.search(question, filters, embedding=q_emb)
+
         # Build context for LLM
         chunks = []
         folders = []
-        for d, m in zip(docs, metadatas):
-            chunks.append(d)
+        for hit in hits:
+            chunks.append(hit['text'])
+            m = hit['metadata']
             fn = m.get('folder_name') if isinstance(m, dict) else None
             if fn and fn not in folders:
                 folders.append(fn)
+        return key, None, chunks, folders
+
+    def _answer_request(self, lb, question: str, chunks: List[str]) -> Dict:
+        """Chat request for a grounded answer (plain text, not JSON)"""
+        context_text = "\n\n".join(chunks[: self.top_k])
+        user_prompt = f"КОНТЕКСТ:\n{context_text}\n\nВОПРОС: {question}"
+        return dict(
+            model=lb.model,
+            messages=[
+                {'role': 'system', 'content': self.ANSWER_PROMPT},
+                {'role': 'user', 'content': user_prompt}
+            ],
+            options={'temperature': 0.0}
+        )
+
+    def _remember(self, question: str, key: Tuple, result: Dict) -> None:
+        with self._cache_lock:
+            self.answers.put(question, *key, result)
+
+    def query(
+        self,
+        question: str,
+        source_type: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        platform: Optional[str] = None,
+        tag: Optional[str] = None
+    ) -> Dict:
+        """Run hybrid (dense + BM25) search and generate an answer using LocalBrain.
+
+        Both searches return `candidates` chunks, merged by reciprocal rank
+        fusion; the best top_k go to the LLM. Filters apply to both searches:
+        source_type ('summary', 'description', 'transcript'), folder date range
+        (YYYY-MM-DD), platform and tag.
+
+        Returns a dict: {'answer': str, 'sources': [folder_names], 'chunks': [texts]}
+        """
+        filters = SearchFilters(source_type, date_from, date_to, platform, tag)
+        key, cached, chunks, folders = self._retrieve(question, filters)
+        if cached is not None:
+            return cached
+        if not chunks:
+            return {'answer': self.NOT_FOUND, 'sources': [], 'chunks': []}
 
         # Ask LocalBrain for a grounded answer
         try:
-            from src.modules.local_brain import LocalBrain
-            lb = LocalBrain()
-            # system prompt per spec
-            system = """
-Ты — умный помощник. Отвечай на вопрос ТОЛЬКО на основе приведенного ниже контекста.
-Если в контексте нет ответа, скажи "Я не нашел информации в вашей базе".
-Не выдумывай факты.
-"""
-
-            # Build user prompt
-            context_text = "\n\n".join(chunks[: self.top_k])
-            user_prompt = f"КОНТЕКСТ:\n{context_text}\n\nВОПРОС: {question}"
-
-            # Use LocalBrain to call LLM (it expects to return JSON in some cases), but here we just ask for plain text
             # We'll directly call ollama via LocalBrain.client to keep behavior consistent with project
-            lb.initialize()
-            response = lb.client.chat(
-                model=lb.model,
-                messages=[
-                    {'role': 'system', 'content': system},
-                    {'role': 'user', 'content': user_prompt}
-                ],
-                options={'temperature': 0.0}
-            )
-
+            lb = self._llm()
+            response = lb.client.chat(**self._answer_request(lb, question, chunks))
             answer = response['message']['content']
         except Exception as e:
-            answer = f"Ошибка при генерации ответа: {e}"
+            # Not cached: the next attempt asks the LLM again
+            return {'answer': f"Ошибка при генерации ответа: {e}", 'sources': folders, 'chunks': chunks}
 
-        return {
+        result = {
             'answer': answer,
             'sources': folders,
             'chunks': chunks,
         }
+        self._remember(question, key, result)
+        return result
+
+    async def query_stream(
+        self,
+        question: str,
+        source_type: Optional[str] = None,
+        date_from: Optional[str] = None,
+        date_to: Optional[str] = None,
+        platform: Optional[str] = None,
+        tag: Optional[str] = None
+    ) -> AsyncIterator[Dict]:
+        """Streaming query(): the answer arrives token by token.
+
+        Yields events:
+            {'type': 'sources', 'sources': [folder_names], 'chunks': [texts]} - first
+            {'type': 'token', 'text': str} - pieces of the answer as Ollama generates them
+            {'type': 'done', 'answer': str, 'cached': bool} - last on success
+            {'type': 'error', 'error': str} - last if generation failed (not cached)
+
+        Search runs in a worker thread; generation uses LocalBrain's async
+        client with stream=True.
+        """
+        filters = SearchFilters(source_type, date_from, date_to, platform, tag)
+        key, cached, chunks, folders = await asyncio.to_thread(self._retrieve, question, filters)
+        if cached is not None:
+            yield {'type': 'sources', 'sources': cached['sources'], 'chunks': cached['chunks']}
+            yield {'type': 'token', 'text': cached['answer']}
+            yield {'type': 'done', 'answer': cached['answer'], 'cached': True}
+            return
+
+        yield {'type': 'sources', 'sources': folders, 'chunks': chunks}
+        if not chunks:
+            yield {'type': 'token', 'text': self.NOT_FOUND}
+            yield {'type': 'done', 'answer': self.NOT_FOUND, 'cached': False}
+            return
+
+        parts: List[str] = []
+        try:
+            lb = await asyncio.to_thread(self._llm)
+            client = self._async_client(lb)
+            stream = await client.chat(**self._answer_request(lb, question, chunks), stream=True)
+            async for part in stream:
+                text = part['message']['content']
+                if text:
+                    parts.append(text)
+                    yield {'type': 'token', 'text': text}
+        except Exception as e:
+            yield {'type': 'error', 'error': f"Ошибка при генерации ответа: {e}"}
+            return
+
+        answer = "".join(parts)
+        self._remember(question, key, {'answer': answer, 'sources': folders, 'chunks': chunks})
+        yield {'type': 'done', 'answer': answer, 'cached': False}
+
+    def _async_client(self, lb):
+        """LocalBrain's async client, bound to the running event loop"""
+        loop = asyncio.get_running_loop()
+        if lb.async_client is None or self._brain_loop is not loop:
+            lb.reset_async()
+            lb.initialize_async()
+            self._brain_loop = loop
+        return lb.async_client
+
+    def _llm(self):
+        """LocalBrain shared by all answers of this engine"""
+        with self._lock:
+            if self._brain is None:
+                from src.modules.local_brain import LocalBrain
+                brain = LocalBrain()
+                brain.initialize()
+                self._brain = brain
+            return self._brain
+
+
+# Process-wide registries: one embedding model per name, one engine per user_root
+_embedders: Dict[Tuple[object, str], object] = {}
+_embedders_lock = threading.Lock()
+_engines: Dict[Path, RAGEngine] = {}
+_engines_lock = threading.Lock()
+
+
+def shared_embedder(factory: Callable[[str], object], model_name: str) -> object:
+    """Model (embedder, cross-encoder) loaded once per process and shared by all engines"""
+    key = (factory, model_name)
+    with _embedders_lock:
+        if key not in _embedders:
+            _embedders[key] = factory(model_name)
+        return _embedders[key]
+
+
+def get_engine(user_root: Path) -> RAGEngine:
+    """Shared RAGEngine for a user_root (one chroma client per vector_db)
+
+    A configured reranker is loaded and timed here, so the first question
+    neither waits for the model nor overruns the rerank budget.
+    """
+    key = Path(user_root).resolve()
+    with _engines_lock:
+        if key not in _engines:
+            _engines[key] = RAGEngine(user_root=key)
+        engine = _engines[key]
+    if engine.reranker is not None:
+        engine.reranker.warm_up()
+    return engine
+
+
+def rag_available() -> bool:
+    """sentence-transformers, langchain-text-splitters and the configured vector store are installed"""
+    try:
+        if os.getenv('RAG_VECTOR_BACKEND', 'chroma').strip().lower() == 'chroma':
+            import chromadb  # noqa: F401
+        import sentence_transformers  # noqa: F401
+        import langchain_text_splitters  # noqa: F401
+    except Exception:
+        return False
+    return True
+
+
+class IndexWorker:
+    """Background indexing of folders by a single thread.
+
+    Folders are indexed in submission order through the shared engines, so
+    the embedding model is loaded once and a vector_db never has concurrent
+    writers. The queue is bounded: a producer faster than indexing waits
+    instead of piling up work.
+    """
+
+    def __init__(self, maxsize: int = 256) -> None:
+        self._queue: queue.Queue = queue.Queue(maxsize=maxsize)
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+
+    def submit(
+        self,
+        user_root: Path,
+        folder: Path,
+        on_done: Optional[Callable[[int], None]] = None,
+        on_error: Optional[Callable[[Exception], None]] = None
+    ) -> None:
+        """Queues a folder; on_done gets the number of indexed chunks"""
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='rag-index', daemon=True)
+                self._thread.start()
+        self._queue.put((Path(user_root), Path(folder), on_done, on_error))
+
+    def pending(self) -> int:
+        return self._queue.unfinished_tasks
+
+    def join(self) -> None:
+        """Waits until everything submitted so far is indexed"""
+        self._queue.join()
+
+    def _run(self) -> None:
+        while True:
+            user_root, folder, on_done, on_error = self._queue.get()
+            try:
+                chunks = get_engine(user_root).index_folder(folder)
+                if on_done is not None:
+                    on_done(chunks)
+            except Exception as e:
+                logger.warning(f"RAG indexing failed for {folder}: {e}")
+                if on_error is not None:
+                    on_error(e)
+            finally:
+                self._queue.task_done()
+
+
+# Global instance
+index_worker = IndexWorker()
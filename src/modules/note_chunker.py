@@ -0,0 +1,254 @@
+"""
+NoteChunker - Разбиение файлов папки контента на фрагменты RAG
+
+Общий сплиттер по символам режет сырой Markdown вместе с frontmatter,
+встраиваниями Obsidian, служебными разделами и обеими копиями
+транскрипции. Здесь у каждого файла свой разбор: frontmatter уходит в
+метаданные фрагментов, Knowledge.md делится по разделам без служебных,
+transcript.md - по сегментам с таймкодами (время начала и конца в
+метаданных), причём из двух копий транскрипции индексируется одна.
+"""
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+import re
+
+from .prompt_compaction import CLEAN_TEXT_HEADING, strip_markup
+
+
+# Меняется вместе с правилами разбиения: старые фрагменты индексируются заново
+CHUNKER_VERSION = 2
+
+# Размер фрагмента, символов
+CHUNK_SIZE = 1000
+
+# Поля frontmatter, которые попадают в метаданные фрагментов
+FRONTMATTER_FIELDS = ('title', 'author', 'date', 'language', 'tags')
+
+# Разделы Knowledge.md без содержания: служебная шапка, теги (они в метаданных), ссылки
+SKIP_SECTIONS = ('метаданные', 'теги', 'связанные файлы', 'изображения')
+
+# Заголовки чистого текста в transcript.md (Модуль 2 и src/download.py)
+CLEAN_HEADINGS = (CLEAN_TEXT_HEADING, "## Чистый текст")
+
+_FRONTMATTER = re.compile(r'\A---\n(.*?)\n---\n', re.DOTALL)
+_SECTION = re.compile(r'^##\s+(.*)$', re.MULTILINE)
+_TITLE = re.compile(r'^#\s+(.+)$', re.MULTILINE)
+_EMBED = re.compile(r'!\[\[[^\]]*\]\]')
+_WIKILINK = re.compile(r'\[\[(?:[^\]|]*\|)?([^\]]*)\]\]')
+# Подвал Модуля 3 и заглушки пустых разделов ("*Нет ценных комментариев*")
+_BOILERPLATE = re.compile(r'^\*(?:Создано автоматически|Нет )[^\n]*\*\s*$', re.MULTILINE)
+# Заголовки и строки description.md, повторяющие frontmatter
+_DESCRIPTION_NOISE = re.compile(r'^(?:#{1,6}\s.*|\*\*(?:Author|Date):\*\*.*)$', re.MULTILINE)
+_TIMED_LINE = re.compile(r'^\[(\d{1,2}):(\d{2})(?::(\d{2}))?\]\s*(.*)$')
+
+
+@dataclass
+class NoteChunk:
+    """Текст фрагмента и его метаданные (только str/int/float - ограничение ChromaDB)"""
+    text: str
+    metadata: Dict[str, object] = field(default_factory=dict)
+
+
+def parse_frontmatter(text: str) -> Tuple[Dict[str, object], str]:
+    """
+    YAML frontmatter без PyYAML: "ключ: значение" и списки [a, b] или "- a"
+
+    Returns:
+        (поля, текст без frontmatter); ключи в нижнем регистре
+    """
+    text = text.replace('\r\n', '\n')
+    match = _FRONTMATTER.match(text)
+    if not match:
+        return {}, text
+
+    fields: Dict[str, object] = {}
+    list_key: Optional[str] = None
+    for line in match.group(1).split('\n'):
+        if list_key and line.lstrip().startswith('-'):
+            fields[list_key].append(_unquote(line.lstrip()[1:]))
+            continue
+        list_key = None
+        key, sep, value = line.partition(':')
+        if not sep or not key.strip():
+            continue
+        key, value = key.strip().lower(), value.strip()
+        if not value:
+            list_key = key
+            fields[key] = []
+        elif value.startswith('[') and value.endswith(']'):
+            fields[key] = [_unquote(item) for item in value[1:-1].split(',') if item.strip()]
+        else:
+            fields[key] = _unquote(value)
+    return fields, text[match.end():]
+
+
+def _unquote(value: str) -> str:
+    return value.strip().strip('"\'')
+
+
+def _front_metadata(fields: Dict[str, object]) -> Dict[str, object]:
+    """Поля frontmatter для метаданных; списки склеиваются в строку"""
+    metadata: Dict[str, object] = {}
+    for key in FRONTMATTER_FIELDS:
+        value = fields.get(key)
+        if isinstance(value, list):
+            value = ", ".join(str(item).lstrip('#') for item in value if item)
+        if value:
+            metadata[key] = str(value)
+    return metadata
+
+
+def _clean_markdown(text: str) -> str:
+    """Без встраиваний Obsidian, подвала и заглушек; [[файл|подпись]] -> подпись"""
+    text = _EMBED.sub('', text)
+    text = _WIKILINK.sub(r'\1', text)
+    return _BOILERPLATE.sub('', text)
+
+
+def _pack(pieces: List[str], split: Callable[[str], List[str]], size: int, prefix: str = "") -> List[str]:
+    """
+    Склеивает соседние куски до size символов
+
+    Кусок длиннее size режется split; prefix (заголовок заметки)
+    повторяется в начале каждого фрагмента.
+    """
+    room = max(1, size - len(prefix))
+    chunks: List[str] = []
+    current = ""
+    for piece in pieces:
+        if current and len(current) + 2 + len(piece) > room:
+            chunks.append(current)
+            current = ""
+        if len(piece) > room:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.extend(part for part in split(piece) if part.strip())
+            continue
+        current = f"{current}\n\n{piece}" if current else piece
+    if current:
+        chunks.append(current)
+    return [prefix + chunk for chunk in chunks]
+
+
+def chunk_knowledge(text: str, split: Callable[[str], List[str]], size: int = CHUNK_SIZE) -> List[NoteChunk]:
+    """
+    Knowledge.md: разделы "## ..." без служебных, мелкие склеиваются
+
+    Каждый фрагмент начинается с названия заметки, чтобы раздел
+    "Категория" или "Саммари" находился вместе с темой.
+    """
+    fields, body = parse_frontmatter(text)
+    metadata = _front_metadata(fields)
+    body = _clean_markdown(body)
+
+    title = metadata.get('title')
+    heading = _TITLE.search(body.split('\n## ', 1)[0])
+    if not title and heading:
+        title = metadata['title'] = heading.group(1).strip()
+
+    parts = _SECTION.split(body)
+    # parts: [до первого раздела, заголовок 1, текст 1, заголовок 2, ...]
+    pieces = [strip_markup(_TITLE.sub('', parts[0]))]
+    for name, content in zip(parts[1::2], parts[2::2]):
+        label = re.sub(r'^\W+', '', name).strip()
+        if label.lower() in SKIP_SECTIONS:
+            continue
+        content = strip_markup(content)
+        if content:
+            pieces.append(f"{label}\n{content}")
+
+    pieces = [piece for piece in pieces if piece]
+    prefix = f"{title}\n\n" if title else ""
+    return [NoteChunk(chunk, dict(metadata)) for chunk in _pack(pieces, split, size, prefix)]
+
+
+def chunk_description(text: str, split: Callable[[str], List[str]], size: int = CHUNK_SIZE) -> List[NoteChunk]:
+    """description.md: текст без заголовков и разметки, поля frontmatter (автор, дата) - в метаданные"""
+    fields, body = parse_frontmatter(text)
+    metadata = _front_metadata(fields)
+    body = _DESCRIPTION_NOISE.sub('', _clean_markdown(body))
+    paragraphs = [p.strip() for p in strip_markup(body).split('\n\n') if p.strip()]
+    return [NoteChunk(chunk, dict(metadata)) for chunk in _pack(paragraphs, split, size)]
+
+
+def _timestamp(seconds: float) -> str:
+    return f"{int(seconds // 60):02d}:{int(seconds % 60):02d}"
+
+
+def chunk_transcript(text: str, split: Callable[[str], List[str]], size: int = CHUNK_SIZE) -> List[NoteChunk]:
+    """
+    transcript.md: подряд идущие сегменты [MM:SS] до size символов
+
+    Фрагмент начинается с диапазона времени "[MM:SS - MM:SS]", в
+    метаданных - start и end в секундах. Чистый текст (вторая копия)
+    индексируется, только если таймкодов в файле нет.
+    """
+    fields, body = parse_frontmatter(text)
+    metadata = _front_metadata(fields)
+    timed_part = body
+    clean_part = None
+    for heading in CLEAN_HEADINGS:
+        if heading in body:
+            timed_part, clean_part = body.split(heading, 1)
+            break
+
+    segments: List[Tuple[float, str]] = []
+    for line in timed_part.split('\n'):
+        match = _TIMED_LINE.match(line.strip())
+        if match and match.group(4).strip():
+            h_or_m, m_or_s, s = match.group(1), match.group(2), match.group(3)
+            start = (int(h_or_m) * 3600 + int(m_or_s) * 60 + int(s)) if s else int(h_or_m) * 60 + int(m_or_s)
+            segments.append((float(start), match.group(4).strip()))
+
+    if not segments:
+        plain = strip_markup(clean_part if clean_part is not None else body)
+        return [NoteChunk(chunk, dict(metadata)) for chunk in split(plain) if chunk.strip()]
+
+    try:
+        duration = float(fields.get('duration') or 0)
+    except (TypeError, ValueError):
+        duration = 0.0
+
+    groups: List[List[Tuple[float, str]]] = [[]]
+    length = 0
+    for segment in segments:
+        if groups[-1] and length + len(segment[1]) + 1 > size:
+            groups.append([])
+            length = 0
+        groups[-1].append(segment)
+        length += len(segment[1]) + 1
+
+    chunks = []
+    for i, group in enumerate(groups):
+        start = group[0][0]
+        end = groups[i + 1][0][0] if i + 1 < len(groups) else max(duration, group[-1][0])
+        texts = " ".join(text for _, text in group)
+        chunks.append(NoteChunk(
+            f"[{_timestamp(start)} - {_timestamp(end)}] {texts}",
+            {**metadata, 'start': start, 'end': end}
+        ))
+    return chunks
+
+
+_CHUNKERS = {
+    "Knowledge.md": chunk_knowledge,
+    "description.md": chunk_description,
+    "transcript.md": chunk_transcript,
+}
+
+
+def chunk_file(name: str, text: str, split: Callable[[str], List[str]], size: int = CHUNK_SIZE) -> List[NoteChunk]:
+    """
+    Фрагменты файла папки контента по его имени
+
+    Args:
+        name: Имя файла (Knowledge.md, description.md, transcript.md)
+        text: Содержимое
+        split: Запасной сплиттер для слишком длинных кусков и неизвестных файлов
+        size: Размер фрагмента, символов
+    """
+    chunker = _CHUNKERS.get(name)
+    if chunker is None:
+        return [NoteChunk(chunk) for chunk in split(text) if chunk.strip()]
+    return chunker(text, split, size)
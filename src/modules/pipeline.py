@@ -75,14 +75,15 @@ class SecBrainPipeline:
         full_text = transcript_result.full_text if transcript_result else ""
         
         # Шаг 3: AI анализ
-        known_tags_string = self.tag_manager.get_tags_string()
+        known_tags_string, recent_tags = self.tag_manager.get_tags_block()
         
         ai_result = self.brain.analyze(
             caption=content.caption,
             transcript=transcript_text,
             comments=content.comments,
             author=content.author,
-            known_tags=known_tags_string
+            known_tags=known_tags_string,
+            recent_tags=recent_tags
         )
         
         if not ai_result:
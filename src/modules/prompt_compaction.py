@@ -0,0 +1,105 @@
+"""
+PromptCompaction - Подготовка входа LLM под бюджет контекста
+
+description.md и transcript.md пишутся для человека: YAML frontmatter,
+заголовки, жирный шрифт и транскрипция дважды (с таймкодами и чистым
+текстом). Для промпта остаются только сами данные, а их размер
+оценивается в токенах, чтобы вход не обрезался молча по num_ctx.
+"""
+from typing import List
+import re
+
+
+# Грубая оценка для llama/qwen: кириллица ~3 символа на токен, латиница ~4
+CHARS_PER_TOKEN = 3
+
+# Заголовок чистого текста в transcript.md (см. render_transcript_markdown)
+CLEAN_TEXT_HEADING = "## Полный текст (без таймингов)"
+
+_FRONTMATTER = re.compile(r'\A---\n.*?\n---\n', re.DOTALL)
+_TIMED_LINE = re.compile(r'^\[\d{2}:\d{2}(?::\d{2})?\]')
+_HEADING = re.compile(r'^#{1,6}\s+', re.MULTILINE)
+_RULE = re.compile(r'^\s*(-{3,}|\*{3,})\s*$', re.MULTILINE)
+_EMPHASIS = re.compile(r'(\*\*|__|`)')
+
+
+def estimate_tokens(text: str) -> int:
+    """Оценка числа токенов (с запасом, без токенизатора модели)"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def strip_frontmatter(text: str) -> str:
+    """Убирает YAML frontmatter в начале файла"""
+    return _FRONTMATTER.sub('', text.replace('\r\n', '\n'), count=1)
+
+
+def strip_markup(text: str) -> str:
+    """Убирает frontmatter, заголовки, разделители, жирный шрифт и лишние пустые строки"""
+    text = strip_frontmatter(text)
+    text = _HEADING.sub('', text)
+    text = _RULE.sub('', text)
+    text = _EMPHASIS.sub('', text)
+    return re.sub(r'\n{3,}', '\n\n', text).strip()
+
+
+def compact_description(text: str) -> str:
+    """description.md -> текст для промпта"""
+    return strip_markup(text)
+
+
+def compact_transcript(text: str) -> str:
+    """
+    transcript.md -> текст для промпта
+
+    Таймкоды нужны для ссылок в саммари, поэтому из двух копий
+    транскрипции остаются строки [MM:SS]; чистый текст и шапка
+    (файл, модель, длительность) отбрасываются.
+    """
+    body = strip_frontmatter(text)
+    timed = [line.strip() for line in body.split(CLEAN_TEXT_HEADING)[0].split('\n')
+             if _TIMED_LINE.match(line.strip())]
+    if timed:
+        return "\n".join(timed)
+    return strip_markup(body)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Обрезает текст до max_tokens по границе строки или слова"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    cut = text[:max(0, max_tokens) * CHARS_PER_TOKEN]
+    boundary = max(cut.rfind('\n'), cut.rfind(' '))
+    return (cut[:boundary] if boundary > len(cut) // 2 else cut).rstrip() + " …"
+
+
+def split_into_chunks(text: str, max_tokens: int) -> List[str]:
+    """
+    Делит текст на части не больше max_tokens по строкам
+
+    Слишком длинная строка (транскрипт без таймкодов) режется по словам.
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    size = 0
+
+    for line in text.split('\n'):
+        pieces = [line]
+        if estimate_tokens(line) > max_tokens:
+            pieces, words = [], line.split()
+            while words:
+                piece = truncate_to_tokens(" ".join(words), max_tokens).rstrip(" …")
+                taken = len(piece.split()) or 1
+                pieces.append(" ".join(words[:taken]))
+                words = words[taken:]
+
+        for piece in pieces:
+            tokens = estimate_tokens(piece) + 1
+            if current and size + tokens > max_tokens:
+                chunks.append("\n".join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += tokens
+
+    if current:
+        chunks.append("\n".join(current))
+    return [chunk for chunk in chunks if chunk.strip()]
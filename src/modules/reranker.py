@@ -0,0 +1,148 @@
+"""
+Reranker - Переранжирование кандидатов RAG cross-encoder'ом с бюджетом времени
+
+Плотный и BM25 поиск дают широкую выдачу (десятки фрагментов), а в
+промпт попадают лучшие несколько. Cross-encoder оценивает пары
+(вопрос, фрагмент) точнее, но на CPU медленно, поэтому оценка идёт
+пакетами в порядке исходной выдачи и останавливается до исчерпания
+бюджета в миллисекундах: неоценённые кандидаты остаются после
+оценённых в исходном порядке.
+
+Переранжирование включается явно (RAG_RERANK_MODEL): модель скачивается
+и загружается при создании движка (warm_up), а не на первом вопросе.
+"""
+from typing import Callable, Dict, List, Optional
+import logging
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+# Рекомендуемая многоязычная модель (заметки в основном на русском), ~120 МБ, CPU
+RECOMMENDED_RERANK_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+DEFAULT_BUDGET_MS = 250.0
+DEFAULT_BATCH_SIZE = 8
+# Вес нового замера в оценке времени на одну пару
+_EMA_WEIGHT = 0.3
+
+
+class Reranker:
+    """
+    Cross-encoder с жёстким бюджетом времени на запрос
+
+    Время на пару (вопрос, фрагмент) оценивается по прошлым пакетам;
+    следующий пакет уменьшается или не запускается, если не уложится
+    в остаток бюджета. Оценку задаёт warm_up(); без неё первый пакет -
+    одна пара, так что бюджет соблюдается и до калибровки.
+    """
+
+    def __init__(
+        self,
+        load: Callable[[], object],
+        budget_ms: float = DEFAULT_BUDGET_MS,
+        batch_size: int = DEFAULT_BATCH_SIZE
+    ) -> None:
+        """
+        Args:
+            load: Загрузка модели с методом predict([(вопрос, текст), ...]) -> оценки
+            budget_ms: Бюджет на один запрос, мс (0 - не переранжировать)
+            batch_size: Максимум пар в одном вызове predict
+        """
+        self._load = load
+        self.budget_ms = budget_ms
+        self.batch_size = max(1, batch_size)
+        self._model = None
+        self._failed = False
+        self._lock = threading.Lock()
+        self._pair_seconds: Optional[float] = None
+        # Сколько кандидатов оценено в последнем запросе и за сколько мс
+        self.last_scored = 0
+        self.last_ms = 0.0
+
+    def _get_model(self):
+        with self._lock:
+            if self._model is None and not self._failed:
+                try:
+                    self._model = self._load()
+                except Exception as e:
+                    self._failed = True
+                    logger.warning(f"Reranker disabled, model failed to load: {e}")
+            return self._model
+
+    def _batch_limit(self, remaining: float) -> int:
+        if remaining <= 0:
+            return 0
+        if self._pair_seconds is None:
+            return 1
+        return min(self.batch_size, int(remaining / max(self._pair_seconds, 1e-6)))
+
+    def _record(self, seconds: float, pairs: int) -> None:
+        per_pair = seconds / pairs
+        self._pair_seconds = per_pair if self._pair_seconds is None else (
+            (1 - _EMA_WEIGHT) * self._pair_seconds + _EMA_WEIGHT * per_pair
+        )
+
+    def warm_up(self) -> bool:
+        """
+        Загрузка модели и первая оценка времени на пару вне запросов
+
+        Returns:
+            Модель готова к работе
+        """
+        if self.budget_ms <= 0:
+            return False
+        model = self._get_model()
+        if model is None:
+            return False
+        if self._pair_seconds is None:
+            pairs = [("warm up", "warm up")] * self.batch_size
+            started = time.perf_counter()
+            try:
+                model.predict(pairs)
+            except Exception as e:
+                logger.warning(f"Reranker warm-up failed: {e}")
+                return False
+            self._record(time.perf_counter() - started, len(pairs))
+        return True
+
+    def rerank(self, question: str, hits: List[Dict], top_n: int) -> List[Dict]:
+        """
+        Лучшие top_n кандидатов по оценке cross-encoder'а
+
+        Args:
+            question: Вопрос
+            hits: Кандидаты [{'id', 'text', 'metadata'}] в порядке исходной выдачи
+            top_n: Сколько вернуть
+
+        Returns:
+            Оценённые кандидаты по убыванию оценки, за ними неоценённые
+        """
+        self.last_scored, self.last_ms = 0, 0.0
+        if self.budget_ms <= 0 or len(hits) <= 1:
+            return hits[:top_n]
+        # Загрузка модели не входит в бюджет запроса
+        model = self._get_model()
+        if model is None:
+            return hits[:top_n]
+
+        start = time.perf_counter()
+        deadline = start + self.budget_ms / 1000.0
+        scored = []
+        while len(scored) < len(hits):
+            count = self._batch_limit(deadline - time.perf_counter())
+            if count < 1:
+                break
+            batch = hits[len(scored):len(scored) + count]
+            batch_start = time.perf_counter()
+            scores = model.predict([(question, hit['text']) for hit in batch])
+            self._record(time.perf_counter() - batch_start, len(batch))
+            scored.extend(zip((float(score) for score in scores), batch))
+
+        self.last_scored = len(scored)
+        self.last_ms = (time.perf_counter() - start) * 1000
+        logger.debug(f"Reranked {self.last_scored}/{len(hits)} candidates in {self.last_ms:.0f} ms")
+
+        # sorted стабилен: при равных оценках сохраняется исходный порядок
+        ranked = [hit for _, hit in sorted(scored, key=lambda item: -item[0])]
+        return (ranked + hits[len(scored):])[:top_n]
@@ -0,0 +1,161 @@
+"""
+StructuredOutput - Разбор и проверка JSON-ответа LLM
+
+Ollama ограничивает генерацию JSON-схемой (format=schema), но ответ
+всё равно может быть обрезан по num_predict или обёрнут в ```json.
+Почти валидный ответ чинится локально, а промежуточные результаты
+анализа папки сохраняются, чтобы повтор не пересчитывал всё заново.
+"""
+from pathlib import Path
+from typing import Any, Dict, Optional
+import hashlib
+import json
+import re
+
+from .transcript_writer import write_atomic
+
+
+# Схема ответа Librarian (format для Ollama >= 0.5)
+ANALYSIS_SCHEMA: Dict[str, Any] = {
+    "type": "object",
+    "properties": {
+        "summary": {"type": "string"},
+        "category": {"type": "string"},
+        "tags": {"type": "array", "items": {"type": "string"}},
+        "valuable_comments": {"type": "array", "items": {"type": "string"}},
+    },
+    "required": ["summary", "category", "tags"],
+}
+
+# Промежуточные результаты анализа в папке контента
+PARTIAL_FILENAME = ".analysis.partial.json"
+
+_FENCE = re.compile(r'^```(?:json)?\s*|\s*```$', re.IGNORECASE)
+_TRAILING_COMMA = re.compile(r',\s*([}\]])')
+
+
+def _close_json(text: str) -> str:
+    """Закрывает незакрытые строку, массивы и объекты (ответ обрезан по num_predict)"""
+    stack = []
+    in_string = escaped = False
+    for char in text:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in '{[':
+            stack.append('}' if char == '{' else ']')
+        elif char in '}]' and stack:
+            stack.pop()
+
+    if in_string:
+        text += '"'
+    text = re.sub(r',\s*$', '', text.rstrip())
+    if text.endswith(':'):
+        text += ' null'
+    return text + "".join(reversed(stack))
+
+
+def parse_json_loose(text: str) -> Optional[Dict]:
+    """
+    Разбор почти валидного JSON
+
+    Снимает ```json-обёртку, отбрасывает текст вокруг объекта, лишние
+    запятые и закрывает обрезанный конец.
+
+    Returns:
+        Словарь или None
+    """
+    text = _FENCE.sub('', text.strip())
+    start = text.find('{')
+    if start < 0:
+        return None
+    text = text[start:]
+
+    end = text.rfind('}')
+    candidates = [text[:end + 1]] if end >= 0 else []
+    candidates.append(_close_json(text))
+
+    for candidate in candidates:
+        try:
+            data = json.loads(_TRAILING_COMMA.sub(r'\1', candidate))
+        except json.JSONDecodeError:
+            continue
+        if isinstance(data, dict):
+            return data
+    return None
+
+
+def normalize_analysis(data: Dict) -> Optional[Dict]:
+    """
+    Приводит ответ к схеме ANALYSIS_SCHEMA
+
+    Returns:
+        Словарь или None, если нет ни саммари, ни тегов
+    """
+    summary = data.get('summary')
+    if isinstance(summary, list):
+        summary = "\n".join(f"- {item}" for item in summary)
+
+    tags = data.get('tags') or []
+    if isinstance(tags, str):
+        tags = [tag for tag in re.split(r'[,\s]+', tags) if tag]
+
+    if not summary and not tags:
+        return None
+
+    result = dict(data)
+    result['summary'] = str(summary or "")
+    result['category'] = str(data.get('category') or "")
+    result['tags'] = [str(tag).lstrip('#') for tag in tags if tag]
+    result['valuable_comments'] = [str(c) for c in data.get('valuable_comments') or []]
+    return result
+
+
+def source_digest(*parts: str) -> str:
+    """Хэш входа анализа (промежуточные результаты от другого входа не используются)"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class AnalysisPartial:
+    """
+    Промежуточные результаты анализа одной папки
+
+    Хранит сжатую транскрипцию, сырой ответ модели и итог разбора.
+    Повторный запуск берёт готовое, а не повторяет запросы к LLM.
+    """
+
+    def __init__(self, path: Path, source: str) -> None:
+        """
+        Args:
+            path: Файл промежуточных результатов
+            source: source_digest() входа анализа
+        """
+        self.path = Path(path)
+        self.source = source
+        self.data: Dict[str, Any] = {}
+        try:
+            data = json.loads(self.path.read_text(encoding='utf-8'))
+            if data.get('source') == source:
+                self.data = data
+        except (OSError, ValueError):
+            pass
+
+    def get(self, key: str) -> Any:
+        return self.data.get(key)
+
+    def save(self, **values: Any) -> None:
+        self.data.update(values, source=self.source)
+        write_atomic(self.path, json.dumps(self.data, ensure_ascii=False))
+
+    def clear(self) -> None:
+        self.path.unlink(missing_ok=True)
@@ -0,0 +1,225 @@
+"""
+SubtitleTranscript - Транскрипция из субтитров платформы
+
+YouTube отдаёт ручные субтитры и автосубтитры (VTT/SRV3/SRT). Если есть
+дорожка на нужном языке, Whisper не нужен: субтитры конвертируются в
+те же секции [MM:SS] и чистый текст, что и транскрипция Whisper.
+"""
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+import html
+import re
+import xml.etree.ElementTree as ET
+
+from .local_ears import TimedSegment, TranscriptResult, build_transcript_result
+
+
+SUBTITLE_EXTENSIONS = ['.srv3', '.vtt', '.srt']  # В порядке предпочтения
+# Профиль транскрипции из субтитров (не улучшается через --upgrade)
+SUBTITLE_PROFILE = "subtitles"
+# Меньше слов - дорожка считается пустой (заглушка, только музыка)
+MIN_WORDS = 5
+
+_TIME_LINE = re.compile(r'([\d:.,]+)\s*-->\s*([\d:.,]+)')
+_TAG = re.compile(r'<[^>]+>')
+
+
+def _parse_time(value: str) -> float:
+    """'01:02:03.500', '02:03,500' или '03.5' -> секунды"""
+    seconds = 0.0
+    for part in value.replace(',', '.').split(':'):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def _clean_text(text: str) -> str:
+    """Убирает теги (<c>, <00:00:01.000>, <i>), HTML-сущности и лишние пробелы"""
+    return " ".join(html.unescape(_TAG.sub('', text)).split())
+
+
+def parse_cues(text: str) -> List[Tuple[float, float, List[str]]]:
+    """
+    Разбор VTT/SRT на реплики
+
+    Returns:
+        [(start, end, [строки текста])]
+    """
+    cues = []
+    # Только пустые строки разделяют реплики: строка из пробела в автосубтитрах YouTube - часть реплики
+    for block in re.split(r'\n{2,}', text.replace('\r\n', '\n')):
+        lines = block.strip().split('\n')
+        for i, line in enumerate(lines):
+            match = _TIME_LINE.search(line)
+            if match:
+                text_lines = [_clean_text(l) for l in lines[i + 1:]]
+                cues.append((
+                    _parse_time(match.group(1)),
+                    _parse_time(match.group(2)),
+                    [l for l in text_lines if l]
+                ))
+                break
+    return cues
+
+
+def parse_srv3(text: str) -> List[Tuple[float, float, List[str]]]:
+    """
+    Разбор YouTube SRV3 (timedtext format 3)
+
+    Returns:
+        [(start, end, [строки текста])]
+    """
+    cues = []
+    root = ET.fromstring(text)
+    for p in root.iter('p'):
+        start = int(p.get('t', 0)) / 1000
+        end = start + int(p.get('d', 0)) / 1000
+        lines = [_clean_text(line) for line in "".join(p.itertext()).split('\n')]
+        lines = [line for line in lines if line]
+        if lines:
+            cues.append((start, end, lines))
+    return cues
+
+
+def cues_to_segments(cues: List[Tuple[float, float, List[str]]]) -> List[TimedSegment]:
+    """
+    Склейка реплик в сегменты без повторов
+
+    Автосубтитры "катятся": каждая реплика повторяет предыдущую строку
+    и добавляет новую, либо дописывает слова к текущей. Повторённые
+    строки отбрасываются, дописанные - заменяют исходную.
+    """
+    segments: List[TimedSegment] = []
+    for start, end, lines in cues:
+        for line in lines:
+            last = segments[-1] if segments else None
+            if last is not None and line == last.text:
+                last.end = max(last.end, end)
+            elif last is not None and line.startswith(last.text + " "):
+                last.text = line
+                last.end = max(last.end, end)
+            elif len(segments) > 1 and line == segments[-2].text:
+                continue
+            else:
+                segments.append(TimedSegment(start, end, line))
+    return segments
+
+
+def subtitle_language(path: Path) -> str:
+    """Язык из имени файла yt-dlp: VIDEO_ID.ru.vtt -> ru"""
+    suffixes = path.suffixes
+    if len(suffixes) >= 2:
+        return suffixes[-2].lstrip('.').split('-')[0].lower()
+    return ""
+
+
+def select_subtitle_tracks(
+    metadata: Dict,
+    languages: Sequence[str] = ('ru', 'en')
+) -> Tuple[List[str], List[str]]:
+    """
+    Какие дорожки скачивать по метаданным yt-dlp (--dump-json)
+
+    Автосубтитры YouTube - распознавание на языке оригинала (дорожка
+    "xx-orig") плюс машинные переводы на все остальные языки. Перевод
+    транскрипцией не считается: автосубтитры берутся только на языке
+    оригинала (поле language или дорожка -orig). Ручные субтитры
+    предпочтительнее, на языке оригинала - если он среди languages.
+
+    Returns:
+        (языки ручных субтитров, языки автосубтитров); оба пустые - нужен Whisper
+    """
+    base = lambda lang: lang.split('-')[0].lower()
+    original = base(metadata.get('language') or '')
+
+    manual = [lang for lang in (metadata.get('subtitles') or {}) if base(lang) in languages]
+    if manual:
+        own = [lang for lang in manual if base(lang) == original]
+        return own or manual, []
+
+    automatic = metadata.get('automatic_captions') or {}
+    if not original:
+        # Без language язык оригинала виден только по дорожке -orig
+        origs = [lang for lang in automatic if lang.endswith('-orig')]
+        original = base(origs[0]) if origs else ''
+    if original not in languages:
+        return [], []
+    for lang in (f"{original}-orig", original):
+        if lang in automatic:
+            return [], [lang]
+    return [], []
+
+
+def find_subtitle_track(folder: Path, languages: Sequence[str] = ('ru', 'en')) -> Optional[Path]:
+    """
+    Лучшая дорожка субтитров в папке
+
+    Args:
+        folder: Папка контента
+        languages: Допустимые языки в порядке предпочтения
+
+    Returns:
+        Путь к файлу субтитров или None
+    """
+    tracks = [
+        f for f in folder.iterdir()
+        if f.is_file() and f.suffix.lower() in SUBTITLE_EXTENSIONS and subtitle_language(f) in languages
+    ]
+    if not tracks:
+        return None
+
+    return min(tracks, key=lambda f: (
+        languages.index(subtitle_language(f)),
+        # Ручные субтитры (VIDEO_ID.en.vtt) раньше распознанных (VIDEO_ID.en-orig.vtt)
+        '-orig.' in f.name,
+        SUBTITLE_EXTENSIONS.index(f.suffix.lower()),
+        f.name
+    ))
+
+
+def subtitles_to_transcript(path: Path) -> Optional[TranscriptResult]:
+    """
+    Конвертирует файл субтитров в TranscriptResult
+
+    Returns:
+        TranscriptResult или None, если субтитры пустые/битые
+    """
+    try:
+        text = path.read_text(encoding='utf-8', errors='replace')
+        cues = parse_srv3(text) if path.suffix.lower() == '.srv3' else parse_cues(text)
+    except (OSError, ET.ParseError, ValueError) as e:
+        print(f"   ⚠️  Не удалось разобрать субтитры {path.name}: {e}")
+        return None
+
+    segments = cues_to_segments(cues)
+    words = sum(len(segment.text.split()) for segment in segments)
+    if words < MIN_WORDS:
+        return None
+
+    return build_transcript_result(
+        segments,
+        language=subtitle_language(path) or "ru",
+        duration=max(segment.end for segment in segments),
+        profile=SUBTITLE_PROFILE
+    )
+
+
+def transcript_from_subtitles(
+    folder: Path,
+    languages: Sequence[str] = ('ru', 'en')
+) -> Optional[Tuple[TranscriptResult, Path]]:
+    """
+    Транскрипция из лучшей дорожки субтитров папки
+
+    Returns:
+        (TranscriptResult, путь к субтитрам) или None - тогда нужен Whisper
+    """
+    track = find_subtitle_track(folder, languages)
+    if track is None:
+        return None
+
+    transcript = subtitles_to_transcript(track)
+    if transcript is None:
+        print(f"   ⚠️  Субтитры {track.name} пустые, нужен Whisper")
+        return None
+
+    return transcript, track
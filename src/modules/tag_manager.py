@@ -3,7 +3,11 @@ TagManager - Управление базой тегов для консисте
 """
 import json
 from pathlib import Path
-from typing import List, Set
+from typing import List, Optional, Set, Tuple
+
+
+# Блок тегов в системном промпте обновляется раз в N новых тегов
+TAG_BLOCK_REFRESH = 20
 
 
 class TagManager:
@@ -29,6 +33,9 @@ class TagManager:
         
         self.tags_file = tags_file
         self.known_tags: Set[str] = set()
+        self.block_version = 0
+        self._block: Optional[str] = None
+        self._block_tags: Set[str] = set()
         self.load_tags()
     
     def load_tags(self) -> None:
@@ -67,6 +74,28 @@ class TagManager:
         """
         return ", ".join(sorted(self.known_tags))
     
+    def get_tags_block(self, refresh_every: int = TAG_BLOCK_REFRESH) -> Tuple[str, List[str]]:
+        """
+        Теги для промпта с кэшируемым префиксом
+        
+        Пока блок не обновлён, системный промпт не меняется и Ollama
+        переиспользует его KV-кэш. Теги, добавленные после обновления,
+        передаются отдельно в сообщении пользователя.
+        
+        Args:
+            refresh_every: Сколько новых тегов копить до обновления блока
+        
+        Returns:
+            (стабильный блок тегов, новые теги вне блока)
+        """
+        recent = sorted(self.known_tags - self._block_tags)
+        if self._block is None or len(recent) >= refresh_every:
+            self._block_tags = set(self.known_tags)
+            self._block = ", ".join(sorted(self._block_tags))
+            self.block_version += 1
+            recent = []
+        return self._block, recent
+    
     def add_tags(self, new_tags: List[str]) -> int:
         """
         Добавляет новые уникальные теги в базу
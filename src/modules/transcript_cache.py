@@ -0,0 +1,142 @@
+"""
+TranscriptCache - Кэш транскрипций по содержимому медиа
+
+Один и тот же рилс часто сохраняется несколько раз (повторная ссылка,
+репост, другое имя папки). Транскрипция хранится по хэшу медиафайла +
+модели + профилю в SQLite под DATA_DIR, поэтому дубликат стоит одного
+хэширования вместо минут Whisper.
+"""
+from contextlib import contextmanager
+from dataclasses import replace
+from pathlib import Path
+from typing import Callable, Iterator, Optional, Union
+import json
+import os
+import sqlite3
+import time
+import zlib
+
+from .decoding_profiles import PROFILES, get_profile
+from .local_ears import TimedSegment, TranscriptResult, build_transcript_result
+
+
+CACHE_FILENAME = "transcript_cache.sqlite3"
+
+
+def default_cache_path() -> Path:
+    """Путь к кэшу в DATA_DIR (как у src.config)"""
+    return Path(os.getenv('DATA_DIR', 'data')) / CACHE_FILENAME
+
+
+class TranscriptCache:
+    """
+    Таблица transcripts(media_hash, model, profile) -> сегменты
+
+    Сегменты хранятся сжатым JSON ([start, end, text]), соединение
+    открывается на каждую операцию: кэш безопасно делят процессы
+    module2 --workers и бот.
+    """
+
+    def __init__(self, path: Optional[Path] = None) -> None:
+        """
+        Args:
+            path: Файл SQLite (по умолчанию DATA_DIR/transcript_cache.sqlite3)
+        """
+        self.path = Path(path) if path else default_cache_path()
+        self._initialized = False
+
+    @contextmanager
+    def _session(self) -> Iterator[sqlite3.Connection]:
+        """Соединение с commit/rollback и закрытием"""
+        if not self._initialized:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                self._ensure_schema(conn)
+                yield conn
+        finally:
+            conn.close()
+
+    def _ensure_schema(self, conn: sqlite3.Connection) -> None:
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS transcripts (
+                    media_hash TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    profile TEXT NOT NULL,
+                    language TEXT NOT NULL,
+                    duration REAL NOT NULL,
+                    segments BLOB NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (media_hash, model, profile)
+                )
+                """
+            )
+            self._initialized = True
+
+    def get(
+        self,
+        media_hash: str,
+        model: Union[str, Callable[[str], str]],
+        min_profile: Optional[str] = None
+    ) -> Optional[TranscriptResult]:
+        """
+        Лучшая сохранённая транскрипция медиа для модели
+
+        Args:
+            media_hash: Хэш содержимого медиафайла
+            model: Размер модели Whisper или функция язык -> модель
+                   (маршрутизация по языку: язык известен только из записи)
+            min_profile: Минимально допустимый профиль (None - любой)
+
+        Returns:
+            TranscriptResult с моделью, которая его получила, или None
+        """
+        min_rank = get_profile(min_profile).rank if min_profile else -1
+        resolve = model if callable(model) else (lambda language: model)
+
+        with self._session() as conn:
+            rows = conn.execute(
+                "SELECT model, profile, language, duration, segments FROM transcripts "
+                "WHERE media_hash = ?",
+                (media_hash,)
+            ).fetchall()
+
+        # Профили вне PROFILES (например, субтитры) в кэш не пишутся
+        rows = [
+            row for row in rows
+            if row[0] == resolve(row[2]) and row[1] in PROFILES and PROFILES[row[1]].rank >= min_rank
+        ]
+        if not rows:
+            return None
+
+        model_size, profile, language, duration, blob = max(rows, key=lambda row: PROFILES[row[1]].rank)
+        segments = [TimedSegment(*item) for item in json.loads(zlib.decompress(blob))]
+        return replace(build_transcript_result(segments, language, duration, profile), model=model_size)
+
+    def put(self, media_hash: str, model: str, transcript: TranscriptResult) -> None:
+        """
+        Сохраняет транскрипцию
+
+        Args:
+            media_hash: Хэш содержимого медиафайла
+            model: Модель Whisper, которая транскрибировала (после маршрутизации по языку)
+            transcript: Результат с сегментами
+        """
+        if transcript.profile not in PROFILES:
+            return
+
+        blob = zlib.compress(json.dumps(
+            [[round(s.start, 3), round(s.end, 3), s.text] for s in transcript.segments],
+            ensure_ascii=False
+        ).encode('utf-8'))
+
+        with self._session() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO transcripts VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (media_hash, model, transcript.profile, transcript.language,
+                 transcript.duration, blob, time.time())
+            )
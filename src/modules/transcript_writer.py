@@ -0,0 +1,258 @@
+"""
+TranscriptWriter - Потоковая запись транскрипции с чекпоинтами
+
+Сегменты дописываются в transcript.partial.jsonl по мере появления.
+После падения транскрибация продолжается с последнего сегмента,
+а transcript.md появляется только после успешного завершения.
+"""
+from pathlib import Path
+from typing import Dict, List, Optional
+from datetime import datetime
+import json
+import os
+
+from .local_ears import TimedSegment
+
+
+PARTIAL_FILENAME = "transcript.partial.jsonl"
+TRANSCRIPT_FILENAME = "transcript.md"
+
+
+def write_atomic(path: Path, text: str) -> None:
+    """
+    Атомарная запись файла: временный файл + os.replace
+
+    Читатель (Модуль 3, бот) никогда не увидит недописанный transcript.md.
+    """
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+class TranscriptCheckpoint:
+    """
+    Чекпоинт транскрибации в формате JSON Lines
+
+    Строки файла:
+        {"type": "header", "media": "video.mp4", "size": 123, "profile": "fast"}
+        {"type": "segment", "start": 0.0, "end": 4.2, "text": "..."}
+        {"type": "done", "language": "ru", "duration": 61.0, "profile": "fast"}
+    """
+
+    # fsync каждые N сегментов (flush - на каждый)
+    FSYNC_EVERY = 20
+
+    def __init__(self, path: Path, media_path: Path) -> None:
+        """
+        Args:
+            path: Путь к transcript.partial.jsonl
+            media_path: Транскрибируемый файл (чекпоинт другого файла игнорируется)
+        """
+        self.path = Path(path)
+        self.media_path = Path(media_path)
+        self.segments: List[TimedSegment] = []
+        self.completed: Optional[Dict] = None
+        self.profile: Optional[str] = None  # Профиль декодирования, которым начата запись
+        self._file = None
+        self._unsynced = 0
+
+    @classmethod
+    def for_folder(cls, folder: Path, media_path: Path) -> "TranscriptCheckpoint":
+        """Чекпоинт в стандартном месте папки контента"""
+        return cls(Path(folder) / PARTIAL_FILENAME, media_path)
+
+    def _header(self) -> Dict:
+        header = {
+            'type': 'header',
+            'media': self.media_path.name,
+            'size': self.media_path.stat().st_size,
+        }
+        if self.profile:
+            header['profile'] = self.profile
+        return header
+
+    def load(self) -> List[TimedSegment]:
+        """
+        Читает сохранённые сегменты
+
+        Недописанная последняя строка (падение во время записи) отбрасывается,
+        чекпоинт от другого медиафайла удаляется.
+
+        Returns:
+            Список TimedSegment
+        """
+        self.segments = []
+        self.completed = None
+        self.profile = None
+
+        if not self.path.exists():
+            return self.segments
+
+        header = None
+        valid_bytes = 0
+        with open(self.path, 'rb') as f:
+            for raw_line in f:
+                if not raw_line.endswith(b"\n"):
+                    break
+                try:
+                    record = json.loads(raw_line)
+                except json.JSONDecodeError:
+                    break
+                valid_bytes += len(raw_line)
+
+                kind = record.get('type')
+                if kind == 'header':
+                    header = record
+                elif kind == 'segment':
+                    self.segments.append(TimedSegment(record['start'], record['end'], record['text']))
+                elif kind == 'done':
+                    self.completed = record
+
+        expected = self._header()
+        if header is None or header.get('media') != expected['media'] or header.get('size') != expected['size']:
+            print(f"   ♻️  Чекпоинт от другого файла, начинаем заново")
+            self.discard()
+            return self.segments
+        self.profile = header.get('profile')
+
+        # Обрезаем хвост, чтобы дописывать после последней целой строки
+        if valid_bytes < self.path.stat().st_size:
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_bytes)
+
+        return self.segments
+
+    @property
+    def resume_from(self) -> float:
+        """Время окончания последнего сохранённого сегмента"""
+        return self.segments[-1].end if self.segments else 0.0
+
+    def append(self, segment: TimedSegment) -> None:
+        """Дописывает сегмент в чекпоинт"""
+        self._write({'type': 'segment', 'start': segment.start, 'end': segment.end, 'text': segment.text})
+        self.segments.append(segment)
+
+    def mark_done(self, language: str, duration: float) -> None:
+        """Отмечает, что все сегменты записаны"""
+        self.completed = {'type': 'done', 'language': language, 'duration': duration}
+        if self.profile:
+            self.completed['profile'] = self.profile
+        self._write(self.completed)
+        self._sync()
+
+    def finalize(self, transcript_path: Path, markdown: str) -> Path:
+        """
+        Записывает transcript.md и удаляет чекпоинт
+
+        Returns:
+            Путь к transcript.md
+        """
+        self.close()
+        write_atomic(transcript_path, markdown)
+        self.path.unlink(missing_ok=True)
+        return transcript_path
+
+    def discard(self) -> None:
+        """Удаляет чекпоинт"""
+        self.close()
+        self.path.unlink(missing_ok=True)
+        self.segments = []
+        self.completed = None
+        self.profile = None
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._sync()
+            self._file.close()
+            self._file = None
+
+    def _write(self, record: Dict) -> None:
+        if self._file is None:
+            is_new = not self.path.exists() or self.path.stat().st_size == 0
+            self._file = open(self.path, 'a', encoding='utf-8')
+            if is_new:
+                self._file.write(json.dumps(self._header(), ensure_ascii=False) + "\n")
+
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self._unsynced += 1
+        if self._unsynced >= self.FSYNC_EVERY:
+            self._sync()
+
+    def _sync(self) -> None:
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+
+
+def render_transcript_markdown(transcript, media_file: Path, model_size: str) -> str:
+    """
+    Формирует transcript.md с YAML frontmatter
+
+    Args:
+        transcript: TranscriptResult
+        media_file: Исходный медиафайл
+        model_size: Модель Whisper
+
+    Returns:
+        Markdown текст
+    """
+    # Модель могла смениться по языку речи (language_models)
+    model_size = transcript.model or model_size
+
+    markdown = "---\n"
+    markdown += f"title: Транскрипция {media_file.stem}\n"
+    markdown += f"date: {datetime.now().strftime('%Y-%m-%d')}\n"
+    markdown += f"media_file: {media_file.name}\n"
+    markdown += f"whisper_model: {model_size}\n"
+    markdown += f"whisper_profile: {transcript.profile}\n"
+    markdown += f"language: {transcript.language}\n"
+    markdown += f"duration: {transcript.duration:.1f}\n"
+    markdown += f"type: transcript\n"
+    markdown += "---\n\n"
+
+    markdown += f"# Транскрипция\n\n"
+    markdown += f"**Файл**: `{media_file.name}`\n"
+    markdown += f"**Модель**: `{model_size}`\n"
+    markdown += f"**Профиль**: `{transcript.profile}`\n"
+    markdown += f"**Язык**: `{transcript.language}`\n"
+    markdown += f"**Длительность**: `{transcript.duration:.1f}` секунд\n\n"
+    markdown += "---\n\n"
+
+    # Добавляем транскрипт с таймингами
+    markdown += transcript.timed_transcript
+    markdown += "\n\n---\n\n"
+    markdown += "## Полный текст (без таймингов)\n\n"
+    markdown += transcript.full_text
+    markdown += "\n"
+
+    return markdown
+
+
+def read_transcript_profile(transcript_path: Path) -> Optional[str]:
+    """
+    Профиль декодирования из frontmatter transcript.md
+
+    Returns:
+        Имя профиля или None (транскрипция сделана до появления профилей)
+    """
+    try:
+        with open(transcript_path, 'r', encoding='utf-8') as f:
+            if f.readline().strip() != "---":
+                return None
+            for line in f:
+                line = line.strip()
+                if line == "---":
+                    break
+                if line.startswith("whisper_profile:"):
+                    return line.split(":", 1)[1].strip() or None
+    except OSError:
+        return None
+    return None
@@ -0,0 +1,363 @@
+"""
+VaultIndex - Инкрементальный индекс папок хранилища
+
+Модули 2 и 3 на каждом запуске обходили все папки и все файлы, чтобы
+понять, что ещё не обработано. Индекс хранит в SQLite (DATA_DIR) для
+каждой папки mtime и состояние этапов; при обновлении заново читаются
+только папки, чей mtime изменился (в них добавили/удалили/заменили
+файлы), а "что требует работы" - это запрос к таблице. Правка заметки
+на месте (Obsidian) mtime папки не меняет, поэтому у папок контента
+отдельно сверяется mtime их Markdown файлов.
+"""
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+import os
+import sqlite3
+import time
+
+
+INDEX_FILENAME = "vault_index.sqlite3"
+
+VIDEO_EXTENSIONS = ('.mp4', '.mov', '.avi', '.mkv', '.webm')
+AUDIO_EXTENSIONS = ('.mp3', '.m4a', '.wav', '.flac', '.ogg')
+MEDIA_EXTENSIONS = VIDEO_EXTENSIONS + AUDIO_EXTENSIONS
+
+# Служебные каталоги без контента (база векторов RAG)
+SKIP_DIRS = {'vector_db'}
+
+# Файлы папки контента, попадающие в RAG: флаг наличия -> имя
+CONTENT_FILES = {
+    'has_transcript': "transcript.md",
+    'has_description': "description.md",
+    'has_analysis': "Knowledge.md",
+}
+
+# Этапы, для которых индекс отвечает "что требует работы"
+TRANSCRIBE = "transcribe"
+ANALYZE = "analyze"
+INDEX = "index"
+
+_PENDING_WHERE = {
+    # Модуль 2: есть медиа, нет транскрипции
+    TRANSCRIBE: "has_media AND NOT has_transcript",
+    # Модуль 3 (should_process_folder): транскрипция готова или это фото/текст без медиа
+    ANALYZE: "NOT has_analysis AND (has_transcript OR (has_description AND NOT has_media))",
+    # Модуль 4: Knowledge.md есть, но папка не проиндексирована после изменения
+    INDEX: "has_analysis AND NOT indexed",
+}
+
+# Этап упал после всех попыток (skip_failed), а папка с тех пор не менялась
+_GAVE_UP = "failed_stage IS '{stage}' AND failed_mtime_ns IS mtime_ns AND failed_files_mtime_ns IS files_mtime_ns"
+_PENDING_WHERE = {
+    stage: f"({where}) AND NOT ({_GAVE_UP.format(stage=stage)})"
+    for stage, where in _PENDING_WHERE.items()
+}
+
+# Отметка об упавшем этапе (поля добавляются и в индекс прежней версии)
+_FAILED_COLUMNS = {
+    'failed_job': "INTEGER",
+    'failed_stage': "TEXT",
+    'failed_mtime_ns': "INTEGER",
+    'failed_files_mtime_ns': "INTEGER",
+}
+
+
+def default_index_path() -> Path:
+    """Путь к индексу в DATA_DIR (как у src.config)"""
+    return Path(os.getenv('DATA_DIR', 'data')) / INDEX_FILENAME
+
+
+def _scan_folder(path: Path) -> Tuple[Dict[str, int], List[Path]]:
+    """Один проход scandir: флаги содержимого папки и её подпапки"""
+    flags = {'has_media': 0, 'has_transcript': 0, 'has_description': 0, 'has_analysis': 0}
+    subfolders = []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.name.startswith('.'):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name not in SKIP_DIRS:
+                    subfolders.append(Path(entry.path))
+            elif entry.name == "transcript.md":
+                flags['has_transcript'] = 1
+            elif entry.name == "description.md":
+                flags['has_description'] = 1
+            elif entry.name == "Knowledge.md":
+                flags['has_analysis'] = 1
+            elif os.path.splitext(entry.name)[1].lower() in MEDIA_EXTENSIONS:
+                flags['has_media'] = 1
+    return flags, subfolders
+
+
+def _files_mtime(path: Path, flags: Dict[str, int]) -> int:
+    """Последний mtime Markdown файлов папки (по stat на каждый имеющийся файл)"""
+    latest = 0
+    for flag, name in CONTENT_FILES.items():
+        if flags[flag]:
+            try:
+                latest = max(latest, (path / name).stat().st_mtime_ns)
+            except OSError:
+                pass
+    return latest
+
+
+class VaultIndex:
+    """
+    Таблица folders(path) -> mtime, родитель, состояние этапов
+
+    Пути хранятся абсолютными, поэтому один файл индекса обслуживает
+    несколько корней (downloads разных пользователей).
+    """
+
+    def __init__(self, root: Path, path: Optional[Path] = None) -> None:
+        """
+        Args:
+            root: Корень хранилища (downloads)
+            path: Файл SQLite (по умолчанию DATA_DIR/vault_index.sqlite3)
+        """
+        self.root = Path(root).resolve()
+        self.path = Path(path) if path else default_index_path()
+        self._initialized = False
+
+    @contextmanager
+    def _session(self) -> Iterator[sqlite3.Connection]:
+        """Соединение с commit/rollback и закрытием"""
+        if not self._initialized:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            with conn:
+                self._ensure_schema(conn)
+                yield conn
+        finally:
+            conn.close()
+
+    def _ensure_schema(self, conn: sqlite3.Connection) -> None:
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS folders (
+                    path TEXT PRIMARY KEY,
+                    parent TEXT,
+                    mtime_ns INTEGER NOT NULL,
+                    files_mtime_ns INTEGER NOT NULL DEFAULT 0,
+                    has_media INTEGER NOT NULL DEFAULT 0,
+                    has_transcript INTEGER NOT NULL DEFAULT 0,
+                    has_description INTEGER NOT NULL DEFAULT 0,
+                    has_analysis INTEGER NOT NULL DEFAULT 0,
+                    indexed INTEGER NOT NULL DEFAULT 0,
+                    scanned_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS folders_parent ON folders (parent);
+                """
+            )
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(folders)")}
+            if 'files_mtime_ns' not in columns:
+                # Индекс прежней версии: -1 - mtime файлов ещё не записан (см. refresh)
+                conn.execute("ALTER TABLE folders ADD COLUMN files_mtime_ns INTEGER NOT NULL DEFAULT -1")
+            for column, kind in _FAILED_COLUMNS.items():
+                if column not in columns:
+                    conn.execute(f"ALTER TABLE folders ADD COLUMN {column} {kind}")
+            self._initialized = True
+
+    @property
+    def _under_root(self) -> Tuple[str, str]:
+        """Границы диапазона путей внутри корня (LIKE не подходит: '_' в именах папок)"""
+        prefix = str(self.root) + os.sep
+        return prefix, prefix[:-1] + chr(ord(os.sep) + 1)
+
+    def _known(
+        self,
+        conn: sqlite3.Connection
+    ) -> Tuple[Dict[str, Tuple[int, int, Dict[str, int]]], Dict[str, List[str]]]:
+        """mtime папки, mtime её файлов, флаги файлов и подпапки всех известных папок под корнем"""
+        known: Dict[str, Tuple[int, int, Dict[str, int]]] = {}
+        children: Dict[str, List[str]] = {}
+        rows = conn.execute(
+            "SELECT path, parent, mtime_ns, files_mtime_ns, has_transcript, has_description, has_analysis "
+            "FROM folders WHERE path = ? OR (path >= ? AND path < ?)",
+            (str(self.root), *self._under_root)
+        )
+        for path, parent, mtime_ns, files_mtime_ns, *flags in rows:
+            known[path] = (mtime_ns, files_mtime_ns, dict(zip(CONTENT_FILES, flags)))
+            if parent is not None:
+                children.setdefault(parent, []).append(path)
+        return known, children
+
+    @staticmethod
+    def _is_content(flags: Dict[str, int]) -> bool:
+        """Папка контента: внутрь не спускаемся (как process_folder модулей 2 и 3)"""
+        return any(flags[key] for key in ('has_media', 'has_transcript', 'has_description', 'has_analysis'))
+
+    def refresh(self) -> int:
+        """
+        Синхронизирует индекс с диском
+
+        Каждая известная папка проверяется одним stat(), у папки контента -
+        ещё по stat() на transcript.md, description.md и Knowledge.md;
+        читается (scandir) только папка с новым mtime. Изменённые на месте
+        файлы снимают отметку RAG. Удалённые папки убираются из индекса.
+
+        Returns:
+            Сколько папок перечитано
+        """
+        rescanned = 0
+        with self._session() as conn:
+            known, children = self._known(conn)
+            seen = set()
+            stack = [(self.root, None)]
+
+            while stack:
+                folder, parent = stack.pop()
+                key = str(folder)
+                try:
+                    mtime_ns = folder.stat().st_mtime_ns
+                except OSError:
+                    continue
+                seen.add(key)
+
+                if key in known and known[key][0] == mtime_ns:
+                    _, files_mtime_ns, file_flags = known[key]
+                    files_now = _files_mtime(folder, file_flags)
+                    if files_now != files_mtime_ns:
+                        # После обновления индекса (-1) отметка RAG сохраняется
+                        conn.execute(
+                            "UPDATE folders SET files_mtime_ns = ?, "
+                            "indexed = CASE WHEN files_mtime_ns = -1 THEN indexed ELSE 0 END WHERE path = ?",
+                            (files_now, key)
+                        )
+                    stack.extend((Path(child), key) for child in children.get(key, ()))
+                    continue
+
+                try:
+                    flags, subfolders = _scan_folder(folder)
+                except OSError:
+                    continue
+                rescanned += 1
+                # Содержимое изменилось - папку нужно переиндексировать в RAG
+                conn.execute(
+                    "INSERT INTO folders (path, parent, mtime_ns, files_mtime_ns, has_media, "
+                    "has_transcript, has_description, has_analysis, indexed, scanned_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0, ?) "
+                    # Отметка об упавшем этапе переживает перечитывание (см. skip_failed)
+                    "ON CONFLICT (path) DO UPDATE SET parent = excluded.parent, mtime_ns = excluded.mtime_ns, "
+                    "files_mtime_ns = excluded.files_mtime_ns, has_media = excluded.has_media, "
+                    "has_transcript = excluded.has_transcript, has_description = excluded.has_description, "
+                    "has_analysis = excluded.has_analysis, indexed = 0, scanned_at = excluded.scanned_at",
+                    (key, parent, mtime_ns, _files_mtime(folder, flags), flags['has_media'],
+                     flags['has_transcript'], flags['has_description'], flags['has_analysis'], time.time())
+                )
+                if folder != self.root and self._is_content(flags):
+                    subfolders = []
+                stack.extend((sub, key) for sub in subfolders)
+
+            removed = [(path,) for path in known if path not in seen]
+            conn.executemany("DELETE FROM folders WHERE path = ?", removed)
+
+        return rescanned
+
+    def update_folder(self, folder: Path) -> None:
+        """Перечитывает одну папку после её обработки (следующий refresh её не тронет)"""
+        folder = Path(folder).resolve()
+        try:
+            mtime_ns = folder.stat().st_mtime_ns
+            flags, _ = _scan_folder(folder)
+        except OSError:
+            return
+        files_mtime_ns = _files_mtime(folder, flags)
+        with self._session() as conn:
+            cursor = conn.execute(
+                "UPDATE folders SET indexed = CASE WHEN mtime_ns = ? AND files_mtime_ns = ? "
+                "THEN indexed ELSE 0 END, mtime_ns = ?, files_mtime_ns = ?, has_media = ?, "
+                "has_transcript = ?, has_description = ?, has_analysis = ?, scanned_at = ? WHERE path = ?",
+                (mtime_ns, files_mtime_ns, mtime_ns, files_mtime_ns, flags['has_media'], flags['has_transcript'],
+                 flags['has_description'], flags['has_analysis'], time.time(), str(folder))
+            )
+            if cursor.rowcount == 0:
+                conn.execute(
+                    "INSERT INTO folders (path, parent, mtime_ns, files_mtime_ns, has_media, has_transcript, "
+                    "has_description, has_analysis, scanned_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (str(folder), str(folder.parent), mtime_ns, files_mtime_ns, flags['has_media'],
+                     flags['has_transcript'], flags['has_description'], flags['has_analysis'], time.time())
+                )
+
+    def mark_indexed(self, folder: Path) -> None:
+        """Отмечает папку проиндексированной в RAG"""
+        with self._session() as conn:
+            conn.execute("UPDATE folders SET indexed = 1 WHERE path = ?", (str(Path(folder).resolve()),))
+
+    def skip_failed(self, folder: Path, stage: str, job_id: int) -> bool:
+        """
+        Решение по папке, чья последняя задача этапа упала после всех попыток
+
+        Первое обращение по задаче job_id запоминает её вместе с текущим
+        mtime папки и её файлов: пока они те же, этап не запускается
+        (pending и next_stage папку не отдают). Изменение папки - повод
+        попробовать снова.
+
+        Returns:
+            True - пропустить папку
+        """
+        key = str(Path(folder).resolve())
+        with self._session() as conn:
+            row = conn.execute(
+                "SELECT failed_job, failed_stage, failed_mtime_ns, failed_files_mtime_ns, mtime_ns, files_mtime_ns "
+                "FROM folders WHERE path = ?",
+                (key,)
+            ).fetchone()
+            if row is None:
+                return False
+            failed_job, failed_stage, failed_mtime_ns, failed_files_mtime_ns, mtime_ns, files_mtime_ns = row
+            if failed_job == job_id and failed_stage == stage:
+                return (failed_mtime_ns, failed_files_mtime_ns) == (mtime_ns, files_mtime_ns)
+            conn.execute(
+                "UPDATE folders SET failed_job = ?, failed_stage = ?, failed_mtime_ns = mtime_ns, "
+                "failed_files_mtime_ns = files_mtime_ns WHERE path = ?",
+                (job_id, stage, key)
+            )
+        return True
+
+    def next_stage(self, folder: Path) -> Optional[str]:
+        """
+        Следующий этап для папки по последнему сканированию
+
+        Returns:
+            TRANSCRIBE, ANALYZE, INDEX или None (папка обработана или не контент)
+        """
+        cases = " ".join(f"WHEN {where} THEN '{stage}'" for stage, where in _PENDING_WHERE.items())
+        with self._session() as conn:
+            row = conn.execute(
+                f"SELECT CASE {cases} END FROM folders WHERE path = ?",
+                (str(Path(folder).resolve()),)
+            ).fetchone()
+        return row[0] if row else None
+
+    def pending(self, stage: str) -> List[Path]:
+        """
+        Папки, которым нужен этап stage (TRANSCRIBE, ANALYZE, INDEX)
+
+        Raises:
+            ValueError: Неизвестный этап
+        """
+        if stage not in _PENDING_WHERE:
+            raise ValueError(f"Неизвестный этап: {stage} (доступны: {', '.join(_PENDING_WHERE)})")
+
+        with self._session() as conn:
+            rows = conn.execute(
+                f"SELECT path FROM folders WHERE path >= ? AND path < ? AND {_PENDING_WHERE[stage]} ORDER BY path",
+                self._under_root
+            ).fetchall()
+        return [Path(row[0]) for row in rows]
+
+    def counts(self) -> Dict[str, int]:
+        """Сколько папок ждёт каждого этапа"""
+        with self._session() as conn:
+            return {
+                stage: conn.execute(
+                    f"SELECT COUNT(*) FROM folders WHERE path >= ? AND path < ? AND {where}",
+                    self._under_root
+                ).fetchone()[0]
+                for stage, where in _PENDING_WHERE.items()
+            }
@@ -0,0 +1,223 @@
+"""
+WhisperModelPool - Общий для процесса реестр моделей faster-whisper
+
+Загрузка модели Whisper стоит дороже транскрибации короткого рилса,
+поэтому бот, module2 и пайплайн берут модель из одного пула, а не
+держат собственные копии.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+import os
+import threading
+import time
+
+
+@dataclass(frozen=True)
+class ModelKey:
+    """Ключ модели в пуле"""
+    model_size: str
+    compute_type: str
+    device: str
+    cpu_threads: int
+    num_workers: int = 1  # >1 - параллельные transcribe() из разных потоков
+
+
+@dataclass
+class PoolEntry:
+    """Загруженная модель и её счётчики"""
+    model: Any
+    refcount: int = 0
+    loaded_at: float = field(default_factory=time.time)
+    last_used: float = field(default_factory=time.time)
+    hits: int = 0
+
+
+def _load_whisper_model(key: ModelKey) -> Any:
+    """Загрузка модели faster-whisper с диска"""
+    try:
+        from faster_whisper import WhisperModel
+    except ImportError:
+        raise ImportError(
+            "Библиотека faster-whisper не установлена. "
+            "Установите: pip install faster-whisper"
+        )
+
+    return WhisperModel(
+        key.model_size,
+        device=key.device,
+        compute_type=key.compute_type,
+        cpu_threads=key.cpu_threads,
+        num_workers=key.num_workers
+    )
+
+
+def _warm_up_model(model: Any) -> None:
+    """Прогон секунды тишины, чтобы инициализировать CTranslate2 заранее"""
+    try:
+        import numpy as np
+
+        segments, _ = model.transcribe(np.zeros(16000, dtype=np.float32), beam_size=1)
+        for _ in segments:
+            pass
+    except Exception as e:
+        print(f"   ⚠️  Прогрев Whisper не удался: {e}")
+
+
+class WhisperModelPool:
+    """
+    Реестр моделей Whisper с ленивой загрузкой и вытеснением
+
+    - acquire()/release() ведут счётчик ссылок
+    - модели без ссылок выгружаются после idle_ttl секунд простоя
+    - одновременный acquire одного ключа грузит модель один раз
+    """
+
+    def __init__(
+        self,
+        idle_ttl: float = 600.0,
+        loader: Optional[Callable[[ModelKey], Any]] = None,
+        warm_up: bool = True
+    ) -> None:
+        """
+        Args:
+            idle_ttl: Секунды простоя до выгрузки модели (0 - не выгружать)
+            loader: Функция загрузки модели (для тестов)
+            warm_up: Прогревать модель сразу после загрузки
+        """
+        self.idle_ttl = idle_ttl
+        self.loader = loader or _load_whisper_model
+        self.warm_up = warm_up
+
+        self._entries: Dict[ModelKey, PoolEntry] = {}
+        self._lock = threading.Lock()
+        self._key_locks: Dict[ModelKey, threading.Lock] = {}
+        self._reaper: Optional[threading.Thread] = None
+
+    def acquire(self, key: ModelKey) -> Any:
+        """
+        Возвращает модель для ключа, загружая её при необходимости
+
+        Каждый acquire() должен завершаться release() с тем же ключом.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.refcount += 1
+                entry.hits += 1
+                entry.last_used = time.time()
+                return entry.model
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # Загрузка вне общего замка: другие ключи не ждут
+        with key_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    entry.refcount += 1
+                    entry.hits += 1
+                    entry.last_used = time.time()
+                    return entry.model
+
+            print(f"🔄 Загрузка Whisper модели ({key.model_size}, {key.compute_type})...")
+            print(f"   ⏳ Это может занять некоторое время при первом запуске...")
+            model = self.loader(key)
+            if self.warm_up:
+                _warm_up_model(model)
+            print("   ✅ Модель Whisper готова")
+
+            with self._lock:
+                self._entries[key] = PoolEntry(model=model, refcount=1)
+
+        self._ensure_reaper()
+        return model
+
+    def release(self, key: ModelKey) -> None:
+        """Освобождает ссылку на модель"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry.refcount = max(0, entry.refcount - 1)
+            entry.last_used = time.time()
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """
+        Выгружает модели без ссылок, простаивающие дольше idle_ttl
+
+        Returns:
+            Количество выгруженных моделей
+        """
+        if self.idle_ttl <= 0:
+            return 0
+
+        now = now if now is not None else time.time()
+        with self._lock:
+            stale = [
+                key for key, entry in self._entries.items()
+                if entry.refcount == 0 and now - entry.last_used >= self.idle_ttl
+            ]
+            for key in stale:
+                del self._entries[key]
+                self._key_locks.pop(key, None)
+
+        for key in stale:
+            print(f"♻️  Whisper модель выгружена после простоя: {key.model_size}")
+        return len(stale)
+
+    def clear(self) -> None:
+        """Выгружает все модели (без учёта ссылок)"""
+        with self._lock:
+            self._entries.clear()
+            self._key_locks.clear()
+
+    def stats(self) -> List[Dict]:
+        """Состояние пула для логов и /check"""
+        with self._lock:
+            return [
+                {
+                    'model_size': key.model_size,
+                    'compute_type': key.compute_type,
+                    'device': key.device,
+                    'cpu_threads': key.cpu_threads,
+                    'num_workers': key.num_workers,
+                    'refcount': entry.refcount,
+                    'hits': entry.hits,
+                    'idle': round(time.time() - entry.last_used, 1),
+                }
+                for key, entry in self._entries.items()
+            ]
+
+    def _ensure_reaper(self) -> None:
+        """Запускает фоновый поток вытеснения (один на пул)"""
+        if self.idle_ttl <= 0:
+            return
+        with self._lock:
+            if self._reaper is not None and self._reaper.is_alive():
+                return
+            self._reaper = threading.Thread(
+                target=self._reap_loop,
+                name="whisper-pool-reaper",
+                daemon=True
+            )
+            self._reaper.start()
+
+    def _reap_loop(self) -> None:
+        interval = max(1.0, min(self.idle_ttl / 2, 60.0))
+        while True:
+            time.sleep(interval)
+            self.evict_idle()
+            with self._lock:
+                if not self._entries:
+                    self._reaper = None
+                    return
+
+
+def _default_idle_ttl() -> float:
+    try:
+        return float(os.getenv('WHISPER_POOL_IDLE_TTL', '600'))
+    except ValueError:
+        return 600.0
+
+
+# Global instance
+model_pool = WhisperModelPool(idle_ttl=_default_idle_ttl())
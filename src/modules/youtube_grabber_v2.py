@@ -3,7 +3,7 @@ Production-Ready YouTube Grabber v2
 Применены лучшие практики из youtube-dl и Hitomi-Downloader
 """
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Sequence
 from dataclasses import dataclass
 import subprocess
 import json
@@ -14,6 +14,8 @@ from functools import wraps
 from threading import Lock
 import hashlib
 
+from .subtitle_transcript import select_subtitle_tracks
+
 
 # ============================================================================
 # DECORATORS (взято из Hitomi-Downloader)
@@ -490,6 +492,62 @@ class ProductionYouTubeGrabber:
                 self.cookie_manager.mark_usage(cookie_file, success=False)
             raise
     
+    @rate_limit(calls=1, period=3.0)
+    def download_subtitles(
+        self,
+        url: str,
+        output_dir: Optional[Path] = None,
+        languages: Sequence[str] = ('ru', 'en'),
+        metadata: Optional[Dict] = None
+    ) -> List[Path]:
+        """
+        Скачивает субтитры без видео: ручные или автосубтитры на языке оригинала
+        
+        Машинные переводы автосубтитров не скачиваются (см. select_subtitle_tracks):
+        без подходящей дорожки транскрипцию делает Whisper.
+        
+        Args:
+            url: YouTube URL
+            output_dir: Директория для сохранения (если None, используется self.output_dir)
+            languages: Языки субтитров
+            metadata: Метаданные get_metadata (если None, запрашиваются)
+        
+        Returns:
+            Список файлов субтитров (VIDEO_ID.<lang>.<ext>, автосубтитры - VIDEO_ID.<lang>-orig.<ext>)
+        """
+        target_dir = output_dir if output_dir else self.output_dir
+        
+        video_id_match = re.search(r'(?:youtube\.com/(?:watch\?v=|shorts/)|youtu\.be/)([a-zA-Z0-9_-]{11})', url)
+        if not video_id_match:
+            return []
+        
+        video_id = video_id_match.group(1)
+        if metadata is None:
+            metadata = self.get_metadata(url) or {}
+        manual, automatic = select_subtitle_tracks(metadata, languages)
+        
+        for flag, langs in (('--write-subs', manual), ('--write-auto-subs', automatic)):
+            if not langs:
+                continue
+            cmd = self._build_command(url, [
+                '--skip-download',
+                flag,
+                '--sub-langs', ','.join(langs),
+                '--sub-format', 'srv3/vtt/srt/best',
+                '-o', str(target_dir / f"{video_id}.%(ext)s"),
+            ])
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=120)
+            if result.returncode != 0:
+                print(f"⚠️  Субтитры недоступны: {result.stderr[:200]}")
+        
+        if not manual and not automatic:
+            print(f"ℹ️  Нет субтитров на языке оригинала ({metadata.get('language') or '?'}), нужен Whisper")
+        
+        return sorted(
+            f for f in target_dir.glob(f"{video_id}.*")
+            if f.suffix.lower() in ('.srv3', '.vtt', '.srt')
+        )
+    
     def get_comments(
         self,
         url: str,
@@ -108,7 +108,7 @@ class YouTubeVideoDownloader(BaseDownloader):
         print_progress(f"✅ Видео скачано: {video_path.name}", "")
         
         # Скачиваем субтитры если есть
-        subtitles = self._download_subtitles(url, folder_path, video_id)
+        subtitles = self._download_subtitles(url, folder_path, video_id, metadata)
         if subtitles:
             print_progress(f"📝 Субтитры: {len(subtitles)} языков", "")
         
@@ -151,7 +151,8 @@ class YouTubeVideoDownloader(BaseDownloader):
         self, 
         url: str, 
         folder_path: Path, 
-        video_id: str
+        video_id: str,
+        metadata: Optional[Dict] = None
     ) -> List[Path]:
         """
         Скачивает субтитры
@@ -160,6 +161,7 @@ class YouTubeVideoDownloader(BaseDownloader):
             url: URL видео
             folder_path: Папка для сохранения
             video_id: ID видео
+            metadata: Метаданные видео (по ним выбираются дорожки)
             
         Returns:
             Список файлов субтитров
@@ -167,7 +169,8 @@ class YouTubeVideoDownloader(BaseDownloader):
         try:
             subtitle_paths = self.grabber.download_subtitles(
                 url=url,
-                output_dir=folder_path
+                output_dir=folder_path,
+                metadata=metadata
             )
             return subtitle_paths
         except Exception as e:
@@ -116,13 +116,14 @@ def find_unprocessed_folders(inbox_dir: Path) -> List[Path]:
     
     for folder in inbox_dir.iterdir():
         if folder.is_dir():
-            note_file = folder / "Knowledge.md"
-            if not note_file.exists():
+            # Один проход по папке вместо stat() каждого файла и повторного iterdir()
+            names = {f.name for f in folder.iterdir()}
+            if "Knowledge.md" not in names:
                 # Проверяем, что есть хотя бы один из файлов данных
                 has_data = (
-                    (folder / "caption.md").exists() or
-                    (folder / "transcript.md").exists() or
-                    any(f.suffix.lower() in ['.jpg', '.jpeg', '.png', '.mp4'] for f in folder.iterdir())
+                    "caption.md" in names or
+                    "transcript.md" in names or
+                    any(Path(name).suffix.lower() in ['.jpg', '.jpeg', '.png', '.mp4'] for name in names)
                 )
                 if has_data:
                     unprocessed.append(folder)
@@ -283,7 +284,7 @@ def process_folder(folder: Path, config: Config, brain: LocalBrain, tag_manager:
                         current_comment = ""
             
             # Получаем known_tags
-            known_tags_str = ", ".join(sorted(tag_manager.known_tags))
+            known_tags_str, recent_tags = tag_manager.get_tags_block()
             
             # Извлекаем автора из метаданных
             metadata = extract_metadata_from_folder(folder)
@@ -295,7 +296,8 @@ def process_folder(folder: Path, config: Config, brain: LocalBrain, tag_manager:
                 transcript=transcript,
                 comments=comments_list,
                 author=author,
-                known_tags=known_tags_str
+                known_tags=known_tags_str,
+                recent_tags=recent_tags
             )
             
             if not ai_result:
@@ -0,0 +1,30 @@
+from src.modules.answer_cache import AnswerCache, LRUCache, normalize_question
+
+
+def test_normalize_question():
+    assert normalize_question("  Что   такое Ёлка?! ") == "что такое елка"
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(maxsize=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert len(cache) == 2
+
+
+def test_answer_cache_matches_near_identical_questions():
+    cache = AnswerCache(similarity=0.95)
+    cache.put('Как настроить docker?', [1.0, 0.0, 0.1], (), 1, {'answer': 'a'})
+
+    assert cache.get('как настроить docker', [0.0, 1.0, 0.0], (), 1) == {'answer': 'a'}
+    assert cache.get('Как поднять docker?', [1.0, 0.0, 0.12], (), 1) == {'answer': 'a'}
+    assert cache.get('Как поднять docker?', [1.0, 0.0, 0.12], ('summary',), 1) is None
+    assert cache.get('Как поднять docker?', [1.0, 0.0, 0.12], (), 2) is None
+    assert cache.get('Что такое kubernetes?', [0.0, 1.0, 0.0], (), 1) is None
+
+    expired = AnswerCache(ttl=-1)
+    expired.put('q', [1.0], (), 1, {'answer': 'a'})
+    assert expired.get('q', [1.0], (), 1) is None
@@ -0,0 +1,142 @@
+"""
+Unit Tests for AudioPrep
+========================
+
+Тесты предобработки аудио: кэш PCM, нарезка по тишине, склейка таймкодов.
+"""
+import subprocess
+from unittest.mock import MagicMock
+
+import numpy as np
+
+from modules import audio_prep
+from modules.audio_prep import (
+    SAMPLE_RATE,
+    as_float32,
+    group_speech,
+    load_pcm,
+    media_hash,
+    merge_block_spans,
+    prepare_audio,
+)
+from modules.local_ears import LocalEars
+
+
+class TestAudioPrep:
+    """Тесты для audio_prep"""
+
+    def test_group_speech_cuts_in_pauses(self):
+        """Границы кусков ставятся посередине пауз"""
+        spans = [(0, 50), (60, 110), (120, 170), (180, 230)]
+        chunks = group_speech(spans, total_samples=240, target_samples=100)
+
+        assert chunks == [(0, 115), (115, 240)]
+
+    def test_merge_block_spans_joins_speech_cut_by_block(self):
+        """Речь, разрезанная границей блока VAD, склеивается; настоящая пауза остаётся"""
+        spans = [(10, 100), (100, 150), (170, 190), (260, 300)]
+        merged = merge_block_spans(spans, block_samples=100, min_silence=50)
+
+        assert merged == [(10, 150), (170, 190), (260, 300)]
+
+    def test_group_speech_without_speech(self):
+        """Без речи - один кусок на всё аудио"""
+        assert group_speech([], total_samples=100, target_samples=10) == [(0, 100)]
+
+    def test_prepare_audio_uses_cache(self, tmp_path, monkeypatch):
+        """Повторная подготовка читает PCM кэш без ffmpeg"""
+        media = tmp_path / "video.mp4"
+        media.write_bytes(b"fake video")
+        samples = (np.arange(SAMPLE_RATE, dtype=np.int16) % 100)
+
+        def fake_run(cmd, **kwargs):
+            samples.tofile(cmd[-1])
+            return subprocess.CompletedProcess(cmd, 0, "", "")
+
+        run = MagicMock(side_effect=fake_run)
+        monkeypatch.setattr(audio_prep.subprocess, 'run', run)
+
+        first = prepare_audio(media)
+        second = prepare_audio(media)
+
+        assert run.call_count == 1
+        assert first.path == second.path
+        assert first.path.name.startswith(".audio_")
+        assert first.media_hash == media_hash(media)
+        assert first.duration == 1.0
+        assert load_pcm(first.path).dtype == np.int16
+        assert np.allclose(as_float32(load_pcm(first.path)), samples / 32768.0)
+
+    def test_cache_eviction_is_per_media(self, tmp_path, monkeypatch):
+        """Новая версия медиа вытесняет свой старый кэш, но не кэш соседнего файла"""
+        video = tmp_path / "video.mp4"
+        voice = tmp_path / "voice.m4a"
+        video.write_bytes(b"old video")
+        voice.write_bytes(b"voice")
+
+        def fake_run(cmd, **kwargs):
+            np.zeros(10, dtype=np.int16).tofile(cmd[-1])
+            return subprocess.CompletedProcess(cmd, 0, "", "")
+
+        monkeypatch.setattr(audio_prep.subprocess, 'run', MagicMock(side_effect=fake_run))
+
+        old = prepare_audio(video)
+        other = prepare_audio(voice)
+        video.write_bytes(b"new video")
+        new = prepare_audio(video)
+
+        assert not old.path.exists()
+        assert other.path.exists() and new.path.exists()
+
+        new.discard()
+        assert not new.path.exists()
+
+    def test_prepare_audio_without_ffmpeg(self, tmp_path, monkeypatch):
+        """Без ffmpeg предобработка отключается, а не падает"""
+        media = tmp_path / "video.mp4"
+        media.write_bytes(b"fake video")
+        monkeypatch.setattr(audio_prep.subprocess, 'run', MagicMock(side_effect=FileNotFoundError))
+
+        assert prepare_audio(media) is None
+
+    def test_chunked_transcription_offsets(self):
+        """Куски транскрибируются отдельно, таймкоды сдвигаются на начало куска"""
+        ears = LocalEars(chunk_workers=2)
+
+        def fake_transcribe(audio, **kwargs):
+            segment = MagicMock(start=1.0, end=2.0, text=f" кусок {len(audio)}")
+            info = MagicMock(language="ru", duration=len(audio) / SAMPLE_RATE)
+            return [segment], info
+
+        ears.model = MagicMock()
+        ears.model.transcribe.side_effect = fake_transcribe
+        audio = np.zeros(SAMPLE_RATE * 90, dtype=np.float32)
+
+        meta = {}
+        chunks = [(0, SAMPLE_RATE * 60), (SAMPLE_RATE * 60, SAMPLE_RATE * 90)]
+        segments = list(ears._iter_chunk_segments(audio, chunks, 0.0, meta))
+
+        assert [s.start for s in segments] == [1.0, 61.0]
+        assert ears._format_timestamp(segments[1].start) == "01:01"
+        assert meta['language'] == "ru"
+        assert ears.model_key.num_workers == 2
+        assert ears.model_key.cpu_threads == 8
+
+    def test_chunks_are_converted_one_at_a_time(self):
+        """В Whisper идут float32 куски, весь int16 PCM в float32 не переводится"""
+        ears = LocalEars(chunk_workers=2)
+        seen = []
+
+        def fake_transcribe(audio, **kwargs):
+            seen.append((audio.dtype, len(audio)))
+            info = MagicMock(language="ru", duration=len(audio) / SAMPLE_RATE)
+            return [], info
+
+        ears.model = MagicMock()
+        ears.model.transcribe.side_effect = fake_transcribe
+        audio = np.zeros(SAMPLE_RATE * 90, dtype=np.int16)
+
+        chunks = [(0, SAMPLE_RATE * 60), (SAMPLE_RATE * 60, SAMPLE_RATE * 90)]
+        list(ears._iter_chunk_segments(audio, chunks, 0.0, {}))
+
+        assert sorted(seen) == [(np.float32, SAMPLE_RATE * 30), (np.float32, SAMPLE_RATE * 60)]
@@ -0,0 +1,162 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from src.modules.compact_store import BINARY, INT8, CompactClient, CompactCollection, quantize_int8, unit_rows
+
+
+def _vectors(n, dim=64, seed=0):
+    return unit_rows(np.random.default_rng(seed).standard_normal((n, dim)))
+
+
+def _fill(collection, vectors):
+    ids = [f"id{i}" for i in range(len(vectors))]
+    collection.upsert(
+        ids=ids,
+        documents=[f"Текст {i}" for i in range(len(vectors))],
+        metadatas=[{'file_path': f"f{i % 3}.md", 'source_type': 'knowledge' if i % 2 else 'transcript'}
+                   for i in range(len(vectors))],
+        embeddings=vectors,
+    )
+    return ids
+
+
+def test_quantize_int8_roundtrip():
+    vectors = _vectors(10)
+    codes, scales = quantize_int8(vectors)
+    assert codes.dtype == np.int8
+    assert np.abs(codes * scales[:, None] - vectors).max() < 0.01
+
+
+@pytest.mark.parametrize('mode', [INT8, BINARY])
+def test_query_finds_nearest_with_documents(tmp_path, mode):
+    collection = CompactCollection(tmp_path / 'c', mode)
+    vectors = _vectors(200)
+    _fill(collection, vectors)
+
+    res = collection.query(query_embeddings=[vectors[42]], n_results=3, include=['documents', 'metadatas'])
+    assert res['ids'][0][0] == 'id42'
+    assert res['documents'][0][0] == "Текст 42"
+    assert res['metadatas'][0][0] == {'file_path': 'f0.md', 'source_type': 'transcript'}
+    assert res['distances'][0][0] == pytest.approx(0.0, abs=0.01)
+    assert len(res['ids'][0]) == 3
+
+    with pytest.raises(TypeError):
+        collection.query(query_texts=["текст"])
+
+
+def test_where_filter_and_delete(tmp_path):
+    collection = CompactCollection(tmp_path / 'c')
+    vectors = _vectors(30)
+    _fill(collection, vectors)
+
+    res = collection.query(query_embeddings=[vectors[0]], n_results=30, where={'source_type': 'knowledge'})
+    assert res['ids'][0] and all(int(i[2:]) % 2 for i in res['ids'][0])
+    res = collection.query(query_embeddings=[vectors[0]], n_results=30,
+                           where={'$and': [{'file_path': {'$in': ['f1.md']}}, {'source_type': 'knowledge'}]})
+    assert {int(i[2:]) % 6 for i in res['ids'][0]} == {1}
+
+    collection.delete(ids=['id0', 'missing'])
+    collection.delete(where={'file_path': {'$in': ['f1.md', 'f2.md']}})
+    assert collection.count() == 9
+    res = collection.query(query_embeddings=[vectors[0]], n_results=30)
+    assert 'id0' not in res['ids'][0]
+    assert all(int(i[2:]) % 3 == 0 for i in res['ids'][0])
+
+
+def test_upsert_reuses_rows_and_compacts_documents(tmp_path):
+    collection = CompactCollection(tmp_path / 'c')
+    vectors = _vectors(20)
+    _fill(collection, vectors)
+    collection.delete(ids=[f"id{i}" for i in range(15)])
+    # Freed rows are reused, the vectors file does not grow
+    collection.upsert(ids=['new'], documents=["Новый"], metadatas=[{}], embeddings=[vectors[3]])
+    assert collection._count == 20
+
+    # More deleted than live text: the documents file was rewritten
+    docs = (tmp_path / 'c' / 'documents.bin').read_bytes().decode('utf-8')
+    assert "Текст 0" not in docs and "Текст 19" in docs and "Новый" in docs
+
+    # Another instance (another process) sees the same state
+    reopened = CompactCollection(tmp_path / 'c')
+    res = reopened.query(query_embeddings=[vectors[3]], n_results=2)
+    assert res['ids'][0][0] == 'new'
+    assert res['documents'][0][0] == "Новый"
+    assert reopened.count() == 6
+
+
+def test_compact_store_is_smaller_than_float32(tmp_path):
+    vectors = _vectors(2048, dim=384)
+    sizes = {}
+    for mode in (INT8, BINARY):
+        client = CompactClient(tmp_path, mode)
+        collection = client.get_or_create_collection('secbrain')
+        _fill(collection, vectors)
+        sizes[mode] = collection._codes.nbytes + (collection._bits.nbytes if mode == BINARY else 0)
+        client.delete_collection('secbrain')
+        assert not (tmp_path / f"secbrain.{mode}").exists()
+
+    assert sizes[INT8] * 4 <= vectors.nbytes
+    # Scanned in the first pass of binary mode: 32x less than float32
+    assert (sizes[BINARY] - sizes[INT8]) * 32 <= vectors.nbytes
+
+
+def test_other_instance_applies_only_changes(tmp_path):
+    vectors = _vectors(40)
+    writer = CompactCollection(tmp_path / 'c')
+    _fill(writer, vectors[:30])
+    reader = CompactCollection(tmp_path / 'c')
+    assert reader.count() == 30
+
+    # Delete, reuse freed rows for new ids, move an id, compact documents
+    writer.delete(ids=[f"id{i}" for i in range(20)])
+    writer.upsert(ids=['id25', 'new1', 'new2'], documents=["Двадцать пять", "Новый 1", "Новый 2"],
+                  metadatas=[{}, {'file_path': 'n.md'}, {}], embeddings=vectors[[30, 31, 32]])
+
+    res = reader.query(query_embeddings=[vectors[31]], n_results=1, include=['documents', 'metadatas'])
+    assert res['ids'][0] == ['new1']
+    assert res['documents'][0] == ["Новый 1"]
+    assert res['metadatas'][0] == [{'file_path': 'n.md'}]
+    assert reader.query(query_embeddings=[vectors[30]], n_results=1)['documents'][0] == ["Двадцать пять"]
+
+    fresh = CompactCollection(tmp_path / 'c')
+    fresh.count()
+    assert reader._rows == fresh._rows
+    assert reader._ids == fresh._ids
+    assert (reader._live == fresh._live).all()
+    assert (reader._offsets[reader._live] == fresh._offsets[fresh._live]).all()
+
+
+def test_queries_share_the_collection_lock(tmp_path):
+    vectors = _vectors(10)
+    _fill(CompactCollection(tmp_path / 'c'), vectors)
+    first = CompactCollection(tmp_path / 'c')
+    second = CompactCollection(tmp_path / 'c')
+
+    # A query in progress in another process does not block this one
+    with first._session(write=False):
+        res = second.query(query_embeddings=[vectors[4]], n_results=1)
+    assert res['ids'][0] == ['id4']
+
+
+def test_queries_in_one_instance_score_in_parallel(tmp_path):
+    vectors = _vectors(10)
+    collection = CompactCollection(tmp_path / 'c')
+    _fill(collection, vectors)
+
+    # Each scoring pass waits for the other: serialized queries would break the barrier
+    barrier = threading.Barrier(2, timeout=5)
+    scores = collection._scores
+
+    def meeting_scores(*args):
+        barrier.wait()
+        return scores(*args)
+
+    collection._scores = meeting_scores
+    with ThreadPoolExecutor(max_workers=2) as pool:
+        results = list(pool.map(
+            lambda i: collection.query(query_embeddings=[vectors[i]], n_results=1), [2, 7]
+        ))
+    assert [res['ids'][0] for res in results] == [['id2'], ['id7']]
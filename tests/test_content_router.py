@@ -0,0 +1,67 @@
+import threading
+import time
+from unittest.mock import patch
+
+import pytest
+
+from src.modules.content_router import ContentRouter
+from src.modules.downloader_base import ContentSource, DownloadResult, DownloadSettings
+
+
+@pytest.fixture
+def router(tmp_path):
+    with patch('src.modules.youtube_video_downloader.ProductionYouTubeGrabber'), \
+            patch('src.modules.youtube_shorts_downloader.ProductionYouTubeGrabber'):
+        return ContentRouter(DownloadSettings(), output_dir=tmp_path)
+
+
+def _fake_download(router, delay=0.05, fail=()):
+    """Replaces ContentRouter.download; records peak concurrency per platform"""
+    lock = threading.Lock()
+    active = {}
+    peak = {}
+
+    def download(url):
+        platform = 'YouTube' if 'youtu' in url else 'Instagram'
+        with lock:
+            active[platform] = active.get(platform, 0) + 1
+            peak[platform] = max(peak.get(platform, 0), active[platform])
+        try:
+            time.sleep(delay)
+            if url in fail:
+                raise RuntimeError("blocked")
+            return DownloadResult(ContentSource.UNKNOWN, 'video', url, url[-3:], folder_path=router.output_dir)
+        finally:
+            with lock:
+                active[platform] -= 1
+
+    router.download = download
+    return peak
+
+
+def test_download_many_caps_concurrency_per_platform(router):
+    peak = _fake_download(router)
+    urls = [f"https://www.instagram.com/reel/r{i:02d}/" for i in range(8)]
+    urls += [f"https://www.youtube.com/watch?v=v{i:02d}" for i in range(4)]
+
+    started = time.perf_counter()
+    items = list(router.download_many(urls, {'Instagram': 4, 'YouTube': 2}))
+    elapsed = time.perf_counter() - started
+
+    assert sorted(item.url for item in items) == sorted(urls)
+    assert all(item.ok for item in items)
+    assert peak == {'Instagram': 4, 'YouTube': 2}
+    # 8 reels x 4 and 4 videos x 2: two rounds, not twelve sequential downloads
+    assert elapsed < 0.05 * 6
+
+
+def test_download_many_reports_errors_unsupported_and_duplicates(router):
+    _fake_download(router, delay=0, fail={"https://youtu.be/bad"})
+    urls = ["https://example.com/x", "https://youtu.be/bad", "https://youtu.be/ok1", "https://youtu.be/ok1", ""]
+
+    items = {item.url: item for item in router.download_many(urls)}
+
+    assert set(items) == {"https://example.com/x", "https://youtu.be/bad", "https://youtu.be/ok1"}
+    assert items["https://example.com/x"].error == "URL не поддерживается"
+    assert items["https://youtu.be/bad"].error == "blocked"
+    assert items["https://youtu.be/ok1"].ok and items["https://youtu.be/ok1"].platform == 'YouTube'
@@ -0,0 +1,45 @@
+"""
+Unit Tests for DecodingProfiles
+===============================
+
+Тесты выбора профиля декодирования Whisper.
+"""
+import pytest
+
+from modules.decoding_profiles import choose_profile, get_profile, needs_upgrade
+from modules.local_ears import LocalEars
+
+
+class TestDecodingProfiles:
+    """Тесты для decoding_profiles"""
+
+    def test_profile_by_duration(self):
+        """Короткие рилсы - accurate, длинные видео - быстрее"""
+        assert choose_profile(45).name == "accurate"
+        assert choose_profile(10 * 60).name == "balanced"
+        assert choose_profile(60 * 60).name == "fast"
+
+    def test_queue_depth_downgrades(self):
+        """Очередь понижает профиль, но не ниже fast"""
+        assert choose_profile(45, queue_depth=3).name == "balanced"
+        assert choose_profile(45, queue_depth=6).name == "fast"
+        assert choose_profile(60 * 60, queue_depth=10).name == "fast"
+
+    def test_override_wins(self):
+        """Явный профиль важнее длительности и очереди"""
+        assert choose_profile(60 * 60, queue_depth=10, override="accurate").name == "accurate"
+        with pytest.raises(ValueError):
+            get_profile("ultra")
+
+    def test_needs_upgrade(self):
+        """Старые транскрипции без профиля считаются accurate"""
+        assert needs_upgrade("fast")
+        assert not needs_upgrade("accurate")
+        assert not needs_upgrade(None)
+
+    def test_decode_options_follow_profile(self):
+        """beam_size/best_of берутся из профиля"""
+        options = LocalEars()._decode_options(get_profile("fast"))
+
+        assert options['beam_size'] == 1
+        assert options['best_of'] == 1
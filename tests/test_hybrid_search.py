@@ -0,0 +1,81 @@
+from src.modules.hybrid_search import (
+    LexicalIndex,
+    SearchFilters,
+    folder_metadata,
+    match_query,
+    reciprocal_rank_fusion,
+    stems,
+)
+
+
+def test_stems_normalize_russian_forms():
+    assert stems("Кубернетеса") == stems("кубернетес")
+    assert stems("нейросетями") == stems("нейросети")
+    assert stems("Ёлки") == stems("елка")
+    assert stems("containers") == stems("container")
+
+
+def test_match_query_uses_prefixes_and_dedupes():
+    assert match_query("Кластер кластера") == '"кластер"*'
+    assert match_query("!!!") is None
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([['a', 'b', 'c'], ['c', 'd']], k=60)
+    ids = [doc_id for doc_id, _ in fused]
+    assert ids[0] == 'c'
+    assert set(ids) == {'a', 'b', 'c', 'd'}
+    assert fused[0][1] == 1 / 63 + 1 / 61
+
+
+def test_folder_metadata_from_name_and_frontmatter(tmp_path):
+    folder = tmp_path / '2026-03-05_12-00_youtube_talk'
+    folder.mkdir()
+    (folder / 'Knowledge.md').write_text(
+        "---\ncreated: 2025-01-01\ntags:\n  - AI\n  - '#LLM'\n---\n\nText", encoding='utf-8'
+    )
+    assert folder_metadata(folder) == {'date': '2026-03-05', 'platform': 'youtube', 'tags': ['ai', 'llm']}
+
+    legacy = tmp_path / 'instagram_ABC_title'
+    legacy.mkdir()
+    (legacy / 'Knowledge.md').write_text(
+        "---\ntitle: x\ndate: 2025-12-31\ntags: [#food, #рецепты]\nsource: instagram\n---\n", encoding='utf-8'
+    )
+    assert folder_metadata(legacy) == {'date': '2025-12-31', 'platform': 'instagram', 'tags': ['food', 'рецепты']}
+
+
+def test_lexical_index_update_and_search(tmp_path):
+    index = LexicalIndex(tmp_path / 'lexical.sqlite3')
+    folder = tmp_path / '2026-01-10_10-00_youtube_k8s'
+    folder.mkdir()
+    path = str(folder / 'transcript.md')
+
+    index.update([('1', path, folder, 'transcript', "Настройка кубернетеса"),
+                  ('2', path, folder, 'transcript', "Рецепт пасты")], [], [], [folder])
+    assert index.folder_files(folder) == {path}
+    assert [hit['id'] for hit in index.search("кубернетес", 5)] == ['1']
+    assert index.search("кубернетес", 5, SearchFilters(source_type='summary')) == []
+    assert index.search("кубернетес", 5, SearchFilters(platform='youtube'))[0]['metadata']['source_type'] == 'transcript'
+
+    # Re-inserting after an interrupted run does not duplicate, deleting removes
+    index.update([('1', path, folder, 'transcript', "Настройка кубернетеса")], ['2'], [], [])
+    assert len(index.search("кубернетес OR паста", 5)) == 1
+    index.update([], [], [path], [])
+    assert index.folder_files(folder) == set()
+
+
+def test_lexical_index_backfills_row_map_of_older_index(tmp_path):
+    import sqlite3
+
+    index = LexicalIndex(tmp_path / 'lexical.sqlite3')
+    folder = tmp_path / 'note'
+    path = str(folder / 'Knowledge.md')
+    index.update([('1', path, folder, 'summary', "Кубернетес")], [], [], [])
+    # An index written before chunk_rows existed
+    with sqlite3.connect(tmp_path / 'lexical.sqlite3') as conn:
+        conn.execute("DELETE FROM chunk_rows")
+
+    reopened = LexicalIndex(tmp_path / 'lexical.sqlite3')
+    assert reopened.folder_files(folder) == {path}
+    reopened.update([], [], [path], [])
+    assert reopened.search("кубернетес", 5) == []
@@ -0,0 +1,137 @@
+"""
+Unit Tests for JobQueue
+=======================
+
+Тесты durable-очереди задач бота и диспетчера.
+"""
+import asyncio
+import sqlite3
+import time
+
+from src.bot.services.job_queue import DONE, FAILED, QUEUED, RUNNING, JobDispatcher, JobQueue
+
+
+class TestJobQueue:
+    """Тесты для JobQueue"""
+
+    def test_priority_then_fifo(self, tmp_path):
+        """Сначала высокий приоритет, затем порядок постановки"""
+        queue = JobQueue(tmp_path / "jobs.sqlite3")
+        first = queue.enqueue("transcribe", 1, "a")
+        second = queue.enqueue("transcribe", 2, "b")
+        urgent = queue.enqueue("transcribe", 3, "c", priority=10)
+
+        assert queue.position(urgent) == 1
+        assert queue.position(second) == 3
+        assert [queue.claim("transcribe").id for _ in range(3)] == [urgent.id, first.id, second.id]
+        assert queue.claim("transcribe") is None
+
+    def test_dedupe_key(self, tmp_path):
+        """Повторная постановка того же файла не создаёт вторую задачу"""
+        queue = JobQueue(tmp_path / "jobs.sqlite3")
+        job = queue.enqueue("transcribe", 1, "a", dedupe_key="video.mp4")
+
+        assert queue.enqueue("transcribe", 1, "a", dedupe_key="video.mp4").id == job.id
+        assert queue.depth("transcribe") == 1
+
+    def test_retry_with_backoff_then_fail(self, tmp_path):
+        """Ошибка откладывает задачу, после max_attempts - failed"""
+        queue = JobQueue(tmp_path / "jobs.sqlite3", retry_delay=0)
+        queue.enqueue("ai", 1, "a", max_attempts=2)
+
+        job = queue.claim("ai")
+        assert queue.fail(job, "boom") is True
+        assert queue.get_status("ai", 1)['status'] == QUEUED
+
+        job = queue.claim("ai")
+        assert job.attempts == 2
+        assert queue.fail(job, "boom again") is False
+        status = queue.get_status("ai", 1)
+        assert status['status'] == FAILED
+        assert status['error'] == "boom again"
+
+        delayed = JobQueue(tmp_path / "delayed.sqlite3", retry_delay=60)
+        delayed.enqueue("ai", 1, "a")
+        delayed.fail(delayed.claim("ai"), "boom")
+        assert delayed.claim("ai") is None
+
+    def test_survives_restart(self, tmp_path):
+        """Очередь переживает перезапуск, прерванные задачи возвращаются в очередь"""
+        queue = JobQueue(tmp_path / "jobs.sqlite3")
+        queue.enqueue("transcribe", 1, "a", payload={'file': "video.mp4"})
+        queue.claim("transcribe")
+
+        restarted = JobQueue(tmp_path / "jobs.sqlite3")
+        assert restarted.get_status("transcribe", 1)['status'] == RUNNING
+        assert restarted.recover_running() == 1
+        assert restarted.claim("transcribe").payload == {'file': "video.mp4"}
+
+
+class TestJobDispatcher:
+    """Тесты для JobDispatcher"""
+
+    def test_concurrency_per_stage(self, tmp_path):
+        """Одновременно выполняется не больше concurrency задач стадии"""
+        queue = JobQueue(tmp_path / "jobs.sqlite3")
+        for user_id in range(5):
+            queue.enqueue("transcribe", user_id, "u")
+
+        active = []
+        peak = []
+
+        async def handler(job):
+            active.append(job.id)
+            peak.append(len(active))
+            await asyncio.sleep(0.01)
+            active.remove(job.id)
+            if job.user_id == 4:
+                raise RuntimeError("boom")
+
+        async def scenario():
+            dispatcher = JobDispatcher(queue, {"transcribe": handler}, {"transcribe": 2}, poll_interval=0.01)
+            runner = asyncio.create_task(dispatcher.run())
+            while queue.depth("transcribe") > 0:
+                await asyncio.sleep(0.01)
+            dispatcher.stop()
+            await runner
+
+        queue.retry_delay = 0
+        asyncio.run(scenario())
+
+        assert max(peak) == 2
+        assert len(peak) == 7  # 4 успешных + 3 попытки упавшей
+        assert queue.get_status("transcribe", 0)['status'] == DONE
+        assert queue.get_status("transcribe", 4)['status'] == FAILED
+
+    def test_locked_queue_does_not_block_event_loop(self, tmp_path):
+        """Пока очередь заблокирована другим процессом, event loop продолжает работать"""
+        queue = JobQueue(tmp_path / "jobs.sqlite3")
+        queue.enqueue("transcribe", 1, "u")
+        done = []
+
+        async def handler(job):
+            done.append(job.id)
+
+        async def scenario():
+            blocker = sqlite3.connect(queue.path, isolation_level=None)
+            blocker.execute("BEGIN IMMEDIATE")
+            dispatcher = JobDispatcher(queue, {"transcribe": handler}, poll_interval=0.01)
+            runner = asyncio.create_task(dispatcher.run())
+
+            start = time.monotonic()
+            for _ in range(20):
+                await asyncio.sleep(0.01)
+            assert time.monotonic() - start < 2
+            assert not done
+
+            blocker.execute("ROLLBACK")
+            blocker.close()
+            while not done:
+                await asyncio.sleep(0.01)
+            # wake() из рабочего потока (маршрутизация демона)
+            await asyncio.to_thread(dispatcher.wake)
+            dispatcher.stop()
+            await runner
+
+        asyncio.run(scenario())
+        assert queue.get_status("transcribe", 1)['status'] == DONE
@@ -75,3 +75,163 @@ class TestLocalBrain:
         
         assert "user1" in prompt or "COMMENTS" in prompt
 
+
+
+class TestLocalBrainAsync:
+    """Тесты параллельных запросов через AsyncClient"""
+
+    def test_concurrency_is_bounded(self):
+        """Одновременно выполняется не больше max_parallel запросов"""
+        import asyncio
+
+        brain = LocalBrain(max_parallel=2)
+        active = []
+        peak = []
+
+        async def chat(**kwargs):
+            active.append(1)
+            peak.append(len(active))
+            await asyncio.sleep(0.01)
+            active.pop()
+            return {
+                'message': {'content': '{"summary": "ok", "tags": []}'},
+                'eval_count': 50,
+                'eval_duration': 500_000_000
+            }
+
+        brain.async_client = MagicMock()
+        brain.async_client.chat = chat
+
+        async def run():
+            return await asyncio.gather(*(
+                brain.analyze_async("c", "t", [], "a", "", label=f"f{i}") for i in range(5)
+            ))
+
+        results = asyncio.run(run())
+
+        assert all(r['summary'] == "ok" and r['tags'] == [] for r in results)
+        assert max(peak) == 2
+        assert len(brain.metrics) == 5
+        assert brain.metrics[0].tokens_per_sec == 100.0
+        assert max(m.queue_wait for m in brain.metrics) > 0
+
+    def test_request_keeps_model_loaded(self):
+        """Запрос передаёт keep_alive, чтобы модель не выгружалась между папками"""
+        brain = LocalBrain(keep_alive="1h")
+
+        request = brain._chat_request("system", "user")
+
+        assert request['keep_alive'] == "1h"
+        assert request['format']['required'] == ['summary', 'category', 'tags']
+
+    def test_tags_only_in_system_prompt_prefix(self):
+        """Контент и новые теги идут в сообщении пользователя, системный промпт не меняется"""
+        brain = LocalBrain()
+
+        first = brain._chat_request(brain._system_prompt("ai, python"), brain._build_prompt("one", "", [], "a"))
+        second = brain._chat_request(
+            brain._system_prompt("ai, python"),
+            brain._build_prompt("two", "", [], "b", recent_tags=["docker"])
+        )
+
+        assert first['messages'][0] == second['messages'][0]
+        assert first['messages'][0]['content'].rstrip().endswith("KNOWN TAGS LIST: [ai, python]")
+        assert "docker" in second['messages'][1]['content']
+
+    def test_long_transcript_is_condensed(self):
+        """Транскрипция длиннее бюджета пересказывается по частям, итоговый запрос помещается в контекст"""
+        from modules.prompt_compaction import estimate_tokens
+
+        brain = LocalBrain()
+        brain.num_ctx = 2048
+        requests = []
+
+        def chat(**kwargs):
+            requests.append(kwargs)
+            if 'format' in kwargs:
+                return {'message': {'content': '{"summary": "ok", "tags": []}'}}
+            return {'message': {'content': f"- [00:00] заметка {len(requests)}"}}
+
+        brain.client = MagicMock()
+        brain.client.chat = chat
+        transcript = "\n".join(f"[{i // 60:02d}:{i % 60:02d}] длинная фраза из видео номер {i}" for i in range(600))
+
+        result = brain.analyze("caption", transcript, [], "author", "ai")
+
+        assert result['summary'] == "ok"
+        condense_calls = [r for r in requests if 'format' not in r]
+        assert len(condense_calls) > 1
+        final = requests[-1]
+        prompt_tokens = sum(estimate_tokens(m['content']) for m in final['messages'])
+        assert prompt_tokens + 500 <= 2048
+        assert "заметка" in final['messages'][1]['content']
+
+    def test_broken_json_is_repaired_and_resumed(self, tmp_path):
+        """Битый ответ чинится коротким запросом, повтор берёт сохранённый результат"""
+        brain = LocalBrain()
+        responses = [
+            {'message': {'content': 'Here is the analysis: {"summary": "итог", "tags": ["ai",'}},
+        ]
+
+        brain.client = MagicMock()
+        brain.client.chat.side_effect = lambda **kwargs: responses.pop(0)
+        partial_path = tmp_path / ".analysis.partial.json"
+
+        result = brain.analyze("caption", "", [], "author", "ai", partial_path=partial_path)
+
+        assert result['summary'] == "итог"
+        assert result['tags'] == ["ai"]
+        assert brain.parse_stats['tolerant'] == 1
+        assert brain.repair_rate == 1.0
+
+        again = brain.analyze("caption", "", [], "author", "ai", partial_path=partial_path)
+
+        assert again == result
+        assert brain.client.chat.call_count == 1
+
+    def test_repair_request_when_unparseable(self):
+        """Неразбираемый ответ чинится отдельным запросом без контента"""
+        brain = LocalBrain()
+        responses = [
+            {'message': {'content': 'summary: итог, tags: ai'}},
+            {'message': {'content': '{"summary": "итог", "category": "News", "tags": ["ai"]}'}},
+        ]
+        requests = []
+
+        def chat(**kwargs):
+            requests.append(kwargs)
+            return responses.pop(0)
+
+        brain.client = MagicMock()
+        brain.client.chat = chat
+
+        result = brain.analyze("секретный caption", "", [], "author", "ai")
+
+        assert result['category'] == "News"
+        assert brain.parse_stats['repaired'] == 1
+        assert "секретный caption" not in requests[1]['messages'][1]['content']
+
+    def test_truncated_response_repair_gets_larger_budget(self):
+        """Ответ, обрезанный по num_predict, чинится с бóльшим лимитом"""
+        brain = LocalBrain()
+        truncated = '{"sum' + 'мм' * 300
+        responses = [
+            {'message': {'content': truncated}, 'eval_count': 500, 'done_reason': 'length'},
+            {'message': {'content': '{"summary": "итог", "category": "News", "tags": ["ai"]}'}},
+        ]
+        requests = []
+
+        def chat(**kwargs):
+            requests.append(kwargs)
+            return responses.pop(0)
+
+        brain.client = MagicMock()
+        brain.client.chat = chat
+
+        result = brain.analyze("caption", "", [], "author", "ai")
+
+        assert result['summary'] == "итог"
+        assert brain.parse_stats['repaired'] == 1
+        assert requests[0]['options']['num_predict'] == 500
+        assert requests[1]['options']['num_predict'] > requests[0]['options']['num_predict']
+        assert brain._repair_request(truncated, 900)['options']['num_predict'] == 1800
@@ -79,3 +79,79 @@ class TestLocalEars:
         assert ears._format_timestamp(90) == "01:30"
         assert ears._format_timestamp(3600) == "60:00"  # 1 час = 60 минут
 
+    
+    def test_language_detection_routes_model(self, tmp_path, monkeypatch):
+        """Английская речь: язык определяет tiny, транскрибирует модель для en"""
+        import numpy as np
+        from modules import local_ears
+        from modules.audio_prep import SAMPLE_RATE, PreparedAudio
+        from modules.whisper_pool import WhisperModelPool
+        
+        audio_file = tmp_path / "talk.mp4"
+        audio_file.write_bytes(b"fake video")
+        audio = np.zeros(SAMPLE_RATE * 60, dtype=np.int16)
+        pcm = tmp_path / ".audio_talk.mp4.x.pcm"
+        pcm.write_bytes(b"pcm")
+        monkeypatch.setattr(
+            local_ears, 'prepare_audio',
+            lambda path, content_hash=None: PreparedAudio(path=pcm, media_hash="x", audio=audio)
+        )
+        
+        models = {}
+        
+        def loader(key):
+            model = MagicMock()
+            model.transcribe.return_value = (
+                [MagicMock(start=0.0, end=2.0, text=" Hello everyone")],
+                MagicMock(language="en", language_probability=0.97, duration=60.0)
+            )
+            models[key.model_size] = model
+            return model
+        
+        ears = LocalEars(
+            pool=WhisperModelPool(idle_ttl=0, loader=loader, warm_up=False),
+            language_models={"en": "distil-small.en"}
+        )
+        result = ears.transcribe(audio_file)
+        
+        detect_audio = models["tiny"].transcribe.call_args[0][0]
+        assert len(detect_audio) == SAMPLE_RATE * 30
+        assert detect_audio.dtype == np.float32
+        options = models["distil-small.en"].transcribe.call_args[1]
+        assert options['language'] == "en"
+        assert result.language == "en"
+        assert result.model == "distil-small.en"
+        assert "small" not in models
+        # Транскрипция окончательная (accurate) - кэш PCM больше не нужен
+        assert not pcm.exists()
+    
+    def test_pcm_cache_kept_for_upgrade(self, tmp_path, monkeypatch):
+        """После быстрого профиля PCM остаётся: --upgrade перечитает его без ffmpeg"""
+        import numpy as np
+        from modules import local_ears
+        from modules.audio_prep import SAMPLE_RATE, PreparedAudio
+        
+        audio_file = tmp_path / "talk.mp4"
+        audio_file.write_bytes(b"fake video")
+        pcm = tmp_path / ".audio_talk.mp4.x.pcm"
+        pcm.write_bytes(b"pcm")
+        audio = np.zeros(SAMPLE_RATE * 10, dtype=np.int16)
+        monkeypatch.setattr(
+            local_ears, 'prepare_audio',
+            lambda path, content_hash=None: PreparedAudio(path=pcm, media_hash="x", audio=audio)
+        )
+        
+        ears = LocalEars(language="ru")
+        ears.model = MagicMock()
+        ears.model.transcribe.return_value = (
+            [MagicMock(start=0.0, end=2.0, text=" Привет")],
+            MagicMock(language="ru", duration=10.0)
+        )
+        ears.load_model = MagicMock()
+        
+        ears.transcribe(audio_file, profile="fast")
+        assert pcm.exists()
+        assert ears.model.transcribe.call_args[0][0].dtype == np.float32
+        
+        ears.transcribe(audio_file, profile="accurate")
+        assert not pcm.exists()
@@ -1,7 +1,15 @@
+import math
+import os
 import pytest
 from unittest.mock import Mock, patch, MagicMock
 from pathlib import Path
-from module2_transcribe import TranscriptionProcessor
+from module2_transcribe import (
+    TranscriptionProcessor,
+    LOCK_FILENAME,
+    claim_folder,
+    release_folder,
+    write_atomic,
+)
 from src.modules.local_ears import TranscriptResult
 
 class TestTranscriptionProcessor:
@@ -85,3 +93,140 @@ class TestTranscriptionProcessor:
         
         assert stats['no_media'] is True
         assert stats['success'] is False
+
+    def test_collect_pending_folders_expands_containers(self, processor, tmp_path):
+        root = tmp_path / "downloads"
+        done = root / "done"
+        done.mkdir(parents=True)
+        (done / "video.mp4").touch()
+        (done / "transcript.md").touch()
+        nested = root / "container" / "reel"
+        nested.mkdir(parents=True)
+        (nested / "reel.mp4").touch()
+
+        pending = processor.collect_pending_folders()
+        assert pending == [nested]
+
+    def test_process_folder_skips_locked(self, processor, tmp_path):
+        folder = tmp_path / "downloads" / "locked_folder"
+        folder.mkdir(parents=True)
+        (folder / "video.mp4").touch()
+        # Папку держит другой воркер
+        assert claim_folder(folder) is True
+        processor.ears.transcribe = Mock()
+
+        stats = processor.process_folder(folder)
+
+        assert stats['locked'] is True
+        processor.ears.transcribe.assert_not_called()
+        release_folder(folder)
+
+
+def test_claim_folder_is_exclusive_and_recovers_stale(tmp_path):
+    assert claim_folder(tmp_path) is True
+    assert claim_folder(tmp_path) is False
+    release_folder(tmp_path)
+    assert not (tmp_path / LOCK_FILENAME).exists()
+
+    # Лок-файл упавшего процесса без flock не мешает
+    (tmp_path / LOCK_FILENAME).write_text("999999999 0")
+    assert claim_folder(tmp_path) is True
+    assert (tmp_path / LOCK_FILENAME).read_text().split()[0] == str(os.getpid())
+    release_folder(tmp_path)
+
+
+def test_claim_folder_takeover_is_exclusive(tmp_path):
+    """Из процессов, увидевших брошенный лок, папку получает ровно один"""
+    import multiprocessing
+
+    (tmp_path / LOCK_FILENAME).write_text("999999999 0")
+    ctx = multiprocessing.get_context('fork')
+    with ctx.Pool(8) as pool:
+        results = pool.map(_claim_and_hold, [tmp_path] * 8)
+
+    assert sum(results) == 1
+
+
+def _claim_and_hold(folder):
+    # Лок не снимается: его держит рабочий процесс пула до закрытия пула
+    return claim_folder(folder)
+
+
+def test_write_atomic_replaces_file(tmp_path):
+    target = tmp_path / "transcript.md"
+    target.write_text("old")
+    write_atomic(target, "new")
+    assert target.read_text() == "new"
+    assert [p.name for p in tmp_path.iterdir()] == ["transcript.md"]
+
+
+def test_find_upgradable_folders(tmp_path):
+    content_dir = tmp_path / "downloads"
+    for name, profile_line in [("fast", "whisper_profile: fast\n"), ("accurate", "whisper_profile: accurate\n"), ("legacy", "")]:
+        folder = content_dir / name
+        folder.mkdir(parents=True)
+        (folder / "video.mp4").touch()
+        (folder / "transcript.md").write_text(f"---\ntitle: x\n{profile_line}---\n\n# Транскрипция\n")
+
+    processor = TranscriptionProcessor(content_dir=content_dir)
+
+    assert processor.find_upgradable_folders() == [content_dir / "fast"]
+
+
+def test_upgrade_ignores_its_own_load(tmp_path, monkeypatch):
+    """Нагрузка от собственного Whisper не останавливает улучшение, чужая - останавливает"""
+    import module2_transcribe
+
+    content_dir = tmp_path / "downloads"
+    folders = []
+    for name in ("a", "b", "c", "d"):
+        folder = content_dir / name
+        folder.mkdir(parents=True)
+        (folder / "video.mp4").touch()
+        folders.append(folder)
+
+    processor = TranscriptionProcessor(content_dir=content_dir, num_threads=8)
+    monkeypatch.setattr(processor, 'find_upgradable_folders', lambda target: folders)
+    monkeypatch.setattr(module2_transcribe.os, 'nice', Mock())
+    monkeypatch.setattr(module2_transcribe.os, 'cpu_count', lambda: 8)
+
+    clock = [0.0]
+    load = [0.5]  # фон до начала улучшения
+    monkeypatch.setattr(module2_transcribe.time, 'monotonic', lambda: clock[0])
+    monkeypatch.setattr(module2_transcribe.os, 'getloadavg', lambda: (load[0], 0.0, 0.0))
+
+    def transcribe_file(media_file, folder, profile=None):
+        # Пять минут Whisper на 8 потоках: load average растёт из-за самого улучшения
+        clock[0] += 300
+        load[0] = 0.5 + 8 * (1 - math.exp(-5))
+        if folder.name == "c":
+            load[0] += 6  # пришла чужая работа
+        return folder / "transcript.md"
+
+    processor.transcribe_file = transcribe_file
+
+    stats = processor.upgrade_all()
+
+    assert stats['upgraded'] == 3
+    assert stats['skipped_busy'] == 1
+    module2_transcribe.os.nice.assert_called_once()
+
+
+def test_subtitles_replace_whisper(tmp_path):
+    folder = tmp_path / "downloads" / "youtube_video"
+    folder.mkdir(parents=True)
+    (folder / "abc.mp4").write_bytes(b"video")
+    (folder / "abc.ru.srt").write_text(
+        "1\n00:00:01,000 --> 00:00:04,000\nэто текст из субтитров видео\n", encoding='utf-8'
+    )
+
+    processor = TranscriptionProcessor(content_dir=tmp_path / "downloads")
+    processor.transcribe_file = Mock()
+
+    stats = processor.process_folder(folder)
+
+    assert stats['success']
+    processor.transcribe_file.assert_not_called()
+    transcript = (folder / "transcript.md").read_text(encoding='utf-8')
+    assert "[00:01] это текст из субтитров видео" in transcript
+    assert "whisper_profile: subtitles" in transcript
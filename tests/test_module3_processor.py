@@ -62,7 +62,7 @@ class TestAIProcessor:
             'tags': ['tag1', 'tag2'],
             'category': 'Test Category'
         }
-        processor.tag_manager.get_tags_string.return_value = "existing_tag"
+        processor.tag_manager.get_tags_block.return_value = ("existing_tag", [])
         processor.tag_manager.add_tags.return_value = 2
 
         stats = processor.process_folder(folder)
@@ -85,3 +85,24 @@ class TestAIProcessor:
         
         images = processor.find_images(folder)
         assert len(images) == 2
+
+    def test_process_all_concurrent(self, processor, tmp_path):
+        downloads = tmp_path / "downloads"
+        for name in ("instagram_a_ID1_One", "instagram_b_ID2_Two"):
+            folder = downloads / "user_1" / name
+            folder.mkdir(parents=True)
+            (folder / "description.md").write_text("Test description")
+
+        async def analyze_async(**kwargs):
+            return {'summary': kwargs['label'], 'tags': ['tag1']}
+
+        processor.brain.analyze_async = analyze_async
+        processor.tag_manager = MagicMock()
+        processor.tag_manager.get_tags_block.return_value = ("", [])
+        processor.tag_manager.add_tags.return_value = 0
+
+        stats = processor.process_all(concurrency=2)
+
+        assert stats['total_folders'] == 2
+        assert stats['successfully_processed'] == 2
+        assert "instagram_a_ID1_One" in (downloads / "user_1" / "instagram_a_ID1_One" / "Knowledge.md").read_text()
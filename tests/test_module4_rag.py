@@ -2,6 +2,8 @@ import sys
 import types
 from pathlib import Path
 
+import pytest
+
 
 def _make_fake_env(monkeypatch):
     # fake sentence_transformers
@@ -37,23 +39,46 @@ def _make_fake_env(monkeypatch):
     # fake chromadb
     class FakeCollection:
         def __init__(self):
-            self.docs = []
-            self.metadatas = []
-            self.ids = []
+            self.store = {}
+            self.upserted = []
+            self.deleted = []
 
         def upsert(self, ids, documents, metadatas, embeddings=None):
-            self.ids = ids
-            self.docs = documents
-            self.metadatas = metadatas
+            self.upserted.extend(ids)
+            for id_, doc, meta in zip(ids, documents, metadatas):
+                self.store[id_] = (doc, meta)
 
         def add(self, ids, documents, metadatas, embeddings=None):
             self.upsert(ids, documents, metadatas, embeddings)
 
-        def query(self, query_embeddings=None, n_results=5, include=None, query_texts=None, n_results_per_query=None, include_metadata=None):
-            # return first n_results documents
-            docs = self.docs[:n_results]
-            metas = self.metadatas[:n_results]
-            return {'documents': [docs], 'metadatas': [metas]}
+        def delete(self, ids=None, where=None):
+            if where is not None:
+                paths = where['file_path']['$in']
+                ids = [id_ for id_, (_, meta) in self.store.items() if meta['file_path'] in paths]
+            self.deleted.extend(ids)
+            for id_ in ids:
+                self.store.pop(id_, None)
+
+        @staticmethod
+        def _matches(meta, where):
+            if where is None:
+                return True
+            if '$and' in where:
+                return all(FakeCollection._matches(meta, clause) for clause in where['$and'])
+            key, value = next(iter(where.items()))
+            if isinstance(value, dict):
+                return meta[key] in value['$in']
+            return meta[key] == value
+
+        def query(self, query_embeddings=None, n_results=5, include=None, query_texts=None, where=None):
+            # return first n_results matching documents (insertion order stands in for similarity)
+            entries = [(id_, doc, meta) for id_, (doc, meta) in self.store.items() if self._matches(meta, where)]
+            entries = entries[:n_results]
+            return {
+                'ids': [[id_ for id_, _, _ in entries]],
+                'documents': [[doc for _, doc, _ in entries]],
+                'metadatas': [[meta for _, _, meta in entries]],
+            }
 
     class FakeClient:
         def __init__(self, path=None):
@@ -63,6 +88,9 @@ def _make_fake_env(monkeypatch):
         def get_or_create_collection(self, name='secbrain'):
             return self._col
 
+        def delete_collection(self, name='secbrain'):
+            self._col = FakeCollection()
+
     monkeypatch.setitem(sys.modules, 'chromadb', types.SimpleNamespace(PersistentClient=FakeClient))
 
     # fake LocalBrain used in query (ollama call)
@@ -110,3 +138,398 @@ def test_index_and_query(monkeypatch, tmp_path):
     assert 'answer' in res
     assert 'sources' in res
     assert 'chunks' in res
+
+
+def test_reindex_only_changed_chunks(monkeypatch, tmp_path):
+    _make_fake_env(monkeypatch)
+
+    user_root = tmp_path / 'user_123'
+    folder = user_root / '2026-01-15_test'
+    folder.mkdir(parents=True)
+    knowledge = folder / 'Knowledge.md'
+    knowledge.write_text("А" * 1500 + "Б" * 1500, encoding='utf-8')
+    (folder / 'description.md').write_text("Описание поста", encoding='utf-8')
+
+    from src.modules.module4_rag import RAGEngine
+
+    rag = RAGEngine(user_root=user_root)
+    first = rag.index_folder(folder)
+    assert first > 0
+    collection = rag._collection
+    total = len(collection.store)
+
+    # Nothing changed: no chunks are embedded again
+    assert rag.index_folder(folder) == 0
+
+    # Only the tail of Knowledge.md changed
+    collection.upserted.clear()
+    collection.deleted.clear()
+    knowledge.write_text("А" * 1500 + "В" * 1500, encoding='utf-8')
+    changed = rag.index_folder(folder)
+    assert 0 < changed < first
+    assert len(collection.deleted) == changed
+    assert len(collection.store) == total
+
+    # Removed file: its chunks are deleted from the collection
+    (folder / 'description.md').unlink()
+    assert rag.index_folder(folder) == 0
+    assert len(collection.store) == total - 1
+
+
+def test_reindex_streams_batches_and_resumes(monkeypatch, tmp_path):
+    _make_fake_env(monkeypatch)
+
+    user_root = tmp_path / 'downloads'
+    for i in range(6):
+        folder = user_root / f'2026-01-{i + 10}_post'
+        folder.mkdir(parents=True)
+        (folder / 'Knowledge.md').write_text(f"Заметка {i} " * 300, encoding='utf-8')
+    (user_root / 'empty').mkdir()
+
+    from src.modules.module4_rag import RAGEngine
+
+    rag = RAGEngine(user_root=user_root)
+    rag._init_client()
+    batches = []
+    encode = rag._embedder.encode
+
+    def counting_encode(texts, show_progress_bar=False):
+        batches.append(len(texts))
+        return encode(texts)
+
+    rag._embedder.encode = counting_encode
+    progress = []
+    stats = rag.reindex(batch_size=4, upsert_batch=8, readers=3, progress=lambda s: progress.append(s.chunks))
+
+    assert stats.folders == 6
+    assert stats.files == 6
+    assert stats.chunks == len(rag._collection.store) > 0
+    assert stats.chunks_per_sec > 0
+    # Fixed-size batches across folders, only the last one may be smaller
+    assert all(size == 4 for size in batches[:-1])
+    assert len(progress) > 1
+
+    # Resume: everything already recorded in the manifest is skipped
+    batches.clear()
+    again = rag.reindex(batch_size=4)
+    assert again.chunks == 0
+    assert batches == []
+
+    # Full rebuild re-embeds everything
+    rebuilt = rag.reindex(batch_size=4, full=True)
+    assert rebuilt.chunks == stats.chunks
+    assert len(rag._collection.store) == stats.chunks
+
+
+def test_shared_engine_embedder_and_worker(monkeypatch, tmp_path):
+    _make_fake_env(monkeypatch)
+
+    from src.modules import module4_rag
+    from src.modules.module4_rag import IndexWorker, get_engine
+
+    loads = []
+    embedder_cls = sys.modules['sentence_transformers'].SentenceTransformer
+
+    class CountingEmbedder(embedder_cls):
+        def __init__(self, model_name):
+            loads.append(model_name)
+            super().__init__(model_name)
+
+    monkeypatch.setitem(sys.modules, 'sentence_transformers', types.SimpleNamespace(SentenceTransformer=CountingEmbedder))
+    monkeypatch.setattr(module4_rag, '_engines', {})
+
+    roots = [tmp_path / 'alice' / 'downloads', tmp_path / 'bob' / 'downloads']
+    folders = []
+    for root in roots:
+        for i in range(3):
+            folder = root / f'2026-01-1{i}_post'
+            folder.mkdir(parents=True)
+            (folder / 'Knowledge.md').write_text(f"Заметка {i}", encoding='utf-8')
+            folders.append((root, folder))
+
+    assert get_engine(roots[0]) is get_engine(roots[0])
+    assert get_engine(roots[0]) is not get_engine(roots[1])
+
+    worker = IndexWorker(maxsize=2)
+    done = []
+    for root, folder in folders:
+        worker.submit(root, folder, on_done=lambda chunks, folder=folder: done.append((folder, chunks)))
+    worker.join()
+
+    assert [folder for folder, _ in done] == [folder for _, folder in folders]
+    assert all(chunks == 1 for _, chunks in done)
+    # Both users' engines share one embedding model
+    assert len(loads) == 1
+    assert worker.pending() == 0
+
+
+def test_hybrid_search_fuses_lexical_hits_and_filters(monkeypatch, tmp_path):
+    _make_fake_env(monkeypatch)
+    monkeypatch.setenv('RAG_SEARCH_TOP_K', '1')
+
+    user_root = tmp_path / 'downloads'
+    notes = {
+        '2026-01-10_10-00_instagram_recipe': ("Рецепт пасты с томатами", "#food"),
+        '2026-01-11_10-00_instagram_travel': ("Поездка в горы на выходных", "#travel"),
+        '2026-02-01_09-30_youtube_k8s': ("Разворачиваем кластер кубернетеса с нуля", "#devops, #docker"),
+    }
+    for name, (text, tags) in notes.items():
+        folder = user_root / name
+        folder.mkdir(parents=True)
+        (folder / 'Knowledge.md').write_text(f"---\ntags: [{tags}]\n---\n\n{text}\n", encoding='utf-8')
+
+    from src.modules.hybrid_search import SearchFilters
+    from src.modules.module4_rag import RAGEngine
+
+    rag = RAGEngine(user_root=user_root)
+    rag.reindex()
+
+    # Dense (fake) ranks notes by insertion order; the exact term wins through fusion
+    hits = rag.search('кластеры кубернетес')
+    assert [hit['metadata']['folder_name'] for hit in hits] == ['2026-02-01_09-30_youtube_k8s']
+
+    rag.top_k = 5
+    names = lambda filters: {hit['metadata']['folder_name'] for hit in rag.search('заметка', filters)}
+    assert names(SearchFilters(platform='youtube')) == {'2026-02-01_09-30_youtube_k8s'}
+    assert names(SearchFilters(tag='#food')) == {'2026-01-10_10-00_instagram_recipe'}
+    assert names(SearchFilters(date_from='2026-01-11', date_to='2026-01-31')) == {'2026-01-11_10-00_instagram_travel'}
+    assert names(SearchFilters(source_type='transcript')) == set()
+    assert rag.search('заметка', SearchFilters(platform='tiktok')) == []
+
+    res = rag.query('кубернетес', platform='tiktok')
+    assert res['chunks'] == [] and res['sources'] == []
+
+
+def test_query_caches_embeddings_and_answers(monkeypatch, tmp_path):
+    _make_fake_env(monkeypatch)
+
+    brains = []
+    llm_calls = []
+    local_brain = sys.modules['src.modules.local_brain']
+    fake_brain_cls = local_brain.LocalBrain
+
+    class CountingBrain(fake_brain_cls):
+        def __init__(self):
+            super().__init__()
+            brains.append(self)
+            chat = self.client.chat
+            self.client.chat = lambda **kwargs: llm_calls.append(kwargs) or chat(**kwargs)
+
+    monkeypatch.setattr(local_brain, 'LocalBrain', CountingBrain)
+
+    user_root = tmp_path / 'downloads'
+    folder = user_root / '2026-01-15_test'
+    folder.mkdir(parents=True)
+    knowledge = folder / 'Knowledge.md'
+    knowledge.write_text("Заметка про кэширование ответов", encoding='utf-8')
+
+    from src.modules.module4_rag import RAGEngine
+
+    rag = RAGEngine(user_root=user_root)
+    rag.index_folder(folder)
+
+    encoded = []
+    encode = rag._embedder.encode
+
+    def encode_by_text(texts, show_progress_bar=False):
+        encoded.extend(texts)
+        # Different questions get orthogonal vectors
+        return [[1.0 if i == len(text) % 8 else 0.0 for i in range(8)] for text in texts]
+
+    rag._embedder.encode = encode_by_text
+
+    first = rag.query('Что про кэш?')
+    assert first['answer'] == 'Ответ (фейковый)'
+    # Same question up to case and punctuation: no embedding, search or LLM call
+    assert rag.query('что про кэш') == first
+    assert len(llm_calls) == 1
+    assert encoded == ['Что про кэш?']
+
+    # Filters are part of the key
+    rag.query('что про кэш', source_type='summary')
+    assert len(llm_calls) == 2
+
+    # Reindexing a changed note invalidates cached answers
+    rag._embedder.encode = encode
+    knowledge.write_text("Заметка про кэширование ответов, дополненная", encoding='utf-8')
+    rag.index_folder(folder)
+    rag._embedder.encode = encode_by_text
+    rag.query('что про кэш')
+    assert len(llm_calls) == 3
+    assert len(brains) == 1
+
+
+
+def test_query_stream_yields_sources_then_tokens(monkeypatch, tmp_path):
+    import asyncio
+
+    _make_fake_env(monkeypatch)
+
+    class FakeAsyncClient:
+        def __init__(self):
+            self.requests = []
+
+        async def chat(self, stream=False, **request):
+            self.requests.append(request)
+            assert stream
+
+            async def parts():
+                for text in ["Ответ ", "по ", "базе"]:
+                    yield {'message': {'content': text}}
+            return parts()
+
+    class FakeStreamingBrain:
+        model = 'fake-model'
+
+        def __init__(self):
+            self.async_client = None
+            self.clients = []
+
+        def initialize_async(self):
+            self.async_client = FakeAsyncClient()
+            self.clients.append(self.async_client)
+
+        def reset_async(self):
+            self.async_client = None
+
+    user_root = tmp_path / 'downloads'
+    folder = user_root / '2026-01-15_test'
+    folder.mkdir(parents=True)
+    (folder / 'Knowledge.md').write_text("Заметка про потоковые ответы", encoding='utf-8')
+
+    from src.modules.module4_rag import RAGEngine
+
+    rag = RAGEngine(user_root=user_root)
+    rag.index_folder(folder)
+    brain = rag._brain = FakeStreamingBrain()
+
+    async def collect(question):
+        return [event async for event in rag.query_stream(question)]
+
+    events = asyncio.run(collect('Что про ответы?'))
+    assert events[0] == {'type': 'sources', 'sources': ['2026-01-15_test'], 'chunks': ["Заметка про потоковые ответы"]}
+    assert [e['text'] for e in events if e['type'] == 'token'] == ["Ответ ", "по ", "базе"]
+    assert events[-1] == {'type': 'done', 'answer': "Ответ по базе", 'cached': False}
+
+    # The streamed answer is cached for query() and the next stream
+    assert rag.query('что про ответы')['answer'] == "Ответ по базе"
+    cached = asyncio.run(collect('Что про ответы'))
+    assert cached[-1] == {'type': 'done', 'answer': "Ответ по базе", 'cached': True}
+    assert sum(len(client.requests) for client in brain.clients) == 1
+
+
+def test_compact_backend_and_backend_switch(monkeypatch, tmp_path):
+    _make_fake_env(monkeypatch)
+    monkeypatch.setenv('RAG_VECTOR_BACKEND', 'int8')
+
+    user_root = tmp_path / 'downloads'
+    folder = user_root / '2026-01-15_test'
+    folder.mkdir(parents=True)
+    (folder / 'Knowledge.md').write_text("Заметка про компактное хранилище векторов", encoding='utf-8')
+
+    from src.modules.compact_store import CompactCollection
+    from src.modules.module4_rag import RAGEngine
+
+    rag = RAGEngine(user_root=user_root)
+    assert rag.index_folder(folder) == 1
+    assert isinstance(rag._collection, CompactCollection)
+    assert rag.index_folder(folder) == 0
+    hits = rag.search('хранилище')
+    assert [hit['text'] for hit in hits] == ["Заметка про компактное хранилище векторов"]
+
+    # Another backend: the manifest describes the old store, everything is indexed again
+    monkeypatch.setenv('RAG_VECTOR_BACKEND', 'chroma')
+    rag = RAGEngine(user_root=user_root)
+    assert rag.index_folder(folder) == 1
+    assert len(rag._collection.store) == 1
+
+    monkeypatch.setenv('RAG_VECTOR_BACKEND', 'float16')
+    with pytest.raises(ValueError):
+        RAGEngine(user_root=user_root)
+
+
+def test_index_folder_uses_structure_aware_chunks(monkeypatch, tmp_path):
+    _make_fake_env(monkeypatch)
+
+    user_root = tmp_path / 'downloads'
+    folder = user_root / '2026-01-15_test'
+    folder.mkdir(parents=True)
+    (folder / 'transcript.md').write_text(
+        "---\nlanguage: ru\nduration: 20.0\n---\n\n# Транскрипция\n\n---\n\n"
+        "[00:00] Первый сегмент\n[00:10] Второй сегмент\n\n---\n\n"
+        "## Полный текст (без таймингов)\n\nПервый сегмент Второй сегмент\n",
+        encoding='utf-8'
+    )
+
+    from src.modules.module4_rag import RAGEngine
+
+    rag = RAGEngine(user_root=user_root)
+    assert rag.index_folder(folder) == 1
+    (doc, meta), = rag._collection.store.values()
+    assert doc == "[00:00 - 00:20] Первый сегмент Второй сегмент"
+    assert (meta['start'], meta['end'], meta['language'], meta['source_type']) == (0.0, 20.0, 'ru', 'transcript')
+
+
+def test_search_reranks_wide_candidates(monkeypatch, tmp_path):
+    _make_fake_env(monkeypatch)
+    monkeypatch.setenv('RAG_SEARCH_TOP_K', '1')
+    monkeypatch.setenv('RAG_RERANK_CANDIDATES', '10')
+    monkeypatch.setenv('RAG_RERANK_MODEL', 'fake-cross-encoder')
+
+    class FakeCrossEncoder:
+        def __init__(self, model_name):
+            self.model_name = model_name
+
+        def predict(self, pairs):
+            return [float('кубернетес' in text) for _, text in pairs]
+
+    st = sys.modules['sentence_transformers']
+    monkeypatch.setitem(sys.modules, 'sentence_transformers', types.SimpleNamespace(
+        SentenceTransformer=st.SentenceTransformer, CrossEncoder=FakeCrossEncoder))
+
+    user_root = tmp_path / 'downloads'
+    for name, text in [('a_note', "Рецепт пасты"), ('b_note', "Поездка в горы"), ('c_note', "Настройка кубернетес")]:
+        (user_root / name).mkdir(parents=True)
+        (user_root / name / 'Knowledge.md').write_text(text, encoding='utf-8')
+
+    from src.modules.module4_rag import RAGEngine
+
+    rag = RAGEngine(user_root=user_root)
+    for folder in sorted(user_root.iterdir()):
+        rag.index_folder(folder)
+    # Fake dense search and fusion rank the pasta note first; the cross-encoder picks the cluster one
+    assert [hit['text'] for hit in rag.search('что я сохранял про кластеры')] == ["Настройка кубернетес"]
+    assert rag.reranker.last_scored == 3
+
+    rag.reranker = None
+    assert [hit['text'] for hit in rag.search('что я сохранял про кластеры')] == ["Рецепт пасты"]
+
+
+def test_reranker_is_opt_in_and_warmed_up_by_get_engine(monkeypatch, tmp_path):
+    _make_fake_env(monkeypatch)
+    predicted = []
+
+    class FakeCrossEncoder:
+        def __init__(self, model_name):
+            self.model_name = model_name
+
+        def predict(self, pairs):
+            predicted.append(len(pairs))
+            return [0.0] * len(pairs)
+
+    st = sys.modules['sentence_transformers']
+    monkeypatch.setitem(sys.modules, 'sentence_transformers', types.SimpleNamespace(
+        SentenceTransformer=st.SentenceTransformer, CrossEncoder=FakeCrossEncoder))
+
+    from src.modules import module4_rag
+
+    monkeypatch.delenv('RAG_RERANK_MODEL', raising=False)
+    assert module4_rag.RAGEngine(user_root=tmp_path / 'plain').reranker is None
+
+    monkeypatch.setenv('RAG_RERANK_MODEL', 'fake-cross-encoder')
+    monkeypatch.setattr(module4_rag, '_engines', {})
+    engine = module4_rag.get_engine(tmp_path / 'downloads')
+    # Model loaded and timed before the first question
+    assert engine.reranker._model is not None
+    assert engine.reranker._pair_seconds is not None
+    assert predicted == [engine.reranker.batch_size]
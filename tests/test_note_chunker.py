@@ -0,0 +1,116 @@
+from src.modules.note_chunker import chunk_file, parse_frontmatter
+
+
+def _split(text, size=40):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+KNOWLEDGE = """---
+title: Docker за 5 минут
+date: 2026-01-15
+tags: [#docker, #devops]
+source: youtube
+---
+
+# Docker за 5 минут
+
+## 📊 Метаданные
+
+- **Источник**: YOUTUBE
+
+## 🏷️ Теги
+
+#docker #devops
+
+## 📝 Саммари
+
+Контейнеры **изолируют** приложения.
+
+## 📂 Категория
+
+Технологии
+
+## 💬 Ценные комментарии
+
+*Нет ценных комментариев*
+
+## 📎 Связанные файлы
+
+- [[description.md|Описание]]
+
+## 🖼️ Изображения
+
+![[img_01.jpg]]
+
+---
+
+*Создано автоматически модулем AI анализа [SecondBrain](https://t.me/sec_brainbot)*
+"""
+
+TRANSCRIPT = """---
+title: Транскрипция video
+language: ru
+duration: 75.0
+type: transcript
+---
+
+# Транскрипция
+
+**Файл**: `video.mp4`
+**Модель**: `small`
+
+---
+
+[00:00] Привет всем
+[00:05] Сегодня про докер
+[01:02] Конец
+
+---
+
+## Полный текст (без таймингов)
+
+Привет всем Сегодня про докер Конец
+"""
+
+
+def test_parse_frontmatter_lists_and_body():
+    fields, body = parse_frontmatter("---\ntitle: 'X'\ntags:\n  - a\n  - b\nkw: [c, d]\n---\n\nТекст")
+    assert fields == {'title': 'X', 'tags': ['a', 'b'], 'kw': ['c', 'd']}
+    assert body == "\nТекст"
+    assert parse_frontmatter("Без frontmatter") == ({}, "Без frontmatter")
+
+
+def test_knowledge_drops_service_sections_and_boilerplate():
+    chunks = chunk_file("Knowledge.md", KNOWLEDGE, _split)
+    assert len(chunks) == 1
+    assert chunks[0].text == "Docker за 5 минут\n\nСаммари\nКонтейнеры изолируют приложения.\n\nКатегория\nТехнологии"
+    assert chunks[0].metadata == {'title': 'Docker за 5 минут', 'date': '2026-01-15', 'tags': 'docker, devops'}
+
+
+def test_knowledge_long_section_is_split_with_title():
+    text = "# Заметка\n\n## Саммари\n\n" + "слово " * 100
+    chunks = chunk_file("Knowledge.md", text, _split, size=200)
+    assert len(chunks) > 1
+    assert all(chunk.text.startswith("Заметка\n\n") for chunk in chunks)
+
+
+def test_transcript_segments_with_time_ranges_once():
+    chunks = chunk_file("transcript.md", TRANSCRIPT, _split, size=25)
+    assert [chunk.text for chunk in chunks] == [
+        "[00:00 - 00:05] Привет всем",
+        "[00:05 - 01:15] Сегодня про докер Конец",
+    ]
+    assert chunks[1].metadata == {'title': 'Транскрипция video', 'language': 'ru', 'start': 5.0, 'end': 75.0}
+
+
+def test_transcript_without_timestamps_uses_clean_text():
+    text = "# Транскрипция видео\n\n---\n\n## С таймкодами\n\nтекст\n\n---\n\n## Чистый текст\n\nЧистый текст видео\n"
+    assert [chunk.text for chunk in chunk_file("transcript.md", text, _split)] == ["Чистый текст видео"]
+
+
+def test_description_keeps_content_only():
+    text = ("---\nauthor: bob\ndate: 2026-01-01\ntype: description\n---\n\n# Description\n\n"
+            "**Author:** bob\n\n## Content\n\nПост про [[docker]].")
+    chunks = chunk_file("description.md", text, _split)
+    assert [chunk.text for chunk in chunks] == ["Пост про docker."]
+    assert chunks[0].metadata == {'author': 'bob', 'date': '2026-01-01'}
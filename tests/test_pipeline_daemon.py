@@ -0,0 +1,138 @@
+"""
+Unit Tests for PipelineDaemon
+=============================
+
+Тесты маршрутизации папок демона конвейера по этапам.
+"""
+import asyncio
+import os
+import time
+
+import pytest
+
+from pipeline_daemon import PipelineDaemon
+from src.bot.services.job_queue import AI, TRANSCRIBE, JobQueue
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    users = tmp_path / "users"
+    (users / "admin" / "downloads").mkdir(parents=True)
+    daemon = PipelineDaemon(
+        users_dir=users,
+        queue=JobQueue(tmp_path / "jobs.sqlite3"),
+        index_path=tmp_path / "index.sqlite3",
+        settle=0
+    )
+    daemon._rag_available = False
+    daemon.discover_roots()
+    return daemon
+
+
+def make_folder(daemon, name, *files):
+    folder = daemon.users_dir / "admin" / "downloads" / name
+    folder.mkdir()
+    for file in files:
+        (folder / file).write_text("x", encoding='utf-8')
+    return folder
+
+
+class TestPipelineDaemon:
+    """Тесты для PipelineDaemon"""
+
+    def test_new_media_enqueues_transcription(self, daemon):
+        """Новое видео -> задача транскрибации, повторное событие не дублирует её"""
+        folder = make_folder(daemon, "youtube_1_video", "video.mp4")
+
+        daemon.on_path_changed(folder / "video.mp4")
+        daemon.on_path_changed(folder / "video.mp4")
+        assert daemon.flush_settled() == 1
+
+        job = daemon.queue.claim(TRANSCRIBE)
+        assert job.payload['folder'] == str(folder.resolve())
+        assert daemon.queue.claim(TRANSCRIBE) is None
+
+    def test_transcript_enqueues_analysis(self, daemon):
+        """Появился transcript.md -> следующий этап AI"""
+        folder = make_folder(daemon, "youtube_1_video", "video.mp4", "transcript.md")
+
+        job = daemon.route(folder)
+
+        assert job.stage == AI
+
+    def test_temp_files_are_ignored(self, daemon):
+        """Недокачанные и служебные файлы не запускают этапы"""
+        folder = make_folder(daemon, "youtube_1_video")
+
+        daemon.on_path_changed(folder / "video.mp4.part")
+        daemon.on_path_changed(folder / ".transcript.md.123.tmp")
+
+        assert daemon.flush_settled() == 0
+
+    def test_failed_folder_waits_for_change(self, daemon):
+        """Папка, чья задача упала после всех попыток, не ставится снова до изменения"""
+        folder = make_folder(daemon, "youtube_1_broken", "video.mp4")
+        job = daemon.route(folder)
+        daemon.queue.retry_delay = 0
+        for _ in range(job.max_attempts):
+            daemon.queue.fail(daemon.queue.claim(TRANSCRIBE), "broken media")
+
+        assert daemon.route(folder) is None
+        assert daemon.scan() == 0
+        assert daemon.route(folder) is None
+
+        # Файл заменили - папка снова идёт в работу
+        stat = folder.stat()
+        os.utime(folder, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        assert daemon.route(folder).stage == TRANSCRIBE
+
+    def test_concurrent_transcriptions_get_own_processors(self, daemon, monkeypatch):
+        """Параллельные задачи транскрибации не делят один LocalEars"""
+        import module2_transcribe
+
+        used = []
+
+        class FakeProcessor:
+            def __init__(self, content_dir):
+                self.ears = None
+
+            def process_folder(self, folder):
+                used.append(self)
+                time.sleep(0.05)
+                return {}
+
+        monkeypatch.setattr(module2_transcribe, 'TranscriptionProcessor', FakeProcessor)
+        monkeypatch.setattr(daemon, 'route', lambda folder: None)
+        jobs = [daemon.queue.enqueue(TRANSCRIBE, 0, payload={'folder': str(f)}) for f in ("a", "b")]
+
+        async def scenario():
+            await asyncio.gather(*(daemon._run_transcribe(job) for job in jobs))
+            await daemon._run_transcribe(jobs[0])
+
+        asyncio.run(scenario())
+
+        assert used[0] is not used[1]
+        # Освободившийся процессор переиспользуется
+        assert len(daemon._transcribers) == 2
+        assert used[2] in used[:2]
+
+    def test_vector_db_writes_are_ignored(self, daemon):
+        """Записи индексатора RAG не попадают в папки на маршрутизацию"""
+        root = daemon.users_dir / "admin" / "downloads"
+        store = root / "vector_db" / "secbrain.int8"
+        store.mkdir(parents=True)
+
+        daemon.on_path_changed(store / "rows.sqlite3")
+        daemon.on_path_changed(root / "vector_db" / "chroma.sqlite3")
+
+        assert not daemon._dirty
+
+    def test_scan_catches_up(self, daemon):
+        """Стартовый проход ставит в очередь то, что появилось без демона"""
+        make_folder(daemon, "youtube_1_video", "video.mp4")
+        make_folder(daemon, "instagram_2_photo", "description.md", "1.jpg")
+        make_folder(daemon, "instagram_3_done", "description.md", "Knowledge.md")
+
+        assert daemon.scan() == 2
+        assert daemon.queue.depth(TRANSCRIBE) == 1
+        assert daemon.queue.depth(AI) == 1
@@ -0,0 +1,62 @@
+"""
+Unit Tests for PromptCompaction
+===============================
+
+Тесты подготовки описания и транскрипции для промпта LLM.
+"""
+from pathlib import Path
+
+from modules.local_ears import TimedSegment, build_transcript_result
+from modules.prompt_compaction import (
+    compact_description,
+    compact_transcript,
+    estimate_tokens,
+    split_into_chunks,
+    truncate_to_tokens,
+)
+from modules.transcript_writer import render_transcript_markdown
+
+
+class TestCompaction:
+    """Тесты очистки файлов контента"""
+
+    def test_transcript_keeps_timed_lines_only(self):
+        """Из transcript.md остаются строки с таймкодами, без шапки и чистого текста"""
+        transcript = build_transcript_result(
+            [TimedSegment(0.0, 2.0, "Привет"), TimedSegment(65.0, 70.0, "мир")],
+            language="ru", duration=70.0, profile="accurate"
+        )
+        markdown = render_transcript_markdown(transcript, Path("video.mp4"), "small")
+
+        compact = compact_transcript(markdown)
+
+        assert compact == "[00:00] Привет\n[01:05] мир"
+
+    def test_description_markup_is_stripped(self):
+        """Frontmatter, заголовки и жирный шрифт убираются"""
+        text = "---\nauthor: user\ntype: description\n---\n\n# Description\n\n**Author:** user\n\n---\n\nТекст поста"
+
+        compact = compact_description(text)
+
+        assert compact == "Description\n\nAuthor: user\n\nТекст поста"
+
+
+class TestBudget:
+    """Тесты оценки и деления по токенам"""
+
+    def test_truncate_to_tokens(self):
+        text = "слово " * 100
+
+        truncated = truncate_to_tokens(text, 20)
+
+        assert estimate_tokens(truncated) <= 21
+        assert truncated.endswith("…")
+
+    def test_split_into_chunks_respects_budget(self):
+        lines = [f"[00:{i:02d}] строка номер {i}" for i in range(60)]
+
+        chunks = split_into_chunks("\n".join(lines), 50)
+
+        assert len(chunks) > 1
+        assert all(estimate_tokens(chunk) <= 50 for chunk in chunks)
+        assert "\n".join(chunks).split("\n") == lines
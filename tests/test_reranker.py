@@ -0,0 +1,81 @@
+import time
+
+from src.modules.reranker import Reranker
+
+
+def _hits(*texts):
+    return [{'id': str(i), 'text': text, 'metadata': {}} for i, text in enumerate(texts)]
+
+
+class KeywordModel:
+    """Scores a pair by how often the question's last word occurs in the text"""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.pairs = 0
+
+    def predict(self, pairs):
+        time.sleep(self.delay * len(pairs))
+        self.pairs += len(pairs)
+        return [text.count(question.split()[-1]) for question, text in pairs]
+
+
+def test_rerank_orders_by_score_and_keeps_ties_stable():
+    model = KeywordModel()
+    reranker = Reranker(lambda: model, budget_ms=1000, batch_size=2)
+    hits = _hits("без ответа", "докер", "докер докер", "тоже без ответа")
+    ranked = reranker.rerank("что такое докер", hits, top_n=3)
+    assert [hit['text'] for hit in ranked] == ["докер докер", "докер", "без ответа"]
+    assert reranker.last_scored == 4
+
+
+def test_rerank_stops_at_budget_and_keeps_the_rest_in_order():
+    model = KeywordModel(delay=0.01)
+    reranker = Reranker(lambda: model, budget_ms=50, batch_size=4)
+    hits = _hits(*(["пусто"] * 39 + ["докер"]))
+    started = time.perf_counter()
+    ranked = reranker.rerank("докер", hits, top_n=40)
+    # Without warm-up the first batch is a single pair, so the budget holds
+    assert (time.perf_counter() - started) * 1000 < 100
+    assert 0 < reranker.last_scored < 40
+    assert [hit['id'] for hit in ranked[reranker.last_scored:]] == [hit['id'] for hit in hits[reranker.last_scored:]]
+
+
+def test_first_batch_respects_budget_without_warm_up():
+    model = KeywordModel(delay=0.03)
+    reranker = Reranker(lambda: model, budget_ms=50, batch_size=8)
+    reranker.rerank("докер", _hits(*(["пусто"] * 8)), top_n=8)
+    # A full first batch would take 240 ms; one pair calibrates, the estimate stops the rest
+    assert reranker.last_scored == 1
+    assert reranker.last_ms < 100
+
+
+def test_warm_up_loads_model_and_calibrates():
+    loads = []
+    model = KeywordModel(delay=0.001)
+
+    def load():
+        loads.append(1)
+        return model
+
+    reranker = Reranker(load, budget_ms=1000, batch_size=4)
+    assert reranker.warm_up()
+    assert loads == [1] and model.pairs == 4
+    reranker.rerank("докер", _hits(*(["пусто"] * 6 + ["докер"])), top_n=1)
+    # Calibrated: full batches from the first one
+    assert reranker.last_scored == 7
+    assert model.pairs == 11
+    assert loads == [1]
+
+
+def test_rerank_disabled_by_budget_or_failed_model():
+    hits = _hits("a", "b", "c")
+    assert Reranker(lambda: KeywordModel(), budget_ms=0).rerank("q", hits, 2) == hits[:2]
+
+    def broken():
+        raise OSError("no model")
+
+    reranker = Reranker(broken)
+    assert not reranker.warm_up()
+    assert reranker.rerank("q", hits, 2) == hits[:2]
+    assert reranker.rerank("q", hits, 2) == hits[:2]
@@ -0,0 +1,49 @@
+"""
+Unit Tests for StructuredOutput
+===============================
+
+Тесты терпимого разбора JSON-ответа LLM и промежуточных результатов.
+"""
+from modules.structured_output import AnalysisPartial, normalize_analysis, parse_json_loose
+
+
+class TestParseJsonLoose:
+    """Тесты разбора почти валидного JSON"""
+
+    def test_code_fence_and_trailing_comma(self):
+        text = '```json\n{"summary": "итог", "tags": ["ai", "coding",],}\n```'
+
+        assert parse_json_loose(text) == {"summary": "итог", "tags": ["ai", "coding"]}
+
+    def test_truncated_output_is_closed(self):
+        text = '{"summary": "итог", "category": "News", "tags": ["ai", "cod'
+
+        assert parse_json_loose(text) == {"summary": "итог", "category": "News", "tags": ["ai", "cod"]}
+
+    def test_no_object(self):
+        assert parse_json_loose("не JSON") is None
+
+
+class TestNormalizeAnalysis:
+    """Тесты приведения ответа к схеме"""
+
+    def test_list_summary_and_string_tags(self):
+        result = normalize_analysis({"summary": ["раз", "два"], "tags": "#ai, coding"})
+
+        assert result['summary'] == "- раз\n- два"
+        assert result['tags'] == ["ai", "coding"]
+        assert result['valuable_comments'] == []
+
+    def test_empty_answer(self):
+        assert normalize_analysis({"category": "News"}) is None
+
+
+class TestAnalysisPartial:
+    """Тесты промежуточных результатов"""
+
+    def test_other_source_is_ignored(self, tmp_path):
+        path = tmp_path / ".analysis.partial.json"
+        AnalysisPartial(path, "a").save(raw_response="{")
+
+        assert AnalysisPartial(path, "a").get('raw_response') == "{"
+        assert AnalysisPartial(path, "b").get('raw_response') is None
@@ -0,0 +1,139 @@
+"""
+Unit Tests for SubtitleTranscript
+=================================
+
+Тесты конвертации субтитров YouTube (VTT/SRV3/SRT) в транскрипцию.
+"""
+from unittest.mock import MagicMock
+
+from modules.subtitle_transcript import (
+    SUBTITLE_PROFILE,
+    find_subtitle_track,
+    select_subtitle_tracks,
+    subtitles_to_transcript,
+)
+
+
+ROLLING_VTT = """WEBVTT
+Kind: captions
+Language: ru
+
+00:00:00.000 --> 00:00:02.500 align:start position:0%
+ 
+привет<00:00:00.500><c> всем</c><00:00:01.000><c> друзья</c>
+
+00:00:02.500 --> 00:00:02.510 align:start position:0%
+привет всем друзья
+ 
+
+00:00:02.510 --> 00:00:05.000 align:start position:0%
+привет всем друзья
+сегодня<00:00:03.000><c> говорим</c><00:00:04.000><c> про</c><00:00:04.500><c> Python</c>
+
+00:00:05.000 --> 00:00:07.000
+сегодня говорим про Python
+"""
+
+SRT = """1
+00:00:01,000 --> 00:00:03,000
+Первая строка
+
+2
+00:01:05,500 --> 00:01:08,000
+Вторая &amp; последняя строка
+"""
+
+SRV3 = """<?xml version="1.0" encoding="utf-8" ?><timedtext format="3"><body>
+<p t="0" d="2000"><s>hello</s><s t="500"> there</s><s t="900"> my friends</s></p>
+<p t="2000" d="1" a="1">
+</p>
+<p t="61000" d="3000"><s>second</s><s t="400"> line here</s></p>
+</body></timedtext>"""
+
+
+class TestSubtitleTranscript:
+    """Тесты для subtitle_transcript"""
+
+    def test_rolling_vtt_is_deduplicated(self, tmp_path):
+        """Катящиеся автосубтитры дают каждую фразу один раз"""
+        track = tmp_path / "abc.ru.vtt"
+        track.write_text(ROLLING_VTT, encoding='utf-8')
+
+        result = subtitles_to_transcript(track)
+
+        assert result.timed_transcript == "[00:00] привет всем друзья\n[00:02] сегодня говорим про Python"
+        assert result.full_text == "привет всем друзья сегодня говорим про Python"
+        assert result.language == "ru"
+        assert result.profile == SUBTITLE_PROFILE
+
+    def test_srt(self, tmp_path):
+        """SRT: запятая в таймкодах, HTML-сущности"""
+        track = tmp_path / "abc.ru.srt"
+        track.write_text(SRT, encoding='utf-8')
+
+        result = subtitles_to_transcript(track)
+
+        assert result.timed_transcript == "[00:01] Первая строка\n[01:05] Вторая & последняя строка"
+        assert result.duration == 68.0
+
+    def test_srv3(self, tmp_path):
+        """SRV3: слова из <s> склеиваются, пустые <p> пропускаются"""
+        track = tmp_path / "abc.en.srv3"
+        track.write_text(SRV3, encoding='utf-8')
+
+        result = subtitles_to_transcript(track)
+
+        assert result.timed_transcript == "[00:00] hello there my friends\n[01:01] second line here"
+        assert result.language == "en"
+
+    def test_empty_track_is_rejected(self, tmp_path):
+        """Субтитры без речи не заменяют Whisper"""
+        track = tmp_path / "abc.ru.vtt"
+        track.write_text("WEBVTT\n\n00:00:00.000 --> 00:00:02.000\n[Музыка]\n", encoding='utf-8')
+
+        assert subtitles_to_transcript(track) is None
+
+    def test_find_track_prefers_language_then_format(self, tmp_path):
+        """Язык важнее формата, среди одного языка - srv3 > vtt > srt"""
+        for name in ["abc.en.srv3", "abc.ru.srt", "abc.ru.vtt", "abc.de.vtt", "abc.mp4"]:
+            (tmp_path / name).touch()
+
+        assert find_subtitle_track(tmp_path).name == "abc.ru.vtt"
+        assert find_subtitle_track(tmp_path, languages=('de',)).name == "abc.de.vtt"
+        assert find_subtitle_track(tmp_path, languages=('fr',)) is None
+
+    def test_find_track_prefers_manual_over_recognized(self, tmp_path):
+        """Ручные субтитры раньше автосубтитров языка оригинала"""
+        for name in ["abc.en-orig.srv3", "abc.en.vtt"]:
+            (tmp_path / name).touch()
+
+        assert find_subtitle_track(tmp_path).name == "abc.en.vtt"
+
+    def test_select_auto_captions_only_in_original_language(self):
+        """Машинный перевод автосубтитров на ru не скачивается для английского видео"""
+        metadata = {
+            'language': 'en',
+            'subtitles': {'live_chat': []},
+            'automatic_captions': {'en-orig': [], 'en': [], 'ru': [], 'de': []},
+        }
+        assert select_subtitle_tracks(metadata) == ([], ['en-orig'])
+
+        # Без поля language язык оригинала виден по дорожке -orig
+        del metadata['language']
+        assert select_subtitle_tracks(metadata) == ([], ['en-orig'])
+
+        # Немецкое видео: переводы на ru/en не подходят, нужен Whisper
+        german = {'language': 'de', 'automatic_captions': {'de-orig': [], 'ru': [], 'en': []}}
+        assert select_subtitle_tracks(german) == ([], [])
+
+    def test_select_prefers_manual_subtitles(self):
+        """Ручные субтитры важнее автосубтитров, на языке оригинала - если есть"""
+        metadata = {
+            'language': 'ru',
+            'subtitles': {'en': [], 'ru': [], 'fr': []},
+            'automatic_captions': {'ru-orig': []},
+        }
+        assert select_subtitle_tracks(metadata) == (['ru'], [])
+
+        metadata['subtitles'] = {'en-US': []}
+        assert select_subtitle_tracks(metadata) == (['en-US'], [])
@@ -83,6 +83,25 @@ class TestTagManager:
         assert "python" in tags_string
         assert "ai" in tags_string
     
+    def test_tags_block_is_stable_until_refresh(self, tmp_path):
+        """Блок тегов не меняется, пока новых тегов меньше порога"""
+        manager = TagManager(tmp_path / "tags.json")
+        manager.add_tags(["python", "ai"])
+        
+        block, recent = manager.get_tags_block(refresh_every=2)
+        manager.add_tags(["docker"])
+        same_block, recent = manager.get_tags_block(refresh_every=2)
+        
+        assert same_block == block == "ai, python"
+        assert recent == ["docker"]
+        
+        manager.add_tags(["linux"])
+        new_block, recent = manager.get_tags_block(refresh_every=2)
+        
+        assert new_block == "ai, docker, linux, python"
+        assert recent == []
+        assert manager.block_version == 2
+    
     def test_save_tags(self, tmp_path):
         """Тест сохранения тегов в файл"""
         tags_file = tmp_path / "tags.json"
@@ -0,0 +1,124 @@
+"""
+Unit Tests for TranscriptCache
+==============================
+
+Тесты кэша транскрипций по хэшу содержимого медиа.
+"""
+from dataclasses import replace
+from unittest.mock import MagicMock
+
+import numpy as np
+
+from modules import local_ears
+from modules.audio_prep import SAMPLE_RATE, PreparedAudio
+from modules.local_ears import LocalEars, TimedSegment, build_transcript_result
+from modules.transcript_cache import TranscriptCache
+from modules.whisper_pool import WhisperModelPool
+
+
+def make_result(profile: str):
+    segments = [TimedSegment(0.0, 2.0, "Привет"), TimedSegment(62.0, 64.0, f"профиль {profile}")]
+    return build_transcript_result(segments, "ru", 64.0, profile)
+
+
+class TestTranscriptCache:
+    """Тесты для TranscriptCache"""
+
+    def test_roundtrip(self, tmp_path):
+        """Сохранённая транскрипция восстанавливается целиком"""
+        cache = TranscriptCache(tmp_path / "cache.sqlite3")
+        cache.put("hash1", "small", make_result("fast"))
+
+        restored = cache.get("hash1", "small")
+
+        assert restored == replace(make_result("fast"), model="small")
+        assert cache.get("hash1", "medium") is None
+        assert cache.get("hash2", "small") is None
+
+    def test_best_profile_and_minimum(self, tmp_path):
+        """Отдаётся лучший профиль, но не ниже запрошенного"""
+        cache = TranscriptCache(tmp_path / "cache.sqlite3")
+        cache.put("hash1", "small", make_result("fast"))
+        cache.put("hash1", "small", make_result("balanced"))
+
+        assert cache.get("hash1", "small").profile == "balanced"
+        assert cache.get("hash1", "small", min_profile="accurate") is None
+
+    def test_duplicate_media_skips_whisper(self, tmp_path, monkeypatch):
+        """Копия того же файла в другой папке берётся из кэша без модели"""
+        first = tmp_path / "a" / "video.mp4"
+        second = tmp_path / "b" / "reel.mp4"
+        for media in (first, second):
+            media.parent.mkdir()
+            media.write_bytes(b"same video bytes")
+
+        audio = np.zeros(SAMPLE_RATE * 2, dtype=np.float32)
+        monkeypatch.setattr(
+            local_ears, 'prepare_audio',
+            lambda path, content_hash=None: PreparedAudio(path=path, media_hash=content_hash, audio=audio)
+        )
+        model = MagicMock()
+        model.transcribe.return_value = (
+            [MagicMock(start=0.0, end=1.5, text=" один раз")],
+            MagicMock(language="ru", duration=2.0)
+        )
+        loader = MagicMock(return_value=model)
+        ears = LocalEars(
+            pool=WhisperModelPool(idle_ttl=0, loader=loader, warm_up=False),
+            cache=TranscriptCache(tmp_path / "cache.sqlite3"),
+            language="ru"
+        )
+
+        original = ears.transcribe(first)
+        duplicate = ears.transcribe(second)
+
+        assert model.transcribe.call_count == 1
+        assert duplicate.full_text == original.full_text == "один раз"
+
+    def test_routed_model_is_the_cache_key(self, tmp_path):
+        """Запись ищется по модели, которая транскрибировала язык записи"""
+        cache = TranscriptCache(tmp_path / "cache.sqlite3")
+        english = replace(make_result("fast"), language="en")
+        cache.put("hash1", "distil-small.en", english)
+
+        route = {"en": "distil-small.en"}.get
+        restored = cache.get("hash1", lambda language: route(language, "small"))
+
+        assert restored.model == "distil-small.en"
+        assert restored.language == "en"
+        assert cache.get("hash1", "small") is None
+        # Для en маршрут изменился - старая запись не подходит
+        assert cache.get("hash1", lambda language: "medium") is None
+
+    def test_duplicate_routed_media_skips_detection(self, tmp_path, monkeypatch):
+        """Копия английского видео берётся из кэша без определения языка"""
+        first = tmp_path / "a" / "talk.mp4"
+        second = tmp_path / "b" / "talk.mp4"
+        for media in (first, second):
+            media.parent.mkdir()
+            media.write_bytes(b"same english bytes")
+
+        audio = np.zeros(SAMPLE_RATE * 2, dtype=np.float32)
+        monkeypatch.setattr(
+            local_ears, 'prepare_audio',
+            lambda path, content_hash=None: PreparedAudio(path=path, media_hash=content_hash, audio=audio)
+        )
+        model = MagicMock()
+        model.transcribe.return_value = (
+            [MagicMock(start=0.0, end=1.5, text=" hello")],
+            MagicMock(language="en", language_probability=0.9, duration=2.0)
+        )
+        loader = MagicMock(return_value=model)
+        ears = LocalEars(
+            pool=WhisperModelPool(idle_ttl=0, loader=loader, warm_up=False),
+            cache=TranscriptCache(tmp_path / "cache.sqlite3"),
+            language_models={"en": "distil-small.en"}
+        )
+
+        ears.transcribe(first)
+        calls = model.transcribe.call_count
+        duplicate = ears.transcribe(second)
+
+        assert model.transcribe.call_count == calls
+        assert duplicate.model == "distil-small.en"
+        assert duplicate.full_text == "hello"
@@ -0,0 +1,117 @@
+"""
+Unit Tests for TranscriptWriter
+===============================
+
+Тесты потокового чекпоинта транскрипции и продолжения после падения.
+"""
+from pathlib import Path
+from unittest.mock import MagicMock
+
+import numpy as np
+
+from modules import local_ears
+from modules.audio_prep import SAMPLE_RATE, PreparedAudio
+from modules.local_ears import LocalEars, TimedSegment
+from modules.transcript_writer import PARTIAL_FILENAME, TranscriptCheckpoint
+from modules.whisper_pool import WhisperModelPool
+
+
+def make_media(tmp_path: Path) -> Path:
+    media = tmp_path / "video.mp4"
+    media.write_bytes(b"fake video")
+    return media
+
+
+class TestTranscriptCheckpoint:
+    """Тесты для TranscriptCheckpoint"""
+
+    def test_append_and_load(self, tmp_path):
+        """Сохранённые сегменты читаются обратно"""
+        media = make_media(tmp_path)
+        checkpoint = TranscriptCheckpoint.for_folder(tmp_path, media)
+        checkpoint.append(TimedSegment(0.0, 2.5, "Привет"))
+        checkpoint.append(TimedSegment(2.5, 5.0, "мир"))
+        checkpoint.close()
+
+        restored = TranscriptCheckpoint.for_folder(tmp_path, media)
+        segments = restored.load()
+
+        assert [s.text for s in segments] == ["Привет", "мир"]
+        assert restored.resume_from == 5.0
+        assert restored.completed is None
+
+    def test_torn_tail_is_truncated(self, tmp_path):
+        """Недописанная строка отбрасывается, запись продолжается после целых"""
+        media = make_media(tmp_path)
+        checkpoint = TranscriptCheckpoint.for_folder(tmp_path, media)
+        checkpoint.append(TimedSegment(0.0, 1.0, "целый"))
+        checkpoint.close()
+        with open(tmp_path / PARTIAL_FILENAME, 'a', encoding='utf-8') as f:
+            f.write('{"type": "segment", "start": 1.0, "en')
+
+        restored = TranscriptCheckpoint.for_folder(tmp_path, media)
+        assert [s.text for s in restored.load()] == ["целый"]
+
+        restored.append(TimedSegment(1.0, 2.0, "следующий"))
+        restored.close()
+        assert [s.text for s in TranscriptCheckpoint.for_folder(tmp_path, media).load()] == ["целый", "следующий"]
+
+    def test_other_media_is_discarded(self, tmp_path):
+        """Чекпоинт от другого файла удаляется"""
+        media = make_media(tmp_path)
+        checkpoint = TranscriptCheckpoint.for_folder(tmp_path, media)
+        checkpoint.append(TimedSegment(0.0, 1.0, "старое"))
+        checkpoint.close()
+        media.write_bytes(b"another, longer video")
+
+        restored = TranscriptCheckpoint.for_folder(tmp_path, media)
+
+        assert restored.load() == []
+        assert not (tmp_path / PARTIAL_FILENAME).exists()
+
+    def test_finalize_replaces_checkpoint(self, tmp_path):
+        """finalize пишет transcript.md и удаляет чекпоинт"""
+        media = make_media(tmp_path)
+        checkpoint = TranscriptCheckpoint.for_folder(tmp_path, media)
+        checkpoint.append(TimedSegment(0.0, 1.0, "текст"))
+        checkpoint.mark_done("ru", 1.0)
+
+        transcript_path = checkpoint.finalize(tmp_path / "transcript.md", "# Транскрипция\n")
+
+        assert transcript_path.read_text(encoding='utf-8') == "# Транскрипция\n"
+        assert not (tmp_path / PARTIAL_FILENAME).exists()
+
+
+class TestLocalEarsResume:
+    """Продолжение транскрибации с чекпоинта"""
+
+    def test_resume_skips_transcribed_audio(self, tmp_path, monkeypatch):
+        """Whisper получает только аудио после последнего сохранённого сегмента"""
+        media = make_media(tmp_path)
+        audio = np.zeros(SAMPLE_RATE * 10, dtype=np.float32)
+        monkeypatch.setattr(
+            local_ears, 'prepare_audio',
+            lambda path, content_hash=None: PreparedAudio(path=tmp_path / ".audio_x.pcm", media_hash="x", audio=audio)
+        )
+
+        checkpoint = TranscriptCheckpoint.for_folder(tmp_path, media)
+        checkpoint.append(TimedSegment(0.0, 4.0, "первый"))
+        checkpoint.close()
+
+        model = MagicMock()
+        model.transcribe.return_value = (
+            [MagicMock(start=1.0, end=3.0, text=" второй")],
+            MagicMock(language="ru", duration=6.0)
+        )
+        pool = WhisperModelPool(idle_ttl=0, loader=lambda key: model, warm_up=False)
+        ears = LocalEars(pool=pool, language="ru")
+        progress = []
+
+        result = ears.transcribe(media, checkpoint=checkpoint, progress_callback=lambda pos, total: progress.append((pos, total)))
+
+        sent_audio = model.transcribe.call_args[0][0]
+        assert len(sent_audio) == SAMPLE_RATE * 6
+        assert result.timed_transcript == "[00:00] первый\n[00:05] второй"
+        assert result.duration == 10.0
+        assert progress == [(7.0, 10.0)]
+        assert checkpoint.completed['language'] == "ru"
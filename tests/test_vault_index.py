@@ -0,0 +1,109 @@
+"""
+Unit Tests for VaultIndex
+=========================
+
+Тесты инкрементального индекса папок хранилища.
+"""
+import os
+
+import pytest
+
+from modules.vault_index import ANALYZE, INDEX, TRANSCRIBE, VaultIndex
+
+
+def make_folder(root, name, *files):
+    folder = root / name
+    folder.mkdir(parents=True)
+    for file in files:
+        (folder / file).write_text("x", encoding='utf-8')
+    return folder
+
+
+@pytest.fixture
+def vault(tmp_path):
+    root = tmp_path / "downloads"
+    root.mkdir()
+    return root, VaultIndex(root, path=tmp_path / "index.sqlite3")
+
+
+class TestVaultIndex:
+    """Тесты для VaultIndex"""
+
+    def test_pending_by_stage(self, vault):
+        """Папки распределяются по этапам, контейнеры раскрываются"""
+        root, index = vault
+        video = make_folder(root, "user/youtube_1_video", "video.mp4")
+        transcribed = make_folder(root, "user/youtube_2_video", "video.mp4", "transcript.md")
+        photo = make_folder(root, "instagram_3_photo", "description.md", "1.jpg")
+        make_folder(root, "instagram_4_done", "description.md", "Knowledge.md")
+
+        index.refresh()
+
+        assert index.pending(TRANSCRIBE) == [video.resolve()]
+        assert index.pending(ANALYZE) == sorted([transcribed.resolve(), photo.resolve()])
+        assert index.counts() == {TRANSCRIBE: 1, ANALYZE: 2, INDEX: 1}
+
+    def test_refresh_rescans_only_changed_folders(self, vault):
+        """Повторный refresh читает только папки с новым mtime"""
+        root, index = vault
+        video = make_folder(root, "youtube_1_video", "video.mp4")
+        make_folder(root, "youtube_2_video", "video.mp4")
+        index.refresh()
+
+        assert index.refresh() == 0
+
+        (video / "transcript.md").write_text("x", encoding='utf-8')
+        stat = video.stat()
+        os.utime(video, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+        assert index.refresh() == 1
+        assert index.pending(ANALYZE) == [video.resolve()]
+        assert index.pending(TRANSCRIBE) == [(root / "youtube_2_video").resolve()]
+
+    def test_removed_folder_is_dropped(self, vault):
+        """Удалённая папка исчезает из индекса"""
+        root, index = vault
+        video = make_folder(root, "youtube_1_video", "video.mp4")
+        index.refresh()
+
+        (video / "video.mp4").unlink()
+        video.rmdir()
+        index.refresh()
+
+        assert index.pending(TRANSCRIBE) == []
+
+    def test_mark_indexed(self, vault):
+        """Проиндексированная папка не ждёт RAG, пока не изменится"""
+        root, index = vault
+        folder = make_folder(root, "instagram_1_done", "description.md", "Knowledge.md")
+        index.refresh()
+
+        index.mark_indexed(folder)
+
+        assert index.pending(INDEX) == []
+
+    def test_in_place_edit_resets_indexed(self, vault):
+        """Правка Knowledge.md на месте (mtime папки тот же) снова ставит папку в RAG"""
+        root, index = vault
+        folder = make_folder(root, "instagram_1_done", "description.md", "Knowledge.md")
+        index.refresh()
+        index.mark_indexed(folder)
+        folder_mtime = folder.stat().st_mtime_ns
+
+        note = folder / "Knowledge.md"
+        note.write_text("правка", encoding='utf-8')
+        stat = note.stat()
+        os.utime(note, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+        os.utime(folder, ns=(folder.stat().st_atime_ns, folder_mtime))
+
+        assert index.refresh() == 0
+        assert index.pending(INDEX) == [folder.resolve()]
+
+        index.mark_indexed(folder)
+        index.refresh()
+        assert index.pending(INDEX) == []
+
+    def test_unknown_stage(self, vault):
+        _, index = vault
+        with pytest.raises(ValueError):
+            index.pending("upload")
@@ -0,0 +1,93 @@
+"""
+Unit Tests for WhisperModelPool
+===============================
+
+Тесты общего пула моделей Whisper (без загрузки faster-whisper).
+"""
+import threading
+import time
+from unittest.mock import MagicMock
+
+from modules.whisper_pool import ModelKey, WhisperModelPool
+from modules.local_ears import LocalEars
+
+
+KEY = ModelKey(model_size="small", compute_type="int8", device="cpu", cpu_threads=4)
+
+
+def make_pool(**kwargs):
+    loader = MagicMock(side_effect=lambda key: object())
+    return WhisperModelPool(loader=loader, warm_up=False, **kwargs), loader
+
+
+class TestWhisperModelPool:
+    """Тесты для WhisperModelPool"""
+
+    def test_acquire_loads_once(self):
+        """Повторный acquire того же ключа не загружает модель заново"""
+        pool, loader = make_pool(idle_ttl=0)
+
+        first = pool.acquire(KEY)
+        second = pool.acquire(KEY)
+
+        assert first is second
+        assert loader.call_count == 1
+        assert pool.stats()[0]['refcount'] == 2
+
+    def test_different_keys_load_separately(self):
+        """Разные параметры модели - разные записи пула"""
+        pool, loader = make_pool(idle_ttl=0)
+        other = ModelKey(model_size="small", compute_type="int8", device="cpu", cpu_threads=8)
+
+        assert pool.acquire(KEY) is not pool.acquire(other)
+        assert loader.call_count == 2
+
+    def test_evict_idle_respects_refcount(self):
+        """Модель со ссылками не выгружается, без ссылок - выгружается после TTL"""
+        pool, loader = make_pool(idle_ttl=10)
+        pool.acquire(KEY)
+
+        assert pool.evict_idle(now=time.time() + 100) == 0
+
+        pool.release(KEY)
+        assert pool.evict_idle(now=time.time() + 1) == 0
+        assert pool.evict_idle(now=time.time() + 100) == 1
+
+        pool.acquire(KEY)
+        assert loader.call_count == 2
+
+    def test_concurrent_acquire_single_load(self):
+        """Параллельные acquire одного ключа грузят модель один раз"""
+        def slow_loader(key):
+            time.sleep(0.05)
+            return object()
+
+        loader = MagicMock(side_effect=slow_loader)
+        pool = WhisperModelPool(loader=loader, warm_up=False, idle_ttl=0)
+        results = []
+
+        threads = [threading.Thread(target=lambda: results.append(pool.acquire(KEY))) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        assert loader.call_count == 1
+        assert len({id(m) for m in results}) == 1
+
+    def test_local_ears_shares_pool(self):
+        """Два LocalEars с одинаковыми параметрами получают одну модель"""
+        pool, loader = make_pool(idle_ttl=0)
+
+        ears1 = LocalEars(num_threads=4, pool=pool)
+        ears2 = LocalEars(num_threads=4, pool=pool)
+        ears1.load_model()
+        ears2.load_model()
+
+        assert ears1.model is ears2.model
+        assert loader.call_count == 1
+
+        ears1.release()
+        ears2.release()
+        assert ears1.model is None
+        assert pool.stats()[0]['refcount'] == 0